@@ -0,0 +1,55 @@
+"""
+Cria nos bancos existentes os índices declarados em `models.py` que ainda não existem:
+os compostos por tenant (ex.: `ix_service_orders_tenant_status_created`) e os das chaves
+estrangeiras (`service_items.order_id`, `order_notes.order_id`, `engines.boat_id`...).
+
+`create_all` só cria índices junto com tabelas novas; para tabelas que já existem, este
+script compara os índices do modelo com os do banco e cria os que faltam. Um índice que
+existe com outras colunas (ex.: os de listagem antes de ganharem o `id` no fim, que segue
+a ordem da paginação por cursor) é recriado. No fim roda ANALYZE, para o planejador de
+consultas ter estatísticas dos índices novos.
+
+Uso (a partir do diretório backend):
+    python add_composite_indexes.py
+"""
+
+import sys
+import os
+from sqlalchemy import text, inspect
+
+# Add backend dir to sys.path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import engine
+import models
+
+def add_indexes():
+    print("Verifying database indexes...")
+    inspector = inspect(engine)
+    created = 0
+
+    for table in models.Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            print(f"Table '{table.name}' does NOT exist. Creating it with its indexes...")
+            table.create(bind=engine)
+            continue
+
+        existing = {index["name"]: index["column_names"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            columns = [column.name for column in index.columns]
+            if existing.get(index.name) == columns:
+                continue
+            if index.name in existing:
+                print(f"Dropping {index.name} on {table.name} ({', '.join(existing[index.name])})...")
+                index.drop(bind=engine)
+            print(f"Creating {index.name} on {table.name} ({', '.join(columns)})...")
+            index.create(bind=engine)
+            created += 1
+
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        conn.commit()
+    print(f"{created} index(es) created. Index verification completed.")
+
+if __name__ == "__main__":
+    add_indexes()
@@ -0,0 +1,43 @@
+"""
+Adiciona a coluna `fiscal_jobs.locked_by` (worker que pegou o job) nos bancos existentes.
+
+Com ela, um job preso em 'processing' por um processo que morreu volta para a fila na
+inicialização do servidor, sem esperar FISCAL_QUEUE_STALE_AFTER (ver `services/fiscal_queue.py`).
+
+Uso (a partir do diretório backend):
+    python add_fiscal_job_columns.py
+"""
+
+import sys
+import os
+from sqlalchemy import text, inspect
+
+# Add backend dir to sys.path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import engine
+
+def add_columns():
+    print("Verifying fiscal_jobs schema...")
+    inspector = inspect(engine)
+
+    if not inspector.has_table('fiscal_jobs'):
+        print("Table 'fiscal_jobs' does NOT exist. Creating tables via models...")
+        import models
+        models.Base.metadata.create_all(bind=engine)
+        print("Tables created.")
+        return
+
+    columns = [col['name'] for col in inspector.get_columns('fiscal_jobs')]
+    with engine.connect() as conn:
+        if 'locked_by' not in columns:
+            print("Adding fiscal_jobs.locked_by column...")
+            conn.execute(text("ALTER TABLE fiscal_jobs ADD COLUMN locked_by VARCHAR(100)"))
+            print("locked_by added.")
+        else:
+            print("locked_by already exists.")
+        conn.commit()
+    print("Schema verification completed.")
+
+if __name__ == "__main__":
+    add_columns()
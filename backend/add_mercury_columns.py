@@ -36,7 +36,23 @@ def add_columns():
             print("mercury_password added.")
         else:
             print("mercury_password already exists.")
+
+        if 'mercury_backend' not in columns:
+            print("Adding mercury_backend column...")
+            conn.execute(text("ALTER TABLE company_info ADD COLUMN mercury_backend VARCHAR(20)"))
+            print("mercury_backend added.")
+        else:
+            print("mercury_backend already exists.")
             
+        if inspector.has_table('engines'):
+            engine_columns = [col['name'] for col in inspector.get_columns('engines')]
+            if 'warranty_checked_at' not in engine_columns:
+                print("Adding engines.warranty_checked_at column...")
+                conn.execute(text("ALTER TABLE engines ADD COLUMN warranty_checked_at TIMESTAMP"))
+                print("warranty_checked_at added.")
+            else:
+                print("warranty_checked_at already exists.")
+
         conn.commit()
     print("Schema verification completed.")
 
@@ -0,0 +1,53 @@
+"""
+Preenche as datas nulas usadas como chave da paginação por cursor (`pagination.py`) e
+torna as colunas NOT NULL: `service_orders.created_at` e `stock_movements.date`.
+
+Com uma data nula na última linha de uma página, o cursor da próxima página não podia ser
+decodificado (400), e o filtro `(data, id) < (:data, :id)` nunca casa com linhas de data
+nula, que sumiam das páginas seguintes. As linhas sem data recebem `MISSING_DATE` (ficam no
+fim das listagens, como as mais antigas).
+
+No PostgreSQL a restrição NOT NULL é aplicada com ALTER TABLE; no SQLite (que não altera
+colunas existentes) ela vale para bancos novos, e o default do modelo sempre grava a data.
+
+Uso (a partir do diretório backend):
+    python backfill_keyset_columns.py
+"""
+
+import sys
+import os
+from datetime import datetime
+from sqlalchemy import text, inspect
+
+# Add backend dir to sys.path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import engine
+
+MISSING_DATE = datetime(1970, 1, 1) # Data gravada nas linhas sem data.
+KEYSET_COLUMNS = [("service_orders", "created_at"), ("stock_movements", "date")]
+
+def backfill(bind=engine):
+    print("Verifying pagination key columns...")
+    inspector = inspect(bind)
+    filled = 0
+
+    with bind.connect() as conn:
+        for table, column in KEYSET_COLUMNS:
+            if not inspector.has_table(table):
+                print(f"Table '{table}' does not exist. Skipping.")
+                continue
+            result = conn.execute(
+                text(f"UPDATE {table} SET {column} = :missing WHERE {column} IS NULL"), {"missing": MISSING_DATE}
+            )
+            print(f"{table}.{column}: {result.rowcount} row(s) without date filled.")
+            filled += result.rowcount
+            if bind.dialect.name == "postgresql":
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+                print(f"{table}.{column} set to NOT NULL.")
+        conn.commit()
+    print("Pagination key verification completed.")
+    return filled
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,115 @@
+"""
+Benchmark: vazão da assinatura de NF-e (assinaturas por segundo) com o `FiscalSigner`.
+
+Gera um certificado A1 autoassinado (RSA 2048) num diretório temporário e assina N notas:
+- lendo o PFX a cada assinatura (como seria assinar inline, sem cache);
+- no próprio processo, com o certificado em cache (FISCAL_SIGN_WORKERS=0);
+- no pool de processos, de 1 até o número de núcleos da máquina.
+
+Todas as notas assinadas são conferidas com `verify_nfe_signature`. O tempo do pool não
+inclui a partida dos processos (uma rodada de aquecimento assina uma nota por worker).
+
+Uso (a partir do diretório backend):
+    python benchmarks/bench_fiscal_signer.py [--documents 200] [--items 10] [--workers 1,2,4]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+# Adiciona o diretório backend ao sys.path (mesmo padrão dos scripts de manutenção).
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509.oid import NameOID
+
+from services import fiscal_signer
+from services.fiscal_signer import FiscalSigner, sign_nfe, verify_nfe_signature
+from services.nfe_builder import NFeBuilder
+
+PASSWORD = "benchmark"
+
+
+def write_pfx(path: str):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "MARE ALTA NAUTICA LTDA:12345678000199")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder().subject_name(subject).issuer_name(subject).public_key(key.public_key())
+        .serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=365))
+        .sign(key, hashes.SHA256())
+    )
+    with open(path, "wb") as f:
+        f.write(pkcs12.serialize_key_and_certificates(
+            b"a1", key, certificate, None, serialization.BestAvailableEncryption(PASSWORD.encode())
+        ))
+
+
+def documents(count: int, items: int):
+    builder = NFeBuilder()
+    issuer = {"companyName": "Mare Alta Nautica LTDA", "cnpj": "12345678000199", "address": {"state": "PR"}}
+    lines = [{"code": f"8M{i:07d}", "desc": f"Item {i}", "qty": 1, "price": 10.0, "total": 10.0} for i in range(items)]
+    return [
+        builder.build({"number": str(n), "tenant_id": 1, "issuer": issuer, "items": lines, "totalValue": 10.0 * items})
+        for n in range(count)
+    ]
+
+
+def report(label: str, count: int, elapsed: float):
+    print(f"{label:<34}{count / elapsed:>12.1f}{elapsed / count * 1000:>12.2f}")
+
+
+def main(count: int, items: int, workers):
+    xmls = documents(count, items)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "certificate.pfx")
+        write_pfx(path)
+        print(f"{count} NF-e de {items} itens ({len(xmls[0]) / 1024:.1f} KB), {os.cpu_count()} núcleo(s)")
+        print(f"{'modo':<34}{'assin./s':>12}{'ms/assin.':>12}")
+
+        # Sem cache: cada assinatura lê e decifra o PFX de novo.
+        started = time.perf_counter()
+        for xml in xmls:
+            fiscal_signer._credentials.clear()
+            sign_nfe(xml, fiscal_signer.load_credentials(path, PASSWORD))
+        report("inline, PFX lido a cada nota", count, time.perf_counter() - started)
+
+        inline = FiscalSigner(cert_path=path, cert_dir="", password=PASSWORD, max_workers=0)
+        started = time.perf_counter()
+        signed = inline.sign_many(xmls)
+        report("inline, certificado em cache", count, time.perf_counter() - started)
+        assert all(verify_nfe_signature(xml) for xml in signed)
+
+        for size in workers:
+            signer = FiscalSigner(cert_path=path, cert_dir="", password=PASSWORD, max_workers=size)
+            try:
+                signer.sign_many(xmls[:size])  # aquecimento: sobe os processos e carrega o PFX
+                started = time.perf_counter()
+                signed = signer.sign_many(xmls)
+                report(f"pool de {size} processo(s)", count, time.perf_counter() - started)
+            finally:
+                signer.shutdown()
+            assert all(verify_nfe_signature(xml) for xml in signed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument(
+        "--workers", default=None,
+        help="Tamanhos de pool, separados por vírgula (padrão: 1, 2, 4... até o número de núcleos)",
+    )
+    args = parser.parse_args()
+    if args.workers:
+        sizes = [int(n) for n in args.workers.split(",")]
+    else:
+        cores = os.cpu_count() or 1
+        sizes = sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    main(args.documents, args.items, sizes)
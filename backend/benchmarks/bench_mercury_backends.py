@@ -0,0 +1,140 @@
+"""
+Benchmark: backend HTTP x Playwright do scraper Mercury, sobre as páginas gravadas
+em `tests/fixtures/mercury` (nenhum acesso ao portal real).
+
+Mede latência média por busca de produto e pico de memória Python (tracemalloc)
+para o caminho HTTP. O caminho Playwright é medido servindo as mesmas páginas via
+`page.route`, quando o Chromium estiver instalado (`playwright install chromium`);
+para ele também é reportado o RSS do processo do navegador, quando disponível.
+
+Uso (a partir do diretório backend):
+    python benchmarks/bench_mercury_backends.py [--iterations 50] [--latency-ms 0]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+# Adiciona o diretório backend ao sys.path (mesmo padrão dos scripts de manutenção).
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from services.mercury_http import MercuryHttpClient
+from services.mercury_parser import parse_product_results
+from services.mercury_pool import BrowserPool
+from services.mercury_session import MercurySessionManager
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures", "mercury")
+BASE_URL = "https://portal.bench/epdv"
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def page_for(path: str, method: str = "GET") -> tuple:
+    """Retorna (html, cookie) que o portal gravado devolveria para o caminho."""
+    page = path.rsplit("/", 1)[-1].split("?", 1)[0]
+    if page == "epdv001.asp":
+        if method == "POST":
+            return "<html>ok</html>", "ASPSESSIONID=bench; Path=/"
+        return load_fixture("epdv001.html"), None
+    return load_fixture(page.replace(".asp", ".html")), None
+
+
+async def bench_http(iterations: int, latency: float) -> dict:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if latency:
+            await asyncio.sleep(latency)
+        html, cookie = page_for(request.url.path, request.method)
+        headers = {"Set-Cookie": cookie} if cookie else {}
+        return httpx.Response(200, text=html, headers=headers)
+
+    client = MercuryHttpClient(base_url=BASE_URL, transport=httpx.MockTransport(handler))
+    await client.search_product("aquecimento", "bench", "bench", tenant_id=1) # Login fora da medição.
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await client.search_product("filtro", "bench", "bench", tenant_id=1)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"backend": "http", "ms_per_lookup": elapsed / iterations * 1000, "peak_mb": peak / 1e6}
+
+
+def browser_rss_mb() -> float:
+    # Soma o RSS dos processos do Chromium (Linux), quando /proc estiver disponível.
+    total = 0
+    for pid in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if b"chrom" not in f.read():
+                    continue
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total / 1e6
+
+
+async def bench_playwright(iterations: int, latency: float) -> dict:
+    pool = BrowserPool(size=1)
+    sessions = MercurySessionManager()
+
+    async def route(route):
+        if latency:
+            await asyncio.sleep(latency)
+        html, cookie = page_for(route.request.url, route.request.method)
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        if cookie:
+            headers["Set-Cookie"] = cookie
+        await route.fulfill(status=200, body=html, headers=headers)
+
+    url = f"{BASE_URL}/epdv002d2.asp?s_desc_item=filtro"
+    try:
+        async with pool.context() as context:
+            await context.route("**/*", route)
+            page = await context.new_page()
+            await sessions.goto(page, url, 1, "bench", "bench") # Login fora da medição.
+            started = time.perf_counter()
+            for _ in range(iterations):
+                html = await sessions.goto(page, url, 1, "bench", "bench")
+                parse_product_results(html)
+            elapsed = time.perf_counter() - started
+            rss = browser_rss_mb()
+    finally:
+        await pool.stop()
+    return {"backend": "playwright", "ms_per_lookup": elapsed / iterations * 1000, "peak_mb": rss}
+
+
+async def main(iterations: int, latency_ms: float):
+    latency = latency_ms / 1000
+    results = [await bench_http(iterations, latency)]
+    try:
+        results.append(await bench_playwright(iterations, latency))
+    except Exception as e:
+        print(f"Playwright não medido ({type(e).__name__}: {str(e).splitlines()[0]})")
+
+    print(f"{'backend':<12}{'ms/busca':>12}{'memória (MB)':>16}")
+    for r in results:
+        print(f"{r['backend']:<12}{r['ms_per_lookup']:>12.2f}{r['peak_mb']:>16.2f}")
+    if len(results) == 2:
+        print(f"Ganho de latência do HTTP: {results[1]['ms_per_lookup'] / results[0]['ms_per_lookup']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latência simulada por requisição ao portal")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations, args.latency_ms))
@@ -0,0 +1,152 @@
+"""
+Benchmark: parsing das páginas do Portal Mercury, BeautifulSoup (antes) x lxml (atual).
+
+Usa as páginas gravadas em `tests/fixtures/mercury` e uma página de preços ampliada
+com N linhas, simulando buscas genéricas (ex.: "filtro") que retornam centenas de itens.
+O caminho "antes" é a implementação original com `BeautifulSoup(html, "html.parser")` e
+`find`/`find_all` encadeados, mantida aqui apenas como referência de comparação.
+
+Uso (a partir do diretório backend):
+    python benchmarks/bench_mercury_parser.py [--iterations 200] [--rows 500]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+# Adiciona o diretório backend ao sys.path (mesmo padrão dos scripts de manutenção).
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from services import mercury_parser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures", "mercury")
+
+ROW_TEMPLATE = (
+    '<tr class="Row"><td><input type="checkbox"></td><td>8M{0:07d}</td><td>1</td>'
+    '<td>FILTRO DE OLEO {0}</td><td>3</td><td>R$ 1.234,56</td><td>R$ 1.300,00</td><td>R$ 987,65</td></tr>\n'
+)
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def large_product_page(rows: int) -> str:
+    """Página de preços gravada, com `rows` linhas extras na tabela de resultados."""
+    html = load_fixture("epdv002d2.html")
+    extra = "".join(ROW_TEMPLATE.format(i) for i in range(rows))
+    return html.replace("</table>\n    </td>", extra + "</table>\n    </td>", 1)
+
+
+# --- Implementação anterior (BeautifulSoup) ---
+
+def bs4_parse_product_results(html: str):
+    soup = BeautifulSoup(html, "html.parser")
+    form = soup.find("form", id="preco_item_web")
+    if not form:
+        return []
+    first_table = form.find("table")
+    tbody = first_table.find("tbody") if first_table else None
+    tr = tbody.find("tr") if tbody else None
+    td = tr.find("td") if tr else None
+    if not td:
+        return []
+    tables_in_td = td.find_all("table")
+    if len(tables_in_td) < 2:
+        return []
+    dados = []
+    for linha in tables_in_td[1].find_all("tr", class_="Row"):
+        colunas = linha.find_all("td")
+        if len(colunas) >= 8:
+            dados.append({
+                "codigo": colunas[1].text.strip(),
+                "qtd": colunas[2].text.strip(),
+                "descricao": colunas[3].text.strip(),
+                "qtdaEst": colunas[4].text.strip(),
+                "valorVenda": colunas[5].text.strip(),
+                "valorTabela": colunas[6].text.strip(),
+                "valorCusto": colunas[7].text.strip(),
+            })
+    return dados
+
+
+def bs4_parse_warranty(html: str, client_html: str, nro_motor: str):
+    soup = BeautifulSoup(html, "html.parser")
+    if nro_motor.upper() not in soup.get_text().upper():
+        return None
+    row = soup.select_one("tr.Row")
+    cells = row.find_all("td") if row else []
+    if len(cells) < 6:
+        return None
+    result = {
+        "nro_motor": nro_motor,
+        "nro_serie": cells[0].get_text(strip=True),
+        "modelo": cells[1].get_text(strip=True),
+        "dt_venda": cells[2].get_text(strip=True),
+        "status_garantia": cells[4].get_text(strip=True),
+        "vld_garantia": cells[5].get_text(strip=True),
+    }
+    soup_client = BeautifulSoup(client_html, "html.parser")
+    nome_cli = ""
+    client_table = soup_client.select_one("#warranty_clients table")
+    if client_table:
+        rows = client_table.find_all("tr")
+        if len(rows) >= 3:
+            nome_cli = rows[2].get_text(strip=True).replace("NOME ", "").strip()
+    if not nome_cli:
+        match = re.search(r"NOME\s+([^\n]+)", soup_client.get_text())
+        if match:
+            nome_cli = match.group(1).strip()
+    result["nome_cli"] = nome_cli
+    return result
+
+
+# --- Implementação atual (lxml) ---
+
+def lxml_parse_warranty(html: str, client_html: str, nro_motor: str):
+    result = mercury_parser.parse_warranty_summary(html, nro_motor)
+    if result is not None:
+        result["nome_cli"] = mercury_parser.parse_warranty_client_name(client_html)
+    return result
+
+
+def timed(fn, iterations: int) -> float:
+    """Tempo médio por chamada, em milissegundos."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def main(iterations: int, rows: int):
+    product_small = load_fixture("epdv002d2.html")
+    product_large = large_product_page(rows)
+    warranty = load_fixture("ewr010.html")
+    warranty_client = load_fixture("ewr010c.html")
+
+    cases = [
+        ("produtos (3 linhas)", lambda: bs4_parse_product_results(product_small), lambda: mercury_parser.parse_product_results(product_small)),
+        (f"produtos ({rows + 3} linhas)", lambda: bs4_parse_product_results(product_large), lambda: mercury_parser.parse_product_results(product_large)),
+        ("garantia", lambda: bs4_parse_warranty(warranty, warranty_client, "2B123456"), lambda: lxml_parse_warranty(warranty, warranty_client, "2B123456")),
+    ]
+
+    print(f"{'página':<24}{'antes (ms)':>12}{'lxml (ms)':>12}{'ganho':>8}")
+    for name, before, after in cases:
+        # As duas implementações precisam extrair exatamente o mesmo resultado.
+        assert before() == after(), f"Resultados divergentes em {name}"
+        before_ms = timed(before, iterations)
+        after_ms = timed(after, iterations)
+        print(f"{name:<24}{before_ms:>12.3f}{after_ms:>12.3f}{before_ms / after_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=500, help="Linhas extras na página de preços ampliada")
+    args = parser.parse_args()
+    main(args.iterations, args.rows)
@@ -0,0 +1,200 @@
+"""
+Benchmark do scraper Mercury contra o portal local de replay (`mercury_replay.py`).
+
+Reporta latência p50/p95, vazão e pico de memória de:
+- `search_product_playwright` e `search_warranty_playwright` (quando o Chromium estiver instalado);
+- as mesmas buscas pelo backend HTTP (`mercury_http_client`);
+- a sincronização de preços em massa (`run_price_sync`) sobre N peças num SQLite em memória.
+
+A latência e as falhas do portal são simuladas pelo servidor de replay. O limite de
+requisições por segundo (MERCURY_MAX_RPS) é desligado por padrão, para medir o scraper
+e não o governador de taxa; defina a variável para incluí-lo na medição.
+
+Uso (a partir do diretório backend):
+    python benchmarks/bench_mercury_replay.py [--iterations 30] [--concurrency 4] [--latency-ms 50]
+        [--jitter-ms 10] [--failure-rate 0] [--extra-rows 0] [--parts 200] [--sync-backend http]
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+# Adiciona o diretório backend ao sys.path (mesmo padrão dos scripts de manutenção).
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mercury_replay import ReplayServer
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+async def measure(name: str, operation, iterations: int, concurrency: int, rss=None) -> dict:
+    """
+    Executa `operation(i)` `iterations` vezes com até `concurrency` em paralelo.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await operation(i)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(iterations)])
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "name": name,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "ops_s": iterations / elapsed,
+        "peak_mb": peak / 1e6,
+        "rss_mb": rss() if rss else None,
+        "errors": errors,
+    }
+
+
+async def bench_sync(parts: int, concurrency: int, backend: str) -> dict:
+    """
+    Sincronização em massa: N peças num SQLite em memória, buscadas pelo caminho completo
+    (`search_product_portal`: single-flight, limitador e circuit breaker).
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    import models
+    import schemas
+    from routers.mercury_router import search_product_portal
+    from services.mercury_sync import PriceSyncJobStore, run_price_sync
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    tenant = models.Tenant(name="Bench", subdomain="bench")
+    db.add(tenant)
+    db.commit()
+    tenant_id = tenant.id
+    db.add_all([models.Part(sku=f"8M{i:07d}", name=f"Peça {i}", manufacturer="Mercury", tenant_id=tenant_id) for i in range(parts)])
+    db.commit()
+    selected = [(part.id, part.sku) for part in db.query(models.Part).all()]
+    db.close()
+
+    credentials = schemas.CompanyInfoBase(mercury_username="bench", mercury_password="bench", mercury_backend=backend)
+    job = PriceSyncJobStore().create(tenant_id, selected, concurrency=concurrency)
+
+    latencies = []
+
+    async def search(sku: str):
+        started = time.perf_counter()
+        try:
+            return await search_product_portal(sku, credentials, tenant_id=tenant_id)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await run_price_sync(job, search, session_factory)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "name": f"sync em massa ({backend}, {parts} peças)",
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "ops_s": parts / elapsed,
+        "peak_mb": peak / 1e6,
+        "rss_mb": None,
+        "errors": job.counts["error"],
+    }
+
+
+async def main(args):
+    server = ReplayServer(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate,
+        failure_mode=args.failure_mode, hang_seconds=5, extra_rows=args.extra_rows, seed=42,
+    ).start()
+    # Configura o scraper para o portal local antes de importar os módulos (lidos no import).
+    os.environ["MERCURY_PORTAL_URL"] = server.base_url
+    os.environ.setdefault("MERCURY_MAX_RPS", "0")
+    os.environ.setdefault("MERCURY_POOL_SIZE", str(args.concurrency))
+    os.environ.setdefault("MERCURY_MAX_CONCURRENCY", str(args.concurrency))
+    os.environ.setdefault("MERCURY_TENANT_MAX_CONCURRENCY", str(args.concurrency))
+
+    from benchmarks.bench_mercury_backends import browser_rss_mb
+    from routers.mercury_router import search_product_playwright, search_warranty_playwright
+    from services.mercury_http import mercury_http_client
+    from services.mercury_pool import browser_pool
+
+    user, password = "bench", "bench"
+    results = []
+    try:
+        results.append(await measure(
+            "produto (http)",
+            lambda i: mercury_http_client.search_product("filtro", user, password, tenant_id=1),
+            args.iterations, args.concurrency,
+        ))
+        results.append(await measure(
+            "garantia (http)",
+            lambda i: mercury_http_client.search_warranty(f"2B{i:06d}", user, password, tenant_id=1),
+            args.iterations, args.concurrency,
+        ))
+
+        try:
+            await browser_pool.start()
+        except Exception as e:
+            print(f"Playwright não medido ({type(e).__name__}: {str(e).splitlines()[0]})")
+        else:
+            results.append(await measure(
+                "search_product_playwright",
+                lambda i: search_product_playwright("filtro", user, password, tenant_id=1),
+                args.iterations, args.concurrency, rss=browser_rss_mb,
+            ))
+            results.append(await measure(
+                "search_warranty_playwright",
+                lambda i: search_warranty_playwright(f"2B{i:06d}", user, password, tenant_id=1),
+                args.iterations, args.concurrency, rss=browser_rss_mb,
+            ))
+
+        if args.sync_backend != "playwright" or browser_pool.stats().get("browser_connected"):
+            results.append(await bench_sync(args.parts, args.concurrency, args.sync_backend))
+    finally:
+        await browser_pool.stop()
+        await mercury_http_client.close()
+        server.stop()
+
+    print(f"\nPortal de replay: latência {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, falhas {args.failure_rate:.0%} ({args.failure_mode})")
+    print(f"{'operação':<36}{'p50 (ms)':>10}{'p95 (ms)':>10}{'ops/s':>9}{'heap (MB)':>11}{'RSS (MB)':>10}{'erros':>7}")
+    for r in results:
+        rss = f"{r['rss_mb']:.1f}" if r["rss_mb"] is not None else "-"
+        print(f"{r['name']:<36}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['ops_s']:>9.1f}{r['peak_mb']:>11.2f}{rss:>10}{r['errors']:>7}")
+    print(f"Requisições ao portal: {server.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latência simulada por requisição ao portal")
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--failure-mode", choices=["500", "timeout", "reset"], default="500")
+    parser.add_argument("--extra-rows", type=int, default=0, help="Linhas extras na página de preços")
+    parser.add_argument("--parts", type=int, default=200, help="Peças na sincronização em massa")
+    parser.add_argument("--sync-backend", choices=["http", "playwright"], default="http")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,131 @@
+"""
+Benchmark: geração do XML da NF-e com o `NFeBuilder` (lxml) conforme cresce o número de itens.
+
+Mede o tempo por nota para notas de 1 até N itens, com e sem a cache do `<emit>`, e
+confere que o XML gerado tem um `<det>` por item e o total correto. Como referência,
+mede a abordagem anterior (f-string com `invoice_data.get(...)` encadeados), estendida
+para repetir o bloco `<det>` por item, já que a original gerava sempre um só.
+
+Uso (a partir do diretório backend):
+    python benchmarks/bench_nfe_builder.py [--iterations 50] [--items 1,50,200,500,1000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Adiciona o diretório backend ao sys.path (mesmo padrão dos scripts de manutenção).
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree
+
+from services.nfe_builder import NFE_NAMESPACE, EmitCache, NFeBuilder
+
+ISSUER = {
+    "companyName": "Mare Alta Nautica LTDA", "tradeName": "Mare Alta", "cnpj": "12.345.678/0001-99",
+    "ie": "901.234.567-8", "crt": "1",
+    "address": {"street": "Rua do Porto", "number": "10", "neighborhood": "Centro", "city": "Paranaguá", "state": "PR", "zip": "83200-000"},
+}
+
+
+def invoice(items: int) -> dict:
+    lines = [
+        {"code": f"8M{i:07d}", "desc": f"Filtro de oleo {i}", "qty": 1 + i % 3, "price": 50.0, "total": 50.0 * (1 + i % 3)}
+        for i in range(items)
+    ]
+    return {
+        "type": "NFE", "number": "1001", "series": "1", "tenant_id": 1,
+        "issuer": ISSUER, "recipient": {"name": "Joao da Silva", "doc": "123.456.789-00"},
+        "items": lines, "totalValue": sum(line["total"] for line in lines),
+    }
+
+
+def fstring_generate(invoice_data: dict) -> str:
+    """Abordagem anterior: f-strings com lookups encadeados, um bloco <det> por item."""
+    dets = "".join(
+        f"""
+                <det nItem="{n}">
+                    <prod>
+                        <cProd>{item.get('code', '')}</cProd>
+                        <cEAN>SEM GTIN</cEAN>
+                        <xProd>{item.get('desc', '')}</xProd>
+                        <NCM>00000000</NCM>
+                        <CFOP>5102</CFOP>
+                        <uCom>UN</uCom>
+                        <qCom>{float(item.get('qty', 0)):.4f}</qCom>
+                        <vUnCom>{float(item.get('price', 0)):.2f}</vUnCom>
+                        <vProd>{float(item.get('total', 0)):.2f}</vProd>
+                        <cEANTrib>SEM GTIN</cEANTrib>
+                        <uTrib>UN</uTrib>
+                        <qTrib>{float(item.get('qty', 0)):.4f}</qTrib>
+                        <vUnTrib>{float(item.get('price', 0)):.2f}</vUnTrib>
+                        <indTot>1</indTot>
+                    </prod>
+                    <imposto>
+                        <vTotTrib>0.00</vTotTrib>
+                        <ICMS><ICMSSN102><orig>0</orig><CSOSN>102</CSOSN></ICMSSN102></ICMS>
+                        <PIS><PISOutr><CST>99</CST><vBC>0.00</vBC><pPIS>0.00</pPIS><vPIS>0.00</vPIS></PISOutr></PIS>
+                        <COFINS><COFINSOutr><CST>99</CST><vBC>0.00</vBC><pCOFINS>0.00</pCOFINS><vCOFINS>0.00</vCOFINS></COFINSOutr></COFINS>
+                    </imposto>
+                </det>"""
+        for n, item in enumerate(invoice_data.get('items', []), start=1)
+    )
+    return f"""
+        <NFe xmlns="http://www.portalfiscal.inf.br/nfe">
+            <infNFe Id="NFe{'0' * 44}" versao="4.00">
+                <emit>
+                    <CNPJ>{invoice_data.get('issuer', {}).get('cnpj', '')}</CNPJ>
+                    <xNome>{invoice_data.get('issuer', {}).get('companyName', '')}</xNome>
+                    <enderEmit>
+                        <xLgr>{invoice_data.get('issuer', {}).get('address', {}).get('street', '')}</xLgr>
+                        <nro>{invoice_data.get('issuer', {}).get('address', {}).get('number', '')}</nro>
+                        <xMun>{invoice_data.get('issuer', {}).get('address', {}).get('city', '')}</xMun>
+                        <UF>{invoice_data.get('issuer', {}).get('address', {}).get('state', '')}</UF>
+                    </enderEmit>
+                </emit>{dets}
+                <total><ICMSTot><vNF>{invoice_data.get('totalValue', 0)}</vNF></ICMSTot></total>
+            </infNFe>
+        </NFe>
+        """.strip()
+
+
+def timed(fn, iterations: int) -> float:
+    """Tempo médio por chamada, em milissegundos."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def check(xml: str, data: dict):
+    root = etree.fromstring(xml.encode("utf-8"))
+    dets = root.findall(f".//{{{NFE_NAMESPACE}}}det")
+    assert len(dets) == len(data["items"]), (len(dets), len(data["items"]))
+    v_nf = root.find(f".//{{{NFE_NAMESPACE}}}vNF").text
+    assert float(v_nf) == round(data["totalValue"], 2), v_nf
+
+
+def main(iterations: int, sizes):
+    cached = NFeBuilder()
+    print(f"{'itens':>6}{'lxml (ms)':>12}{'sem cache (ms)':>16}{'f-string (ms)':>15}{'µs/item':>10}{'KB':>8}")
+    for size in sizes:
+        data = invoice(size)
+        xml = cached.build(data)
+        check(xml, data)
+        with_cache = timed(lambda: cached.build(data), iterations)
+        without_cache = timed(lambda: NFeBuilder(emit_cache=EmitCache()).build(data), iterations)
+        fstring = timed(lambda: fstring_generate(data), iterations)
+        print(
+            f"{size:>6}{with_cache:>12.3f}{without_cache:>16.3f}{fstring:>15.3f}"
+            f"{with_cache / size * 1000:>10.1f}{len(xml) / 1024:>8.1f}"
+        )
+    print(f"Cache do <emit>: {cached.emit_cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--items", default="1,50,200,500,1000", help="Quantidades de itens, separadas por vírgula")
+    args = parser.parse_args()
+    main(args.iterations, [int(n) for n in args.items.split(",")])
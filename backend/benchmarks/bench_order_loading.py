@@ -0,0 +1,120 @@
+"""
+Benchmark: carga das ordens de serviço com itens e notas, comparando dois joinedload na
+mesma consulta (como era antes) com `crud.ORDER_DETAIL_OPTIONS` (um selectinload por coleção).
+
+Popula um banco SQLite temporário (perfil de produção de `database.py`) com N ordens de um
+tenant, cada uma com I itens e T notas, e mede para a listagem (`get_orders(limit=100)`) e
+para o detalhe de uma OS (`get_order`): número de consultas, linhas devolvidas pelo banco
+(o JOIN duplo devolve itens x notas linhas por OS) e o melhor tempo de algumas repetições.
+
+Uso (a partir do diretório backend):
+    python benchmarks/bench_order_loading.py [--orders 500] [--items 40] [--notes 30] [--page-size 100]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Adiciona o diretório backend ao sys.path (mesmo padrão dos scripts de manutenção).
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import joinedload, sessionmaker
+
+import crud
+import models
+from database import Base, create_db_engine
+
+JOINED_OPTIONS = (joinedload(models.ServiceOrder.items), joinedload(models.ServiceOrder.notes))
+
+
+def populate(engine, orders: int, items: int, notes: int):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(models.Tenant), [{"name": "Bench", "subdomain": "bench"}])
+        connection.execute(insert(models.Client), [{"tenant_id": 1, "name": "Cliente", "document": "12345678900"}])
+        connection.execute(insert(models.Boat), [{"tenant_id": 1, "client_id": 1, "name": "Barco", "hull_id": "HULL-1"}])
+        connection.execute(insert(models.ServiceOrder), [
+            {"tenant_id": 1, "boat_id": 1, "description": f"Revisão {i}"} for i in range(orders)
+        ])
+        connection.execute(insert(models.ServiceItem), [
+            {"order_id": order_id, "type": models.ItemType.PART, "description": f"Item {i}", "unit_price": 10, "total": 10}
+            for order_id in range(1, orders + 1) for i in range(items)
+        ])
+        connection.execute(insert(models.OrderNote), [
+            {"order_id": order_id, "text": f"Nota {i}"} for order_id in range(1, orders + 1) for i in range(notes)
+        ])
+        connection.exec_driver_sql("ANALYZE")
+
+
+def measure(engine, db, load, repeat: int = 5):
+    """
+    Roda `load` e devolve (consultas, linhas lidas do banco, melhor tempo em ms).
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        load()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    db.expunge_all()
+    # Linhas que o banco devolveu em cada SELECT, contadas depois (fora do listener).
+    rows = sum(
+        db.connection().exec_driver_sql(f"SELECT COUNT(*) FROM ({statement})", parameters).scalar()
+        for statement, parameters in statements
+    )
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        load()
+        best = min(best, time.perf_counter() - started)
+        db.expunge_all()
+    return len(statements), rows, best * 1000
+
+
+def main(orders: int, items: int, notes: int, page_size: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        try:
+            populate(engine, orders, items, notes)
+            db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+            Order = models.ServiceOrder
+            cases = {
+                f"listagem ({page_size})": {
+                    "joinedload": lambda: (
+                        db.query(Order).options(*JOINED_OPTIONS).filter(Order.tenant_id == 1)
+                        .order_by(Order.created_at.desc(), Order.id.desc()).limit(page_size).all()
+                    ),
+                    "selectinload": lambda: crud.get_orders(db, tenant_id=1, limit=page_size),
+                },
+                "detalhe (1 OS)": {
+                    "joinedload": lambda: db.query(Order).options(*JOINED_OPTIONS).filter(Order.id == 1).first(),
+                    "selectinload": lambda: crud.get_order(db, 1),
+                },
+            }
+            print(f"{orders} OS com {items} itens e {notes} notas cada")
+            print(f"{'carga':<18}{'estratégia':<14}{'consultas':>10}{'linhas':>10}{'ms':>10}")
+            for label, strategies in cases.items():
+                for strategy, load in strategies.items():
+                    queries, rows, elapsed = measure(engine, db, load)
+                    print(f"{label:<18}{strategy:<14}{queries:>10}{rows:>10}{elapsed:>10.1f}")
+            db.close()
+        finally:
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--items", type=int, default=40)
+    parser.add_argument("--notes", type=int, default=30)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+    main(args.orders, args.items, args.notes, args.page_size)
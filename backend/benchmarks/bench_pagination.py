@@ -0,0 +1,113 @@
+"""
+Benchmark: latência e memória de uma página do Kardex (movimentos de estoque) conforme o
+histórico do tenant cresce, comparando a paginação por cursor (`crud.get_movements`) com
+LIMIT/OFFSET e com a listagem inteira (como era antes).
+
+Popula um banco SQLite temporário (perfil de produção de `database.py`) com N movimentos
+de um tenant e mede, em várias profundidades do histórico, o tempo de buscar uma página:
+- cursor: `get_movements(cursor=..., limit=100)` a partir da página anterior;
+- offset: a mesma consulta com OFFSET (lê e descarta todas as linhas anteriores);
+- tudo: `.all()` do histórico inteiro (pico de memória via tracemalloc).
+
+Uso (a partir do diretório backend):
+    python benchmarks/bench_pagination.py [--movements 200000] [--page-size 100]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Adiciona o diretório backend ao sys.path (mesmo padrão dos scripts de manutenção).
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import models
+from database import Base, create_db_engine
+from pagination import encode_cursor
+
+
+def populate(engine, movements: int):
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2020, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(models.Tenant), [{"name": "Bench", "subdomain": "bench"}, {"name": "Other", "subdomain": "other"}])
+        connection.execute(insert(models.Part), [{"tenant_id": 1, "sku": "8M0000001", "name": "Peça"}])
+        batch = 20000
+        for offset in range(0, movements, batch):
+            connection.execute(insert(models.StockMovement), [
+                {
+                    # Dois tenants intercalados, como num banco compartilhado.
+                    "tenant_id": 1 + (i % 2), "part_id": 1, "type": models.MovementType.OUT_OS, "quantity": 1,
+                    "description": "bench", "date": start + timedelta(minutes=i),
+                }
+                for i in range(offset, min(offset + batch, movements))
+            ])
+        connection.exec_driver_sql("ANALYZE")
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main(movements: int, page_size: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        try:
+            populate(engine, movements)
+            db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+            history = movements // 2
+            print(f"{history} movimentos do tenant ({movements} no banco), páginas de {page_size}")
+            print(f"{'profundidade':>14}{'cursor ms':>12}{'offset ms':>12}")
+            Movement = models.StockMovement
+            for depth in (0, history // 100, history // 10, history // 2, history - page_size):
+                # Chave da última linha da página anterior (o que o cliente teria no cursor).
+                cursor = None
+                if depth:
+                    anchor = (
+                        db.query(Movement.date, Movement.id).filter(Movement.tenant_id == 1)
+                        .order_by(Movement.date.desc(), Movement.id.desc()).offset(depth - 1).first()
+                    )
+                    cursor = encode_cursor([anchor.date, anchor.id])
+                keyset = timed(lambda: crud.get_movements(db, tenant_id=1, cursor=cursor, limit=page_size))
+                offset = timed(lambda: (
+                    db.query(Movement).filter(Movement.tenant_id == 1)
+                    .order_by(Movement.date.desc(), Movement.id.desc()).offset(depth).limit(page_size).all()
+                ))
+                db.expunge_all()
+                print(f"{depth:>14}{keyset:>12.2f}{offset:>12.2f}")
+
+            tracemalloc.start()
+            crud.get_movements(db, tenant_id=1, limit=page_size)
+            page_peak = tracemalloc.get_traced_memory()[1]
+            db.expunge_all()
+            tracemalloc.reset_peak()
+            started = time.perf_counter()
+            crud.get_movements(db, tenant_id=1)
+            elapsed = time.perf_counter() - started
+            full_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"uma página: pico {page_peak / 1024 / 1024:.1f} MB")
+            print(f"histórico inteiro (.all()): {elapsed * 1000:.0f} ms, pico {full_peak / 1024 / 1024:.1f} MB")
+            db.close()
+        finally:
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movements", type=int, default=200000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+    main(args.movements, args.page_size)
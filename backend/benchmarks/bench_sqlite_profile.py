@@ -0,0 +1,133 @@
+"""
+Benchmark: vazão de leitura/escrita do SQLite com clientes concorrentes, antes e depois do
+perfil de produção de `database.py` (WAL, synchronous=NORMAL, busy_timeout, cache e mmap).
+
+Cria um banco temporário com as tabelas do sistema e N peças, e roda cada configuração
+com 1, 4 e 16 threads por alguns segundos. Cada cliente faz uma mistura parecida com a do
+balcão: leituras (peça por SKU e página do estoque) e escritas (movimento de estoque +
+atualização da quantidade, numa transação). Conta também os erros "database is locked".
+
+- padrão: `create_engine(url, connect_args={"check_same_thread": False})` (como era antes);
+- produção: `database.create_db_engine(url)`.
+
+Uso (a partir do diretório backend):
+    python benchmarks/bench_sqlite_profile.py [--seconds 5] [--parts 5000] [--writes 0.2] [--clients 1,4,16]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# Adiciona o diretório backend ao sys.path (mesmo padrão dos scripts de manutenção).
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import Base, create_db_engine
+
+
+def populate(engine, parts: int):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(models.Tenant), [{"name": "Bench", "subdomain": "bench"}])
+        connection.execute(insert(models.Part), [
+            {"tenant_id": 1, "sku": f"8M{i:07d}", "name": f"Peça {i}", "quantity": 100, "cost": 10, "price": 20}
+            for i in range(parts)
+        ])
+
+
+def client(session_factory, parts: int, write_ratio: float, deadline: float, totals: dict, lock: threading.Lock):
+    reads = writes = errors = 0
+    write_latencies = []
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        db = session_factory()
+        try:
+            sku = f"8M{rng.randrange(parts):07d}"
+            if rng.random() < write_ratio:
+                started = time.perf_counter()
+                part = db.query(models.Part).filter(models.Part.tenant_id == 1, models.Part.sku == sku).first()
+                part.quantity -= 1
+                db.add(models.StockMovement(
+                    tenant_id=1, part_id=part.id, type=models.MovementType.OUT_OS, quantity=1, description="bench",
+                ))
+                db.commit()
+                write_latencies.append(time.perf_counter() - started)
+                writes += 1
+            else:
+                db.query(models.Part).filter(models.Part.tenant_id == 1, models.Part.sku == sku).first()
+                offset = rng.randrange(max(1, parts - 50))
+                db.query(models.Part).filter(models.Part.tenant_id == 1).order_by(models.Part.id).offset(offset).limit(50).all()
+                reads += 1
+        except OperationalError:
+            db.rollback()
+            errors += 1
+        finally:
+            db.close()
+    with lock:
+        totals["reads"] += reads
+        totals["writes"] += writes
+        totals["errors"] += errors
+        totals["write_latencies"].extend(write_latencies)
+
+
+def run(engine, clients: int, seconds: float, parts: int, write_ratio: float) -> dict:
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    totals = {"reads": 0, "writes": 0, "errors": 0, "write_latencies": []}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=client, args=(session_factory, parts, write_ratio, deadline, totals, lock))
+        for _ in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return totals
+
+
+def p95(values) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[int(len(values) * 0.95) - 1 if len(values) > 1 else 0] * 1000
+
+
+def main(seconds: float, parts: int, write_ratio: float, client_counts):
+    profiles = {
+        "padrão": lambda url: create_engine(url, connect_args={"check_same_thread": False}),
+        "produção": create_db_engine,
+    }
+    print(f"{parts} peças, {write_ratio:.0%} escritas, {seconds:.0f}s por rodada, {os.cpu_count()} núcleo(s)")
+    print(f"{'perfil':<10}{'clientes':>9}{'leituras/s':>12}{'escritas/s':>12}{'p95 escr. ms':>14}{'locked':>8}")
+    for label, factory in profiles.items():
+        with tempfile.TemporaryDirectory() as directory:
+            engine = factory(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+            try:
+                populate(engine, parts)
+                for clients in client_counts:
+                    totals = run(engine, clients, seconds, parts, write_ratio)
+                    print(
+                        f"{label:<10}{clients:>9}{totals['reads'] / seconds:>12.0f}{totals['writes'] / seconds:>12.0f}"
+                        f"{p95(totals['write_latencies']):>14.1f}{totals['errors']:>8}"
+                    )
+            finally:
+                engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--parts", type=int, default=5000)
+    parser.add_argument("--writes", type=float, default=0.2, help="Fração de operações de escrita (0 a 1)")
+    parser.add_argument("--clients", default="1,4,16", help="Números de clientes concorrentes, separados por vírgula")
+    args = parser.parse_args()
+    main(args.seconds, args.parts, args.writes, [int(n) for n in args.clients.split(",")])
@@ -0,0 +1,268 @@
+"""
+Servidor local que imita o Portal Mercury, servindo as páginas gravadas em
+`tests/fixtures/mercury` (login, preços e garantia), com latência e falhas configuráveis.
+
+Permite medir o scraper e conferir o parsing sem acessar o portal real. Basta apontar
+MERCURY_PORTAL_URL para ele (ex.: `http://127.0.0.1:8765/epdv`).
+
+Comportamento:
+- `epdv001.asp`: GET devolve o formulário de login; POST cria a sessão (cookie ASPSESSIONID).
+- Páginas de dados sem sessão válida devolvem o formulário de login (sessão expirada).
+- `epdv002d2.asp`: tabela de preços gravada, com `extra_rows` linhas adicionais; termos
+  contendo "NORECORDS" devolvem a página sem resultados.
+- `ewr010.asp`: garantia do número de série pedido; seriais iniciados por "9Z" não existem.
+- `ewr010c.asp`: página do cliente.
+
+Falhas (`failure_rate`, sorteadas por requisição): "500" (erro do servidor), "timeout"
+(segura a resposta por `hang_seconds`) ou "reset" (fecha a conexão sem responder).
+
+Uso (a partir do diretório backend):
+    python benchmarks/mercury_replay.py [--port 8765] [--latency-ms 150] [--failure-rate 0.05]
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures", "mercury")
+
+ROW_TEMPLATE = (
+    '<tr class="Row"><td><input type="checkbox"></td><td>8M{0:07d}</td><td>1</td>'
+    '<td>FILTRO DE OLEO {0}</td><td>3</td><td>R$ 1.234,56</td><td>R$ 1.300,00</td><td>R$ 987,65</td></tr>\n'
+)
+NOT_FOUND_HTML = "<html><body><p>Nenhum registro encontrado</p></body></html>"
+FIXTURE_SERIAL = "2B123456"
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    server: "_ReplayHTTPServer"
+
+    def log_message(self, format, *args):
+        pass # Silencioso: o servidor é usado em testes e benchmarks.
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method: str):
+        replay = self.server.replay
+        url = urlsplit(self.path)
+        page = url.path.rsplit("/", 1)[-1]
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            query.update({k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()})
+
+        replay._count("requests")
+        replay._delay()
+        failure = replay._draw_failure()
+        if failure == "reset":
+            self.close_connection = True
+            return
+        if failure == "timeout":
+            time.sleep(replay.hang_seconds)
+            self.close_connection = True
+            return
+        if failure == "500":
+            self._send(500, "<html><body>Erro interno</body></html>")
+            return
+
+        if page == "epdv001.asp":
+            if method == "POST" and query.get("sUsuar") and query.get("sSenha"):
+                token = replay._new_session()
+                self._send(200, "<html><body>Bem-vindo</body></html>", cookie=token)
+            else:
+                self._send(200, load_fixture("epdv001.html"))
+            return
+
+        if not replay._valid_session(self._session_token()):
+            self._send(200, load_fixture("epdv001.html"))
+            return
+
+        if page == "epdv002d2.asp":
+            term = query.get("s_desc_item", "").upper()
+            self._send(200, replay.no_records_page if "NORECORDS" in term else replay.product_page)
+        elif page == "ewr010.asp":
+            serial = query.get("s_nr_serie", "").strip().upper()
+            if not serial or serial.startswith("9Z"):
+                self._send(200, NOT_FOUND_HTML)
+            else:
+                self._send(200, load_fixture("ewr010.html").replace(FIXTURE_SERIAL, serial))
+        elif page == "ewr010c.asp":
+            self._send(200, load_fixture("ewr010c.html"))
+        else:
+            self._send(404, "<html><body>Página não encontrada</body></html>")
+
+    def _session_token(self) -> Optional[str]:
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        morsel = cookie.get("ASPSESSIONID")
+        return morsel.value if morsel else None
+
+    def _send(self, status: int, html: str, cookie: Optional[str] = None):
+        body = html.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if cookie:
+            self.send_header("Set-Cookie", f"ASPSESSIONID={cookie}; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ReplayHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    replay: "ReplayServer"
+
+
+class ReplayServer:
+    """
+    Portal Mercury de mentira, em uma thread, para testes e benchmarks.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        failure_rate: float = 0.0,
+        failure_mode: str = "500",
+        hang_seconds: float = 30,
+        extra_rows: int = 0,
+        session_max_requests: Optional[int] = None,
+        seed: Optional[int] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.hang_seconds = hang_seconds
+        self.session_max_requests = session_max_requests # Expira a sessão após N páginas de dados.
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, int] = {}
+        self.metrics = {"requests": 0, "failures": 0, "logins": 0, "expired": 0}
+        self.product_page = self._build_product_page(extra_rows)
+        self.no_records_page = load_fixture("epdv002d2_norecords.html")
+        self._server: Optional[_ReplayHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _build_product_page(extra_rows: int) -> str:
+        html = load_fixture("epdv002d2.html")
+        if not extra_rows:
+            return html
+        extra = "".join(ROW_TEMPLATE.format(i) for i in range(extra_rows))
+        return html.replace("</table>\n    </td>", extra + "</table>\n    </td>", 1)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/epdv"
+
+    def start(self) -> "ReplayServer":
+        self._server = _ReplayHTTPServer((self.host, self.port), _ReplayHandler)
+        self._server.replay = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mercury-replay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "ReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def expire_sessions(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.metrics, "sessions": len(self._sessions)}
+
+    # --- Uso interno do handler ---
+
+    def _count(self, metric: str):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    def _delay(self):
+        if self.latency_ms or self.jitter_ms:
+            with self._lock:
+                jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+            time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    def _draw_failure(self) -> Optional[str]:
+        if not self.failure_rate:
+            return None
+        with self._lock:
+            if self._random.random() >= self.failure_rate:
+                return None
+            self.metrics["failures"] += 1
+        return self.failure_mode
+
+    def _new_session(self) -> str:
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[token] = 0
+            self.metrics["logins"] += 1
+        return token
+
+    def _valid_session(self, token: Optional[str]) -> bool:
+        with self._lock:
+            if token is None or token not in self._sessions:
+                return False
+            self._sessions[token] += 1
+            if self.session_max_requests and self._sessions[token] > self.session_max_requests:
+                del self._sessions[token]
+                self.metrics["expired"] += 1
+                return False
+            return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--failure-mode", choices=["500", "timeout", "reset"], default="500")
+    parser.add_argument("--extra-rows", type=int, default=0, help="Linhas extras na página de preços")
+    parser.add_argument("--session-max-requests", type=int, default=None)
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate, failure_mode=args.failure_mode, extra_rows=args.extra_rows,
+        session_max_requests=args.session_max_requests,
+    ).start()
+    print(f"Portal Mercury (replay) em {server.base_url} — use MERCURY_PORTAL_URL={server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
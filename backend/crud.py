@@ -4,14 +4,16 @@ para interagir com o banco de dados. Cada função é responsável por
 uma operação específica em um modelo SQLAlchemy, utilizando uma sessão de banco de dados.
 """
 
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
 from datetime import datetime
 from typing import List, Optional
 
 import models
 import schemas
 from auth import get_password_hash # Importa a função para hash de senhas
+from pagination import Page, paginate # Paginação por cursor (keyset) das listagens
+from services.mercury_sku import normalize_sku # SKU normalizado (vínculo de itens de NF-e às peças)
 
 # --- USER CRUD ---
 # Funções para operações CRUD na tabela de usuários (models.User).
@@ -53,17 +55,25 @@ def create_user(db: Session, user: schemas.UserCreate):
 # --- CLIENT CRUD ---
 # Funções para operações CRUD na tabela de clientes (models.Client).
 
-def get_clients(db: Session, skip: int = 0, limit: int = 100):
+# Cada resposta tem as opções de carga das relações que o seu schema serializa (`*_OPTIONS`):
+# uma relação lazy lida durante a serialização é uma consulta extra por linha da listagem.
+# `schemas.Client` não tem relações (Client.boats não é serializado), então nada é carregado.
+
+def get_clients(db: Session, cursor: Optional[str] = None, limit: Optional[int] = None, tenant_id: Optional[int] = None) -> Page:
     """
-    Retorna uma lista de clientes.
+    Retorna uma página de clientes, por ordem de cadastro.
     Args:
         db (Session): Sessão do banco de dados.
-        skip (int): Número de registros a pular (offset para paginação).
-        limit (int): Número máximo de registros a retornar.
+        cursor (Optional[str]): Cursor da página (`next_cursor` da página anterior).
+        limit (Optional[int]): Itens por página (None = todos a partir do cursor).
+        tenant_id (Optional[int]): ID do tenant (apenas os registros dele).
     Returns:
-        List[models.Client]: Lista de objetos cliente.
+        Page[models.Client]: Lista de objetos cliente, com o cursor da próxima página.
     """
-    return db.query(models.Client).offset(skip).limit(limit).all()
+    query = db.query(models.Client)
+    if tenant_id is not None:
+        query = query.filter(models.Client.tenant_id == tenant_id)
+    return paginate(query, [models.Client.id], cursor, limit, descending=False)
 
 def get_client(db: Session, client_id: int):
     """
@@ -153,30 +163,44 @@ def create_marina(db: Session, marina: schemas.MarinaCreate):
 # --- BOAT CRUD ---
 # Funções para operações CRUD na tabela de embarcações (models.Boat).
 
-def get_boats(db: Session, client_id: Optional[int] = None):
+# `schemas.Boat` serializa os motores: uma consulta (WHERE boat_id IN (...)) para a página toda.
+BOAT_OPTIONS = (
+    selectinload(models.Boat.engines), # Carrega os motores da embarcação
+)
+
+def get_boats(
+    db: Session, client_id: Optional[int] = None, tenant_id: Optional[int] = None,
+    cursor: Optional[str] = None, limit: Optional[int] = None,
+) -> Page:
     """
-    Retorna uma lista de embarcações, opcionalmente filtrada por ID do cliente.
+    Retorna uma página de embarcações (por ordem de cadastro), opcionalmente filtrada por ID do cliente.
     Args:
         db (Session): Sessão do banco de dados.
         client_id (Optional[int]): ID do cliente para filtrar as embarcações.
+        tenant_id (Optional[int]): ID do tenant (apenas os registros dele).
+        cursor (Optional[str]): Cursor da página (`next_cursor` da página anterior).
+        limit (Optional[int]): Itens por página (None = todos a partir do cursor).
     Returns:
-        List[models.Boat]: Lista de objetos embarcação.
+        Page[models.Boat]: Lista de objetos embarcação (com os motores), com o cursor da próxima página.
     """
-    query = db.query(models.Boat)
+    query = db.query(models.Boat).options(*BOAT_OPTIONS)
+    if tenant_id is not None:
+        query = query.filter(models.Boat.tenant_id == tenant_id)
     if client_id:
         query = query.filter(models.Boat.client_id == client_id)
-    return query.all()
+    return paginate(query, [models.Boat.id], cursor, limit, descending=False)
 
 def get_boat(db: Session, boat_id: int):
     """
     Busca uma embarcação pelo ID.
+    Carrega os motores relacionados.
     Args:
         db (Session): Sessão do banco de dados.
         boat_id (int): ID da embarcação.
     Returns:
         models.Boat: O objeto embarcação, se encontrado, ou None.
     """
-    return db.query(models.Boat).filter(models.Boat.id == boat_id).first()
+    return db.query(models.Boat).options(*BOAT_OPTIONS).filter(models.Boat.id == boat_id).first()
 
 def create_boat(db: Session, boat: schemas.BoatCreate, tenant_id: int):
     """
@@ -250,15 +274,21 @@ def update_boat(db: Session, boat_id: int, boat_update: schemas.BoatUpdate):
 # --- PART CRUD ---
 # Funções para operações CRUD na tabela de peças (models.Part).
 
-def get_parts(db: Session):
+def get_parts(db: Session, tenant_id: Optional[int] = None, cursor: Optional[str] = None, limit: Optional[int] = None) -> Page:
     """
-    Retorna uma lista de todas as peças.
+    Retorna uma página de peças, por ordem de cadastro.
     Args:
         db (Session): Sessão do banco de dados.
+        tenant_id (Optional[int]): ID do tenant (apenas os registros dele).
+        cursor (Optional[str]): Cursor da página (`next_cursor` da página anterior).
+        limit (Optional[int]): Itens por página (None = todos a partir do cursor).
     Returns:
-        List[models.Part]: Lista de objetos peça.
+        Page[models.Part]: Lista de objetos peça, com o cursor da próxima página.
     """
-    return db.query(models.Part).all()
+    query = db.query(models.Part)
+    if tenant_id is not None:
+        query = query.filter(models.Part.tenant_id == tenant_id)
+    return paginate(query, [models.Part.id], cursor, limit, descending=False)
 
 def get_part(db: Session, part_id: int):
     """
@@ -271,16 +301,20 @@ def get_part(db: Session, part_id: int):
     """
     return db.query(models.Part).filter(models.Part.id == part_id).first()
 
-def get_part_by_sku(db: Session, sku: str):
+def get_part_by_sku(db: Session, sku: str, tenant_id: Optional[int] = None):
     """
     Busca uma peça pelo SKU.
     Args:
         db (Session): Sessão do banco de dados.
         sku (str): SKU da peça.
+        tenant_id (Optional[int]): ID do tenant (apenas os registros dele).
     Returns:
         models.Part: O objeto peça, se encontrado, ou None.
     """
-    return db.query(models.Part).filter(models.Part.sku == sku).first()
+    query = db.query(models.Part).filter(models.Part.sku == sku)
+    if tenant_id is not None:
+        query = query.filter(models.Part.tenant_id == tenant_id)
+    return query.first()
 
 def create_part(db: Session, part: schemas.PartCreate, tenant_id: int):
     """
@@ -292,13 +326,14 @@ def create_part(db: Session, part: schemas.PartCreate, tenant_id: int):
     db.refresh(db_part)
     return db_part
 
-def update_part(db: Session, part_id: int, part_update: schemas.PartUpdate):
+def update_part(db: Session, part_id: int, part_update: schemas.PartUpdate, price_source: str = "manual"):
     """
     Atualiza os dados de uma peça.
     Args:
         db (Session): Sessão do banco de dados.
         part_id (int): ID da peça a ser atualizada.
         part_update (schemas.PartUpdate): Dados de atualização da peça.
+        price_source (str): Origem registrada no histórico se o custo/preço mudar.
     Returns:
         models.Part: O objeto peça atualizado, ou None se não encontrada.
     """
@@ -307,33 +342,144 @@ def update_part(db: Session, part_id: int, part_update: schemas.PartUpdate):
         return None
     
     update_data = part_update.model_dump(exclude_unset=True) # Obtém apenas os campos que foram definidos no schema de atualização.
+    old_cost, old_price = db_part.cost, db_part.price
     for key, value in update_data.items():
         setattr(db_part, key, value) # Atualiza os atributos do objeto do banco de dados.
+
+    if price_changed(old_cost, db_part.cost) or price_changed(old_price, db_part.price):
+        db.add(build_price_history(db_part.tenant_id, db_part.id, db_part.cost, db_part.price, price_source))
     
     db.commit()
     db.refresh(db_part)
     return db_part
 
+# --- PART PRICE HISTORY ---
+# Histórico de custo/preço das peças, gravado apenas quando os valores mudam.
+
+def price_changed(old: Optional[float], new: Optional[float]) -> bool:
+    """
+    Indica se um valor monetário mudou (diferenças abaixo de meio centavo são ignoradas).
+    """
+    return round(old or 0, 2) != round(new or 0, 2)
+
+def build_price_history(tenant_id: int, part_id: int, cost: Optional[float], price: Optional[float], source: str, observed_at: Optional[datetime] = None):
+    """
+    Cria (sem gravar) uma linha de histórico de preço.
+    Returns:
+        models.PartPriceHistory: A nova linha, a ser adicionada à sessão.
+    """
+    return models.PartPriceHistory(
+        tenant_id=tenant_id,
+        part_id=part_id,
+        source=source,
+        cost=cost or 0,
+        price=price or 0,
+        observed_at=observed_at or datetime.utcnow(),
+    )
+
+def get_price_changes(
+    db: Session, tenant_id: int, since: datetime, source: Optional[str] = None,
+    cursor: Optional[str] = None, limit: int = 1000,
+) -> Page:
+    """
+    Retorna as peças do tenant cujo custo/preço mudou após `since`, com os valores atuais
+    e os últimos valores conhecidos antes desse instante.
+    A última alteração de cada peça é escolhida no banco (ROW_NUMBER por peça), e a ordem
+    (data da última alteração, id da linha do histórico) e o `limit` também são aplicados
+    no banco: só a página é lida. Peças com a mesma data na divisa da página ficam para a
+    próxima, pelo cursor (em vez de se perderem no `since` seguinte).
+    Args:
+        db (Session): Sessão do banco de dados.
+        tenant_id (int): ID do tenant.
+        since (datetime): Considera apenas alterações posteriores a este instante.
+        source (Optional[str]): Filtra pela origem da alteração.
+        cursor (Optional[str]): Cursor da página (`Page.next_cursor` da página anterior).
+        limit (int): Número máximo de peças retornadas (as alterações mais antigas primeiro).
+    Returns:
+        Page: Uma entrada por peça, no formato de `schemas.PartPriceChange`.
+    """
+    History = models.PartPriceHistory
+    filters = [History.tenant_id == tenant_id, History.observed_at > since]
+    if source:
+        filters.append(History.source == source)
+    latest_first = (History.observed_at.desc(), History.id.desc())
+    ranked = (
+        db.query(
+            History.id, History.part_id, History.source, History.cost, History.price,
+            History.observed_at.label("changed_at"),
+            func.row_number().over(partition_by=History.part_id, order_by=latest_first).label("position"),
+            func.count(History.id).over(partition_by=History.part_id).label("changes"),
+        )
+        .filter(*filters)
+        .subquery()
+    )
+    query = (
+        db.query(ranked, models.Part.sku, models.Part.name)
+        .join(models.Part, models.Part.id == ranked.c.part_id)
+        .filter(ranked.c.position == 1)
+    )
+    rows = paginate(query, [ranked.c.changed_at, ranked.c.id], cursor, limit, descending=False)
+    result = Page(
+        [
+            {
+                "part_id": row.part_id, "sku": row.sku, "name": row.name,
+                "source": row.source, "cost": row.cost, "price": row.price, "changed_at": row.changed_at,
+                "previous_cost": None, "previous_price": None, "changes": row.changes,
+            }
+            for row in rows
+        ],
+        rows.next_cursor,
+    )
+    if not result:
+        return result
+
+    # Últimos valores antes do período: uma consulta para todas as peças alteradas.
+    by_part = {c["part_id"]: c for c in result}
+    previous = (
+        db.query(History.part_id, History.cost, History.price)
+        .filter(History.tenant_id == tenant_id, History.part_id.in_(list(by_part)), History.observed_at <= since)
+        .order_by(History.part_id, History.observed_at, History.id)
+        .all()
+    )
+    for part_id, cost, price in previous:
+        by_part[part_id].update(previous_cost=cost, previous_price=price) # A última linha de cada peça prevalece.
+    return result
+
 # --- SERVICE ORDER CRUD ---
 # Funções para operações CRUD na tabela de ordens de serviço (models.ServiceOrder).
 
-def get_orders(db: Session, status: Optional[str] = None):
-    """
-    Retorna uma lista de ordens de serviço, opcionalmente filtrada por status.
+# Itens e notas de uma OS são coleções independentes: carregá-las com dois joinedload na
+# mesma consulta devolve itens x notas linhas por OS (40 itens e 30 notas = 1.200 linhas),
+# deduplicadas depois em Python. Com selectinload cada coleção vem numa consulta própria
+# (WHERE order_id IN (...)), e o total de linhas é itens + notas.
+ORDER_DETAIL_OPTIONS = (
+    selectinload(models.ServiceOrder.items), # Carrega os itens da OS
+    selectinload(models.ServiceOrder.notes), # Carrega as notas da OS
+)
+
+def get_orders(
+    db: Session, status: Optional[str] = None, tenant_id: Optional[int] = None,
+    cursor: Optional[str] = None, limit: Optional[int] = None,
+) -> Page:
+    """
+    Retorna uma página de ordens de serviço, mais recentes primeiro, opcionalmente filtrada por status.
     Carrega os itens e notas relacionadas para evitar N+1 queries.
     Args:
         db (Session): Sessão do banco de dados.
         status (Optional[str]): Status da OS para filtrar.
+        tenant_id (Optional[int]): ID do tenant (apenas os registros dele).
+        cursor (Optional[str]): Cursor da página (`next_cursor` da página anterior).
+        limit (Optional[int]): Itens por página (None = todos a partir do cursor).
     Returns:
-        List[models.ServiceOrder]: Lista de objetos ordem de serviço.
+        Page[models.ServiceOrder]: Lista de objetos ordem de serviço, com o cursor da próxima página.
     """
-    query = db.query(models.ServiceOrder).options(
-        joinedload(models.ServiceOrder.items), # Carrega os itens da OS
-        joinedload(models.ServiceOrder.notes) # Carrega as notas da OS
-    ).order_by(desc(models.ServiceOrder.created_at)) # Ordena pelas mais recentes
+    query = db.query(models.ServiceOrder).options(*ORDER_DETAIL_OPTIONS)
+    if tenant_id is not None:
+        query = query.filter(models.ServiceOrder.tenant_id == tenant_id)
     if status:
         query = query.filter(models.ServiceOrder.status == status)
-    return query.all()
+    # Mais recentes primeiro; o id desempata OS criadas no mesmo instante.
+    return paginate(query, [models.ServiceOrder.created_at, models.ServiceOrder.id], cursor, limit)
 
 def get_order(db: Session, order_id: int):
     """
@@ -345,10 +491,7 @@ def get_order(db: Session, order_id: int):
     Returns:
         models.ServiceOrder: O objeto ordem de serviço, se encontrado, ou None.
     """
-    return db.query(models.ServiceOrder).options(
-        joinedload(models.ServiceOrder.items),
-        joinedload(models.ServiceOrder.notes)
-    ).filter(models.ServiceOrder.id == order_id).first()
+    return db.query(models.ServiceOrder).options(*ORDER_DETAIL_OPTIONS).filter(models.ServiceOrder.id == order_id).first()
 
 def create_order(db: Session, order: schemas.ServiceOrderCreate, tenant_id: int):
     """
@@ -479,15 +622,21 @@ def complete_order(db: Session, order_id: int):
 # --- TRANSACTION CRUD ---
 # Funções para operações CRUD na tabela de transações (models.Transaction).
 
-def get_transactions(db: Session):
+def get_transactions(db: Session, tenant_id: Optional[int] = None, cursor: Optional[str] = None, limit: Optional[int] = None) -> Page:
     """
-    Retorna uma lista de todas as transações financeiras, ordenadas por data.
+    Retorna uma página de transações financeiras, ordenadas por data (mais recentes primeiro).
     Args:
         db (Session): Sessão do banco de dados.
+        tenant_id (Optional[int]): ID do tenant (apenas os registros dele).
+        cursor (Optional[str]): Cursor da página (`next_cursor` da página anterior).
+        limit (Optional[int]): Itens por página (None = todos a partir do cursor).
     Returns:
-        List[models.Transaction]: Lista de objetos transação.
+        Page[models.Transaction]: Lista de objetos transação, com o cursor da próxima página.
     """
-    return db.query(models.Transaction).order_by(desc(models.Transaction.date)).all()
+    query = db.query(models.Transaction)
+    if tenant_id is not None:
+        query = query.filter(models.Transaction.tenant_id == tenant_id)
+    return paginate(query, [models.Transaction.date, models.Transaction.id], cursor, limit)
 
 def create_transaction(db: Session, transaction: schemas.TransactionCreate):
     """
@@ -507,19 +656,27 @@ def create_transaction(db: Session, transaction: schemas.TransactionCreate):
 # --- STOCK MOVEMENT CRUD ---
 # Funções para operações CRUD na tabela de movimentos de estoque (models.StockMovement).
 
-def get_movements(db: Session, part_id: Optional[int] = None):
+def get_movements(
+    db: Session, part_id: Optional[int] = None, tenant_id: Optional[int] = None,
+    cursor: Optional[str] = None, limit: Optional[int] = None,
+) -> Page:
     """
-    Retorna uma lista de movimentos de estoque, opcionalmente filtrada por ID da peça.
+    Retorna uma página de movimentos de estoque (mais recentes primeiro), opcionalmente filtrada por ID da peça.
     Args:
         db (Session): Sessão do banco de dados.
         part_id (Optional[int]): ID da peça para filtrar os movimentos.
+        tenant_id (Optional[int]): ID do tenant (apenas os registros dele).
+        cursor (Optional[str]): Cursor da página (`next_cursor` da página anterior).
+        limit (Optional[int]): Itens por página (None = todos a partir do cursor).
     Returns:
-        List[models.StockMovement]: Lista de objetos movimento de estoque.
+        Page[models.StockMovement]: Lista de objetos movimento de estoque, com o cursor da próxima página.
     """
-    query = db.query(models.StockMovement).order_by(desc(models.StockMovement.date))
+    query = db.query(models.StockMovement)
+    if tenant_id is not None:
+        query = query.filter(models.StockMovement.tenant_id == tenant_id)
     if part_id:
         query = query.filter(models.StockMovement.part_id == part_id)
-    return query.all()
+    return paginate(query, [models.StockMovement.date, models.StockMovement.id], cursor, limit)
 
 def create_stock_movement(db: Session, movement: schemas.StockMovementCreate, user_name: str, tenant_id: int):
     """
@@ -549,23 +706,138 @@ def create_stock_movement(db: Session, movement: schemas.StockMovementCreate, us
     db.refresh(db_movement)
     return db_movement
 
+# --- INVOICE CRUD ---
+# Notas fiscais de entrada (NF-e de fornecedores) importadas a partir do XML.
+
+def import_supplier_invoices(db: Session, tenant_id: int, documents: List[dict], user_name: str):
+    """
+    Grava as NF-e de fornecedor lidas por `services.nfe_import`, numa única transação:
+    a nota (`Invoice`), a despesa, um movimento `IN_INVOICE` por item vinculado a uma
+    peça e o incremento do estoque (com custo médio ponderado, como no frontend).
+    Os itens são vinculados às peças pelo código de barras (cEAN) ou pelo SKU (cProd),
+    por índices montados uma vez com as peças do tenant. O SKU precisa ser igual ao da
+    peça depois de normalizado (maiúsculas, sem traços, espaços ou pontuação): sem
+    remover prefixo de categoria ou sufixo de kit, que apontariam para outra peça e
+    alterariam o estoque e o custo médio dela. Os demais itens vão para `unmatched`.
+    Notas já importadas (mesma chave de acesso) são ignoradas.
+    Args:
+        db (Session): Sessão do banco de dados.
+        tenant_id (int): ID do tenant.
+        documents (List[dict]): Notas no formato de `nfe_import.parse_nfe`.
+        user_name (str): Usuário registrado nos movimentos de estoque.
+    Returns:
+        List[dict]: Um resultado por nota, no formato de `schemas.InvoiceImportDocument`.
+    """
+    parts = db.query(models.Part).filter(models.Part.tenant_id == tenant_id).all()
+    by_sku = {}
+    for part in parts:
+        key = normalize_sku(part.sku)
+        if key:
+            by_sku.setdefault(key, part)
+    by_barcode = {part.barcode.strip(): part for part in parts if part.barcode and part.barcode.strip()}
+
+    keys = [document["access_key"] for document in documents if document.get("access_key")]
+    imported_keys = set()
+    if keys:
+        imported_keys = {
+            key for (key,) in db.query(models.Invoice.xml_key).filter(
+                models.Invoice.tenant_id == tenant_id,
+                models.Invoice.xml_key.in_(keys)
+            )
+        }
+
+    results, invoices = [], []
+    try:
+        for document in documents:
+            number, supplier, key = document["number"], document["supplier"], document.get("access_key")
+            result = {
+                "file": document.get("file"), "number": number, "supplier": supplier,
+                "access_key": key, "total_value": document.get("total_value", 0),
+                "items": len(document["items"]), "matched": 0, "unmatched": [],
+            }
+            results.append(result)
+            if key and key in imported_keys:
+                result["status"] = "duplicate"
+                continue
+            if key:
+                imported_keys.add(key)
+
+            date = document.get("date") or datetime.utcnow()
+            invoice = models.Invoice(
+                tenant_id=tenant_id, number=number, supplier=supplier, date=date,
+                total_value=document.get("total_value", 0), xml_key=key
+            )
+            invoices.append((result, invoice))
+            db.add(invoice)
+
+            description = f"Entrada via NF {number} - {supplier}"[:200]
+            for item in document["items"]:
+                part = (item.get("barcode") and by_barcode.get(item["barcode"])) or by_sku.get(normalize_sku(item["sku"]))
+                if part is None:
+                    result["unmatched"].append(item)
+                    continue
+                result["matched"] += 1
+                stock = max(part.quantity or 0, 0)
+                if stock + item["quantity"] > 0:
+                    new_cost = ((part.cost or 0) * stock + item["unit_cost"] * item["quantity"]) / (stock + item["quantity"])
+                    if price_changed(part.cost, new_cost):
+                        db.add(build_price_history(tenant_id, part.id, new_cost, part.price, "invoice"))
+                    part.cost = new_cost
+                part.quantity = (part.quantity or 0) + item["quantity"]
+                db.add(models.StockMovement(
+                    tenant_id=tenant_id, part_id=part.id, type=models.MovementType.IN_INVOICE,
+                    quantity=item["quantity"], date=datetime.utcnow(), reference_id=number,
+                    description=description, user=user_name
+                ))
+
+            db.add(models.Transaction(
+                tenant_id=tenant_id, type="EXPENSE", category="Peças (Compra)",
+                description=f"Compra NF {number} - {supplier}", amount=document.get("total_value", 0),
+                date=date, status="PAID", document_number=number
+            ))
+            result["status"] = "imported"
+
+        db.flush()
+        for result, invoice in invoices:
+            result["invoice_id"] = invoice.id
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return results
+
 # --- CONFIG CRUD ---
 # Funções para operações CRUD relacionadas a configurações (fabricantes, modelos, informações da empresa).
 
-def get_manufacturers(db: Session, type: Optional[str] = None):
+# `schemas.Manufacturer` serializa os modelos. Com selectinload a página de fabricantes é
+# buscada direto (um joinedload com LIMIT embrulha a consulta numa subconsulta) e os modelos
+# vêm numa segunda consulta.
+MANUFACTURER_OPTIONS = (
+    selectinload(models.Manufacturer.models), # Carrega os modelos do fabricante
+)
+
+def get_manufacturers(
+    db: Session, type: Optional[str] = None, tenant_id: Optional[int] = None,
+    cursor: Optional[str] = None, limit: Optional[int] = None,
+) -> Page:
     """
-    Retorna uma lista de fabricantes, opcionalmente filtrada por tipo (BOAT ou ENGINE).
+    Retorna uma página de fabricantes (por ordem de cadastro), opcionalmente filtrada por tipo (BOAT ou ENGINE).
     Carrega os modelos relacionados para evitar N+1 queries.
     Args:
         db (Session): Sessão do banco de dados.
         type (Optional[str]): Tipo do fabricante para filtrar.
+        tenant_id (Optional[int]): ID do tenant (apenas os registros dele).
+        cursor (Optional[str]): Cursor da página (`next_cursor` da página anterior).
+        limit (Optional[int]): Itens por página (None = todos a partir do cursor).
     Returns:
-        List[models.Manufacturer]: Lista de objetos fabricante.
+        Page[models.Manufacturer]: Lista de objetos fabricante, com o cursor da próxima página.
     """
-    query = db.query(models.Manufacturer).options(joinedload(models.Manufacturer.models))
+    query = db.query(models.Manufacturer).options(*MANUFACTURER_OPTIONS)
+    if tenant_id is not None:
+        query = query.filter(models.Manufacturer.tenant_id == tenant_id)
     if type:
         query = query.filter(models.Manufacturer.type == type)
-    return query.all()
+    return paginate(query, [models.Manufacturer.id], cursor, limit, descending=False)
 
 def create_manufacturer(db: Session, manufacturer: schemas.ManufacturerCreate):
     """
@@ -628,6 +900,25 @@ def delete_model(db: Session, model_id: int):
         db.commit()
     return db_model
 
+def get_orders_for_invoicing(db: Session, tenant_id: int, order_ids: List[int]):
+    """
+    Busca as ordens de serviço do tenant para emissão de notas em lote, já com itens,
+    peças e o proprietário da embarcação carregados (uma única consulta).
+    Args:
+        db (Session): Sessão do banco de dados.
+        tenant_id (int): ID do tenant.
+        order_ids (List[int]): IDs das ordens de serviço.
+    Returns:
+        List[models.ServiceOrder]: As ordens encontradas (ordens de outros tenants são ignoradas).
+    """
+    return db.query(models.ServiceOrder).options(
+        joinedload(models.ServiceOrder.items).joinedload(models.ServiceItem.part),
+        joinedload(models.ServiceOrder.boat).joinedload(models.Boat.owner)
+    ).filter(
+        models.ServiceOrder.tenant_id == tenant_id,
+        models.ServiceOrder.id.in_(order_ids)
+    ).all()
+
 def get_company_info(db: Session, tenant_id: int):
     """
     Retorna as informações da empresa filtrando pelo tenant_id.
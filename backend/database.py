@@ -8,9 +8,11 @@ Ele é responsável por:
 5. Fornecer uma dependência para injeção de sessão do DB no FastAPI.
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
 from dotenv import load_dotenv # Biblioteca para carregar variáveis de ambiente de um arquivo .env
 
@@ -22,14 +24,77 @@ load_dotenv()
 # Se não estiver definida, usa SQLite com um arquivo local "mare_alta.db" por padrão.
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./mare_alta.db")
 
+# Perfil de produção do SQLite, aplicado em toda conexão aberta pelo pool.
+# Com os padrões do SQLite (journal de rollback, synchronous=FULL), o commit de um escritor
+# bloqueia todos os leitores, e escritas concorrentes (ex.: `complete_order` e movimentos
+# de estoque) terminavam em "database is locked". Com WAL, leitores não bloqueiam o
+# escritor (e vice-versa), e o busy_timeout faz o escritor esperar a vez em vez de falhar.
+# synchronous=NORMAL é seguro em WAL: uma queda de energia pode perder só as últimas
+# transações, nunca corromper o banco. Cada valor pode ser ajustado por variável de ambiente.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")), # ms esperando o lock de escrita
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")), # negativo = KiB (64 MB por conexão)
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))), # leitura via mmap (256 MB)
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"), # tabelas temporárias e ordenações em memória
+}
+
+def _is_memory_database(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: dict = None):
+    """
+    Aplica os PRAGMAs do perfil de produção numa conexão sqlite3 recém-aberta.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in (pragmas if pragmas is not None else SQLITE_PRAGMAS).items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+def create_db_engine(url: str = DATABASE_URL, pragmas: dict = None) -> Engine:
+    """
+    Cria o engine do banco. Para SQLite, aplica `SQLITE_PRAGMAS` em cada conexão e escolhe
+    o pool conforme o tipo de banco.
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+
+    # 'check_same_thread': False permite que a conexão seja usada por threads diferentes da
+    # que a abriu (o FastAPI roda endpoints síncronos no threadpool). `timeout` é o busy
+    # timeout do próprio driver, em segundos, usado antes de os PRAGMAs serem aplicados.
+    pragmas = dict(SQLITE_PRAGMAS if pragmas is None else pragmas)
+    connect_args = {"check_same_thread": False, "timeout": pragmas.get("busy_timeout", 5000) / 1000}
+    if _is_memory_database(url):
+        # Banco em memória (testes): WAL e mmap não se aplicam; mantém o pool padrão.
+        pragmas.pop("journal_mode", None)
+        pragmas.pop("mmap_size", None)
+        engine = create_engine(url, connect_args=connect_args)
+    else:
+        # Arquivo: abrir uma conexão SQLite é barato, mas cada uma tem o próprio cache de
+        # páginas e mmap; o pool mantém as conexões (e o cache aquecido) entre requisições.
+        # O tamanho acompanha o threadpool do FastAPI (40 threads por padrão) sem manter 40
+        # caches ociosos: até SQLITE_POOL_SIZE ficam abertas, o excedente é fechado ao devolver.
+        engine = create_engine(
+            url,
+            connect_args=connect_args,
+            poolclass=QueuePool,
+            pool_size=int(os.getenv("SQLITE_POOL_SIZE", "8")),
+            max_overflow=int(os.getenv("SQLITE_MAX_OVERFLOW", "32")),
+            pool_timeout=30,
+        )
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return engine
+
 # Cria o "engine" do SQLAlchemy.
 # O engine é o ponto de partida para qualquer interação com o banco de dados.
-# Para SQLite, 'check_same_thread': False é necessário para permitir que múltiplos threads
-# acessem a mesma conexão de banco de dados, o que é comum em aplicações web.
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+engine = create_db_engine(DATABASE_URL)
 
 # Cria uma classe SessionLocal.
 # Instâncias dessa classe serão nossas sessões de banco de dados.
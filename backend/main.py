@@ -4,15 +4,19 @@ Ele configura a aplicação, inclui os roteadores (endpoints da API), configura
 e serve os arquivos estáticos do frontend, se disponíveis.
 """
 
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
+from contextlib import asynccontextmanager
 import os
 
 # Importa os modelos de banco de dados para garantir que as tabelas sejam criadas.
 import models
 # Importa a configuração do banco de dados e a função para obter a sessão do DB.
 from database import engine, get_db
+# Paginação por cursor das listagens (cabeçalho da próxima página e erro de cursor inválido).
+from pagination import NEXT_CURSOR_HEADER, InvalidCursor
 
 # Importa os roteadores (grupos de endpoints) para diferentes funcionalidades da API.
 # Cada roteador gerencia um conjunto específico de rotas e suas operações.
@@ -30,8 +34,47 @@ from routers.config_router import router as config_router
 # Isso é feito apenas uma vez na inicialização da aplicação.
 models.Base.metadata.create_all(bind=engine)
 
+# Fábrica de sessões dos workers em segundo plano (fila fiscal), ligada ao mesmo banco das rotas.
+# Resolve `get_db` pelos `app.dependency_overrides`: nos testes, a fila usa o banco de teste
+# e não o `SessionLocal` configurado.
+def background_session_factory(app: FastAPI) -> sessionmaker:
+    sessions = app.dependency_overrides.get(get_db, get_db)()
+    try:
+        bind = next(sessions).get_bind()
+    finally:
+        sessions.close()
+    return sessionmaker(autocommit=False, autoflush=False, bind=bind)
+
+# Ciclo de vida da aplicação: recursos de longa duração (como o navegador do scraper Mercury)
+# são iniciados aqui e liberados quando o servidor é encerrado.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from services.mercury_pool import browser_pool
+    from services.mercury_http import mercury_http_client
+    from services.mercury_warranty import warranty_scheduler
+    from routers.mercury_router import refresh_all_tenants_warranty
+    from services.fiscal_pipeline import fiscal_pipeline
+    from services.fiscal_queue import fiscal_queue
+    from services.fiscal_service import fiscal_service
+    # O navegador é lançado sob demanda; MERCURY_POOL_WARMUP=1 antecipa o lançamento para o startup.
+    if os.getenv("MERCURY_POOL_WARMUP", "0") == "1":
+        await browser_pool.start()
+    # Atualização periódica das garantias dos motores (ativada por MERCURY_WARRANTY_REFRESH_INTERVAL).
+    warranty_scheduler.start(refresh_all_tenants_warranty)
+    # Retoma as emissões fiscais assíncronas que ficaram na fila (persistida no banco).
+    # FISCAL_QUEUE_AUTOSTART=0 desativa a retomada (ex.: testes; a fila ainda roda a cada emissão).
+    if os.getenv("FISCAL_QUEUE_AUTOSTART", "1") != "0":
+        fiscal_queue.start(background_session_factory(app))
+    yield
+    await fiscal_queue.stop()
+    await warranty_scheduler.stop()
+    await browser_pool.stop()
+    await mercury_http_client.close()
+    fiscal_pipeline.shutdown()
+    fiscal_service.signer.shutdown()
+
 # Inicializa a aplicação FastAPI com um título.
-app = FastAPI(title="Mare Alta API")
+app = FastAPI(title="Mare Alta API", lifespan=lifespan)
 
 # Configura o Middleware CORS (Cross-Origin Resource Sharing).
 # Isso permite que o frontend (executando em um domínio/porta diferente)
@@ -42,8 +85,14 @@ app.add_middleware(
     allow_credentials=True, # Permite cookies e cabeçalhos de autorização.
     allow_methods=["*"],  # Permite todos os métodos HTTP (GET, POST, PUT, DELETE, etc.).
     allow_headers=["*"],  # Permite todos os cabeçalhos nas requisições.
+    expose_headers=[NEXT_CURSOR_HEADER], # Cursor da próxima página das listagens, lido pelo frontend.
 )
 
+# Cursor de paginação inválido (adulterado ou de outra listagem): erro do cliente, não 500.
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
 # Middleware de Logging para Debug
 @app.middleware("http")
 async def log_requests(request, call_next):
@@ -3,7 +3,7 @@ Este arquivo define os modelos de banco de dados usando SQLAlchemy.
 Cada classe representa uma tabela no banco de dados e seus atributos correspondem às colunas da tabela.
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base # Importa a classe Base do SQLAlchemy declarada em database.py
 from datetime import datetime
@@ -80,6 +80,9 @@ class User(Base):
     Modelo para a tabela 'users'. Armazena informações dos usuários do sistema.
     """
     __tablename__ = "users" # Nome da tabela no banco de dados
+    __table_args__ = (
+        Index("ix_users_tenant_email", "tenant_id", "email"), # Usuário por email dentro do tenant
+    )
     
     id = Column(Integer, primary_key=True, index=True) # Chave primária auto-incrementável
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant (empresa)
@@ -138,7 +141,7 @@ class Engine(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
-    boat_id = Column(Integer, ForeignKey("boats.id"), nullable=False) # ID da embarcação à qual o motor pertence
+    boat_id = Column(Integer, ForeignKey("boats.id"), nullable=False, index=True) # ID da embarcação à qual o motor pertence
     serial_number = Column(String(100), nullable=False) # Número de série do motor
     motor_number = Column(String(100)) # Número do motor (geralmente diferente do serial)
     model = Column(String(200), nullable=False) # Modelo do motor
@@ -148,6 +151,7 @@ class Engine(Base):
     client_name = Column(String(200)) # Nome do cliente proprietário do motor (pode ser redundante se client_id já existe na Boat)
     hours = Column(Integer, default=0) # Horas de uso do motor
     year = Column(Integer) # Ano de fabricação do motor
+    warranty_checked_at = Column(DateTime, nullable=True) # Data da última consulta automática de garantia no portal
 
     # Relacionamento com a tabela Boat. Um motor pertence a uma embarcação.
     boat = relationship("Boat", back_populates="engines")
@@ -157,6 +161,9 @@ class Boat(Base):
     Modelo para a tabela 'boats'. Armazena informações sobre as embarcações.
     """
     __tablename__ = "boats"
+    __table_args__ = (
+        Index("ix_boats_tenant_client", "tenant_id", "client_id"), # Embarcações de um cliente
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
@@ -181,6 +188,10 @@ class Part(Base):
     Modelo para a tabela 'parts'. Armazena informações sobre peças de estoque.
     """
     __tablename__ = "parts"
+    __table_args__ = (
+        Index("ix_parts_tenant_sku", "tenant_id", "sku"), # Busca por SKU (único por tenant)
+        Index("ix_parts_tenant_barcode", "tenant_id", "barcode"), # Leitura do código de barras
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
@@ -205,16 +216,21 @@ class ServiceOrder(Base):
     Modelo para a tabela 'service_orders'. Armazena informações sobre as ordens de serviço.
     """
     __tablename__ = "service_orders"
+    __table_args__ = (
+        # O `id` no fim de cada índice segue a ordem da paginação por cursor (data, id).
+        Index("ix_service_orders_tenant_created", "tenant_id", "created_at", "id"), # Lista de OS, mais recentes primeiro
+        Index("ix_service_orders_tenant_status_created", "tenant_id", "status", "created_at", "id"), # Lista filtrada por status
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
-    boat_id = Column(Integer, ForeignKey("boats.id"), nullable=False) # Embarcação relacionada à OS
+    boat_id = Column(Integer, ForeignKey("boats.id"), nullable=False, index=True) # Embarcação relacionada à OS
     engine_id = Column(Integer, ForeignKey("engines.id"), nullable=True) # Motor relacionado à OS (opcional)
     description = Column(Text, nullable=False) # Descrição do serviço solicitado
     diagnosis = Column(Text) # Diagnóstico realizado
     status = Column(Enum(OSStatus), default=OSStatus.PENDING) # Status atual da OS
     total_value = Column(Float, default=0) # Valor total da OS
-    created_at = Column(DateTime, default=datetime.utcnow) # Data e hora de criação da OS
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False) # Data e hora de criação da OS (chave da paginação)
     requester = Column(String(200)) # Nome do solicitante do serviço
     technician_name = Column(String(200)) # Nome do técnico responsável
     scheduled_at = Column(DateTime, nullable=True) # Data e hora agendada para o serviço
@@ -234,10 +250,10 @@ class ServiceItem(Base):
     __tablename__ = "service_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("service_orders.id"), nullable=False) # ID da OS à qual o item pertence
+    order_id = Column(Integer, ForeignKey("service_orders.id"), nullable=False, index=True) # ID da OS à qual o item pertence
     type = Column(Enum(ItemType), nullable=False) # Tipo do item (PART ou LABOR)
     description = Column(String(200), nullable=False) # Descrição do item
-    part_id = Column(Integer, ForeignKey("parts.id"), nullable=True) # ID da peça associada (se type for PART)
+    part_id = Column(Integer, ForeignKey("parts.id"), nullable=True, index=True) # ID da peça associada (se type for PART)
     quantity = Column(Float, default=1) # Quantidade utilizada
     unit_cost = Column(Float, default=0) # Custo unitário (para controle interno)
     unit_price = Column(Float, nullable=False) # Preço de venda unitário
@@ -255,7 +271,7 @@ class OrderNote(Base):
     __tablename__ = "order_notes"
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("service_orders.id"), nullable=False) # ID da OS à qual a nota pertence
+    order_id = Column(Integer, ForeignKey("service_orders.id"), nullable=False, index=True) # ID da OS à qual a nota pertence
     text = Column(Text, nullable=False) # Conteúdo da nota
     created_at = Column(DateTime, default=datetime.utcnow) # Data e hora de criação da nota
     user_name = Column(String(200)) # Nome do usuário que adicionou a nota
@@ -268,6 +284,9 @@ class Invoice(Base):
     Modelo para a tabela 'invoices'. Armazena informações sobre notas fiscais de entrada.
     """
     __tablename__ = "invoices"
+    __table_args__ = (
+        Index("ix_invoices_tenant_xml_key", "tenant_id", "xml_key"), # Notas já importadas (chave de acesso)
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
@@ -283,13 +302,18 @@ class StockMovement(Base):
     Modelo para a tabela 'stock_movements'. Registra todos os movimentos de estoque de peças.
     """
     __tablename__ = "stock_movements"
+    __table_args__ = (
+        # O `id` no fim de cada índice segue a ordem da paginação por cursor (data, id).
+        Index("ix_stock_movements_tenant_date", "tenant_id", "date", "id"), # Kardex do tenant, mais recentes primeiro
+        Index("ix_stock_movements_tenant_part_date", "tenant_id", "part_id", "date", "id"), # Kardex de uma peça
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
-    part_id = Column(Integer, ForeignKey("parts.id"), nullable=False) # ID da peça movimentada
+    part_id = Column(Integer, ForeignKey("parts.id"), nullable=False, index=True) # ID da peça movimentada
     type = Column(Enum(MovementType), nullable=False) # Tipo de movimento (entrada, saída, ajuste)
     quantity = Column(Float, nullable=False) # Quantidade movimentada
-    date = Column(DateTime, default=datetime.utcnow) # Data e hora do movimento
+    date = Column(DateTime, default=datetime.utcnow, nullable=False) # Data e hora do movimento (chave da paginação)
     reference_id = Column(String(100)) # Referência do movimento (ex: ID da OS, número da NFe)
     description = Column(String(200), nullable=False) # Descrição do movimento
     user = Column(String(200)) # Usuário responsável pelo movimento
@@ -297,11 +321,94 @@ class StockMovement(Base):
     # Relacionamento com Part. A peça envolvida no movimento.
     part = relationship("Part", back_populates="movements")
 
+class PartPriceHistory(Base):
+    """
+    Modelo para a tabela 'part_price_history'. Histórico de custo/preço das peças (somente inserção).
+    Uma linha é gravada apenas quando o custo ou o preço de fato mudam.
+    """
+    __tablename__ = "part_price_history"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
+    part_id = Column(Integer, ForeignKey("parts.id"), nullable=False, index=True) # ID da peça
+    source = Column(String(20), nullable=False) # Origem da alteração (ex: 'mercury', 'manual')
+    cost = Column(Float, nullable=False) # Custo após a alteração
+    price = Column(Float, nullable=False) # Preço de venda após a alteração
+    observed_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True) # Quando a alteração foi observada
+
+    # Relacionamento com Part. A peça cujo preço mudou.
+    part = relationship("Part")
+
+class FiscalJob(Base):
+    """
+    Modelo para a tabela 'fiscal_jobs'. Fila persistente das emissões fiscais assíncronas.
+    A requisição é gravada aqui e processada depois, com novas tentativas em caso de falha.
+    """
+    __tablename__ = "fiscal_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
+    status = Column(String(20), default="queued", nullable=False, index=True) # queued, processing, authorized, rejected, failed
+    invoice_type = Column(String(10)) # Tipo da nota (NFE ou NFSE)
+    number = Column(String(20)) # Número da nota
+    series = Column(String(5)) # Série da nota
+    payload = Column(Text, nullable=False) # Dados da nota (JSON da InvoiceRequest)
+    attempts = Column(Integer, default=0, nullable=False) # Tentativas de emissão já feitas
+    max_attempts = Column(Integer, default=5, nullable=False) # Limite de tentativas antes de falhar
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True) # Quando a próxima tentativa pode rodar
+    locked_at = Column(DateTime, nullable=True) # Último sinal de vida do worker que está com o job (detecta jobs abandonados)
+    locked_by = Column(String(100), nullable=True) # Worker que pegou o job (host:pid:instância)
+    last_error = Column(Text, nullable=True) # Erro da última tentativa
+    protocol = Column(String(50), nullable=True) # Protocolo de autorização da SEFAZ
+    message = Column(String(255), nullable=True) # Mensagem de retorno da SEFAZ
+    xml = Column(Text, nullable=True) # XML assinado e transmitido
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class FiscalSequence(Base):
+    """
+    Modelo para a tabela 'fiscal_sequences'. Contador da numeração fiscal por tenant, tipo e série.
+    Incrementado por um único UPDATE atômico (ver `services/fiscal_numbering.py`).
+    """
+    __tablename__ = "fiscal_sequences"
+    __table_args__ = (UniqueConstraint("tenant_id", "invoice_type", "series", name="uq_fiscal_sequence"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
+    invoice_type = Column(String(10), nullable=False, default="NFE") # Tipo da nota (NFE ou NFSE)
+    series = Column(String(5), nullable=False, default="1") # Série da nota
+    next_number = Column(Integer, nullable=False, default=1) # Próximo número a ser reservado
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class FiscalNumber(Base):
+    """
+    Modelo para a tabela 'fiscal_numbers'. Registro de cada número fiscal reservado e do seu destino:
+    reserved (em emissão ou resultado desconhecido), used (nota autorizada) ou voided (a inutilizar).
+    """
+    __tablename__ = "fiscal_numbers"
+    __table_args__ = (UniqueConstraint("tenant_id", "invoice_type", "series", "number", name="uq_fiscal_number"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
+    invoice_type = Column(String(10), nullable=False, default="NFE") # Tipo da nota (NFE ou NFSE)
+    series = Column(String(5), nullable=False, default="1") # Série da nota
+    number = Column(Integer, nullable=False) # Número da nota
+    status = Column(String(20), nullable=False, default="reserved", index=True) # reserved, used, voided
+    protocol = Column(String(50), nullable=True) # Protocolo de autorização (status used)
+    reason = Column(String(255), nullable=True) # Motivo da inutilização (status voided)
+    reserved_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True) # Quando passou para used/voided
+
 class Transaction(Base):
     """
     Modelo para a tabela 'transactions'. Armazena transações financeiras (receitas e despesas).
     """
     __tablename__ = "transactions"
+    __table_args__ = (
+        # O `id` no fim do índice segue a ordem da paginação por cursor (data, id).
+        Index("ix_transactions_tenant_date", "tenant_id", "date", "id"), # Extrato do tenant, mais recentes primeiro
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
@@ -319,6 +426,9 @@ class Manufacturer(Base):
     Modelo para a tabela 'manufacturers'. Armazena informações sobre fabricantes de barcos/motores.
     """
     __tablename__ = "manufacturers"
+    __table_args__ = (
+        Index("ix_manufacturers_tenant_type", "tenant_id", "type"), # Fabricantes de barcos ou de motores
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True) # ID do tenant
@@ -336,7 +446,7 @@ class Model(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(200), nullable=False) # Nome do modelo
-    manufacturer_id = Column(Integer, ForeignKey("manufacturers.id"), nullable=False) # Fabricante ao qual o modelo pertence
+    manufacturer_id = Column(Integer, ForeignKey("manufacturers.id"), nullable=False, index=True) # Fabricante ao qual o modelo pertence
     
     # Relacionamento com Manufacturer. O fabricante deste modelo.
     manufacturer = relationship("Manufacturer", back_populates="models")
@@ -369,4 +479,5 @@ class CompanyInfo(Base):
     # Integrações
     mercury_username = Column(String(100))
     mercury_password = Column(String(100))
+    mercury_backend = Column(String(20), nullable=True) # Backend do scraper: "playwright" ou "http" (None = padrão do servidor)
 
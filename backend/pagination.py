@@ -0,0 +1,114 @@
+"""
+Paginação por cursor (keyset) das listagens.
+
+As listagens devolviam a tabela inteira com `.all()` (e `get_clients` usava OFFSET, que
+lê e descarta todas as linhas anteriores à página). Aqui cada página é buscada a partir
+da chave de ordenação da última linha da página anterior:
+
+    WHERE tenant_id = :t AND (date, id) < (:date, :id) ORDER BY date DESC, id DESC LIMIT n + 1
+
+Com os índices compostos por tenant (ver `models.py`), o banco desce direto no ponto do
+cursor: o custo de uma página não cresce com o histórico do tenant, e inserções entre uma
+página e outra não duplicam nem pulam linhas (o `id` desempata datas iguais).
+
+O cursor é opaco para o cliente: os valores da chave em JSON, codificados em base64 url-safe.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Sequence
+
+from fastapi import Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 100 # Itens por página quando o cliente não informa `limit`.
+MAX_PAGE_SIZE = 500 # Limite de `limit` aceito pelas rotas.
+NEXT_CURSOR_HEADER = "X-Next-Cursor" # Cabeçalho com o cursor da próxima página.
+
+
+class InvalidCursor(ValueError):
+    """
+    Cursor malformado ou de outra listagem (respondido com 400 pela aplicação).
+    """
+
+
+class Page(list):
+    """
+    Itens de uma página (é uma lista comum) e o cursor da próxima página (None na última).
+    """
+
+    def __init__(self, items: Iterable[Any] = (), next_cursor: Optional[str] = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[Any]) -> List[Any]:
+    """
+    Converte o cursor de volta nos valores das colunas `keys`. Levanta `InvalidCursor`.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Cursor de paginação inválido.")
+    if not isinstance(payload, list) or len(payload) != len(keys) or any(value is None for value in payload):
+        raise InvalidCursor("Cursor de paginação inválido.")
+    values = []
+    for key, value in zip(keys, payload):
+        try:
+            if key.type.python_type is datetime:
+                values.append(datetime.fromisoformat(value))
+            else:
+                values.append(key.type.python_type(value))
+        except (TypeError, ValueError):
+            raise InvalidCursor("Cursor de paginação inválido.")
+    return values
+
+
+def paginate(
+    query: Query,
+    keys: Sequence[Any],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    descending: bool = True,
+) -> Page:
+    """
+    Ordena `query` por `keys` (a última deve ser única, ex.: o id) e devolve a página que
+    começa depois de `cursor`. Sem `limit`, devolve todas as linhas a partir do cursor.
+    As colunas de `keys` devem ser NOT NULL: a comparação do cursor nunca casa com NULL
+    (ver `backfill_keyset_columns.py`).
+    """
+    query = query.order_by(*(key.desc() if descending else key.asc() for key in keys))
+    if cursor:
+        values = decode_cursor(cursor, keys)
+        if len(keys) == 1:
+            row, bound = keys[0], values[0]
+        else:
+            row, bound = tuple_(*keys), tuple_(*values)
+        query = query.filter(row < bound if descending else row > bound)
+    if limit is None:
+        return Page(query.all())
+
+    # Uma linha a mais indica se existe próxima página, sem um COUNT.
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows)
+    last = rows[limit - 1]
+    return Page(rows[:limit], encode_cursor([getattr(last, key.key) for key in keys]))
+
+
+def set_next_cursor(response: Response, page: Page):
+    """
+    Publica o cursor da próxima página no cabeçalho `X-Next-Cursor` (ausente na última).
+    """
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
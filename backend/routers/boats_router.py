@@ -2,7 +2,7 @@
 Este módulo define as rotas da API para gerenciamento de embarcações.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -11,22 +11,30 @@ import schemas
 import crud
 import auth
 from database import get_db # Função de dependência para obter a sessão do banco de dados.
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_next_cursor # Paginação por cursor das listagens.
 
 # Cria uma instância de APIRouter com um prefixo e tags para organização na documentação OpenAPI.
 router = APIRouter(prefix="/api/boats", tags=["Embarcações"])
 
 @router.get("", response_model=List[schemas.Boat])
 def get_all_boats(
+    response: Response,
+    cursor: Optional[str] = None, # Cursor da página (cabeçalho X-Next-Cursor da resposta anterior).
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), # Itens por página.
     client_id: Optional[int] = None, # Parâmetro de query opcional para filtrar embarcações por cliente.
     db: Session = Depends(get_db), # Injeta a sessão do banco de dados.
     current_user: schemas.User = Depends(auth.get_current_active_user) # Garante que o usuário esteja autenticado.
 ):
     """
     Retorna uma lista de todas as embarcações, opcionalmente filtradas por client_id.
+    Paginada por cursor: a resposta traz o cursor da próxima página no cabeçalho
+    X-Next-Cursor (ausente na última página).
     Requer autenticação.
     """
     # Chama a função CRUD para obter as embarcações do banco de dados.
-    return crud.get_boats(db, client_id=client_id)
+    page = crud.get_boats(db, client_id=client_id, tenant_id=current_user.tenant_id, cursor=cursor, limit=limit)
+    set_next_cursor(response, page)
+    return page
 
 @router.post("", response_model=schemas.Boat)
 def create_new_boat(
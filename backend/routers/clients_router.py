@@ -2,30 +2,38 @@
 Este módulo define as rotas da API para gerenciamento de clientes.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 # Importa os esquemas de dados (Pydantic), funções CRUD e utilitários de autenticação.
 import schemas
 import crud
 import auth
 from database import get_db # Função de dependência para obter a sessão do banco de dados.
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_next_cursor # Paginação por cursor das listagens.
 
 # Cria uma instância de APIRouter com um prefixo e tags para organização na documentação OpenAPI.
 router = APIRouter(prefix="/api/clients", tags=["Clientes"])
 
 @router.get("", response_model=List[schemas.Client])
 def get_all_clients(
+    response: Response,
+    cursor: Optional[str] = None, # Cursor da página (cabeçalho X-Next-Cursor da resposta anterior).
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), # Itens por página.
     db: Session = Depends(get_db), # Injeta a sessão do banco de dados.
     current_user: schemas.User = Depends(auth.get_current_active_user) # Garante que o usuário esteja autenticado.
 ):
     """
     Retorna uma lista de todos os clientes.
+    Paginada por cursor: a resposta traz o cursor da próxima página no cabeçalho
+    X-Next-Cursor (ausente na última página).
     Requer autenticação.
     """
     # Chama a função CRUD para obter os clientes do banco de dados.
-    return crud.get_clients(db)
+    page = crud.get_clients(db, tenant_id=current_user.tenant_id, cursor=cursor, limit=limit)
+    set_next_cursor(response, page)
+    return page
 
 @router.post("", response_model=schemas.Client)
 def create_new_client(
@@ -3,7 +3,7 @@ Este módulo define as rotas da API para gerenciamento de configurações da apl
 incluindo fabricantes, modelos e informações da empresa.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -12,6 +12,9 @@ import schemas
 import crud
 import auth
 from database import get_db # Função de dependência para obter a sessão do banco de dados.
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_next_cursor # Paginação por cursor das listagens.
+from services.mercury_session import session_manager
+from services.mercury_http import mercury_http_client
 
 # Cria uma instância de APIRouter com um prefixo e tags para organização na documentação OpenAPI.
 router = APIRouter(prefix="/api/config", tags=["Configuração"])
@@ -21,16 +24,23 @@ router = APIRouter(prefix="/api/config", tags=["Configuração"])
 
 @router.get("/manufacturers", response_model=List[schemas.Manufacturer])
 def get_all_manufacturers(
+    response: Response,
+    cursor: Optional[str] = None, # Cursor da página (cabeçalho X-Next-Cursor da resposta anterior).
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), # Itens por página.
     type: Optional[str] = None, # Parâmetro de query opcional para filtrar fabricantes por tipo ("BOAT" ou "ENGINE").
     db: Session = Depends(get_db), # Injeta a sessão do banco de dados.
     current_user: schemas.User = Depends(auth.get_current_active_user) # Garante que o usuário esteja autenticado.
 ):
     """
     Retorna uma lista de todos os fabricantes, opcionalmente filtrados por tipo.
+    Paginada por cursor: a resposta traz o cursor da próxima página no cabeçalho
+    X-Next-Cursor (ausente na última página).
     Requer autenticação.
     """
     # Chama a função CRUD para obter os fabricantes do banco de dados.
-    return crud.get_manufacturers(db, type=type)
+    page = crud.get_manufacturers(db, type=type, tenant_id=current_user.tenant_id, cursor=cursor, limit=limit)
+    set_next_cursor(response, page)
+    return page
 
 @router.post("/manufacturers", response_model=schemas.Manufacturer)
 def create_new_manufacturer(
@@ -126,7 +136,11 @@ def update_company_information(
     try:
         print(f"DEBUG: Updating company info with: {info} for tenant {current_user.tenant_id}")
         # Chama a função CRUD para atualizar ou criar as informações da empresa.
-        return crud.update_company_info(db, info, tenant_id=current_user.tenant_id)
+        updated = crud.update_company_info(db, info, tenant_id=current_user.tenant_id)
+        # Credenciais do portal podem ter mudado: descarta a sessão Mercury em cache do tenant.
+        session_manager.invalidate(current_user.tenant_id)
+        mercury_http_client.invalidate(current_user.tenant_id)
+        return updated
     except Exception as e:
         print(f"ERROR in update_company_information: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro interno: {str(e)}")
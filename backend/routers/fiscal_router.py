@@ -5,8 +5,9 @@ Ele utiliza um serviço fiscal (`fiscal_service`) para gerar, assinar e transmit
 os documentos fiscais.
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Response, status
 from pydantic import BaseModel
+from sqlalchemy.orm import Session, sessionmaker
 from typing import Dict, Any, Optional, List
 import sys
 import os
@@ -15,6 +16,17 @@ import os
 # Embora funcione, é uma abordagem que pode ser frágil em projetos maiores.
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.fiscal_service import fiscal_service # Importa o serviço que lida com a lógica fiscal.
+# Pipeline que executa as etapas bloqueantes do serviço fora do event loop.
+from services.fiscal_pipeline import FiscalBusy, FiscalTimeout, fiscal_pipeline
+# Fila persistente para a emissão assíncrona (POST /emit?async=true).
+from services.fiscal_queue import fiscal_queue, job_to_dict
+# Numeração sequencial por tenant e série (contador atômico + registro de números usados/inutilizados).
+from services.fiscal_numbering import fiscal_numbering
+import auth
+import crud
+import models
+import schemas
+from database import get_db
 
 # Cria uma instância de APIRouter com um prefixo e tags para organização na documentação OpenAPI.
 router = APIRouter(
@@ -72,37 +84,260 @@ class InvoiceRequest(BaseModel):
     serviceValue: Optional[float] = 0 # Valor total dos serviços (para NFS-e).
     totalValue: float # Valor total geral da nota.
     naturezaOperacao: Optional[str] = None # Natureza da Operação (ex: "Venda de Mercadoria").
+    series: Optional[str] = None # Série da nota (padrão: "1").
     issRetido: Optional[bool] = False # Indica se o ISS foi retido (para NFS-e).
 
+class InvoiceBatchRequest(BaseModel):
+    """
+    Requisição de emissão em lote: notas completas e/ou IDs de ordens de serviço concluídas.
+    """
+    invoices: Optional[List[InvoiceRequest]] = [] # Notas a emitir.
+    orderIds: Optional[List[int]] = [] # Ordens de serviço concluídas a faturar (emitente vem dos dados da empresa).
+
+MAX_BATCH_SIZE = 500 # Notas por requisição de lote (até 10 lotes enviNFe).
+
+def _allocate_numbers(db: Session, tenant_id: int, invoices: List[InvoiceRequest]) -> List[int]:
+    # Reserva os números de todas as notas: uma faixa por (tipo, série), num único UPDATE cada.
+    groups: Dict[tuple, List[int]] = {}
+    for position, invoice in enumerate(invoices):
+        groups.setdefault((invoice.type, invoice.series or "1"), []).append(position)
+    numbers = [0] * len(invoices)
+    for (invoice_type, series), positions in groups.items():
+        allocated = fiscal_numbering.allocate(db, tenant_id, count=len(positions), series=series, invoice_type=invoice_type)
+        for position, number in zip(positions, allocated):
+            numbers[position] = number
+    return numbers
+
+def _prepare_invoice(invoice: InvoiceRequest, tenant_id: int, number: int) -> Dict[str, Any]:
+    # Converte o modelo Pydantic para um dicionário Python.
+    invoice_data = invoice.model_dump()
+    invoice_data['tenant_id'] = tenant_id # Chave da cache do <emit> do emitente.
+    invoice_data['number'] = str(number) # Número reservado em `fiscal_numbering`.
+    invoice_data['series'] = invoice.series or "1" # Série da nota.
+    return invoice_data
+
+def _outcome(invoice_data: Dict[str, Any], result: Dict[str, Any]) -> tuple:
+    # Destino do número após a resposta da SEFAZ: usado (autorizada) ou a inutilizar.
+    # Em timeout o resultado é desconhecido (a SEFAZ pode ter autorizado): fica 'reserved'.
+    authorized = result.get("status") == "success"
+    if result.get("status") == "timeout":
+        destination = "reserved"
+    else:
+        destination = "used" if authorized else "voided"
+    return (
+        invoice_data["type"], invoice_data["series"], int(invoice_data["number"]),
+        destination,
+        result.get("protocol") if authorized else (result.get("message") or result.get("error") or "Não autorizada"),
+    )
+
+def _invoice_from_order(order: models.ServiceOrder, company: models.CompanyInfo) -> InvoiceRequest:
+    # Monta a nota de uma OS: emitente dos dados da empresa, destinatário do dono da embarcação.
+    owner = order.boat.owner if order.boat else None
+    items = [
+        FiscalItem(
+            code=item.part.sku if item.part else f"OS{order.id}-{item.id}",
+            desc=item.description,
+            qty=item.quantity or 0,
+            price=item.unit_price or 0,
+            total=item.total or 0,
+        )
+        for item in order.items
+    ]
+    return InvoiceRequest(
+        type="NFE",
+        issuer=FiscalEntity(
+            companyName=company.company_name,
+            tradeName=company.trade_name,
+            cnpj=company.cnpj,
+            ie=company.ie,
+            crt=company.crt,
+            address=FiscalAddress(
+                street=company.street or "",
+                number=company.number or "",
+                neighborhood=company.neighborhood or "",
+                city=company.city or "",
+                state=company.state or "",
+                zip=company.zip_code or "",
+            ),
+        ),
+        recipient=FiscalEntity(name=owner.name if owner else None, doc=owner.document if owner else None),
+        items=items,
+        totalValue=sum(item.total for item in items) or order.total_value or 0,
+        naturezaOperacao="Venda de Mercadoria",
+    )
+
 @router.post("/emit")
-async def emit_invoice(invoice: InvoiceRequest):
+async def emit_invoice(
+    invoice: InvoiceRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    async_mode: bool = Query(False, alias="async"), # true: grava na fila e responde na hora com o ID do job.
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
     """
     Endpoint para emitir uma nota fiscal (NF-e ou NFS-e).
     Recebe os dados da nota em formato JSON e processa a emissão.
+    Com `?async=true`, a emissão é enfileirada (202) e acompanhada em GET /jobs/{job_id}.
     """
+    number = _allocate_numbers(db, current_user.tenant_id, [invoice])[0]
+    invoice_data = _prepare_invoice(invoice, current_user.tenant_id, number)
+    if async_mode:
+        job = fiscal_queue.enqueue(db, current_user.tenant_id, invoice_data)
+        # O worker grava com sessões próprias, ligadas ao mesmo banco da requisição.
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+        background_tasks.add_task(fiscal_queue.drain, session_factory)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"status": "queued", "job": job_to_dict(job, include_xml=False)}
+
     try:
-        # Converte o modelo Pydantic para um dicionário Python.
-        invoice_data = invoice.model_dump()
+        # Gera o XML, assina e transmite para a SEFAZ (ou provedor de NFS-e).
+        # As três etapas são bloqueantes e rodam no pool do `fiscal_pipeline`, com timeout
+        # por etapa, para não travar o event loop (e as demais requisições) durante a emissão.
+        result = await fiscal_pipeline.emit(invoice_data)
+        fiscal_numbering.record(db, current_user.tenant_id, [_outcome(invoice_data, result)])
         
-        # Gera um número de nota fiscal (em uma aplicação real, viria de uma sequência no DB).
-        import random
-        invoice_data['number'] = str(random.randint(1000, 9999)) # Número aleatório para demonstração.
-        invoice_data['series'] = "1" # Série da nota.
-        
-        # 1. Gera o XML da nota fiscal usando o serviço fiscal.
-        # O serviço `fiscal_service` abstrai a complexidade da geração do XML conforme a legislação.
-        xml = fiscal_service.generate_nfe_xml(invoice_data)
-        
-        # 2. Assina o XML gerado digitalmente.
-        # A assinatura garante a autenticidade e integridade do documento.
-        signed_xml = fiscal_service.sign_xml(xml)
-        
-        # 3. Transmite o XML assinado para a SEFAZ (Secretaria da Fazenda) ou provedor de NFS-e.
-        # Este passo simula o envio do documento fiscal para as autoridades competentes.
-        result = fiscal_service.transmit_to_sefaz(signed_xml)
-        
-        return result # Retorna o resultado da transmissão.
+        # Retorna o resultado da transmissão, com o número atribuído.
+        return {**result, "number": invoice_data["number"], "series": invoice_data["series"]}
         
+    except FiscalBusy as e:
+        # Nada foi transmitido; o número reservado fica para inutilização.
+        fiscal_numbering.record(db, current_user.tenant_id, [_outcome(invoice_data, {"error": str(e)})])
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
+    except FiscalTimeout as e:
+        # Resultado desconhecido (a SEFAZ pode ter autorizado): o número continua 'reserved'.
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
     except Exception as e:
+        fiscal_numbering.record(db, current_user.tenant_id, [_outcome(invoice_data, {"error": str(e)})])
         # Em caso de erro, levanta um HTTPException 500 com a mensagem de erro.
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro ao emitir nota fiscal: {str(e)}")
+
+@router.post("/emit-batch")
+async def emit_invoice_batch(
+    batch: InvoiceBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Emite várias notas de uma vez (ex.: fechamento do dia das OS concluídas).
+    Os XMLs são gerados numa passada, assinados em paralelo e enviados à SEFAZ em lotes
+    `enviNFe` de até 50 notas. Retorna o resultado de cada nota, na ordem recebida
+    (primeiro as notas, depois as OS); falhas individuais não interrompem as demais.
+    """
+    invoices: List[InvoiceRequest] = list(batch.invoices or [])
+    sources: List[Dict[str, Any]] = [{"index": i} for i in range(len(invoices))]
+    errors: Dict[int, str] = {}
+
+    order_ids = list(dict.fromkeys(batch.orderIds or []))
+    if order_ids:
+        company = crud.get_company_info(db, tenant_id=current_user.tenant_id)
+        if not company or not company.cnpj:
+            raise HTTPException(status_code=400, detail="Dados fiscais da empresa não configurados")
+        orders = {order.id: order for order in crud.get_orders_for_invoicing(db, current_user.tenant_id, order_ids)}
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            sources.append({"index": len(sources), "order_id": order_id})
+            if order is None:
+                errors[len(invoices)] = "Ordem de serviço não encontrada"
+            elif order.status != models.OSStatus.COMPLETED:
+                errors[len(invoices)] = f"Ordem de serviço não concluída ({order.status.value})"
+            invoices.append(_invoice_from_order(order, company) if order is not None else None)
+
+    if not invoices:
+        raise HTTPException(status_code=400, detail="Nenhuma nota informada")
+    if len(invoices) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_BATCH_SIZE} notas por lote")
+
+    to_emit = [i for i in range(len(invoices)) if i not in errors]
+    numbers = _allocate_numbers(db, current_user.tenant_id, [invoices[i] for i in to_emit])
+    prepared = [_prepare_invoice(invoices[i], current_user.tenant_id, number) for i, number in zip(to_emit, numbers)]
+    try:
+        emitted = await fiscal_pipeline.emit_batch(prepared) if prepared else []
+    except FiscalBusy as e:
+        fiscal_numbering.record(db, current_user.tenant_id, [_outcome(data, {"error": str(e)}) for data in prepared])
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
+    except FiscalTimeout as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+
+    fiscal_numbering.record(db, current_user.tenant_id, [_outcome(data, result) for data, result in zip(prepared, emitted)])
+
+    results = [{**source, "status": "error", "error": errors.get(source["index"])} for source in sources]
+    for position, index in enumerate(to_emit):
+        results[index] = {
+            **sources[index],
+            "number": prepared[position]["number"],
+            "series": prepared[position]["series"],
+            **emitted[position],
+        }
+    authorized = sum(1 for r in results if r["status"] == "success")
+    return {
+        "status": "success",
+        "total": len(results),
+        "authorized": authorized,
+        "failed": len(results) - authorized,
+        "lots": len({r["lot"] for r in results if r.get("lot")}),
+        "results": results,
+    }
+
+@router.get("/pipeline")
+async def get_pipeline_stats(
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Estatísticas do pipeline de emissão (emissões em andamento, timeouts, tempo médio por etapa).
+    """
+    return fiscal_pipeline.stats()
+
+@router.get("/numbers")
+async def list_fiscal_numbers(
+    status_filter: Optional[str] = Query(None, alias="status"), # reserved, used ou voided
+    series: Optional[str] = None,
+    type: str = "NFE",
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Números fiscais reservados do tenant e seu destino (ex.: `?status=voided` lista os
+    números a inutilizar na SEFAZ).
+    """
+    numbers = fiscal_numbering.list_numbers(
+        db, current_user.tenant_id, status=status_filter, series=series, invoice_type=type, limit=limit
+    )
+    return {"status": "success", "numbers": numbers}
+
+@router.get("/jobs")
+async def list_fiscal_jobs(
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Lista as emissões assíncronas mais recentes do tenant (sem o XML).
+    """
+    jobs = (
+        db.query(models.FiscalJob)
+        .filter(models.FiscalJob.tenant_id == current_user.tenant_id)
+        .order_by(models.FiscalJob.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return {"status": "success", "jobs": [job_to_dict(job, include_xml=False) for job in jobs]}
+
+@router.get("/jobs/{job_id}")
+async def get_fiscal_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Consulta uma emissão assíncrona: status, tentativas, protocolo e XML.
+    """
+    job = (
+        db.query(models.FiscalJob)
+        .filter(models.FiscalJob.id == job_id, models.FiscalJob.tenant_id == current_user.tenant_id)
+        .first()
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Job de emissão não encontrado")
+    return {"status": "success", "job": job_to_dict(job)}
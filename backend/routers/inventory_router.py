@@ -3,15 +3,18 @@ Este módulo define as rotas da API para gerenciamento de inventário (estoque d
 e movimentações de estoque.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import datetime
 
 # Importa os esquemas de dados (Pydantic), funções CRUD e utilitários de autenticação.
 import schemas
 import crud
 import auth
 from database import get_db # Função de dependência para obter a sessão do banco de dados.
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_next_cursor # Paginação por cursor das listagens.
+from services import nfe_import
 
 # Cria uma instância de APIRouter com um prefixo e tags para organização na documentação OpenAPI.
 router = APIRouter(prefix="/api/inventory", tags=["Inventário"])
@@ -21,15 +24,44 @@ router = APIRouter(prefix="/api/inventory", tags=["Inventário"])
 
 @router.get("/parts", response_model=List[schemas.Part])
 def get_all_parts(
+    response: Response,
+    cursor: Optional[str] = None, # Cursor da página (cabeçalho X-Next-Cursor da resposta anterior).
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), # Itens por página.
     db: Session = Depends(get_db), # Injeta a sessão do banco de dados.
     current_user: schemas.User = Depends(auth.get_current_active_user) # Garante que o usuário esteja autenticado.
 ):
     """
     Retorna uma lista de todas as peças do estoque.
+    Paginada por cursor: a resposta traz o cursor da próxima página no cabeçalho
+    X-Next-Cursor (ausente na última página).
     Requer autenticação.
     """
     # Chama a função CRUD para buscar todas as peças do banco de dados.
-    return crud.get_parts(db)
+    page = crud.get_parts(db, tenant_id=current_user.tenant_id, cursor=cursor, limit=limit)
+    set_next_cursor(response, page)
+    return page
+
+@router.get("/parts/price-changes", response_model=List[schemas.PartPriceChange])
+def get_part_price_changes(
+    since: datetime, # Retorna apenas alterações posteriores a este instante (ISO 8601).
+    response: Response,
+    source: Optional[str] = None, # Filtra pela origem ('mercury', 'manual').
+    cursor: Optional[str] = None, # Cursor da página (cabeçalho X-Next-Cursor da resposta anterior).
+    limit: int = Query(1000, ge=1, le=5000), # Número máximo de peças retornadas.
+    db: Session = Depends(get_db), # Injeta a sessão do banco de dados.
+    current_user: schemas.User = Depends(auth.get_current_active_user) # Garante que o usuário esteja autenticado.
+):
+    """
+    Retorna as variações de custo/preço das peças desde `since`, a partir do histórico de preços.
+    Permite que o frontend (e ferramentas de remarcação em massa) trabalhem de forma incremental,
+    usando o `changedAt` mais recente como próximo `since`. Se a resposta trouxer o cabeçalho
+    X-Next-Cursor, ainda há peças no período: busque-as com o mesmo `since` e esse `cursor`
+    antes de avançar o `since`.
+    Requer autenticação.
+    """
+    page = crud.get_price_changes(db, tenant_id=current_user.tenant_id, since=since, source=source, cursor=cursor, limit=limit)
+    set_next_cursor(response, page)
+    return page
 
 @router.get("/parts/{part_id}", response_model=schemas.Part)
 def get_single_part(
@@ -61,7 +93,7 @@ def create_new_part(
     Verifica se o SKU já existe para evitar duplicatas.
     """
     # Verifica se o SKU (Stock Keeping Unit) já existe.
-    existing = crud.get_part_by_sku(db, sku=part.sku)
+    existing = crud.get_part_by_sku(db, sku=part.sku, tenant_id=current_user.tenant_id)
     if existing:
         # Se o SKU já existe, levanta uma exceção HTTP 400 Bad Request.
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="SKU já existe")
@@ -92,6 +124,9 @@ def update_existing_part(
 
 @router.get("/movements", response_model=List[schemas.StockMovement])
 def get_all_movements(
+    response: Response,
+    cursor: Optional[str] = None, # Cursor da página (cabeçalho X-Next-Cursor da resposta anterior).
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), # Itens por página.
     part_id: Optional[int] = None, # Parâmetro de query opcional para filtrar movimentos por ID da peça.
     db: Session = Depends(get_db), # Injeta a sessão do banco de dados.
     current_user: schemas.User = Depends(auth.get_current_active_user) # Garante que o usuário esteja autenticado.
@@ -99,10 +134,14 @@ def get_all_movements(
     """
     Retorna o histórico de todas as movimentações de estoque (Kardex),
     opcionalmente filtrado por ID da peça.
+    Paginada por cursor: a resposta traz o cursor da próxima página no cabeçalho
+    X-Next-Cursor (ausente na última página).
     Requer autenticação.
     """
     # Chama a função CRUD para buscar as movimentações de estoque.
-    return crud.get_movements(db, part_id=part_id)
+    page = crud.get_movements(db, part_id=part_id, tenant_id=current_user.tenant_id, cursor=cursor, limit=limit)
+    set_next_cursor(response, page)
+    return page
 
 @router.post("/movements", response_model=schemas.StockMovement)
 def create_stock_movement(
@@ -116,3 +155,33 @@ def create_stock_movement(
     """
     # Chama a função CRUD para criar a movimentação no banco de dados.
     return crud.create_stock_movement(db=db, movement=movement, user_name=current_user.name, tenant_id=current_user.tenant_id)
+
+# --- INVOICES (Notas de Entrada) ---
+# Importação de XMLs de NF-e de fornecedores.
+
+@router.post("/invoices/import", response_model=schemas.InvoiceImportResult)
+def import_invoice_xmls(
+    files: List[UploadFile] = File(...), # Um ou mais XMLs de NF-e, ou arquivos .zip com os XMLs.
+    db: Session = Depends(get_db), # Injeta a sessão do banco de dados.
+    current_user: schemas.User = Depends(auth.get_current_active_user) # Garante que o usuário esteja autenticado.
+):
+    """
+    Importa NF-e de fornecedores: cria as notas, lança um movimento de entrada (IN_INVOICE)
+    para cada item vinculado a uma peça (por código de barras ou SKU) e atualiza o estoque,
+    tudo numa única transação. Itens sem peça correspondente voltam em `unmatched`.
+    Requer autenticação.
+    """
+    try:
+        documents, errors = nfe_import.read_documents((upload.filename or "nfe.xml", upload.file) for upload in files)
+    except nfe_import.TooManyDocuments as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    results = crud.import_supplier_invoices(db, current_user.tenant_id, documents, user_name=current_user.name)
+    results += errors
+    return {
+        "imported": sum(1 for r in results if r["status"] == "imported"),
+        "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+        "errors": len(errors),
+        "movements": sum(r.get("matched", 0) for r in results if r["status"] == "imported"),
+        "documents": results,
+    }
@@ -4,14 +4,11 @@ Ele permite buscar produtos e obter informações de garantia de motores
 ao realizar web scraping do portal.
 """
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status
 from typing import Dict, Any, List, Optional
+import logging
 import sys
 import os
-import requests # Biblioteca para fazer requisições HTTP.
-import asyncio # Para rodar funções síncronas em um threadpool.
-from bs4 import BeautifulSoup # Biblioteca para parsing de HTML (web scraping).
-import re # Módulo para expressões regulares.
 import auth
 import schemas
 
@@ -20,6 +17,8 @@ import schemas
 # Mantido conforme estrutura existente.
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+logger = logging.getLogger(__name__)
+
 # Cria uma instância de APIRouter com um prefixo e tags para organização na documentação OpenAPI.
 router = APIRouter(
     prefix="/api/mercury",
@@ -32,176 +31,178 @@ router = APIRouter(
 
 # --- FUNÇÕES AUXILIARES (PLAYWRIGHT) ---
 
-from playwright.async_api import async_playwright
+# O navegador é compartilhado pela aplicação: cada busca empresta um contexto do pool
+# em vez de lançar (e fechar) um Chromium novo por requisição.
+from services.mercury_pool import browser_pool
+# O login de cada tenant é feito uma vez e os cookies são reaproveitados entre as buscas.
+from services.mercury_session import session_manager, PORTAL_BASE_URL
+from services.mercury_parser import (
+    is_no_records,
+    match_portal_row,
+    parse_brl_currency,
+    parse_product_results,
+    parse_warranty_client_name,
+    parse_warranty_summary,
+    suggest_portal_rows,
+)
+# Resultados recentes são servidos do cache (por tenant) sem tocar no portal.
+from services.mercury_cache import mercury_cache, MISSING
+# Coalescência de buscas idênticas em andamento.
+from services.singleflight import SingleFlight
+# Limite de concorrência (global e por tenant) e de requisições por segundo ao portal.
+from services.mercury_limiter import portal_limiter, PortalBusy
+# Circuit breaker: com o portal fora do ar, responde na hora (503 ou resultado antigo do cache).
+from services.mercury_breaker import portal_breaker, CircuitOpen, MercuryPortalError
+from services.mercury_sync import price_sync_jobs, run_price_sync, select_parts_for_sync
+from services.mercury_warranty import (
+    default_checked_before,
+    run_warranty_refresh,
+    select_engines_for_refresh,
+    warranty_refresh_jobs,
+    warranty_scheduler,
+)
+# Caminho rápido sem navegador (HTTP puro), com fallback para o Playwright.
+from services.mercury_http import mercury_http_client, MercuryHttpUnavailable
 
-async def search_product_playwright(item: str, username: str, password: str) -> List[Dict[str, str]]:
+async def search_product_playwright(item: str, username: str, password: str, tenant_id: Optional[int] = None) -> List[Dict[str, str]]:
     """
     Pesquisa produtos no Portal Mercury Marine usando Playwright.
+    Com `tenant_id`, reaproveita a sessão autenticada do tenant em vez de refazer o login.
     """
-    # O user agent e headless mode devem ser configurados
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-
-        try:
-            # Login
-            login_url = "https://portal.mercurymarine.com.br/epdv/epdv001.asp"
-            await page.goto(login_url)
-            # Use credentials from DB
-            await page.fill("input[name='sUsuar']", username)
-            await page.fill("input[name='sSenha']", password)
-            await page.press("input[name='sSenha']", "Enter")
-            await page.wait_for_load_state()
-
+    try:
+        async with browser_pool.page() as page:
             # Busca
             # Nota: O usuário insistiu no uso do ID fixo '11111111111111111', assumindo que com Playwright funcione.
-            url_pesquisa = f"https://portal.mercurymarine.com.br/epdv/epdv002d2.asp?s_nr_pedido_web=11111111111111111&s_nr_tabpre=&s_fm_cod_com=null&s_desc_item={item}"
+            url_pesquisa = f"{PORTAL_BASE_URL}/epdv002d2.asp?s_nr_pedido_web=11111111111111111&s_nr_tabpre=&s_fm_cod_com=null&s_desc_item={item}"
             print(f"Searching (Playwright): {url_pesquisa}")
-            await page.goto(url_pesquisa)
-            await page.wait_for_load_state()
+            # Login (apenas se não houver sessão válida em cache) + navegação
+            content = await session_manager.goto(page, url_pesquisa, tenant_id, username, password)
 
             # Verificar sem resultados
-            content = await page.content()
-            if "NoRecords" in content or "Nenhum registro encontrado" in content:
+            if is_no_records(content):
                 print(f"Mercury search returned 'NoRecords' for item: {item}")
                 return []
 
-            soup = BeautifulSoup(content, "html.parser")
-            
-            # Lógica de parsing adaptada de funcoes_playwright.py
-            form_preco_item_web = soup.find("form", id="preco_item_web")
-            if not form_preco_item_web:
-                return []
+            return parse_product_results(content)
 
-            first_table = form_preco_item_web.find("table")
-            if not first_table: 
-                return []
-                
-            tbody = first_table.find("tbody")
-            if not tbody: 
-                return []
-                
-            tr = tbody.find("tr")
-            if not tr: 
-                return []
-                
-            td = tr.find("td")
-            if not td: 
-                return []
-                
-            tables_in_td = td.find_all("table")
-            data_table = tables_in_td[1] if len(tables_in_td) > 1 else None
-            
-            if not data_table:
-                return []
+    except Exception as e:
+        print(f"Erro Playwright: {e}")
+        # Propaga a falha para o circuit breaker (e para o chamador) em vez de parecer "sem resultados".
+        raise MercuryPortalError(str(e)) from e
 
-            linhas = data_table.find_all("tr", class_="Row")
-            dados = []
-            for linha in linhas:
-                colunas = linha.find_all("td")
-                if len(colunas) >= 8:
-                    dados_linha = {
-                        "codigo": colunas[1].text.strip(),
-                        "qtd": colunas[2].text.strip(),
-                        "descricao": colunas[3].text.strip(),
-                        "qtdaEst": colunas[4].text.strip(),
-                        "valorVenda": colunas[5].text.strip(),
-                        "valorTabela": colunas[6].text.strip(),
-                        "valorCusto": colunas[7].text.strip(),
-                    }
-                    dados.append(dados_linha)
-            return dados
-
-        except Exception as e:
-            print(f"Erro Playwright: {e}")
-            return []
-        finally:
-            await browser.close()
-
-async def search_warranty_playwright(nro_motor: str, username: str, password: str) -> Optional[Dict[str, str]]:
+async def search_warranty_playwright(nro_motor: str, username: str, password: str, tenant_id: Optional[int] = None, include_client: bool = True) -> Optional[Dict[str, str]]:
     """
     Busca garantia usando Playwright.
+    Com `tenant_id`, reaproveita a sessão autenticada do tenant em vez de refazer o login.
+    Com `include_client=False`, não carrega a página secundária com o nome do cliente.
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        
-        try:
-            # Login
-            await page.goto("https://portal.mercurymarine.com.br/epdv/epdv001.asp")
-            # Use credentials from DB
-            await page.fill("input[name='sUsuar']", username)
-            await page.fill("input[name='sSenha']", password)
-            await page.press("input[name='sSenha']", "Enter")
-            await page.wait_for_load_state()
-            
-            # Busca Garantia
-            url_warranty = f"https://portal.mercurymarine.com.br/epdv/ewr010.asp?s_nr_serie={nro_motor}"
-            await page.goto(url_warranty)
-            await page.wait_for_load_state()
-            
-            content = await page.content()
-            soup = BeautifulSoup(content, "html.parser")
-
-            if nro_motor.upper() not in soup.get_text().upper():
-                return None
-
-            row = soup.select_one("tr.Row")
-            if not row: return None
-            
-            cells = row.find_all("td")
-            if len(cells) < 6: return None
-
-            nro_serie = cells[0].get_text(strip=True)
-            modelo = cells[1].get_text(strip=True)
-            dt_venda = cells[2].get_text(strip=True)
-            status_garantia = cells[4].get_text(strip=True)
-            vld_garantia = cells[5].get_text(strip=True)
+    try:
+        async with browser_pool.page() as page:
+            # Busca Garantia (login apenas se a sessão do tenant não estiver em cache ou tiver expirado)
+            url_warranty = f"{PORTAL_BASE_URL}/ewr010.asp?s_nr_serie={nro_motor}"
+            content = await session_manager.goto(page, url_warranty, tenant_id, username, password)
+            result = parse_warranty_summary(content, nro_motor)
+            if result is None or not include_client:
+                return result
 
             # Busca Cliente (Página secundária)
-            url_client = f"https://portal.mercurymarine.com.br/epdv/ewr010c.asp?s_nr_serie={nro_motor}"
+            url_client = f"{PORTAL_BASE_URL}/ewr010c.asp?s_nr_serie={nro_motor}"
+            await portal_limiter.throttle()
             await page.goto(url_client)
-            content_client = await page.content()
-            soup_client = BeautifulSoup(content_client, "html.parser")
-            
-            nome_cli = ""
-            client_table = soup_client.select_one("#warranty_clients table")
-            if client_table:
-                rows = client_table.find_all("tr")
-                if len(rows) >= 3:
-                     nome_cli = rows[2].get_text(strip=True).replace("NOME ", "").strip()
-            
-            if not nome_cli:
-                 match = re.search(r"NOME\s+([^\n]+)", soup_client.get_text())
-                 if match:
-                     nome_cli = match.group(1).strip()
-
-            return {
-                "nro_motor": nro_motor,
-                "nro_serie": nro_serie,
-                "modelo": modelo,
-                "dt_venda": dt_venda,
-                "status_garantia": status_garantia,
-                "vld_garantia": vld_garantia,
-                "nome_cli": nome_cli,
-            }
-
-        except Exception as e:
-            print(f"Erro Playwright Garantia: {e}")
-            return None
-        finally:
-            await browser.close()
+            result["nome_cli"] = parse_warranty_client_name(await page.content())
+            return result
+
+    except Exception as e:
+        print(f"Erro Playwright Garantia: {e}")
+        raise MercuryPortalError(str(e)) from e
+
+# --- SELEÇÃO DO BACKEND DO SCRAPER ---
+# "playwright" (padrão) usa o navegador; "http" tenta o caminho sem navegador primeiro
+# e volta ao Playwright apenas quando ele não consegue atender.
+# A escolha vem do tenant (CompanyInfo.mercury_backend) ou de MERCURY_SCRAPER_BACKEND.
+
+def get_scraper_backend(company) -> str:
+    backend = getattr(company, "mercury_backend", None) or os.getenv("MERCURY_SCRAPER_BACKEND", "playwright")
+    return backend.strip().lower()
+
+# Buscas idênticas e simultâneas (mesmo tenant, operação e argumento) compartilham uma única ida ao portal.
+portal_requests = SingleFlight()
+
+def _flight_key(tenant_id: Optional[int], operation: str, argument: str):
+    return (tenant_id, operation, argument.strip().upper())
+
+async def _scrape_product(item: str, company, tenant_id: Optional[int]) -> List[Dict[str, str]]:
+    if get_scraper_backend(company) == "http":
+        try:
+            return await mercury_http_client.search_product(item, company.mercury_username, company.mercury_password, tenant_id=tenant_id)
+        except MercuryHttpUnavailable as e:
+            logger.warning(f"Mercury HTTP indisponível ({e}); usando Playwright.")
+    return await search_product_playwright(item, company.mercury_username, company.mercury_password, tenant_id=tenant_id)
+
+async def _scrape_warranty(nro_motor: str, company, tenant_id: Optional[int], include_client: bool = True) -> Optional[Dict[str, str]]:
+    if get_scraper_backend(company) == "http":
+        try:
+            return await mercury_http_client.search_warranty(nro_motor, company.mercury_username, company.mercury_password, tenant_id=tenant_id, include_client=include_client)
+        except MercuryHttpUnavailable as e:
+            logger.warning(f"Mercury HTTP indisponível ({e}); usando Playwright.")
+    return await search_warranty_playwright(nro_motor, company.mercury_username, company.mercury_password, tenant_id=tenant_id, include_client=include_client)
+
+async def _fetch_product(item: str, company, tenant_id: Optional[int]) -> List[Dict[str, str]]:
+    portal_breaker.check() # Com o circuito aberto, falha na hora, sem entrar na fila.
+    async with portal_limiter.slot(tenant_id):
+        return await portal_breaker.call(lambda: _scrape_product(item, company, tenant_id))
+
+async def _fetch_warranty(nro_motor: str, company, tenant_id: Optional[int], include_client: bool = True) -> Optional[Dict[str, str]]:
+    portal_breaker.check()
+    async with portal_limiter.slot(tenant_id):
+        return await portal_breaker.call(lambda: _scrape_warranty(nro_motor, company, tenant_id, include_client))
+
+async def search_product_portal(item: str, company, tenant_id: Optional[int] = None) -> List[Dict[str, str]]:
+    """
+    Pesquisa produtos no portal usando o backend configurado para o tenant.
+    """
+    return await portal_requests.do(
+        _flight_key(tenant_id, "product", item),
+        lambda: _fetch_product(item, company, tenant_id),
+    )
+
+async def search_warranty_portal(nro_motor: str, company, tenant_id: Optional[int] = None, include_client: bool = True) -> Optional[Dict[str, str]]:
+    """
+    Busca a garantia de um motor usando o backend configurado para o tenant.
+    Com `include_client=False`, retorna só o resumo (uma página a menos por motor).
+    """
+    return await portal_requests.do(
+        _flight_key(tenant_id, "warranty" if include_client else "warranty_summary", nro_motor),
+        lambda: _fetch_warranty(nro_motor, company, tenant_id, include_client),
+    )
 
 # --- ENDPOINTS ---
 
-from database import get_db
-from sqlalchemy.orm import Session
+from database import get_db, SessionLocal
+from datetime import datetime
+from sqlalchemy.orm import Session, sessionmaker
 from fastapi import Depends
 import crud
+import models
+
+def _serve_stale_or_503(e: CircuitOpen, tenant_id: int, operation: str, argument: str) -> Any:
+    """
+    Com o circuito aberto, devolve o último resultado conhecido do cache (mesmo expirado)
+    ou responde 503 imediatamente.
+    """
+    stale = mercury_cache.get_stale(tenant_id, operation, argument)
+    if stale is not MISSING:
+        return stale
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, int(e.retry_after)))},
+    )
 
 @router.get("/search/{item}")
 async def search_mercury_product(
     item: str,
+    refresh: bool = False, # Ignora o cache e consulta o portal.
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
@@ -211,17 +212,28 @@ async def search_mercury_product(
         if not company or not company.mercury_username or not company.mercury_password:
              raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Credenciais Mercury não configuradas.")
 
-        # Chama a função async diretamente (sem to_thread)
-        results = await search_product_playwright(item, company.mercury_username, company.mercury_password)
+        # Chama a função async diretamente (sem to_thread), passando pelo cache do tenant
+        results = await mercury_cache.get_or_fetch(
+            current_user.tenant_id, "product", item,
+            lambda: search_product_portal(item, company, tenant_id=current_user.tenant_id),
+            refresh=refresh,
+        )
         return {"status": "success", "results": results}
+    except CircuitOpen as e:
+        results = _serve_stale_or_503(e, current_user.tenant_id, "product", item)
+        return {"status": "success", "results": results, "stale": True}
     except HTTPException:
         raise
+    except PortalBusy as e:
+        # Portal saturado: o cliente pode tentar de novo em instantes.
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro ao buscar produto: {str(e)}")
 
 @router.get("/warranty/{serial}")
 async def get_engine_warranty(
     serial: str,
+    refresh: bool = False, # Ignora o cache e consulta o portal.
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
@@ -231,32 +243,83 @@ async def get_engine_warranty(
         if not company or not company.mercury_username or not company.mercury_password:
              raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Credenciais Mercury não configuradas.")
 
-        # Chama a função async diretamente
-        result = await search_warranty_playwright(serial, company.mercury_username, company.mercury_password)
+        # Chama a função async diretamente, passando pelo cache do tenant
+        result = await mercury_cache.get_or_fetch(
+            current_user.tenant_id, "warranty", serial,
+            lambda: search_warranty_portal(serial, company, tenant_id=current_user.tenant_id),
+            refresh=refresh,
+        )
         if result:
             return {"status": "success", "data": result}
         else:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Motor com serial '{serial}' não encontrado.")
+    except CircuitOpen as e:
+        result = _serve_stale_or_503(e, current_user.tenant_id, "warranty", serial)
+        return {"status": "success", "data": result, "stale": True}
     except HTTPException:
         raise
+    except PortalBusy as e:
+        # Portal saturado: o cliente pode tentar de novo em instantes.
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro ao buscar garantia: {str(e)}")
 
-# --- HELPER DE PARSING ---
-def parse_brl_currency(value_str: str) -> float:
-    """Converte string de moeda BRL ('1.234,56') para float (1234.56)."""
-    if not value_str:
-        return 0.0
-    try:
-        # Remove caracteres não numéricos exceto , e . (e R$)
-        clean_str = value_str.strip().replace("R$", "").strip()
-        # Remove pontos de milhar
-        clean_str = clean_str.replace(".", "")
-        # Troca vírgula decimal por ponto
-        clean_str = clean_str.replace(",", ".")
-        return float(clean_str)
-    except ValueError:
-        return 0.0
+@router.get("/pool")
+async def get_browser_pool_status(
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Retorna o estado do pool de navegadores usado pelo scraper (health check).
+    """
+    return {
+        "status": "success",
+        "pool": browser_pool.stats(),
+        "sessions": session_manager.stats(),
+        "http": mercury_http_client.stats(),
+        "in_flight": portal_requests.stats(),
+        "limiter": portal_limiter.stats(),
+        "breaker": portal_breaker.stats(),
+    }
+
+@router.get("/breaker")
+async def get_breaker_status(
+    current_user: schemas.User = Depends(auth.require_role([models.UserRole.ADMIN]))
+):
+    """
+    Retorna o estado do circuit breaker do portal (fechado, aberto ou meio-aberto).
+    """
+    return {"status": "success", "breaker": portal_breaker.stats()}
+
+@router.post("/breaker/reset")
+async def reset_breaker(
+    current_user: schemas.User = Depends(auth.require_role([models.UserRole.ADMIN]))
+):
+    """
+    Fecha o circuito manualmente, liberando novamente o acesso ao portal.
+    """
+    portal_breaker.reset()
+    return {"status": "success", "breaker": portal_breaker.stats()}
+
+@router.get("/cache")
+async def get_cache_status(
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Retorna as métricas do cache de resultados do portal (acertos, falhas, entradas).
+    """
+    return {"status": "success", "cache": mercury_cache.stats()}
+
+@router.delete("/cache")
+async def invalidate_cache(
+    operation: Optional[str] = None, # "product" ou "warranty" (vazio = todas).
+    argument: Optional[str] = None, # SKU/termo ou número de série específico.
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Remove resultados em cache do tenant, no todo ou por operação/argumento.
+    """
+    removed = mercury_cache.invalidate(current_user.tenant_id, operation=operation, argument=argument)
+    return {"status": "success", "removed": removed}
 
 @router.post("/sync-price/{part_id}")
 async def sync_part_price_mercury(
@@ -284,21 +347,24 @@ async def sync_part_price_mercury(
     # 3. Buscar no Portal
     print(f"Sincronizando SKU: {part.sku}")
     try:
-        results = await search_product_playwright(part.sku, company.mercury_username, company.mercury_password)
+        results = await search_product_portal(part.sku, company, tenant_id=current_user.tenant_id)
+    except PortalBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except CircuitOpen as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, int(e.retry_after)))})
     except Exception as e:
          raise HTTPException(status_code=500, detail=f"Erro no scraper: {str(e)}")
     
     # 4. Processar Resultados
-    matched_data = None
-    for item in results:
-        item_code = item['codigo'].strip()
-        # Comparação flexível mas segura
-        if item_code == part.sku or item_code in part.sku or part.sku in item_code:
-             matched_data = item
-             break
+    matched_data = match_portal_row(results, part.sku)
     
     if not matched_data:
-        raise HTTPException(status_code=404, detail=f"Produto não encontrado no portal Mercury para SKU {part.sku}")
+        # Códigos parecidos são só sugeridos: o preço de outra peça nunca é gravado.
+        suggestions = suggest_portal_rows(results, part.sku)
+        detail = f"Produto não encontrado no portal Mercury para SKU {part.sku}"
+        if suggestions:
+            detail += ". Códigos parecidos: " + ", ".join(row["codigo"] for row in suggestions)
+        raise HTTPException(status_code=404, detail=detail)
     
     # 5. Atualizar Preços
     cost = parse_brl_currency(matched_data.get('valorCusto', '0'))
@@ -311,7 +377,7 @@ async def sync_part_price_mercury(
         price=price
     )
     
-    updated_part = crud.update_part(db, part_id, part_update)
+    updated_part = crud.update_part(db, part_id, part_update, price_source="mercury")
     
     updated_part.last_price_updated_at = datetime.utcnow()
     db.commit()
@@ -324,3 +390,165 @@ async def sync_part_price_mercury(
         "new_cost": cost,
         "updated_at": updated_part.last_price_updated_at
     }
+
+# --- SINCRONIZAÇÃO EM MASSA ---
+
+def _portal_credentials(company) -> schemas.CompanyInfoBase:
+    # Copia as credenciais: os jobs rodam depois que a sessão da requisição for fechada.
+    return schemas.CompanyInfoBase(
+        mercury_username=company.mercury_username,
+        mercury_password=company.mercury_password,
+        mercury_backend=company.mercury_backend,
+    )
+
+@router.post("/sync-prices")
+async def start_bulk_price_sync(
+    sync_request: schemas.MercuryPriceSyncRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Inicia um job em segundo plano que sincroniza custo e preço de várias peças com o portal.
+    Retorna o ID do job, consultável em GET /sync-prices/{job_id}.
+    """
+    company = crud.get_company_info(db, tenant_id=current_user.tenant_id)
+    if not company or not company.mercury_username or not company.mercury_password:
+        raise HTTPException(status_code=400, detail="Credenciais Mercury não configuradas")
+
+    parts = select_parts_for_sync(
+        db,
+        tenant_id=current_user.tenant_id,
+        manufacturer=sync_request.manufacturer,
+        updated_before=sync_request.updated_before,
+        part_ids=sync_request.part_ids,
+    )
+    job = price_sync_jobs.create(current_user.tenant_id, parts, concurrency=sync_request.concurrency)
+
+    credentials = _portal_credentials(company)
+    tenant_id = current_user.tenant_id
+
+    async def search(sku: str):
+        return await search_product_portal(sku, credentials, tenant_id=tenant_id)
+
+    # O job grava em lotes com sessões próprias, ligadas ao mesmo banco da requisição.
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    background_tasks.add_task(run_price_sync, job, search, session_factory)
+    return {"status": "success", "job": job.to_dict(include_results=False)}
+
+@router.get("/sync-prices")
+async def list_bulk_price_syncs(
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Lista os jobs de sincronização recentes do tenant (sem os resultados por SKU).
+    """
+    return {"status": "success", "jobs": [job.to_dict(include_results=False) for job in price_sync_jobs.list(current_user.tenant_id)]}
+
+@router.get("/sync-prices/{job_id}")
+async def get_bulk_price_sync(
+    job_id: str,
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Retorna o progresso e o resultado por SKU de um job de sincronização.
+    """
+    job = price_sync_jobs.get(job_id, tenant_id=current_user.tenant_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job de sincronização não encontrado")
+    return {"status": "success", "job": job.to_dict()}
+
+# --- ATUALIZAÇÃO DE GARANTIAS DOS MOTORES ---
+
+def _create_warranty_refresh_job(db: Session, tenant_id: int, checked_before: Optional[datetime] = None, engine_ids: Optional[List[int]] = None, concurrency: Optional[int] = None):
+    engines = select_engines_for_refresh(db, tenant_id, checked_before=checked_before, engine_ids=engine_ids)
+    return warranty_refresh_jobs.create(tenant_id, engines, concurrency=concurrency)
+
+def _warranty_fetcher(company, tenant_id: int):
+    credentials = _portal_credentials(company)
+
+    async def fetch(serial: str):
+        # Só o resumo: o nome do cliente não é gravado pelo job (uma página a menos por motor).
+        return await search_warranty_portal(serial, credentials, tenant_id=tenant_id, include_client=False)
+    return fetch
+
+async def refresh_all_tenants_warranty(session_factory=SessionLocal):
+    """
+    Atualiza as garantias de todos os tenants com credenciais Mercury (usado pelo agendamento).
+    Os tenants são processados um de cada vez; tenants com job em andamento são pulados.
+    """
+    db = session_factory()
+    try:
+        companies = db.query(models.CompanyInfo).filter(
+            models.CompanyInfo.mercury_username.isnot(None),
+            models.CompanyInfo.mercury_password.isnot(None),
+        ).all()
+        work = []
+        for company in companies:
+            if warranty_refresh_jobs.running(company.tenant_id):
+                continue
+            job = _create_warranty_refresh_job(db, company.tenant_id, checked_before=default_checked_before())
+            if job.parts:
+                work.append((job, _warranty_fetcher(company, company.tenant_id)))
+    finally:
+        db.close()
+
+    for job, fetch in work:
+        await run_warranty_refresh(job, fetch, session_factory)
+
+@router.post("/warranty-refresh")
+async def start_warranty_refresh(
+    refresh_request: schemas.MercuryWarrantyRefreshRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Inicia um job em segundo plano que atualiza status, validade e data de venda da garantia
+    dos motores do tenant. Motores verificados dentro da janela do servidor são pulados
+    (a menos que `force` seja informado). Consultável em GET /warranty-refresh/{job_id}.
+    """
+    company = crud.get_company_info(db, tenant_id=current_user.tenant_id)
+    if not company or not company.mercury_username or not company.mercury_password:
+        raise HTTPException(status_code=400, detail="Credenciais Mercury não configuradas")
+
+    running = warranty_refresh_jobs.running(current_user.tenant_id)
+    if running:
+        raise HTTPException(status_code=409, detail=f"Já existe uma atualização de garantias em andamento ({running.id})")
+
+    checked_before = None if refresh_request.force else (refresh_request.checked_before or default_checked_before())
+    job = _create_warranty_refresh_job(
+        db, current_user.tenant_id,
+        checked_before=checked_before,
+        engine_ids=refresh_request.engine_ids,
+        concurrency=refresh_request.concurrency,
+    )
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    background_tasks.add_task(run_warranty_refresh, job, _warranty_fetcher(company, current_user.tenant_id), session_factory)
+    return {"status": "success", "job": job.to_dict(include_results=False)}
+
+@router.get("/warranty-refresh")
+async def list_warranty_refreshes(
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Lista os jobs de atualização de garantias recentes do tenant e o estado do agendamento.
+    """
+    return {
+        "status": "success",
+        "jobs": [job.to_dict(include_results=False) for job in warranty_refresh_jobs.list(current_user.tenant_id)],
+        "schedule": warranty_scheduler.stats(),
+    }
+
+@router.get("/warranty-refresh/{job_id}")
+async def get_warranty_refresh(
+    job_id: str,
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """
+    Retorna o progresso e o resultado por motor de um job de atualização de garantias.
+    """
+    job = warranty_refresh_jobs.get(job_id, tenant_id=current_user.tenant_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job de atualização de garantias não encontrado")
+    return {"status": "success", "job": job.to_dict()}
@@ -4,7 +4,7 @@ Ele inclui funcionalidades para criar, ler, atualizar e completar ordens,
 bem como adicionar itens e notas a elas.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -13,22 +13,30 @@ import schemas
 import crud
 import auth
 from database import get_db # Função de dependência para obter a sessão do banco de dados.
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_next_cursor # Paginação por cursor das listagens.
 
 # Cria uma instância de APIRouter com um prefixo e tags para organização na documentação OpenAPI.
 router = APIRouter(prefix="/api/orders", tags=["Ordens de Serviço"])
 
 @router.get("", response_model=List[schemas.ServiceOrder])
 def get_all_service_orders(
+    response: Response,
+    cursor: Optional[str] = None, # Cursor da página (cabeçalho X-Next-Cursor da resposta anterior).
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), # Itens por página.
     status: Optional[str] = None, # Parâmetro de query opcional para filtrar ordens por status.
     db: Session = Depends(get_db), # Injeta a sessão do banco de dados.
     current_user: schemas.User = Depends(auth.get_current_active_user) # Garante que o usuário esteja autenticado.
 ):
     """
     Retorna uma lista de todas as ordens de serviço, opcionalmente filtradas por status.
+    Paginada por cursor: a resposta traz o cursor da próxima página no cabeçalho
+    X-Next-Cursor (ausente na última página).
     Requer autenticação.
     """
     # Chama a função CRUD para buscar as ordens de serviço do banco de dados.
-    return crud.get_orders(db, status=status)
+    page = crud.get_orders(db, status=status, tenant_id=current_user.tenant_id, cursor=cursor, limit=limit)
+    set_next_cursor(response, page)
+    return page
 
 @router.get("/{order_id}", response_model=schemas.ServiceOrder)
 def get_single_service_order(
@@ -162,6 +162,7 @@ class Engine(EngineBase):
     """
     id: int # ID único do motor.
     boat_id: int # ID da embarcação à qual pertence.
+    warranty_checked_at: Optional[datetime] = None # Última consulta automática da garantia no portal.
 
 class EngineUpdate(CamelModel):
     """
@@ -262,6 +263,21 @@ class Part(PartBase):
     id: int # ID único da peça.
     last_price_updated_at: Optional[datetime] = None # Data última atualização automática.
 
+class PartPriceChange(CamelModel):
+    """
+    Schema para a variação de custo/preço de uma peça desde um instante (ver `GET /parts/price-changes`).
+    """
+    part_id: int # ID da peça.
+    sku: str # SKU da peça.
+    name: str # Nome da peça.
+    source: str # Origem da alteração mais recente ('mercury', 'manual').
+    cost: float # Custo atual.
+    price: float # Preço de venda atual.
+    previous_cost: Optional[float] = None # Custo conhecido antes do período (None se não houver histórico).
+    previous_price: Optional[float] = None # Preço conhecido antes do período.
+    changes: int # Número de alterações no período.
+    changed_at: datetime # Data da alteração mais recente.
+
 # --- SERVICE ITEM SCHEMAS ---
 # Esquemas para validação e serialização de dados relacionados a itens de serviço.
 
@@ -413,6 +429,47 @@ class StockMovement(StockMovementBase):
     id: int # ID único do movimento.
     date: datetime # Data e hora do movimento.
 
+# --- INVOICE IMPORT SCHEMAS ---
+# Esquemas do resultado da importação de XMLs de NF-e de fornecedores (`POST /api/inventory/invoices/import`).
+
+class InvoiceImportLine(CamelModel):
+    """
+    Schema de um item da NF-e que não foi vinculado a nenhuma peça do estoque.
+    """
+    line: int # Número do item na nota (nItem).
+    sku: str # Código do produto no fornecedor (cProd).
+    barcode: Optional[str] = None # Código de barras (cEAN).
+    name: str # Descrição do produto (xProd).
+    quantity: float # Quantidade comercial.
+    unit_cost: float # Valor unitário.
+    total: float # Valor total do item.
+
+class InvoiceImportDocument(CamelModel):
+    """
+    Schema do resultado de uma nota (ou arquivo) na importação.
+    """
+    file: Optional[str] = None # Nome do arquivo (ou "zip/arquivo.xml").
+    status: str # imported, duplicate (já importada) ou error.
+    invoice_id: Optional[int] = None # ID da nota criada.
+    number: Optional[str] = None # Número da nota.
+    supplier: Optional[str] = None # Fornecedor (emitente).
+    access_key: Optional[str] = None # Chave de acesso.
+    total_value: float = 0 # Valor total da nota.
+    items: int = 0 # Quantidade de itens na nota.
+    matched: int = 0 # Itens vinculados a peças (e lançados no estoque).
+    unmatched: List[InvoiceImportLine] = [] # Itens sem peça correspondente (não lançados).
+    error: Optional[str] = None # Motivo da falha, se status = error.
+
+class InvoiceImportResult(CamelModel):
+    """
+    Schema do resultado da importação de XMLs de NF-e.
+    """
+    imported: int # Notas importadas.
+    duplicates: int # Notas ignoradas por já terem sido importadas.
+    errors: int # Arquivos que não puderam ser lidos.
+    movements: int # Movimentos de estoque criados.
+    documents: List[InvoiceImportDocument] # Resultado por nota/arquivo.
+
 # --- CONFIG SCHEMAS ---
 # Esquemas para validação e serialização de dados relacionados à configuração da aplicação.
 
@@ -473,6 +530,7 @@ class CompanyInfoBase(CamelModel):
     environment: Optional[str] = None # Ambiente (production ou homologation)
     mercury_username: Optional[str] = None
     mercury_password: Optional[str] = None
+    mercury_backend: Optional[str] = None # Backend do scraper: "playwright" ou "http" (vazio = padrão do servidor).
 
 class CompanyInfoCreate(CompanyInfoBase):
     """
@@ -486,3 +544,24 @@ class CompanyInfo(CompanyInfoBase):
     """
     id: int # ID único.
 
+
+# --- MERCURY SCHEMAS ---
+# Esquemas para as operações de integração com o Portal Mercury.
+
+class MercuryPriceSyncRequest(CamelModel):
+    """
+    Filtro e parâmetros de um job de sincronização de preços em massa.
+    """
+    manufacturer: Optional[str] = "Mercury" # Fabricante das peças a sincronizar (None = todas).
+    updated_before: Optional[datetime] = None # Sincroniza apenas peças com preço atualizado antes desta data (ou nunca).
+    part_ids: Optional[List[int]] = None # Restringe a sincronização a estas peças.
+    concurrency: Optional[int] = None # Buscas simultâneas no portal (limitado pelo servidor).
+
+class MercuryWarrantyRefreshRequest(CamelModel):
+    """
+    Filtro e parâmetros de um job de atualização de garantias dos motores.
+    """
+    checked_before: Optional[datetime] = None # Atualiza motores verificados antes desta data (padrão: janela do servidor).
+    force: bool = False # Ignora a janela e atualiza todos os motores.
+    engine_ids: Optional[List[int]] = None # Restringe a atualização a estes motores.
+    concurrency: Optional[int] = None # Consultas simultâneas no portal (limitado pelo servidor).
@@ -0,0 +1,158 @@
+"""
+Numeração fiscal sequencial e sem lacunas, por tenant, tipo de nota e série.
+
+O número da NF-e era um `random.randint(1000, 9999)`: colidia sob concorrência e não
+formava a sequência exigida pela SEFAZ (cada número da série precisa ser autorizado ou
+inutilizado). Aqui:
+
+- o contador fica em `fiscal_sequences`, uma linha por (tenant, tipo, série), e é
+  incrementado por um único `UPDATE ... SET next_number = next_number + n RETURNING`.
+  O banco serializa os UPDATEs da mesma linha (lock de linha no Postgres, lock de escrita
+  no SQLite), então dois workers nunca recebem o mesmo número;
+- `allocate(count=n)` reserva uma faixa de n números consecutivos num único UPDATE, e a
+  emissão em lote não disputa a linha do contador nota a nota;
+- cada número reservado ganha uma linha em `fiscal_numbers` na mesma transação do
+  incremento (se ela falhar, o contador volta junto: não há lacunas). A linha termina
+  como `used` (autorizada, com o protocolo) ou `voided` (a inutilizar, com o motivo);
+  as que ficam em `reserved` tiveram resultado desconhecido (ex.: timeout na SEFAZ) e
+  precisam ser consultadas antes de reaproveitar ou inutilizar.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+# (tipo, série, número, status, protocolo ou motivo)
+Outcome = Tuple[str, str, int, str, Optional[str]]
+
+
+class FiscalNumbering:
+    """
+    Reserva e registra os números fiscais de cada tenant.
+    """
+
+    def allocate(
+        self,
+        db: Session,
+        tenant_id: int,
+        count: int = 1,
+        series: str = "1",
+        invoice_type: str = "NFE",
+    ) -> List[int]:
+        """
+        Reserva `count` números consecutivos da série e grava a reserva. Retorna os números.
+        """
+        if count < 1:
+            return []
+        Sequence = models.FiscalSequence
+        now = datetime.utcnow()
+        last = None
+        for _ in range(2):
+            last = db.execute(
+                update(Sequence)
+                .where(
+                    Sequence.tenant_id == tenant_id,
+                    Sequence.invoice_type == invoice_type,
+                    Sequence.series == series,
+                )
+                .values(next_number=Sequence.next_number + count, updated_at=now)
+                .returning(Sequence.next_number)
+                .execution_options(synchronize_session=False)
+            ).scalar_one_or_none()
+            if last is not None:
+                break
+            # Primeira nota da série: cria o contador. Se outro worker criou ao mesmo
+            # tempo, a constraint única barra o INSERT e o UPDATE é refeito (a sessão
+            # não tem nada pendente aqui, então o rollback não desfaz outro trabalho).
+            try:
+                db.add(Sequence(tenant_id=tenant_id, invoice_type=invoice_type, series=series, next_number=1 + count))
+                db.flush()
+                last = 1 + count
+                break
+            except IntegrityError:
+                db.rollback()
+        if last is None:
+            raise RuntimeError(f"Não foi possível reservar números da série {series}.")
+
+        numbers = list(range(last - count, last))
+        db.execute(insert(models.FiscalNumber), [
+            {
+                "tenant_id": tenant_id, "invoice_type": invoice_type, "series": series,
+                "number": number, "status": "reserved", "reserved_at": now,
+            }
+            for number in numbers
+        ])
+        db.commit()
+        return numbers
+
+    def record(self, db: Session, tenant_id: int, outcomes: Iterable[Outcome], commit: bool = True):
+        """
+        Registra o destino dos números: `used` (detalhe = protocolo) ou `voided` (detalhe = motivo).
+        Com `commit=False` a atualização entra na transação do chamador.
+        """
+        outcomes = [o for o in outcomes if o[3] in ("used", "voided")]
+        if not outcomes:
+            return
+        Number = models.FiscalNumber
+        by_key: Dict[Tuple[str, str, int], Outcome] = {(o[0], o[1], int(o[2])): o for o in outcomes}
+        rows = (
+            db.query(Number.id, Number.invoice_type, Number.series, Number.number)
+            .filter(
+                Number.tenant_id == tenant_id,
+                Number.status == "reserved",
+                Number.number.in_({key[2] for key in by_key}),
+            )
+            .all()
+        )
+        now = datetime.utcnow()
+        changes = []
+        for row_id, invoice_type, series, number in rows:
+            outcome = by_key.get((invoice_type, series, number))
+            if outcome is None:
+                continue
+            status, detail = outcome[3], (outcome[4] or "")[:255] or None
+            changes.append({
+                "id": row_id, "status": status, "finished_at": now,
+                "protocol": detail if status == "used" else None,
+                "reason": detail if status == "voided" else None,
+            })
+        if changes:
+            db.execute(update(Number), changes)
+        if commit:
+            db.commit()
+
+    def list_numbers(
+        self,
+        db: Session,
+        tenant_id: int,
+        status: Optional[str] = None,
+        series: Optional[str] = None,
+        invoice_type: str = "NFE",
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """
+        Últimos números da série (ex.: os `voided`, para a inutilização na SEFAZ).
+        """
+        Number = models.FiscalNumber
+        query = db.query(Number).filter(Number.tenant_id == tenant_id, Number.invoice_type == invoice_type)
+        if status:
+            query = query.filter(Number.status == status)
+        if series:
+            query = query.filter(Number.series == series)
+        return [
+            {
+                "series": n.series, "number": n.number, "status": n.status, "protocol": n.protocol,
+                "reason": n.reason,
+                "reserved_at": n.reserved_at.isoformat() if n.reserved_at else None,
+                "finished_at": n.finished_at.isoformat() if n.finished_at else None,
+            }
+            for n in query.order_by(Number.series, Number.number.desc()).limit(limit)
+        ]
+
+
+fiscal_numbering = FiscalNumbering()
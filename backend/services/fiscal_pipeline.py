@@ -0,0 +1,240 @@
+"""
+Pipeline de emissão fiscal (gerar XML -> assinar -> transmitir à SEFAZ) fora do event loop.
+
+As etapas do `FiscalService` são síncronas e bloqueantes (montagem do XML, RSA da
+assinatura, SOAP com a SEFAZ). Chamadas direto de uma rota `async`, congelavam o event
+loop do uvicorn e todas as outras requisições esperavam a emissão terminar. Aqui cada
+etapa roda em um pool de threads limitado, com timeout próprio, e a rota apenas aguarda.
+
+Uma etapa que estoura o timeout libera a requisição com `FiscalTimeout`; a thread
+continua ocupada até a chamada bloqueante retornar, e por isso o pool é limitado e as
+emissões além da capacidade aguardam vaga (ou recebem `FiscalBusy`).
+
+Em lote (`emit_batch`), os XMLs são gerados numa única passada, assinados em paralelo
+(o pool de processos do `FiscalSigner` distribui as notas entre os núcleos) e transmitidos em lotes `enviNFe` de até 50 NF-e,
+com resultado individual por documento.
+
+Configuração (variáveis de ambiente):
+- FISCAL_MAX_WORKERS: threads do pool de emissão (padrão: 4).
+- FISCAL_MAX_PENDING: emissões simultâneas, incluindo as que aguardam thread (padrão: 32).
+- FISCAL_GENERATE_TIMEOUT / FISCAL_SIGN_TIMEOUT / FISCAL_TRANSMIT_TIMEOUT: tempo máximo,
+  em segundos, de cada etapa (padrão: 10 / 20 / 60).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.fiscal_service import MAX_NFE_PER_LOT, FiscalService, fiscal_service
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("generate", "sign", "transmit")
+
+
+class FiscalBusy(Exception):
+    """
+    Muitas emissões em andamento; a requisição não entrou no pipeline.
+    """
+
+
+class FiscalTimeout(Exception):
+    """
+    Uma etapa da emissão não terminou dentro do tempo configurado.
+    """
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"Etapa '{stage}' da emissão fiscal excedeu {timeout:.0f}s.")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class FiscalPipeline:
+    """
+    Executa as etapas bloqueantes do `FiscalService` em um pool de threads limitado.
+    """
+
+    def __init__(
+        self,
+        service: Optional[FiscalService] = None,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.service = service or fiscal_service
+        self.max_workers = max_workers or int(os.getenv("FISCAL_MAX_WORKERS", "4"))
+        self.max_pending = max_pending or int(os.getenv("FISCAL_MAX_PENDING", "32"))
+        self.timeouts = {
+            "generate": float(os.getenv("FISCAL_GENERATE_TIMEOUT", "10")),
+            "sign": float(os.getenv("FISCAL_SIGN_TIMEOUT", "20")),
+            "transmit": float(os.getenv("FISCAL_TRANSMIT_TIMEOUT", "60")),
+            **(timeouts or {}),
+        }
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.in_flight = 0
+        self.metrics = {"emitted": 0, "failed": 0, "timeouts": 0, "rejected": 0, "batches": 0, "lots": 0}
+        self._stage_seconds = {stage: 0.0 for stage in STAGES}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Criado sob demanda (e recriado após `shutdown`), como o pool do navegador.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fiscal")
+        return self._executor
+
+    async def run_stage(self, stage: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Executa uma etapa bloqueante no pool, com o timeout da etapa.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        timeout = self.timeouts.get(stage) or None
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.executor, fn, *args), timeout)
+        except asyncio.TimeoutError:
+            self.metrics["timeouts"] += 1
+            logger.warning(f"Emissão fiscal: etapa '{stage}' excedeu {timeout}s")
+            raise FiscalTimeout(stage, timeout) from None
+        finally:
+            self._stage_seconds[stage] += time.perf_counter() - started
+
+    async def emit(self, invoice_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Gera, assina e transmite a nota. Levanta `FiscalBusy` ou `FiscalTimeout`.
+        """
+        if self.in_flight >= self.max_pending:
+            self.metrics["rejected"] += 1
+            raise FiscalBusy("Muitas emissões fiscais em andamento; tente novamente em instantes.")
+        self.in_flight += 1
+        try:
+            xml = await self.run_stage("generate", self.service.generate_nfe_xml, invoice_data)
+            signed_xml = await self.run_stage("sign", self.service.sign_xml, xml, invoice_data.get("tenant_id"))
+            result = await self.run_stage("transmit", self.service.transmit_to_sefaz, signed_xml)
+        except Exception:
+            self.metrics["failed"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        self.metrics["emitted"] += 1
+        return result
+
+    def _apply_each(self, fn: Callable[[Any], Any], values: List[Any]) -> List[Any]:
+        # Aplica `fn` a cada valor numa única chamada do pool; erros ficam no resultado do documento.
+        results = []
+        for value in values:
+            try:
+                results.append(fn(value))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def emit_batch(self, invoices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Emite várias notas: gera todas, assina em paralelo e transmite as NF-e em lotes de
+        até `MAX_NFE_PER_LOT`. NFS-e não entram no lote enviNFe (que é só de NF-e modelo 55):
+        cada uma segue pela transmissão individual, como em `emit`. Retorna um resultado por
+        nota, na mesma ordem (falhas não interrompem as demais). Notas cuja transmissão
+        excedeu o timeout voltam com status "timeout" (e não "error"), como o `FiscalTimeout` de `emit`.
+        """
+        if self.in_flight >= self.max_pending:
+            self.metrics["rejected"] += 1
+            raise FiscalBusy("Muitas emissões fiscais em andamento; tente novamente em instantes.")
+        self.in_flight += 1
+        self.metrics["batches"] += 1
+        results: List[Optional[Dict[str, Any]]] = [None] * len(invoices)
+
+        def fail(index: int, error: Exception):
+            # Timeout na transmissão: a SEFAZ pode ter autorizado; o resultado é desconhecido.
+            unknown = isinstance(error, FiscalTimeout) and error.stage == "transmit"
+            results[index] = {"status": "timeout" if unknown else "error", "error": str(error) or type(error).__name__}
+
+        try:
+            # 1. Geração: uma única passada no pool.
+            xmls = await self.run_stage("generate", self._apply_each, self.service.generate_nfe_xml, invoices)
+            pending = []
+            for index, xml in enumerate(xmls):
+                if isinstance(xml, Exception):
+                    fail(index, xml)
+                else:
+                    pending.append((index, xml))
+
+            # 2. Assinatura: as notas de cada tenant vão juntas ao pool de processos do assinador.
+            by_tenant: Dict[Any, List[Tuple[int, str]]] = {}
+            for index, xml in pending:
+                by_tenant.setdefault(invoices[index].get("tenant_id"), []).append((index, xml))
+            groups = list(by_tenant.items())
+            signed_groups = await asyncio.gather(
+                *[self.run_stage("sign", self.service.sign_many, [xml for _, xml in docs], tenant_id) for tenant_id, docs in groups],
+                return_exceptions=True,
+            )
+            signed = []
+            for (_, docs), outcome in zip(groups, signed_groups):
+                for position, (index, _) in enumerate(docs):
+                    value = outcome if isinstance(outcome, Exception) else outcome[position]
+                    if isinstance(value, Exception):
+                        fail(index, value)
+                    else:
+                        signed.append((index, value))
+
+            # 3. Transmissão: NF-e em lotes enviNFe de até MAX_NFE_PER_LOT notas; NFS-e, uma
+            # a uma pelo envio individual. Tudo em paralelo.
+            nfe = [(index, xml) for index, xml in signed if invoices[index].get("type") != "NFSE"]
+            nfse = [(index, xml) for index, xml in signed if invoices[index].get("type") == "NFSE"]
+            lots = [nfe[i:i + MAX_NFE_PER_LOT] for i in range(0, len(nfe), MAX_NFE_PER_LOT)]
+            self.metrics["lots"] += len(lots)
+            lot_results, single_results = await asyncio.gather(
+                asyncio.gather(
+                    *[self.run_stage("transmit", self.service.transmit_batch_to_sefaz, [xml for _, xml in lot]) for lot in lots],
+                    return_exceptions=True,
+                ),
+                asyncio.gather(
+                    *[self.run_stage("transmit", self.service.transmit_to_sefaz, xml) for _, xml in nfse],
+                    return_exceptions=True,
+                ),
+            )
+            for lot, outcome in zip(lots, lot_results):
+                for position, (index, _) in enumerate(lot):
+                    if isinstance(outcome, Exception):
+                        fail(index, outcome)
+                    else:
+                        results[index] = outcome[position]
+            for (index, _), outcome in zip(nfse, single_results):
+                if isinstance(outcome, Exception):
+                    fail(index, outcome)
+                else:
+                    results[index] = outcome
+        finally:
+            self.in_flight -= 1
+
+        for result in results:
+            if result.get("status") == "success":
+                self.metrics["emitted"] += 1
+            else:
+                self.metrics["failed"] += 1
+        return results
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.metrics["emitted"] + self.metrics["failed"]
+        return {
+            **self.metrics,
+            "in_flight": self.in_flight,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "timeouts_s": self.timeouts,
+            "signer": self.service.signer.stats(),
+            "stage_ms_avg": {
+                stage: round(seconds / finished * 1000, 1) if finished else 0.0
+                for stage, seconds in self._stage_seconds.items()
+            },
+        }
+
+
+fiscal_pipeline = FiscalPipeline()
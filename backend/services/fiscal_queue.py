@@ -0,0 +1,402 @@
+"""
+Fila persistente de emissões fiscais (modo assíncrono de POST /api/fiscal/emit).
+
+A requisição é gravada em `fiscal_jobs` e a rota responde na hora com o ID do job;
+o resultado (status, protocolo e XML) é consultado em GET /api/fiscal/jobs/{id}.
+Como a fila está no banco, nada se perde se o servidor reiniciar.
+
+Cada job é pego por um único worker com um UPDATE condicional (status 'queued' ->
+'processing'), o que também vale com vários processos do servidor. O job guarda quem o
+pegou (`locked_by`, "host:pid:instância") e, enquanto é emitido, o worker renova
+`locked_at` a cada `stale_after / 3` segundos. Um job em 'processing' volta para a fila:
+- na inicialização, se o worker dele estava neste host e o processo não existe mais (ou é
+  este mesmo PID, de uma execução anterior: reinício do contêiner), sem esperar o prazo;
+- a qualquer momento, se ficou `stale_after` segundos sem sinal de vida. Essa varredura
+  roda periodicamente no laço do worker, que recupera os jobs de outros workers que
+  morreram enquanto ele continuava rodando.
+Falhas na emissão
+(timeout, SEFAZ fora do ar) geram nova tentativa com espera exponencial; rejeições da
+SEFAZ não são repetidas.
+
+O número da nota é reservado na hora de enfileirar (`fiscal_numbering`) e mantido em
+todas as tentativas; ao final, fica registrado como usado (autorizada) ou a inutilizar
+(rejeitada ou sem sucesso após todas as tentativas). Se a última tentativa excedeu o
+timeout da transmissão, o resultado é desconhecido (a SEFAZ pode ter autorizado): o job
+fica 'failed', mas o número continua 'reserved', como no timeout da emissão síncrona.
+
+Configuração (variáveis de ambiente):
+- FISCAL_QUEUE_MAX_ATTEMPTS: tentativas por job antes de marcar como 'failed' (padrão: 5).
+- FISCAL_QUEUE_BACKOFF: espera, em segundos, antes da 2ª tentativa; dobra a cada falha (padrão: 5).
+- FISCAL_QUEUE_BACKOFF_MAX: espera máxima entre tentativas, em segundos (padrão: 300).
+- FISCAL_QUEUE_CONCURRENCY: jobs emitidos em paralelo por processo (padrão: 2).
+- FISCAL_QUEUE_STALE_AFTER: segundos sem sinal de vida do worker para considerar o job abandonado (padrão: 300).
+- FISCAL_QUEUE_AUTOSTART: "0" para não retomar a fila na inicialização do servidor (padrão: "1").
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+import models
+from services.fiscal_numbering import fiscal_numbering
+from services.fiscal_pipeline import FiscalPipeline, FiscalTimeout, fiscal_pipeline
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("authorized", "rejected", "failed")
+HOSTNAME = socket.gethostname()
+
+
+def worker_is_dead(locked_by: Optional[str], worker_id: str) -> bool:
+    """
+    Indica se o worker `locked_by` certamente morreu, visto pelo worker `worker_id`.
+    Só dá para saber para workers do mesmo host; os demais dependem do prazo `stale_after`.
+    """
+    if not locked_by or locked_by == worker_id:
+        return False
+    host, pid, _ = (locked_by.rsplit(":", 2) + ["", ""])[:3]
+    own_host, own_pid, _ = worker_id.rsplit(":", 2)
+    if host != own_host or not pid.isdigit():
+        return False
+    if pid == own_pid:
+        return True # Mesmo PID, outra instância: execução anterior deste processo (ex.: contêiner reiniciado).
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False # Existe, mas é de outro usuário.
+    return False
+
+
+def job_to_dict(job: models.FiscalJob, include_xml: bool = True) -> Dict[str, Any]:
+    data = {
+        "id": job.id,
+        "status": job.status,
+        "type": job.invoice_type,
+        "number": job.number,
+        "series": job.series,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "next_attempt_at": job.next_attempt_at if job.status == "queued" else None,
+        "last_error": job.last_error,
+        "protocol": job.protocol,
+        "message": job.message,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+    if include_xml:
+        data["xml"] = job.xml
+    return data
+
+
+class FiscalQueue:
+    """
+    Worker da fila de emissões: pega os jobs vencidos, emite pelo `FiscalPipeline` e grava o resultado.
+    """
+
+    def __init__(
+        self,
+        pipeline: Optional[FiscalPipeline] = None,
+        max_attempts: Optional[int] = None,
+        backoff: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        stale_after: Optional[float] = None,
+    ):
+        self.pipeline = pipeline or fiscal_pipeline
+        self.max_attempts = max_attempts or int(os.getenv("FISCAL_QUEUE_MAX_ATTEMPTS", "5"))
+        self.backoff = backoff if backoff is not None else float(os.getenv("FISCAL_QUEUE_BACKOFF", "5"))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.getenv("FISCAL_QUEUE_BACKOFF_MAX", "300"))
+        self.concurrency = concurrency or int(os.getenv("FISCAL_QUEUE_CONCURRENCY", "2"))
+        self.stale_after = stale_after if stale_after is not None else float(os.getenv("FISCAL_QUEUE_STALE_AFTER", "300"))
+        self.worker_id = f"{HOSTNAME}:{os.getpid()}:{uuid.uuid4().hex[:8]}" # Gravado em `locked_by` dos jobs que este worker pega.
+        self._draining = False
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Banco (síncrono; chamado via asyncio.to_thread) ---
+
+    def enqueue(self, db: Session, tenant_id: int, invoice_data: Dict[str, Any]) -> models.FiscalJob:
+        job = models.FiscalJob(
+            tenant_id=tenant_id,
+            status="queued",
+            invoice_type=invoice_data.get("type"),
+            number=invoice_data.get("number"),
+            series=invoice_data.get("series"),
+            payload=json.dumps(invoice_data),
+            max_attempts=self.max_attempts,
+            next_attempt_at=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def backoff_for(self, attempts: int) -> float:
+        return min(self.backoff_max, self.backoff * (2 ** max(0, attempts - 1)))
+
+    @property
+    def heartbeat_every(self) -> float:
+        # Intervalo do sinal de vida e da varredura de jobs abandonados.
+        return self.stale_after / 3
+
+    def _claim_next(self, session_factory: Callable[[], Session]) -> Optional[int]:
+        # Pega o job vencido mais antigo. O UPDATE só afeta a linha se ela ainda estiver
+        # 'queued', então dois workers nunca emitem o mesmo job.
+        db = session_factory()
+        try:
+            now = datetime.utcnow()
+            candidates = (
+                db.query(models.FiscalJob.id)
+                .filter(models.FiscalJob.status == "queued", models.FiscalJob.next_attempt_at <= now)
+                .order_by(models.FiscalJob.next_attempt_at, models.FiscalJob.id)
+                .limit(self.concurrency * 2)
+                .all()
+            )
+            for (job_id,) in candidates:
+                claimed = (
+                    db.query(models.FiscalJob)
+                    .filter(models.FiscalJob.id == job_id, models.FiscalJob.status == "queued")
+                    .update(
+                        {"status": "processing", "locked_at": now, "locked_by": self.worker_id, "attempts": models.FiscalJob.attempts + 1},
+                        synchronize_session=False,
+                    )
+                )
+                db.commit()
+                if claimed:
+                    return job_id
+            return None
+        finally:
+            db.close()
+
+    def _next_due_in(self, session_factory: Callable[[], Session]) -> Optional[float]:
+        # Segundos até o próximo job da fila ficar vencido ou até um job de outro worker
+        # ficar abandonado (None se não houver nenhum dos dois).
+        db = session_factory()
+        try:
+            next_at = (
+                db.query(models.FiscalJob.next_attempt_at)
+                .filter(models.FiscalJob.status == "queued")
+                .order_by(models.FiscalJob.next_attempt_at)
+                .limit(1)
+                .scalar()
+            )
+            locked_at = (
+                db.query(func.min(models.FiscalJob.locked_at))
+                .filter(
+                    models.FiscalJob.status == "processing",
+                    or_(models.FiscalJob.locked_by.is_(None), models.FiscalJob.locked_by != self.worker_id),
+                )
+                .scalar()
+            )
+            due = [at for at in (next_at, locked_at and locked_at + timedelta(seconds=self.stale_after)) if at is not None]
+            if not due:
+                return None
+            return max(0.0, (min(due) - datetime.utcnow()).total_seconds())
+        finally:
+            db.close()
+
+    def _load_payload(self, session_factory: Callable[[], Session], job_id: int) -> Dict[str, Any]:
+        db = session_factory()
+        try:
+            return json.loads(db.query(models.FiscalJob.payload).filter(models.FiscalJob.id == job_id).scalar())
+        finally:
+            db.close()
+
+    def _record(
+        self,
+        session_factory: Callable[[], Session],
+        job_id: int,
+        result: Optional[Dict[str, Any]],
+        error: Optional[str],
+        timed_out: bool = False, # A transmissão excedeu o timeout: resultado desconhecido.
+    ):
+        db = session_factory()
+        try:
+            job = db.query(models.FiscalJob).filter(models.FiscalJob.id == job_id).first()
+            if job is None:
+                return
+            if job.status != "processing" or job.locked_by != self.worker_id:
+                # Dado como abandonado e devolvido à fila enquanto emitia: vale o outro worker.
+                logger.warning(f"Job fiscal {job_id} não pertence mais a este worker; resultado descartado")
+                return
+            now = datetime.utcnow()
+            job.locked_at = None
+            job.locked_by = None
+            if error is None and result.get("status") == "success":
+                job.status = "authorized"
+                job.protocol = result.get("protocol")
+                job.message = result.get("message")
+                job.xml = result.get("xml")
+                job.last_error = None
+                job.finished_at = now
+            elif error is None:
+                # A SEFAZ respondeu e recusou a nota: repetir não muda o resultado.
+                job.status = "rejected"
+                job.message = result.get("message")
+                job.xml = result.get("xml")
+                job.finished_at = now
+            elif job.attempts >= job.max_attempts:
+                job.status = "failed"
+                job.last_error = error
+                job.finished_at = now
+            else:
+                job.status = "queued"
+                job.last_error = error
+                job.next_attempt_at = now + timedelta(seconds=self.backoff_for(job.attempts))
+            if job.status == "failed" and timed_out:
+                # A SEFAZ pode ter autorizado a nota: o número não vai para inutilização.
+                logger.warning(f"Job fiscal {job_id} desistiu após timeout na transmissão; número {job.number} continua reservado")
+            elif job.status in FINISHED and job.number and job.number.isdigit():
+                # Baixa do número na mesma transação do status do job.
+                authorized = job.status == "authorized"
+                fiscal_numbering.record(db, job.tenant_id, [(
+                    job.invoice_type or "NFE", job.series or "1", int(job.number),
+                    "used" if authorized else "voided",
+                    job.protocol if authorized else (job.message or job.last_error or job.status),
+                )], commit=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def recover(self, db: Session) -> int:
+        """
+        Devolve à fila os jobs presos em 'processing' cujo worker morreu: sem sinal de vida há
+        `stale_after` segundos ou de um processo deste host que não existe mais.
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.stale_after)
+        stuck = (
+            db.query(models.FiscalJob.id, models.FiscalJob.locked_by, models.FiscalJob.locked_at)
+            .filter(models.FiscalJob.status == "processing")
+            .all()
+        )
+        abandoned = [
+            job_id for job_id, locked_by, locked_at in stuck
+            if locked_by != self.worker_id and (locked_at is None or locked_at < cutoff or worker_is_dead(locked_by, self.worker_id))
+        ]
+        if not abandoned:
+            return 0
+        recovered = (
+            db.query(models.FiscalJob)
+            .filter(models.FiscalJob.id.in_(abandoned), models.FiscalJob.status == "processing")
+            .update({"status": "queued", "locked_at": None, "locked_by": None, "next_attempt_at": now}, synchronize_session=False)
+        )
+        db.commit()
+        return recovered
+
+    def _tick(self, session_factory: Callable[[], Session], job_ids: Iterable[int]) -> int:
+        # Renova o sinal de vida dos jobs deste worker e varre os jobs abandonados.
+        db = session_factory()
+        try:
+            job_ids = list(job_ids)
+            if job_ids:
+                db.query(models.FiscalJob).filter(
+                    models.FiscalJob.id.in_(job_ids),
+                    models.FiscalJob.status == "processing",
+                    models.FiscalJob.locked_by == self.worker_id,
+                ).update({"locked_at": datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+            recovered = self.recover(db)
+        finally:
+            db.close()
+        if recovered:
+            logger.info(f"{recovered} emissão(ões) fiscal(is) devolvida(s) à fila")
+        return recovered
+
+    # --- Processamento ---
+
+    async def _process(self, session_factory: Callable[[], Session], job_id: int):
+        result, error, timed_out = None, None, False
+        try:
+            invoice_data = await asyncio.to_thread(self._load_payload, session_factory, job_id)
+            result = await self.pipeline.emit(invoice_data)
+        except Exception as e:
+            logger.warning(f"Emissão fiscal do job {job_id} falhou: {e}")
+            error = str(e) or type(e).__name__
+            timed_out = isinstance(e, FiscalTimeout) and e.stage == "transmit"
+        await asyncio.to_thread(self._record, session_factory, job_id, result, error, timed_out)
+
+    async def drain(self, session_factory: Callable[[], Session]):
+        """
+        Processa a fila até esvaziar, esperando as novas tentativas agendadas.
+        Se já houver um worker rodando neste processo, apenas o acorda.
+        """
+        if self._draining:
+            if self._wake is not None:
+                self._wake.set()
+            return
+        self._draining = True
+        self._wake = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        active: Dict[asyncio.Task, int] = {} # Tarefa -> ID do job em emissão.
+        next_tick = loop.time() # A primeira varredura roda na entrada (ex.: na inicialização).
+        try:
+            while True:
+                if loop.time() >= next_tick:
+                    await asyncio.to_thread(self._tick, session_factory, active.values())
+                    next_tick = loop.time() + self.heartbeat_every
+                while len(active) < self.concurrency:
+                    job_id = await asyncio.to_thread(self._claim_next, session_factory)
+                    if job_id is None:
+                        break
+                    active[asyncio.create_task(self._process(session_factory, job_id))] = job_id
+                until_tick = max(0.0, next_tick - loop.time())
+                if active:
+                    done, _ = await asyncio.wait(active, timeout=until_tick, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        active.pop(task)
+                    continue
+                delay = await asyncio.to_thread(self._next_due_in, session_factory)
+                if delay is None:
+                    return
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), min(delay, until_tick))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in active:
+                task.cancel()
+            self._draining = False
+            self._wake = None
+
+    # --- Ciclo de vida do servidor ---
+
+    def start(self, session_factory: Callable[[], Session]):
+        """
+        Retoma a fila na inicialização (jobs pendentes de uma execução anterior).
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._resume(session_factory))
+
+    async def _resume(self, session_factory: Callable[[], Session]):
+        try:
+            # A primeira varredura do `drain` devolve à fila os jobs da execução anterior.
+            await self.drain(session_factory)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha ao retomar a fila de emissões fiscais")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+fiscal_queue = FiscalQueue()
@@ -1,178 +1,56 @@
 import os
+import re
 from datetime import datetime
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Union
 # import requests
-# from lxml import etree
-# from signxml import XMLSigner, XMLVerifier
+
+from services.fiscal_signer import FiscalSigner
+from services.nfe_builder import NFeBuilder
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# SEFAZ accepts up to 50 NF-e per enviNFe lot (NF-e 4.00 authorization web service).
+MAX_NFE_PER_LOT = 50
+
+_XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>\s*")
+
 class FiscalService:
     def __init__(self):
         self.cert_path = os.getenv("FISCAL_CERT_PATH", "certs/certificate.pfx")
         self.cert_password = os.getenv("FISCAL_CERT_PASSWORD", "")
         self.environment = os.getenv("FISCAL_ENV", "homologation") # homologation or production
+        self.builder = NFeBuilder(environment=self.environment)
+        self.signer = FiscalSigner(
+            cert_path=self.cert_path,
+            password=self.cert_password,
+            allow_unsigned=self.environment == "homologation",
+        )
 
     def generate_nfe_xml(self, invoice_data: Dict[str, Any]) -> str:
         """
-        Generates the XML for a NF-e based on the provided data.
-        This is a simplified example structure.
-        """
-        logger.info(f"Generating XML for invoice {invoice_data.get('number')}")
-        
-        # In a real implementation, we would use lxml to build the XML tree
-        # conforming to the SEFAZ schema (layout 4.00).
-        
-        # Mocking XML structure for demonstration
-        xml_content = f"""
-        <NFe xmlns="http://www.portalfiscal.inf.br/nfe">
-            <infNFe Id="NFe{invoice_data.get('access_key', '00000000000000000000000000000000000000000000')}" versao="4.00">
-                <ide>
-                    <cUF>41</cUF>
-                    <cNF>{invoice_data.get('number')}</cNF>
-                    <natOp>Venda de Mercadoria</natOp>
-                    <mod>55</mod>
-                    <serie>{invoice_data.get('series', '1')}</serie>
-                    <nNF>{invoice_data.get('number')}</nNF>
-                    <dhEmi>{datetime.now().isoformat()}</dhEmi>
-                    <tpNF>1</tpNF>
-                    <idDest>1</idDest>
-                    <cMunFG>4118204</cMunFG>
-                    <tpImp>1</tpImp>
-                    <tpEmis>1</tpEmis>
-                    <cDV>0</cDV>
-                    <tpAmb>{'2' if self.environment == 'homologation' else '1'}</tpAmb>
-                    <finNFe>1</finNFe>
-                    <indFinal>1</indFinal>
-                    <indPres>1</indPres>
-                    <procEmi>0</procEmi>
-                    <verProc>MareAlta 1.0</verProc>
-                </ide>
-                <emit>
-                    <CNPJ>{invoice_data.get('issuer', {}).get('cnpj', '')}</CNPJ>
-                    <xNome>{invoice_data.get('issuer', {}).get('companyName', '')}</xNome>
-                    <xFant>{invoice_data.get('issuer', {}).get('tradeName', '')}</xFant>
-                    <enderEmit>
-                        <xLgr>{invoice_data.get('issuer', {}).get('address', {}).get('street', '')}</xLgr>
-                        <nro>{invoice_data.get('issuer', {}).get('address', {}).get('number', '')}</nro>
-                        <xBairro>{invoice_data.get('issuer', {}).get('address', {}).get('neighborhood', '')}</xBairro>
-                        <cMun>4118204</cMun>
-                        <xMun>{invoice_data.get('issuer', {}).get('address', {}).get('city', '')}</xMun>
-                        <UF>{invoice_data.get('issuer', {}).get('address', {}).get('state', '')}</UF>
-                        <CEP>{invoice_data.get('issuer', {}).get('address', {}).get('zip', '')}</CEP>
-                        <cPais>1058</cPais>
-                        <xPais>BRASIL</xPais>
-                    </enderEmit>
-                    <IE>{invoice_data.get('issuer', {}).get('ie', '')}</IE>
-                    <CRT>{invoice_data.get('issuer', {}).get('crt', '1')}</CRT>
-                </emit>
-                <dest>
-                    <CNPJ>{invoice_data.get('recipient', {}).get('doc', '')}</CNPJ>
-                    <xNome>{invoice_data.get('recipient', {}).get('name', '')}</xNome>
-                    <enderDest>
-                        <xLgr>Rua Teste</xLgr>
-                        <nro>123</nro>
-                        <xBairro>Centro</xBairro>
-                        <cMun>4118204</cMun>
-                        <xMun>Paranaguá</xMun>
-                        <UF>PR</UF>
-                        <CEP>83200000</CEP>
-                        <cPais>1058</cPais>
-                        <xPais>BRASIL</xPais>
-                    </enderDest>
-                    <indIEDest>9</indIEDest>
-                </dest>
-                <det nItem="1">
-                    <prod>
-                        <cProd>001</cProd>
-                        <cEAN>SEM GTIN</cEAN>
-                        <xProd>Produto Teste</xProd>
-                        <NCM>00000000</NCM>
-                        <CFOP>5102</CFOP>
-                        <uCom>UN</uCom>
-                        <qCom>1.0000</qCom>
-                        <vUnCom>{invoice_data.get('totalValue', 0)}</vUnCom>
-                        <vProd>{invoice_data.get('totalValue', 0)}</vProd>
-                        <cEANTrib>SEM GTIN</cEANTrib>
-                        <uTrib>UN</uTrib>
-                        <qTrib>1.0000</qTrib>
-                        <vUnTrib>{invoice_data.get('totalValue', 0)}</vUnTrib>
-                        <indTot>1</indTot>
-                    </prod>
-                    <imposto>
-                        <vTotTrib>0.00</vTotTrib>
-                        <ICMS>
-                            <ICMSSN102>
-                                <orig>0</orig>
-                                <CSOSN>102</CSOSN>
-                            </ICMSSN102>
-                        </ICMS>
-                        <PIS>
-                            <PISOutr>
-                                <CST>99</CST>
-                                <vBC>0.00</vBC>
-                                <pPIS>0.00</pPIS>
-                                <vPIS>0.00</vPIS>
-                            </PISOutr>
-                        </PIS>
-                        <COFINS>
-                            <COFINSOutr>
-                                <CST>99</CST>
-                                <vBC>0.00</vBC>
-                                <pCOFINS>0.00</pCOFINS>
-                                <vCOFINS>0.00</vCOFINS>
-                            </COFINSOutr>
-                        </COFINS>
-                    </imposto>
-                </det>
-                <total>
-                    <ICMSTot>
-                        <vBC>0.00</vBC>
-                        <vICMS>0.00</vICMS>
-                        <vICMSDeson>0.00</vICMSDeson>
-                        <vFCP>0.00</vFCP>
-                        <vBCST>0.00</vBCST>
-                        <vST>0.00</vST>
-                        <vFCPST>0.00</vFCPST>
-                        <vFCPSTRet>0.00</vFCPSTRet>
-                        <vProd>{invoice_data.get('totalValue', 0)}</vProd>
-                        <vFrete>0.00</vFrete>
-                        <vSeg>0.00</vSeg>
-                        <vDesc>0.00</vDesc>
-                        <vII>0.00</vII>
-                        <vIPI>0.00</vIPI>
-                        <vIPIDevol>0.00</vIPIDevol>
-                        <vPIS>0.00</vPIS>
-                        <vCOFINS>0.00</vCOFINS>
-                        <vOutro>0.00</vOutro>
-                        <vNF>{invoice_data.get('totalValue', 0)}</vNF>
-                    </ICMSTot>
-                </total>
-                <transp>
-                    <modFrete>9</modFrete>
-                </transp>
-            </infNFe>
-        </NFe>
+        Generates the XML for a NF-e (layout 4.00) based on the provided data.
+        One <det> is emitted per item; the issuer's <emit> group is cached per tenant.
         """
-        return xml_content.strip()
+        logger.info(f"Generating XML for invoice {invoice_data.get('number')} ({len(invoice_data.get('items') or [])} items)")
+        return self.builder.build(invoice_data)
 
-    def sign_xml(self, xml_content: str) -> str:
+    def sign_xml(self, xml_content: str, tenant_id: Optional[int] = None) -> str:
         """
-        Signs the XML using the digital certificate.
+        Signs the <infNFe> element with the tenant's A1 certificate.
+        The certificate is parsed once and cached; RSA runs in the signer's process pool.
         """
         logger.info("Signing XML...")
-        # In a real implementation, we would load the PFX/PEM certificate
-        # and use signxml to sign the <infNFe> element.
-        
-        # if not os.path.exists(self.cert_path):
-        #     raise FileNotFoundError(f"Certificate not found at {self.cert_path}")
+        return self.signer.sign(xml_content, tenant_id)
 
-        # Mocking signature
-        signed_xml = xml_content.replace('</NFe>', '<Signature>SignedByMareAlta</Signature></NFe>')
-        return signed_xml
+    def sign_many(self, xml_contents: List[str], tenant_id: Optional[int] = None) -> List[Union[str, Exception]]:
+        """
+        Signs several XMLs of the same tenant in parallel. Failures are returned per document.
+        """
+        logger.info(f"Signing {len(xml_contents)} XMLs...")
+        return self.signer.sign_many(xml_contents, tenant_id)
 
     def transmit_to_sefaz(self, signed_xml: str) -> Dict[str, Any]:
         """
@@ -202,4 +80,46 @@ class FiscalService:
             "timestamp": datetime.now().isoformat()
         }
 
+    def build_envi_nfe(self, signed_xmls: List[str], lot_id: str) -> str:
+        """
+        Wraps signed NF-e documents in an enviNFe lot (asynchronous authorization, indSinc=0).
+        """
+        if len(signed_xmls) > MAX_NFE_PER_LOT:
+            raise ValueError(f"An enviNFe lot accepts at most {MAX_NFE_PER_LOT} NF-e ({len(signed_xmls)} given)")
+        documents = "".join(_XML_DECLARATION.sub("", xml) for xml in signed_xmls)
+        return (
+            '<enviNFe xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">'
+            f"<idLote>{lot_id}</idLote><indSinc>0</indSinc>{documents}</enviNFe>"
+        )
+
+    def transmit_batch_to_sefaz(self, signed_xmls: List[str]) -> List[Dict[str, Any]]:
+        """
+        Transmits up to MAX_NFE_PER_LOT signed XMLs in a single enviNFe lot.
+        Returns one result per document, in the same order.
+        """
+        import random
+        import time
+
+        lot_id = f"{random.randint(1, 999999999999999):015d}"
+        envelope = self.build_envi_nfe(signed_xmls, lot_id)
+        logger.info(f"Transmitting lot {lot_id} with {len(signed_xmls)} NF-e to SEFAZ ({self.environment}, {len(envelope)} bytes)...")
+
+        # In a real implementation, we would send the enviNFe SOAP request and then poll
+        # NFeRetAutorizacao with the returned receipt (nRec) for the per-document protocols.
+
+        # Simulate network latency: one round trip for the whole lot.
+        time.sleep(1.5)
+
+        return [
+            {
+                "status": "success",
+                "protocol": f"{random.randint(100000000000000, 999999999999999)}",
+                "message": "Autorizado o uso da NF-e",
+                "lot": lot_id,
+                "xml": signed_xml,
+                "timestamp": datetime.now().isoformat()
+            }
+            for signed_xml in signed_xmls
+        ]
+
 fiscal_service = FiscalService()
@@ -0,0 +1,296 @@
+"""
+Assinatura digital da NF-e (XMLDSig envelopada sobre `<infNFe>`) em um pool de processos.
+
+Assinar exige ler o certificado A1 (PKCS#12, `.pfx`) e fazer uma operação RSA por nota.
+Lendo o PFX a cada chamada, toda assinatura pagava a derivação de chave do PKCS#12, e o
+RSA rodava na thread da emissão disputando o GIL com o resto da API. Aqui:
+
+- o certificado é lido uma vez por arquivo (um por tenant) em cada processo e fica em
+  cache até o arquivo mudar (mtime);
+- as assinaturas rodam em um `ProcessPoolExecutor` com um processo por núcleo, e
+  `sign_many` distribui um lote inteiro de notas entre eles.
+
+A assinatura segue o padrão da NF-e: C14N 1.0, RSA-SHA1, digest SHA-1, transformações
+enveloped-signature + C14N e `<Signature>` como último filho de `<NFe>`, com o
+certificado em `<X509Certificate>`. Ela é montada direto com lxml + cryptography: o
+`signxml` fixado no requirements não importa com o pyOpenSSL atual.
+
+Certificados:
+- FISCAL_CERT_DIR/<tenant_id>.pfx, se existir; senão FISCAL_CERT_PATH (padrão do servidor).
+- Senha do PFX do tenant (cada A1 tem a sua): a variável FISCAL_CERT_PASSWORD_<tenant_id>
+  ou o arquivo FISCAL_CERT_DIR/<tenant_id>.password (ex.: um secret montado ao lado do
+  PFX); sem nenhum dos dois, FISCAL_CERT_PASSWORD.
+- FISCAL_CERT_PASSWORD: senha do PFX do servidor.
+- Sem certificado, em homologação a nota recebe a assinatura de teste (como antes); em
+  produção, `CertificateError`.
+
+Configuração:
+- FISCAL_SIGN_WORKERS: processos de assinatura (padrão: núcleos da máquina; 0 = assina no
+  próprio processo).
+
+Benchmark de vazão (assinaturas/s) em `benchmarks/bench_fiscal_signer.py`.
+"""
+
+import base64
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import pkcs12
+from lxml import etree
+
+from services.nfe_builder import NFE_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+DSIG_NAMESPACE = "http://www.w3.org/2000/09/xmldsig#"
+C14N_ALGORITHM = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
+PLACEHOLDER_SIGNATURE = "<Signature>SignedByMareAlta</Signature>"
+
+
+class CertificateError(Exception):
+    """
+    Certificado digital ausente, ilegível ou com a senha errada.
+    """
+
+
+class Credentials(NamedTuple):
+    key: Any  # chave privada RSA (cryptography)
+    certificate: str  # certificado X.509 em DER/base64, como vai no <X509Certificate>
+    subject: str
+    not_after: datetime
+
+
+# Cache do processo atual (cada worker do pool tem o seu): (caminho, mtime, senha) -> Credentials.
+# A senha entra na chave para que uma senha errada nunca receba a chave já decifrada.
+_credentials: Dict[Tuple[str, int, str], Credentials] = {}
+_credentials_lock = threading.Lock()
+
+
+def load_credentials(path: str, password: str = "") -> Credentials:
+    """
+    Lê chave e certificado do PFX, uma vez por versão do arquivo neste processo.
+    """
+    try:
+        version = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise CertificateError(f"Certificado não encontrado em {path}") from None
+    with _credentials_lock:
+        cached = _credentials.get((path, version, password))
+    if cached is not None:
+        return cached
+
+    try:
+        with open(path, "rb") as f:
+            key, certificate, _ = pkcs12.load_key_and_certificates(f.read(), password.encode() if password else None)
+    except ValueError as e:
+        raise CertificateError(f"Não foi possível ler o certificado {path}: {e}") from None
+    if key is None or certificate is None:
+        raise CertificateError(f"O arquivo {path} não contém chave privada e certificado.")
+
+    credentials = Credentials(
+        key=key,
+        certificate=base64.b64encode(certificate.public_bytes(serialization.Encoding.DER)).decode("ascii"),
+        subject=certificate.subject.rfc4514_string(),
+        not_after=certificate.not_valid_after_utc,
+    )
+    with _credentials_lock:
+        # Versões antigas do mesmo arquivo (certificado renovado) saem da cache.
+        for stale in [k for k in _credentials if k[0] == path and k[1] != version]:
+            del _credentials[stale]
+        _credentials[(path, version, password)] = credentials
+    return credentials
+
+
+def _c14n(element: etree._Element) -> bytes:
+    return etree.tostring(element, method="c14n", exclusive=False, with_comments=False)
+
+
+def _ds(parent: etree._Element, tag: str, text: Optional[str] = None, **attrib: str) -> etree._Element:
+    element = etree.SubElement(parent, f"{{{DSIG_NAMESPACE}}}{tag}", attrib)
+    element.text = text
+    return element
+
+
+def sign_nfe(xml: str, credentials: Credentials) -> str:
+    """
+    Assina o `<infNFe>` do XML e devolve a NF-e com `<Signature>` ao final.
+    """
+    root = etree.fromstring(xml.encode("utf-8"))
+    inf = root.find(f"{{{NFE_NAMESPACE}}}infNFe")
+    if inf is None or not inf.get("Id"):
+        raise ValueError("XML sem <infNFe Id=...> para assinar.")
+    digest = base64.b64encode(hashlib.sha1(_c14n(inf)).digest()).decode("ascii")
+
+    signature = etree.SubElement(root, f"{{{DSIG_NAMESPACE}}}Signature", nsmap={None: DSIG_NAMESPACE})
+    signed_info = _ds(signature, "SignedInfo")
+    _ds(signed_info, "CanonicalizationMethod", Algorithm=C14N_ALGORITHM)
+    _ds(signed_info, "SignatureMethod", Algorithm=f"{DSIG_NAMESPACE}rsa-sha1")
+    reference = _ds(signed_info, "Reference", URI=f"#{inf.get('Id')}")
+    transforms = _ds(reference, "Transforms")
+    _ds(transforms, "Transform", Algorithm=f"{DSIG_NAMESPACE}enveloped-signature")
+    _ds(transforms, "Transform", Algorithm=C14N_ALGORITHM)
+    _ds(reference, "DigestMethod", Algorithm=f"{DSIG_NAMESPACE}sha1")
+    _ds(reference, "DigestValue", digest)
+
+    value = credentials.key.sign(_c14n(signed_info), padding.PKCS1v15(), hashes.SHA1())
+    _ds(signature, "SignatureValue", base64.b64encode(value).decode("ascii"))
+    _ds(_ds(_ds(signature, "KeyInfo"), "X509Data"), "X509Certificate", credentials.certificate)
+    return etree.tostring(root, encoding="unicode")
+
+
+def verify_nfe_signature(xml: str) -> bool:
+    """
+    Confere digest e assinatura de uma NF-e assinada com o certificado embutido nela.
+    """
+    root = etree.fromstring(xml.encode("utf-8"))
+    inf = root.find(f"{{{NFE_NAMESPACE}}}infNFe")
+    signature = root.find(f"{{{DSIG_NAMESPACE}}}Signature")
+    if inf is None or signature is None:
+        return False
+    ds = {"ds": DSIG_NAMESPACE}
+    reference = signature.find("ds:SignedInfo/ds:Reference", ds)
+    if reference is None or reference.get("URI") != f"#{inf.get('Id')}":
+        return False
+    digest = base64.b64encode(hashlib.sha1(_c14n(inf)).digest()).decode("ascii")
+    if reference.findtext("ds:DigestValue", namespaces=ds) != digest:
+        return False
+    certificate = x509.load_der_x509_certificate(
+        base64.b64decode(signature.findtext("ds:KeyInfo/ds:X509Data/ds:X509Certificate", namespaces=ds) or "")
+    )
+    try:
+        certificate.public_key().verify(
+            base64.b64decode(signature.findtext("ds:SignatureValue", namespaces=ds) or ""),
+            _c14n(signature.find("ds:SignedInfo", ds)),
+            padding.PKCS1v15(),
+            hashes.SHA1(),
+        )
+    except InvalidSignature:
+        return False
+    return True
+
+
+def _sign_with_certificate(xml: str, path: str, password: str) -> str:
+    # Executado nos processos do pool (precisa ser uma função de módulo, serializável).
+    return sign_nfe(xml, load_credentials(path, password))
+
+
+class FiscalSigner:
+    """
+    Assina NF-e com o certificado do tenant em um pool de processos.
+    """
+
+    def __init__(
+        self,
+        cert_path: Optional[str] = None,
+        cert_dir: Optional[str] = None,
+        password: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        allow_unsigned: bool = True,
+    ):
+        self.cert_path = cert_path or os.getenv("FISCAL_CERT_PATH", "certs/certificate.pfx")
+        self.cert_dir = cert_dir if cert_dir is not None else os.getenv("FISCAL_CERT_DIR", "certs/tenants")
+        self.password = password if password is not None else os.getenv("FISCAL_CERT_PASSWORD", "")
+        if max_workers is None:
+            configured = os.getenv("FISCAL_SIGN_WORKERS", "")
+            max_workers = int(configured) if configured else (os.cpu_count() or 1)
+        self.max_workers = max_workers
+        self.allow_unsigned = allow_unsigned
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.metrics = {"signed": 0, "unsigned": 0, "failed": 0}
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # Criado sob demanda (e recriado após `shutdown`). "spawn": o processo da API tem
+        # threads (uvicorn, pools), e fork com threads ativas pode herdar locks presos.
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def certificate_path(self, tenant_id: Optional[int] = None) -> Optional[str]:
+        """
+        Caminho do PFX usado para o tenant (o do tenant, se houver, ou o do servidor).
+        """
+        if tenant_id is not None and self.cert_dir:
+            path = os.path.join(self.cert_dir, f"{tenant_id}.pfx")
+            if os.path.exists(path):
+                return path
+        return self.cert_path if os.path.exists(self.cert_path) else None
+
+    def certificate_password(self, path: str, tenant_id: Optional[int] = None) -> str:
+        """
+        Senha do PFX em `path`: a do tenant, se o certificado for o dele e houver uma
+        configurada (variável FISCAL_CERT_PASSWORD_<tenant_id> ou arquivo
+        `<cert_dir>/<tenant_id>.password`); senão, a senha do servidor.
+        """
+        if tenant_id is None or path != os.path.join(self.cert_dir, f"{tenant_id}.pfx"):
+            return self.password
+        configured = os.getenv(f"FISCAL_CERT_PASSWORD_{tenant_id}")
+        if configured is not None:
+            return configured
+        try:
+            with open(os.path.join(self.cert_dir, f"{tenant_id}.password"), encoding="utf-8") as f:
+                return f.read().rstrip("\r\n")
+        except FileNotFoundError:
+            return self.password
+
+    def sign(self, xml: str, tenant_id: Optional[int] = None) -> str:
+        result = self.sign_many([xml], tenant_id)[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def sign_many(self, xmls: List[str], tenant_id: Optional[int] = None) -> List[Union[str, Exception]]:
+        """
+        Assina várias notas do mesmo tenant, distribuídas entre os processos do pool.
+        Retorna um resultado por nota, na mesma ordem; falhas vêm como a exceção.
+        """
+        path = self.certificate_path(tenant_id)
+        if path is None:
+            if not self.allow_unsigned:
+                raise CertificateError(f"Nenhum certificado digital configurado para o tenant {tenant_id}.")
+            self.metrics["unsigned"] += len(xmls)
+            return [xml.replace("</NFe>", f"{PLACEHOLDER_SIGNATURE}</NFe>") for xml in xmls]
+        password = self.certificate_password(path, tenant_id)
+
+        results: List[Union[str, Exception]] = []
+        if self.max_workers == 0:
+            for xml in xmls:
+                try:
+                    results.append(_sign_with_certificate(xml, path, password))
+                except Exception as e:
+                    results.append(e)
+        else:
+            futures = [self.executor.submit(_sign_with_certificate, xml, path, password) for xml in xmls]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+
+        failed = sum(isinstance(result, Exception) for result in results)
+        self.metrics["failed"] += failed
+        self.metrics["signed"] += len(results) - failed
+        return results
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics, "workers": self.max_workers, "pool_started": self._executor is not None}
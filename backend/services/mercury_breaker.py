@@ -0,0 +1,153 @@
+"""
+Circuit breaker para o Portal Mercury.
+
+Quando o portal está lento ou fora do ar, cada busca esperaria o timeout de navegação
+do Playwright, acumulando requisições presas. O breaker conta falhas (e timeouts)
+consecutivas; ao atingir o limite ele "abre" e as chamadas seguintes falham na hora
+com `CircuitOpen`, sem tocar no portal. Passado o tempo de espera, uma única chamada
+de teste (half-open) é liberada: se der certo o circuito fecha, se falhar abre de novo.
+
+Configuração (variáveis de ambiente):
+- MERCURY_BREAKER_FAILURES: falhas consecutivas para abrir o circuito (padrão: 5).
+- MERCURY_BREAKER_RESET: segundos em aberto antes da chamada de teste (padrão: 30).
+- MERCURY_CALL_TIMEOUT: tempo máximo de uma operação no portal, em segundos (padrão: 45).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """
+    O circuito está aberto: o portal não será acessado até a próxima chamada de teste.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__("Portal Mercury indisponível no momento; tente novamente em instantes.")
+        self.retry_after = retry_after
+
+
+class MercuryPortalError(Exception):
+    """
+    Falha ao acessar o portal (erro de navegação, rede ou timeout).
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker assíncrono (fechado -> aberto -> meio-aberto) com timeout por chamada.
+    """
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None, call_timeout: Optional[float] = None):
+        self.failure_threshold = failure_threshold or int(os.getenv("MERCURY_BREAKER_FAILURES", "5"))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else float(os.getenv("MERCURY_BREAKER_RESET", "30"))
+        self.call_timeout = call_timeout if call_timeout is not None else float(os.getenv("MERCURY_CALL_TIMEOUT", "45"))
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None # time.monotonic() da abertura.
+        self.opened_since: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._probing = False
+        self.metrics = {"calls": 0, "failures": 0, "timeouts": 0, "rejected": 0, "trips": 0}
+
+    def _retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def check(self):
+        """
+        Levanta `CircuitOpen` se a chamada deve falhar imediatamente.
+        """
+        if self.state == OPEN and self._retry_after() > 0:
+            self.metrics["rejected"] += 1
+            raise CircuitOpen(self._retry_after())
+        if self.state != CLOSED and self._probing:
+            # Já existe uma chamada de teste em andamento; as demais aguardam o resultado dela.
+            self.metrics["rejected"] += 1
+            raise CircuitOpen(self.reset_timeout)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Executa `fn()` sob o breaker. Exceções e timeouts contam como falha do portal.
+        """
+        self.check()
+        probe = self.state == OPEN
+        if probe:
+            self.state = HALF_OPEN
+            self._probing = True
+            logger.info("Circuito do portal Mercury meio-aberto; enviando chamada de teste.")
+
+        self.metrics["calls"] += 1
+        try:
+            result = await asyncio.wait_for(fn(), self.call_timeout or None)
+        except asyncio.TimeoutError:
+            self.metrics["timeouts"] += 1
+            self._record_failure("timeout")
+            raise MercuryPortalError(f"Portal Mercury não respondeu em {self.call_timeout:.0f}s.") from None
+        except asyncio.CancelledError:
+            if probe:
+                # A chamada de teste foi abandonada; volta a aberto para permitir outra.
+                self._probing = False
+                self.state = OPEN
+            raise
+        except Exception as e:
+            self._record_failure(str(e))
+            raise
+        self._record_success()
+        return result
+
+    def _record_success(self):
+        if self.state != CLOSED:
+            logger.info("Portal Mercury respondeu; circuito fechado.")
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.opened_since = None
+        self._probing = False
+
+    def _record_failure(self, error: str):
+        self.metrics["failures"] += 1
+        self.failures += 1
+        self.last_error = error
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.metrics["trips"] += 1
+                logger.warning(f"Circuito do portal Mercury aberto após {self.failures} falha(s): {error}")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.opened_since = datetime.utcnow()
+
+    def reset(self):
+        """
+        Fecha o circuito manualmente (ex.: após confirmar que o portal voltou).
+        """
+        self._record_success()
+
+    def stats(self) -> Dict[str, Any]:
+        retry_after = self._retry_after() if self.state == OPEN else 0.0
+        return {
+            **self.metrics,
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+            "call_timeout": self.call_timeout,
+            "retry_after": round(retry_after, 1),
+            "opened_since": self.opened_since,
+            "last_error": self.last_error,
+        }
+
+
+portal_breaker = CircuitBreaker()
@@ -0,0 +1,253 @@
+"""
+Cache de resultados do Portal Mercury (busca de produtos e garantia), por tenant.
+
+Camada em memória com TTL por operação e limite de entradas (LRU), mais uma camada
+persistente opcional em SQLite, que sobrevive a reinícios do servidor. Falhas do portal
+levantam exceção (e passam pelo circuit breaker), então um resultado vazio é uma resposta
+legítima ("nenhum registro") e também é guardado, com validade mais curta: a peça ou o
+motor pode ser cadastrado no portal a qualquer momento.
+
+Configuração (variáveis de ambiente):
+- MERCURY_CACHE_MAX_ENTRIES: entradas na memória (padrão: 1000).
+- MERCURY_PRODUCT_CACHE_TTL: validade das buscas de produto, em segundos (padrão: 900).
+- MERCURY_WARRANTY_CACHE_TTL: validade das consultas de garantia, em segundos (padrão: 86400).
+- MERCURY_EMPTY_CACHE_TTL: validade máxima de resultados vazios, em segundos (padrão: 300).
+- MERCURY_CACHE_DB: caminho do arquivo SQLite da camada persistente (vazio = desativada).
+- MERCURY_CACHE_STALE_TTL: por quanto tempo, após expirar, uma entrada ainda pode ser servida
+  como resultado "stale" enquanto o portal estiver fora do ar (padrão: 604800, 7 dias).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sentinela para diferenciar "não está no cache" de um valor guardado.
+MISSING = object()
+
+CacheKey = Tuple[int, str, str] # (tenant_id, operação, argumento normalizado)
+
+
+def normalize_argument(argument: str) -> str:
+    return argument.strip().upper()
+
+
+class LRUTTLCache:
+    """
+    Cache em memória com expiração por entrada e descarte do item menos usado.
+    """
+
+    def __init__(self, max_entries: int, stale_ttl: float = 0):
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self._data: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: CacheKey, allow_stale: bool = False) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return MISSING
+        expires_at, value = entry
+        now = time.time()
+        if expires_at + self.stale_ttl <= now:
+            del self._data[key]
+            return MISSING
+        if expires_at <= now and not allow_stale:
+            return MISSING # Expirada, mas mantida para uso como "stale".
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: CacheKey, value: Any, expires_at: float):
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete_matching(self, tenant_id: int, operation: Optional[str], argument: Optional[str]) -> int:
+        keys = [
+            key for key in self._data
+            if key[0] == tenant_id
+            and (operation is None or key[1] == operation)
+            and (argument is None or key[2] == argument)
+        ]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCacheTier:
+    """
+    Camada persistente do cache, em um arquivo SQLite próprio (separado do banco da aplicação).
+    """
+
+    def __init__(self, path: str, stale_ttl: float = 0):
+        self.path = path
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS mercury_cache ("
+                " tenant_id INTEGER NOT NULL, operation TEXT NOT NULL, argument TEXT NOT NULL,"
+                " value TEXT NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (tenant_id, operation, argument))"
+            )
+            self._conn.commit()
+
+    def get(self, key: CacheKey, allow_stale: bool = False) -> Tuple[Any, float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM mercury_cache WHERE tenant_id = ? AND operation = ? AND argument = ?",
+                key,
+            ).fetchone()
+        limit = time.time() - (self.stale_ttl if allow_stale else 0)
+        if row is None or row[1] <= limit:
+            return MISSING, 0
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: CacheKey, value: Any, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO mercury_cache (tenant_id, operation, argument, value, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (*key, json.dumps(value), expires_at),
+            )
+            self._conn.commit()
+
+    def delete_matching(self, tenant_id: int, operation: Optional[str], argument: Optional[str]):
+        sql = "DELETE FROM mercury_cache WHERE tenant_id = ?"
+        params: list = [tenant_id]
+        if operation is not None:
+            sql += " AND operation = ?"
+            params.append(operation)
+        if argument is not None:
+            sql += " AND argument = ?"
+            params.append(argument)
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.execute("DELETE FROM mercury_cache WHERE expires_at <= ?", (time.time() - self.stale_ttl,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MercuryResultCache:
+    """
+    Cache de resultados do portal com TTL por operação, LRU e camada SQLite opcional.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttls: Optional[Dict[str, float]] = None, persistent_path: Optional[str] = None, stale_ttl: Optional[float] = None, empty_ttl: Optional[float] = None):
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv("MERCURY_CACHE_STALE_TTL", "604800"))
+        self.memory = LRUTTLCache(max_entries or int(os.getenv("MERCURY_CACHE_MAX_ENTRIES", "1000")), self.stale_ttl)
+        self.ttls = ttls or {
+            "product": float(os.getenv("MERCURY_PRODUCT_CACHE_TTL", "900")),
+            # Dados de garantia mudam raramente: ficam muito mais tempo em cache.
+            "warranty": float(os.getenv("MERCURY_WARRANTY_CACHE_TTL", "86400")),
+        }
+        self.empty_ttl = empty_ttl if empty_ttl is not None else float(os.getenv("MERCURY_EMPTY_CACHE_TTL", "300"))
+        path = persistent_path if persistent_path is not None else os.getenv("MERCURY_CACHE_DB", "")
+        self.persistent = SQLiteCacheTier(path, self.stale_ttl) if path else None
+        self.metrics = {"hits": 0, "persistent_hits": 0, "misses": 0, "stale_hits": 0, "stores": 0, "invalidations": 0}
+
+    def _key(self, tenant_id: int, operation: str, argument: str) -> CacheKey:
+        return (tenant_id, operation, normalize_argument(argument))
+
+    def get(self, tenant_id: int, operation: str, argument: str) -> Any:
+        """
+        Retorna o valor em cache (memória, depois SQLite) ou `MISSING`.
+        """
+        key = self._key(tenant_id, operation, argument)
+        value = self.memory.get(key)
+        if value is not MISSING:
+            self.metrics["hits"] += 1
+            return value
+        if self.persistent is not None:
+            value, expires_at = self.persistent.get(key)
+            if value is not MISSING:
+                self.metrics["persistent_hits"] += 1
+                self.memory.set(key, value, expires_at) # Promove para a memória.
+                return value
+        self.metrics["misses"] += 1
+        return MISSING
+
+    def get_stale(self, tenant_id: int, operation: str, argument: str) -> Any:
+        """
+        Retorna o último valor conhecido, mesmo expirado (dentro de `stale_ttl`), ou `MISSING`.
+        Usado quando o portal está indisponível.
+        """
+        key = self._key(tenant_id, operation, argument)
+        value = self.memory.get(key, allow_stale=True)
+        if value is MISSING and self.persistent is not None:
+            value, _ = self.persistent.get(key, allow_stale=True)
+        if value is not MISSING:
+            self.metrics["stale_hits"] += 1
+        return value
+
+    def set(self, tenant_id: int, operation: str, argument: str, value: Any):
+        key = self._key(tenant_id, operation, argument)
+        ttl = self.ttls.get(operation, 0)
+        if not value:
+            ttl = min(ttl, self.empty_ttl) # "Nenhum registro" vale por menos tempo.
+        expires_at = time.time() + ttl
+        self.memory.set(key, value, expires_at)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, value, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"Falha ao gravar cache Mercury persistente: {e}")
+        self.metrics["stores"] += 1
+
+    async def get_or_fetch(self, tenant_id: int, operation: str, argument: str, fetch: Callable[[], Awaitable[Any]], refresh: bool = False) -> Any:
+        """
+        Retorna o resultado em cache ou chama `fetch()` e guarda o resultado.
+        Com `refresh=True`, ignora o cache e atualiza a entrada.
+        """
+        if not refresh:
+            value = self.get(tenant_id, operation, argument)
+            if value is not MISSING:
+                return value
+        value = await fetch()
+        self.set(tenant_id, operation, argument, value)
+        return value
+
+    def invalidate(self, tenant_id: int, operation: Optional[str] = None, argument: Optional[str] = None) -> int:
+        """
+        Remove entradas do tenant (todas, de uma operação ou de um argumento específico).
+        Retorna quantas entradas foram removidas da memória.
+        """
+        normalized = normalize_argument(argument) if argument is not None else None
+        removed = self.memory.delete_matching(tenant_id, operation, normalized)
+        if self.persistent is not None:
+            self.persistent.delete_matching(tenant_id, operation, normalized)
+        self.metrics["invalidations"] += 1
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["persistent_hits"] + self.metrics["misses"]
+        hit_rate = (self.metrics["hits"] + self.metrics["persistent_hits"]) / lookups if lookups else 0.0
+        return {
+            **self.metrics,
+            "hit_rate": round(hit_rate, 4),
+            "entries": len(self.memory),
+            "max_entries": self.memory.max_entries,
+            "ttls": self.ttls,
+            "empty_ttl": self.empty_ttl,
+            "stale_ttl": self.stale_ttl,
+            "persistent": self.persistent.path if self.persistent else None,
+        }
+
+
+mercury_cache = MercuryResultCache()
@@ -0,0 +1,199 @@
+"""
+Backend HTTP (sem navegador) do scraper do Portal Mercury.
+
+As páginas de preço e garantia (`epdv002d2.asp`, `ewr010.asp`, `ewr010c.asp`) são
+renderizadas no servidor (ASP), então podem ser lidas com um cliente HTTP assíncrono
+comum, com um cookie jar por tenant, em vez de um Chromium inteiro.
+
+Todos os clientes dos tenants compartilham o mesmo pool de conexões (keep-alive).
+Quando este caminho não consegue atender (login não aceito, layout inesperado,
+erro de rede), é lançada `MercuryHttpUnavailable` e o chamador volta ao Playwright.
+
+Configuração (variáveis de ambiente):
+- MERCURY_HTTP_MAX_CONNECTIONS: conexões simultâneas com o portal (padrão: 10).
+- MERCURY_HTTP_TIMEOUT: timeout por requisição, em segundos (padrão: 15).
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote, urljoin
+
+import httpx
+from bs4 import BeautifulSoup
+
+from services.mercury_parser import (
+    has_product_table,
+    is_no_records,
+    parse_product_results,
+    parse_warranty_client_name,
+    parse_warranty_summary,
+)
+from services.mercury_limiter import portal_limiter
+from services.mercury_session import LOGIN_URL, PORTAL_BASE_URL, is_login_page
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+
+class MercuryHttpUnavailable(Exception):
+    """
+    O caminho HTTP não conseguiu atender a requisição; use o Playwright.
+    """
+    pass
+
+
+class MercuryHttpClient:
+    """
+    Cliente HTTP assíncrono do Portal Mercury com um cookie jar por tenant.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, max_connections: Optional[int] = None, timeout: Optional[float] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = (base_url or PORTAL_BASE_URL).rstrip("/")
+        self.login_url = LOGIN_URL if base_url is None else f"{self.base_url}/epdv001.asp"
+        self.max_connections = max_connections or int(os.getenv("MERCURY_HTTP_MAX_CONNECTIONS", "10"))
+        self.timeout = timeout or float(os.getenv("MERCURY_HTTP_TIMEOUT", "15"))
+        self._transport = transport # Transporte compartilhado (pool de conexões); criado sob demanda.
+        self._clients: Dict[Optional[int], httpx.AsyncClient] = {}
+        self._locks: Dict[Optional[int], asyncio.Lock] = {}
+        self.logins = 0
+
+    def _shared_transport(self) -> httpx.AsyncBaseTransport:
+        if self._transport is None:
+            self._transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                retries=1,
+            )
+        return self._transport
+
+    def _client_for(self, tenant_id: Optional[int]) -> httpx.AsyncClient:
+        # Um cliente por tenant (cookies isolados), todos sobre o mesmo transporte.
+        client = self._clients.get(tenant_id)
+        if client is None:
+            client = httpx.AsyncClient(
+                transport=self._shared_transport(),
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                # Toda requisição (inclusive redirecionamentos) respeita o limite de taxa do portal.
+                event_hooks={"request": [self._throttle]},
+            )
+            self._clients[tenant_id] = client
+        return client
+
+    async def _throttle(self, request: httpx.Request):
+        await portal_limiter.throttle()
+
+    def _lock_for(self, tenant_id: Optional[int]) -> asyncio.Lock:
+        lock = self._locks.get(tenant_id)
+        if lock is None:
+            lock = self._locks[tenant_id] = asyncio.Lock()
+        return lock
+
+    def invalidate(self, tenant_id: int):
+        """
+        Descarta os cookies do tenant (o próximo acesso fará login de novo).
+        """
+        client = self._clients.get(tenant_id)
+        if client is not None:
+            client.cookies.clear()
+
+    async def close(self):
+        """
+        Fecha o pool de conexões compartilhado (chamado no encerramento da aplicação).
+        """
+        self._clients.clear()
+        if self._transport is not None:
+            await self._transport.aclose()
+            self._transport = None
+
+    async def _login(self, client: httpx.AsyncClient, username: str, password: str):
+        # Lê o formulário de login para descobrir o `action` e os campos ocultos.
+        response = await client.get(self.login_url)
+        soup = BeautifulSoup(response.text, "html.parser")
+        password_input = soup.find("input", attrs={"name": "sSenha"})
+        form = password_input.find_parent("form") if password_input else None
+        if form is None:
+            raise MercuryHttpUnavailable("Formulário de login não encontrado")
+
+        data = {
+            field.get("name"): field.get("value", "")
+            for field in form.find_all("input")
+            if field.get("name") and field.get("type", "text").lower() == "hidden"
+        }
+        data["sUsuar"] = username
+        data["sSenha"] = password
+        action = urljoin(str(response.url), form.get("action") or str(response.url))
+        method = (form.get("method") or "post").lower()
+        if method == "get":
+            response = await client.get(action, params=data)
+        else:
+            response = await client.post(action, data=data)
+        self.logins += 1
+        if is_login_page(response.text):
+            raise MercuryHttpUnavailable("Login não aceito pelo portal via HTTP")
+
+    async def _get(self, path: str, tenant_id: Optional[int], username: str, password: str) -> str:
+        """
+        Faz um GET autenticado; se o portal devolver o formulário de login,
+        autentica (sob o lock do tenant) e repete uma vez.
+        """
+        client = self._client_for(tenant_id)
+        url = f"{self.base_url}/{path}"
+        try:
+            if not client.cookies:
+                async with self._lock_for(tenant_id):
+                    if not client.cookies:
+                        await self._login(client, username, password)
+            response = await client.get(url)
+            if is_login_page(response.text):
+                async with self._lock_for(tenant_id):
+                    await self._login(client, username, password)
+                response = await client.get(url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise MercuryHttpUnavailable(f"Erro HTTP no portal: {e}") from e
+        if is_login_page(response.text):
+            raise MercuryHttpUnavailable("Sessão não aceita pelo portal via HTTP")
+        return response.text
+
+    async def search_product(self, item: str, username: str, password: str, tenant_id: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Pesquisa produtos no portal (mesmo resultado de `search_product_playwright`).
+        """
+        path = f"epdv002d2.asp?s_nr_pedido_web=11111111111111111&s_nr_tabpre=&s_fm_cod_com=null&s_desc_item={quote(item)}"
+        html = await self._get(path, tenant_id, username, password)
+        if is_no_records(html):
+            return []
+        if not has_product_table(html):
+            raise MercuryHttpUnavailable("Layout da busca de produtos não reconhecido")
+        return parse_product_results(html)
+
+    async def search_warranty(self, nro_motor: str, username: str, password: str, tenant_id: Optional[int] = None, include_client: bool = True) -> Optional[Dict[str, str]]:
+        """
+        Busca a garantia de um motor (mesmo resultado de `search_warranty_playwright`).
+        Com `include_client=False`, não carrega a página do cliente (`ewr010c.asp`).
+        """
+        serial = quote(nro_motor)
+        html = await self._get(f"ewr010.asp?s_nr_serie={serial}", tenant_id, username, password)
+        result = parse_warranty_summary(html, nro_motor)
+        if result is None or not include_client:
+            return result
+        html_client = await self._get(f"ewr010c.asp?s_nr_serie={serial}", tenant_id, username, password)
+        result["nome_cli"] = parse_warranty_client_name(html_client)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tenants": len(self._clients),
+            "logins": self.logins,
+            "max_connections": self.max_connections,
+        }
+
+
+mercury_http_client = MercuryHttpClient()
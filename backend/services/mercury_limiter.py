@@ -0,0 +1,188 @@
+"""
+Limites de tráfego para o Portal Mercury: concorrência (global e por tenant) e taxa de requisições.
+
+Toda operação no portal (busca de produto, garantia, sincronização) ocupa uma vaga do
+limitador antes de abrir um contexto do navegador ou uma conexão HTTP. Quando não há vaga,
+a operação entra na fila do seu tenant; as vagas liberadas são distribuídas em rodízio
+entre os tenants com fila, para que um job grande de um tenant não bloqueie os demais.
+Quem espera mais que o timeout recebe `PortalBusy`.
+
+Além disso, cada requisição ao host do portal passa pelo `throttle()`, um token bucket que
+limita as requisições por segundo (com rajada curta permitida).
+
+Configuração (variáveis de ambiente):
+- MERCURY_MAX_CONCURRENCY: operações simultâneas no total (padrão: MERCURY_POOL_SIZE ou 2).
+- MERCURY_TENANT_MAX_CONCURRENCY: operações simultâneas por tenant (padrão: 2).
+- MERCURY_QUEUE_TIMEOUT: espera máxima na fila, em segundos (padrão: 30).
+- MERCURY_MAX_QUEUE: operações na fila antes de recusar novas (padrão: 100).
+- MERCURY_MAX_RPS: requisições por segundo ao portal (padrão: 5; 0 = sem limite).
+- MERCURY_RPS_BURST: rajada de requisições permitida acima da taxa (padrão: 5).
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, Optional
+
+
+class PortalBusy(Exception):
+    """
+    Não foi possível obter vaga para acessar o portal (fila cheia ou timeout).
+    """
+
+
+class PortalLimiter:
+    """
+    Semáforo global + por tenant com fila justa (rodízio entre tenants) e limite de taxa.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        per_tenant: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        rps: Optional[float] = None,
+        burst: Optional[float] = None,
+    ):
+        default_global = os.getenv("MERCURY_POOL_SIZE", "2")
+        self.max_concurrency = max_concurrency or int(os.getenv("MERCURY_MAX_CONCURRENCY", default_global))
+        self.per_tenant = per_tenant or int(os.getenv("MERCURY_TENANT_MAX_CONCURRENCY", "2"))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(os.getenv("MERCURY_QUEUE_TIMEOUT", "30"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("MERCURY_MAX_QUEUE", "100"))
+        self.rps = rps if rps is not None else float(os.getenv("MERCURY_MAX_RPS", "5"))
+        self.burst = burst if burst is not None else float(os.getenv("MERCURY_RPS_BURST", "5"))
+
+        self._active_total = 0
+        self._active: Dict[Hashable, int] = {}
+        # Fila de cada tenant; a ordem do OrderedDict é a ordem do rodízio.
+        self._waiters: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+        self._tokens = self.burst
+        self._tokens_updated = time.monotonic()
+        self._wait_times: Deque[float] = deque(maxlen=500)
+        self.metrics = {"granted": 0, "timeouts": 0, "rejected": 0, "throttled": 0, "throttle_wait_s": 0.0}
+
+    # --- Concorrência ---
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._waiters.values())
+
+    def _dispatch(self):
+        # Entrega vagas livres aos tenants com fila, um por vez, em rodízio.
+        while self._active_total < self.max_concurrency and self._waiters:
+            for tenant_id in list(self._waiters):
+                if self._active.get(tenant_id, 0) >= self.per_tenant:
+                    continue
+                queue = self._waiters[tenant_id]
+                waiter = queue.popleft()
+                if queue:
+                    self._waiters.move_to_end(tenant_id) # Próxima vaga vai para outro tenant.
+                else:
+                    del self._waiters[tenant_id]
+                self._active_total += 1
+                self._active[tenant_id] = self._active.get(tenant_id, 0) + 1
+                waiter.set_result(None)
+                break
+            else:
+                return # Todos os tenants com fila já estão no limite individual.
+
+    def _remove_waiter(self, tenant_id: Hashable, waiter: asyncio.Future):
+        queue = self._waiters.get(tenant_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        if not queue:
+            del self._waiters[tenant_id]
+
+    async def acquire(self, tenant_id: Hashable):
+        """
+        Aguarda uma vaga para o tenant. Levanta `PortalBusy` se a fila estiver cheia ou o tempo esgotar.
+        """
+        if self.queue_depth >= self.max_queue:
+            self.metrics["rejected"] += 1
+            raise PortalBusy("Fila de acesso ao portal Mercury cheia.")
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(tenant_id, deque()).append(waiter)
+        self._dispatch()
+        try:
+            if not waiter.done():
+                await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout or None)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release(tenant_id) # A vaga chegou junto com o timeout/cancelamento.
+            else:
+                waiter.cancel()
+                self._remove_waiter(tenant_id, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.metrics["timeouts"] += 1
+                raise PortalBusy("Tempo de espera por acesso ao portal Mercury esgotado.") from None
+            raise
+        self.metrics["granted"] += 1
+        self._wait_times.append(time.monotonic() - started)
+
+    def release(self, tenant_id: Hashable):
+        self._active_total -= 1
+        remaining = self._active.get(tenant_id, 0) - 1
+        if remaining > 0:
+            self._active[tenant_id] = remaining
+        else:
+            self._active.pop(tenant_id, None)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tenant_id: Hashable) -> AsyncIterator[None]:
+        """
+        Ocupa uma vaga do tenant durante o bloco `async with`.
+        """
+        await self.acquire(tenant_id)
+        try:
+            yield
+        finally:
+            self.release(tenant_id)
+
+    # --- Taxa de requisições ---
+
+    async def throttle(self):
+        """
+        Aguarda a vez de enviar uma requisição ao portal (token bucket de `rps` por segundo).
+        """
+        if self.rps <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._tokens_updated) * self.rps)
+        self._tokens_updated = now
+        # Reserva o token já (saldo pode ficar negativo): quem chega depois espera mais.
+        self._tokens -= 1
+        if self._tokens < 0:
+            delay = -self._tokens / self.rps
+            self.metrics["throttled"] += 1
+            self.metrics["throttle_wait_s"] += delay
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._wait_times)
+        return {
+            **self.metrics,
+            "throttle_wait_s": round(self.metrics["throttle_wait_s"], 3),
+            "active": self._active_total,
+            "max_concurrency": self.max_concurrency,
+            "per_tenant": self.per_tenant,
+            "queue_depth": self.queue_depth,
+            "queued_tenants": len(self._waiters),
+            "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[math.ceil(len(waits) * 0.95) - 1] * 1000, 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "rps": self.rps,
+        }
+
+
+portal_limiter = PortalLimiter()
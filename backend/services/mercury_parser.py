@@ -0,0 +1,182 @@
+"""
+Funções de parsing das páginas do Portal Mercury (HTML renderizado no servidor, ASP).
+
+Compartilhadas pelos dois backends do scraper (Playwright e HTTP), para que ambos
+extraiam exatamente os mesmos campos das mesmas páginas.
+
+O parsing usa lxml com seletores XPath pré-compilados: buscas genéricas (ex.: "filtro")
+retornam centenas de linhas, e percorrer a árvore do BeautifulSoup com `find`/`find_all`
+encadeados dominava o tempo fora da rede. Comparativo em `benchmarks/bench_mercury_parser.py`.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+import lxml.html
+from lxml import etree
+
+from services.mercury_sku import SkuIndex
+
+
+def is_no_records(html: str) -> bool:
+    """
+    Indica se a página de busca de produtos (`epdv002d2.asp`) veio sem resultados.
+    """
+    return "NoRecords" in html or "Nenhum registro encontrado" in html
+
+
+def has_product_table(html: str) -> bool:
+    """
+    Indica se a página contém o formulário de preços esperado (layout reconhecido).
+    """
+    return "preco_item_web" in html
+
+
+# Seletores compilados uma única vez (XPath via lxml). Reproduzem o caminho que a página
+# de preços usa: form#preco_item_web > 1ª tabela > tbody > 1ª linha > 1ª célula > 2ª tabela.
+_ROW_CLASS = "contains(concat(' ', normalize-space(@class), ' '), ' Row ')"
+_PRODUCT_TABLE = etree.XPath(
+    "((((((//form[@id='preco_item_web'])[1]//table)[1]//tbody)[1]//tr)[1]//td)[1]//table)[2]"
+)
+_ROWS = etree.XPath(f".//tr[{_ROW_CLASS}]")
+_FIRST_ROW = etree.XPath(f"(//tr[{_ROW_CLASS}])[1]")
+_CELLS = etree.XPath(".//td")
+_CLIENT_TABLE_ROWS = etree.XPath("((//*[@id='warranty_clients'])[1]//table)[1]//tr")
+
+_PRODUCT_FIELDS = ("codigo", "qtd", "descricao", "qtdaEst", "valorVenda", "valorTabela", "valorCusto")
+
+
+def _parse_document(html: str):
+    """
+    Converte o HTML em árvore lxml. Retorna None para páginas vazias ou ilegíveis.
+    """
+    if not html or not html.strip():
+        return None
+    try:
+        try:
+            return lxml.html.document_fromstring(html)
+        except ValueError:
+            # Strings com declaração de encoding precisam ser passadas como bytes.
+            return lxml.html.document_fromstring(html.encode("utf-8"))
+    except etree.ParserError:
+        return None
+
+
+def _stripped_text(element) -> str:
+    """
+    Texto do elemento com cada trecho aparado e concatenado (equivale ao `get_text(strip=True)`).
+    """
+    return "".join(part.strip() for part in element.itertext())
+
+
+def parse_product_results(html: str) -> List[Dict[str, str]]:
+    """
+    Extrai as linhas de produtos da página de busca de preços (`epdv002d2.asp`).
+    """
+    doc = _parse_document(html)
+    if doc is None:
+        return []
+
+    tables = _PRODUCT_TABLE(doc)
+    if not tables:
+        return []
+
+    dados = []
+    for linha in _ROWS(tables[0]):
+        colunas = _CELLS(linha)
+        if len(colunas) >= 8:
+            dados.append({
+                field: colunas[index].text_content().strip()
+                for index, field in enumerate(_PRODUCT_FIELDS, start=1)
+            })
+    return dados
+
+
+def parse_warranty_summary(html: str, nro_motor: str) -> Optional[Dict[str, str]]:
+    """
+    Extrai os dados de garantia da página `ewr010.asp` (sem o nome do cliente).
+    Retorna None se o motor não constar na página.
+    """
+    doc = _parse_document(html)
+    if doc is None or nro_motor.upper() not in doc.text_content().upper():
+        return None
+
+    rows = _FIRST_ROW(doc)
+    if not rows:
+        return None
+
+    cells = _CELLS(rows[0])
+    if len(cells) < 6:
+        return None
+
+    return {
+        "nro_motor": nro_motor,
+        "nro_serie": _stripped_text(cells[0]),
+        "modelo": _stripped_text(cells[1]),
+        "dt_venda": _stripped_text(cells[2]),
+        "status_garantia": _stripped_text(cells[4]),
+        "vld_garantia": _stripped_text(cells[5]),
+    }
+
+
+def parse_warranty_client_name(html: str) -> str:
+    """
+    Extrai o nome do cliente da página secundária de garantia (`ewr010c.asp`).
+    """
+    doc = _parse_document(html)
+    if doc is None:
+        return ""
+
+    nome_cli = ""
+    rows = _CLIENT_TABLE_ROWS(doc)
+    if len(rows) >= 3:
+        nome_cli = _stripped_text(rows[2]).replace("NOME ", "").strip()
+
+    if not nome_cli:
+        match = re.search(r"NOME\s+([^\n]+)", doc.text_content())
+        if match:
+            nome_cli = match.group(1).strip()
+    return nome_cli
+
+
+def parse_brl_currency(value_str: str) -> float:
+    """Converte string de moeda BRL ('1.234,56') para float (1234.56)."""
+    if not value_str:
+        return 0.0
+    try:
+        # Remove caracteres não numéricos exceto , e . (e R$)
+        clean_str = value_str.strip().replace("R$", "").strip()
+        # Remove pontos de milhar
+        clean_str = clean_str.replace(".", "")
+        # Troca vírgula decimal por ponto
+        clean_str = clean_str.replace(",", ".")
+        return float(clean_str)
+    except ValueError:
+        return 0.0
+
+
+def match_portal_row(results: List[Dict[str, str]], sku: str) -> Optional[Dict[str, str]]:
+    """
+    Escolhe, entre as linhas retornadas pelo portal, a que corresponde ao SKU da peça
+    (chave normalizada ou número da peça; ver `mercury_sku`). Kits e peças avulsas, kits com
+    sufixos diferentes e códigos apenas parecidos não casam.
+    """
+    return index_portal_rows(results).get(sku)
+
+
+def suggest_portal_rows(results: List[Dict[str, str]], sku: str, limit: int = 3) -> List[Dict[str, Any]]:
+    """
+    Linhas do portal com código parecido com o SKU, para revisão manual quando nenhuma casa.
+    Os preços dessas linhas nunca são gravados automaticamente.
+    """
+    return [
+        {"codigo": row.get('codigo', ''), "descricao": row.get('descricao', ''), "similarity": round(score, 2)}
+        for score, _, row in index_portal_rows(results).candidates(sku, limit=limit)
+    ]
+
+
+def index_portal_rows(results: List[Dict[str, str]]) -> SkuIndex:
+    """
+    Indexa as linhas do portal pelo código do item.
+    """
+    return SkuIndex((item.get('codigo', ''), item) for item in results)
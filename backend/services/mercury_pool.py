@@ -0,0 +1,203 @@
+"""
+Pool persistente de contextos do Chromium (Playwright) para o scraper do Portal Mercury.
+
+Em vez de iniciar o Playwright, lançar o navegador e fechá-lo a cada requisição,
+mantemos um único navegador vivo durante o ciclo de vida da aplicação e emprestamos
+contextos isolados (cookies próprios) para cada operação.
+
+Configuração (variáveis de ambiente):
+- MERCURY_POOL_SIZE: número máximo de contextos simultâneos (padrão: 2).
+- MERCURY_CONTEXT_MAX_USES: usos de um contexto antes de ser reciclado (padrão: 50).
+- MERCURY_HEADLESS: "0" para abrir o navegador com interface (padrão: "1").
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from playwright.async_api import async_playwright
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledContext:
+    """
+    Um contexto do navegador mantido pelo pool, com o contador de usos e a
+    "geração" do navegador que o criou (para descartá-lo se o navegador for relançado).
+    """
+    __slots__ = ("context", "uses", "generation")
+
+    def __init__(self, context: Any, generation: int):
+        self.context = context
+        self.uses = 0
+        self.generation = generation
+
+
+class BrowserPool:
+    """
+    Pool de contextos do Chromium com tamanho configurável, verificação de saúde
+    e reciclagem após N usos ou após uma falha.
+    """
+
+    def __init__(self, size: Optional[int] = None, max_uses: Optional[int] = None, headless: Optional[bool] = None):
+        self.size = size or int(os.getenv("MERCURY_POOL_SIZE", "2"))
+        self.max_uses = max_uses or int(os.getenv("MERCURY_CONTEXT_MAX_USES", "50"))
+        self.headless = headless if headless is not None else os.getenv("MERCURY_HEADLESS", "1") != "0"
+
+        self._playwright = None
+        self._browser = None
+        self._generation = 0 # Incrementado a cada (re)lançamento do navegador.
+        self._idle: List[_PooledContext] = [] # Contextos livres, prontos para empréstimo.
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+
+        # Métricas simples expostas por `stats()`.
+        self._borrowed = 0
+        self._created = 0
+        self._recycled = 0
+        self._restarts = 0
+
+    def _ensure_primitives(self):
+        # As primitivas do asyncio são criadas sob demanda, dentro do loop em execução.
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+            self._start_lock = asyncio.Lock()
+
+    def _browser_alive(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def start(self):
+        """
+        Inicia o Playwright e lança o navegador, se ainda não estiver rodando.
+        Também relança o navegador caso ele tenha caído (crash).
+        """
+        self._ensure_primitives()
+        if self._browser_alive():
+            return
+        async with self._start_lock:
+            if self._browser_alive():
+                return
+            if self._browser is not None:
+                logger.warning("Navegador do pool Mercury desconectado; relançando.")
+                self._restarts += 1
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            self._generation += 1
+            logger.info(f"Pool Mercury iniciado (tamanho={self.size}, max_usos={self.max_uses})")
+
+    async def stop(self):
+        """
+        Fecha todos os contextos, o navegador e o Playwright.
+        Chamado no encerramento da aplicação (lifespan).
+        """
+        for pooled in self._idle:
+            await self._close_context(pooled)
+        self._idle.clear()
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                logger.warning(f"Erro ao fechar navegador do pool Mercury: {e}")
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        # Um novo ciclo de vida (outro event loop) recria as primitivas.
+        self._slots = None
+        self._start_lock = None
+
+    async def _close_context(self, pooled: _PooledContext):
+        try:
+            await pooled.context.close()
+        except Exception:
+            pass # O contexto pode já estar morto junto com o navegador.
+
+    def _is_healthy(self, pooled: _PooledContext) -> bool:
+        return (
+            pooled.generation == self._generation
+            and pooled.uses < self.max_uses
+            and self._browser_alive()
+        )
+
+    async def _acquire_context(self) -> _PooledContext:
+        await self.start()
+        while self._idle:
+            pooled = self._idle.pop()
+            if self._is_healthy(pooled):
+                return pooled
+            self._recycled += 1
+            await self._close_context(pooled)
+        context = await self._browser.new_context()
+        self._created += 1
+        return _PooledContext(context, self._generation)
+
+    async def _release_context(self, pooled: _PooledContext, failed: bool):
+        pooled.uses += 1
+        if failed or not self._is_healthy(pooled):
+            self._recycled += 1
+            await self._close_context(pooled)
+            return
+        try:
+            # Um contexto devolvido não pode carregar a sessão de outro tenant.
+            await pooled.context.clear_cookies()
+        except Exception:
+            self._recycled += 1
+            await self._close_context(pooled)
+            return
+        self._idle.append(pooled)
+
+    @asynccontextmanager
+    async def context(self) -> AsyncIterator[Any]:
+        """
+        Empresta um contexto do navegador (sem cookies) pelo tempo do bloco `async with`.
+        Se o bloco lançar uma exceção, o contexto é descartado e substituído.
+        """
+        self._ensure_primitives()
+        async with self._slots:
+            pooled = await self._acquire_context()
+            self._borrowed += 1
+            failed = False
+            try:
+                yield pooled.context
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                self._borrowed -= 1
+                await self._release_context(pooled, failed)
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Any]:
+        """
+        Empresta um contexto e abre uma página nele; a página é fechada ao final do bloco.
+        """
+        async with self.context() as context:
+            page = await context.new_page()
+            try:
+                yield page
+            finally:
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retorna o estado atual do pool (para health checks e diagnóstico).
+        """
+        return {
+            "running": self._browser_alive(),
+            "size": self.size,
+            "max_uses": self.max_uses,
+            "in_use": self._borrowed,
+            "idle": len(self._idle),
+            "contexts_created": self._created,
+            "contexts_recycled": self._recycled,
+            "browser_restarts": self._restarts,
+        }
+
+
+browser_pool = BrowserPool()
@@ -0,0 +1,160 @@
+"""
+Gerenciador de sessões autenticadas no Portal Mercury, por tenant.
+
+Guarda os cookies obtidos no login (`epdv001.asp`) de cada tenant e os reaplica
+nos contextos emprestados do pool, evitando repetir o login a cada busca.
+A expiração é detectada pela presença do formulário de login na página retornada;
+só então o tenant é autenticado de novo, sob um lock exclusivo do tenant para que
+requisições concorrentes nunca façam login em paralelo.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from services.mercury_limiter import portal_limiter
+
+logger = logging.getLogger(__name__)
+
+# MERCURY_PORTAL_URL permite apontar o scraper para outro host (ex: um servidor local de testes).
+PORTAL_BASE_URL = os.getenv("MERCURY_PORTAL_URL", "https://portal.mercurymarine.com.br/epdv").rstrip("/")
+LOGIN_URL = f"{PORTAL_BASE_URL}/epdv001.asp"
+# Campos do formulário de login; se aparecerem numa página de dados, a sessão expirou.
+LOGIN_USER_FIELD = "input[name='sUsuar']"
+LOGIN_PASSWORD_FIELD = "input[name='sSenha']"
+
+
+def is_login_page(html: str) -> bool:
+    """
+    Indica se o HTML retornado pelo portal é o formulário de login (sessão expirada).
+    """
+    return 'name="sSenha"' in html or "name='sSenha'" in html or "name=sSenha" in html
+
+
+class _TenantSession:
+    """
+    Estado de login de um tenant: usuário usado, cookies e uma versão
+    incrementada a cada novo login (usada para evitar logins duplicados).
+    """
+    __slots__ = ("username", "cookies", "version")
+
+    def __init__(self, username: str, cookies: List[Dict[str, Any]], version: int):
+        self.username = username
+        self.cookies = cookies
+        self.version = version
+
+
+class MercurySessionManager:
+    """
+    Cache de sessões autenticadas do Portal Mercury, indexado por tenant.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[int, _TenantSession] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self.logins = 0 # Total de logins realizados (métrica).
+        self.reuses = 0 # Total de vezes em que a sessão em cache foi reaproveitada.
+
+    def _lock_for(self, tenant_id: int) -> asyncio.Lock:
+        lock = self._locks.get(tenant_id)
+        if lock is None:
+            lock = self._locks[tenant_id] = asyncio.Lock()
+        return lock
+
+    def _current(self, tenant_id: Optional[int], username: str) -> Optional[_TenantSession]:
+        if tenant_id is None:
+            return None
+        session = self._sessions.get(tenant_id)
+        # Se as credenciais do tenant mudaram, a sessão antiga não serve mais.
+        if session is None or session.username != username:
+            return None
+        return session
+
+    def get_cookies(self, tenant_id: int) -> List[Dict[str, Any]]:
+        """
+        Retorna os cookies da sessão em cache do tenant (lista vazia se não houver).
+        """
+        session = self._sessions.get(tenant_id)
+        return list(session.cookies) if session else []
+
+    def invalidate(self, tenant_id: int):
+        """
+        Descarta a sessão em cache de um tenant (ex: após troca de credenciais).
+        """
+        self._sessions.pop(tenant_id, None)
+
+    async def _login(self, page: Any, username: str, password: str) -> List[Dict[str, Any]]:
+        await portal_limiter.throttle()
+        await page.goto(LOGIN_URL)
+        await page.fill(LOGIN_USER_FIELD, username)
+        await page.fill(LOGIN_PASSWORD_FIELD, password)
+        await page.press(LOGIN_PASSWORD_FIELD, "Enter")
+        await page.wait_for_load_state()
+        self.logins += 1
+        state = await page.context.storage_state()
+        return state.get("cookies", [])
+
+    async def ensure_login(self, page: Any, tenant_id: Optional[int], username: str, password: str, stale_version: Optional[int] = None) -> int:
+        """
+        Garante que o contexto da página esteja autenticado para o tenant.
+
+        Reaplica os cookies em cache quando existirem; caso contrário (ou se a versão
+        em cache for a mesma que o chamador detectou como expirada), faz login sob o
+        lock do tenant. Retorna a versão da sessão aplicada.
+        """
+        if tenant_id is None:
+            # Sem tenant não há como compartilhar a sessão: login direto.
+            await self._login(page, username, password)
+            return 0
+
+        session = self._current(tenant_id, username)
+        if session is not None and session.version != stale_version:
+            await page.context.add_cookies(session.cookies)
+            self.reuses += 1
+            return session.version
+
+        async with self._lock_for(tenant_id):
+            # Outra requisição pode ter renovado a sessão enquanto esperávamos o lock.
+            session = self._current(tenant_id, username)
+            if session is not None and session.version != stale_version:
+                await page.context.add_cookies(session.cookies)
+                self.reuses += 1
+                return session.version
+
+            logger.info(f"Autenticando tenant {tenant_id} no Portal Mercury")
+            await page.context.clear_cookies()
+            cookies = await self._login(page, username, password)
+            version = (session.version if session else 0) + 1
+            self._sessions[tenant_id] = _TenantSession(username, cookies, version)
+            return version
+
+    async def goto(self, page: Any, url: str, tenant_id: Optional[int], username: str, password: str) -> str:
+        """
+        Navega até uma página autenticada do portal e retorna o HTML.
+        Se a página retornada for o formulário de login, re-autentica uma vez e repete a navegação.
+        """
+        version = await self.ensure_login(page, tenant_id, username, password)
+        await portal_limiter.throttle()
+        await page.goto(url)
+        await page.wait_for_load_state()
+        content = await page.content()
+        if not is_login_page(content):
+            return content
+
+        logger.info(f"Sessão Mercury expirada para o tenant {tenant_id}; renovando.")
+        await self.ensure_login(page, tenant_id, username, password, stale_version=version)
+        await portal_limiter.throttle()
+        await page.goto(url)
+        await page.wait_for_load_state()
+        return await page.content()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tenants": len(self._sessions),
+            "logins": self.logins,
+            "reuses": self.reuses,
+        }
+
+
+session_manager = MercurySessionManager()
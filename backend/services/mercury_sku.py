@@ -0,0 +1,126 @@
+"""
+Índice de SKUs Mercury normalizados, para casar as linhas do portal com as peças do catálogo.
+
+O portal e o catálogo nem sempre escrevem o mesmo número de peça: "35-8M0065104" no
+portal pode estar cadastrado como "8M0065104" ou "8M 0065104", e kits vêm com sufixo
+("92-858064K01"). Antes, cada SKU era procurado nas linhas com comparação de substring
+(`a in b or b in a`), uma varredura linear que podia escolher a linha errada.
+
+Cada SKU gera duas chaves:
+- chave normalizada: maiúsculas, sem traços, espaços ou pontuação ("35-8M0065104" -> "358M0065104");
+- número da peça: a normalizada sem o prefixo de categoria ("35-"), mantendo o sufixo de kit.
+
+A busca tenta a chave normalizada e depois o número da peça (ambas O(1) por dicionário).
+Só essas correspondências são aceitas: um kit ("858064K01") nunca casa com a peça avulsa
+("858064") nem com outro kit ("858064K02"), e números de peça a um dígito de distância
+("8M0065104" e "8M0065105") são peças diferentes. A chave base (sem o sufixo de kit) e a
+comparação aproximada ranqueada (`candidates`) servem apenas para sugerir códigos parecidos
+para revisão, nunca para gravar preços.
+"""
+
+import re
+from difflib import SequenceMatcher
+from typing import Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_NON_ALNUM = re.compile(r"[^0-9A-Z]")
+_CATEGORY_PREFIX = re.compile(r"^\d{1,3}\s*-\s*(?=[0-9A-Z])")
+_KIT_SUFFIX = re.compile(r"K\d{1,3}$")
+
+FUZZY_CUTOFF = 0.8 # Similaridade mínima (0 a 1) para sugerir uma correspondência aproximada.
+MIN_FUZZY_LENGTH = 5 # Chaves mais curtas que isso não recebem sugestões.
+
+
+def normalize_sku(sku: Optional[str]) -> str:
+    """
+    Chave normalizada do SKU: maiúsculas, apenas letras e dígitos.
+    """
+    return _NON_ALNUM.sub("", (sku or "").upper())
+
+
+def part_number(sku: Optional[str]) -> str:
+    """
+    Chave normalizada sem o prefixo de categoria ("35-8M0065104" -> "8M0065104").
+    """
+    return normalize_sku(_CATEGORY_PREFIX.sub("", (sku or "").strip().upper()))
+
+
+def base_sku(sku: Optional[str]) -> str:
+    """
+    Chave base do SKU: sem prefixo de categoria ("35-") e sem sufixo de kit ("K01").
+    """
+    key = part_number(sku)
+    stripped = _KIT_SUFFIX.sub("", key)
+    return stripped if len(stripped) >= MIN_FUZZY_LENGTH else key
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Similaridade entre duas chaves normalizadas. Uma contida na outra vale a proporção
+    de tamanho; caso contrário, a razão do `SequenceMatcher`.
+    """
+    if not a or not b:
+        return 0.0
+    short, long = sorted((a, b), key=len)
+    if short in long:
+        return len(short) / len(long)
+    return SequenceMatcher(None, a, b).ratio()
+
+
+class SkuIndex(Generic[T]):
+    """
+    Mapeia SKUs (pela chave normalizada e pelo número da peça) para valores: linhas do portal
+    ou ids de peças.
+    Quando dois SKUs têm a mesma chave, vale o primeiro adicionado.
+    """
+
+    def __init__(self, items: Iterable[Tuple[str, T]] = ()):
+        self._exact: Dict[str, T] = {}
+        self._parts: Dict[str, T] = {}
+        self._entries: List[Tuple[str, str, T]] = [] # (chave, chave base, valor) para a busca aproximada.
+        for sku, value in items:
+            self.add(sku, value)
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def add(self, sku: str, value: T):
+        key = normalize_sku(sku)
+        if not key or key in self._exact:
+            return
+        self._exact[key] = value
+        self._parts.setdefault(part_number(sku), value)
+        self._entries.append((key, base_sku(sku), value))
+
+    def get(self, sku: str) -> Optional[T]:
+        """
+        Busca exata: chave normalizada e, em seguida, número da peça (sem o prefixo de
+        categoria). O sufixo de kit faz parte das duas chaves.
+        """
+        key = normalize_sku(sku)
+        if not key:
+            return None
+        value = self._exact.get(key)
+        if value is None:
+            value = self._parts.get(part_number(sku))
+        return value
+
+    def candidates(self, sku: str, limit: int = 5, cutoff: float = FUZZY_CUTOFF) -> List[Tuple[float, str, T]]:
+        """
+        Sugestões aproximadas, da mais para a menos parecida: (similaridade, chave, valor).
+        Servem para revisão manual; não são correspondências (ver `get`).
+        """
+        key = normalize_sku(sku)
+        if len(key) < MIN_FUZZY_LENGTH:
+            return []
+        base = base_sku(sku)
+        ranked = []
+        for other, other_base, value in self._entries:
+            if len(other) < MIN_FUZZY_LENGTH:
+                continue
+            score = max(similarity(key, other), similarity(base, other_base))
+            if score >= cutoff:
+                ranked.append((score, other, value))
+        ranked.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+        return ranked[:limit]
@@ -0,0 +1,243 @@
+"""
+Sincronização em massa de preços do catálogo com o Portal Mercury.
+
+Um job recebe a lista de peças selecionadas pelo filtro, busca cada SKU no portal
+com concorrência limitada (todas as buscas usam a mesma sessão autenticada do tenant)
+e grava custo/preço em lotes, uma transação por lote. As linhas devolvidas por uma
+busca que correspondem a outras peças do job (mesmo número de peça, ver `mercury_sku`)
+são aproveitadas, e essas peças não são buscadas de novo. Só linhas com o mesmo número
+de peça têm o preço gravado; quando nenhuma casa, o resultado do SKU (`not_found`) traz os
+códigos parecidos como sugestões para revisão, sem gravá-los. Apenas as peças cujo valor
+mudou ganham uma linha no histórico de preços (`part_price_history`). O progresso
+e o resultado de cada SKU ficam disponíveis enquanto o job roda.
+
+Configuração (variáveis de ambiente):
+- MERCURY_SYNC_CONCURRENCY: buscas simultâneas por job (padrão: 3).
+- MERCURY_SYNC_BATCH_SIZE: peças gravadas por transação (padrão: 50).
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from services.mercury_parser import match_portal_row, parse_brl_currency, suggest_portal_rows
+from services.mercury_sku import part_number
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = int(os.getenv("MERCURY_SYNC_CONCURRENCY", "3"))
+MAX_CONCURRENCY = 10
+DEFAULT_BATCH_SIZE = int(os.getenv("MERCURY_SYNC_BATCH_SIZE", "50"))
+
+# Função que busca um SKU no portal e devolve as linhas encontradas.
+SearchFn = Callable[[str], Awaitable[List[Dict[str, str]]]]
+
+
+class PriceSyncJob:
+    """
+    Estado de um job de sincronização de preços (progresso e resultado por SKU).
+    """
+
+    def __init__(self, tenant_id: int, parts: List[Tuple[int, str]], concurrency: int, batch_size: int):
+        self.id = uuid.uuid4().hex
+        self.tenant_id = tenant_id
+        self.parts = parts # Lista de (part_id, sku).
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.status = "pending" # pending, running, completed, failed
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.processed = 0
+        self.counts = {"updated": 0, "not_found": 0, "error": 0}
+        self.changed = 0 # Peças cujo custo/preço de fato mudou (gravadas no histórico).
+        self.searches = 0 # Buscas feitas no portal.
+        self.reused = 0 # Peças resolvidas com o resultado da busca de outra peça.
+        self.results: List[Dict[str, Any]] = []
+
+    def to_dict(self, include_results: bool = True) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "total": len(self.parts),
+            "processed": self.processed,
+            "updated": self.counts["updated"],
+            "changed": self.changed,
+            "not_found": self.counts["not_found"],
+            "errors": self.counts["error"],
+            "searches": self.searches,
+            "reused": self.reused,
+            "concurrency": self.concurrency,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if include_results:
+            data["results"] = self.results
+        return data
+
+
+class PriceSyncJobStore:
+    """
+    Registro em memória dos jobs de sincronização, por tenant (mantém os últimos N).
+    `job_class` permite reaproveitar o registro para outros jobs em lote do portal.
+    """
+
+    def __init__(self, max_jobs: int = 50, job_class: type = PriceSyncJob):
+        self.max_jobs = max_jobs
+        self.job_class = job_class
+        self._jobs: "OrderedDict[str, PriceSyncJob]" = OrderedDict()
+
+    def create(self, tenant_id: int, parts: List[Tuple[int, str]], concurrency: Optional[int] = None, batch_size: Optional[int] = None) -> PriceSyncJob:
+        concurrency = max(1, min(concurrency or DEFAULT_CONCURRENCY, MAX_CONCURRENCY))
+        job = self.job_class(tenant_id, parts, concurrency, batch_size or DEFAULT_BATCH_SIZE)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str, tenant_id: int) -> Optional[PriceSyncJob]:
+        job = self._jobs.get(job_id)
+        if job is None or job.tenant_id != tenant_id:
+            return None
+        return job
+
+    def list(self, tenant_id: int) -> List[PriceSyncJob]:
+        return [job for job in reversed(self._jobs.values()) if job.tenant_id == tenant_id]
+
+    def running(self, tenant_id: int) -> Optional[PriceSyncJob]:
+        """
+        Retorna o job do tenant que ainda está pendente ou em execução, se houver.
+        """
+        for job in self.list(tenant_id):
+            if job.status in ("pending", "running"):
+                return job
+        return None
+
+
+def select_parts_for_sync(db: Session, tenant_id: int, manufacturer: Optional[str] = "Mercury", updated_before: Optional[datetime] = None, part_ids: Optional[List[int]] = None) -> List[Tuple[int, str]]:
+    """
+    Seleciona (id, sku) das peças do tenant a sincronizar:
+    fabricante (sem diferenciar maiúsculas) e preço atualizado antes de `updated_before` (ou nunca).
+    """
+    query = db.query(models.Part.id, models.Part.sku).filter(models.Part.tenant_id == tenant_id)
+    if manufacturer:
+        query = query.filter(models.Part.manufacturer.ilike(manufacturer))
+    if updated_before:
+        query = query.filter(
+            (models.Part.last_price_updated_at.is_(None)) | (models.Part.last_price_updated_at < updated_before)
+        )
+    if part_ids:
+        query = query.filter(models.Part.id.in_(part_ids))
+    return [(part_id, sku) for part_id, sku in query.order_by(models.Part.id).all() if sku]
+
+
+def _write_batch(session_factory: Callable[[], Session], updates: List[Dict[str, Any]]) -> int:
+    # Um único UPDATE em lote (executemany) por transação, mais o histórico apenas
+    # das peças cujo custo/preço realmente mudou. Retorna quantas mudaram.
+    db = session_factory()
+    try:
+        current = {
+            part_id: (tenant_id, cost, price)
+            for part_id, tenant_id, cost, price in db.query(
+                models.Part.id, models.Part.tenant_id, models.Part.cost, models.Part.price
+            ).filter(models.Part.id.in_([u["id"] for u in updates]))
+        }
+        history = []
+        for update in updates:
+            tenant_id, cost, price = current.get(update["id"], (None, None, None))
+            if tenant_id is not None and (crud.price_changed(cost, update["cost"]) or crud.price_changed(price, update["price"])):
+                history.append(crud.build_price_history(
+                    tenant_id, update["id"], update["cost"], update["price"], "mercury", update["last_price_updated_at"]
+                ))
+        db.bulk_update_mappings(models.Part, updates)
+        db.add_all(history)
+        db.commit()
+        return len(history)
+    finally:
+        db.close()
+
+
+async def run_price_sync(job: PriceSyncJob, search: SearchFn, session_factory: Callable[[], Session]):
+    """
+    Executa o job: busca os SKUs com concorrência limitada e grava os preços em lotes.
+    """
+    job.status = "running"
+    job.started_at = datetime.utcnow()
+    semaphore = asyncio.Semaphore(job.concurrency)
+    pending: List[Dict[str, Any]] = []
+
+    async def flush():
+        if not pending:
+            return
+        batch = list(pending)
+        pending.clear()
+        job.changed += await asyncio.to_thread(_write_batch, session_factory, batch)
+
+    # Número de peça -> peças do job, para casar cada linha devolvida pelo portal em O(1).
+    catalog: Dict[str, List[int]] = {}
+    for part_id, sku in job.parts:
+        catalog.setdefault(part_number(sku), []).append(part_id)
+    prefetched: Dict[int, Dict[str, str]] = {}
+
+    async def sync_one(part_id: int, sku: str):
+        async with semaphore:
+            if part_id in prefetched:
+                job.reused += 1
+                return part_id, sku, prefetched[part_id], [], None
+            try:
+                results = await search(sku)
+            except Exception as e:
+                return part_id, sku, None, [], str(e)
+            job.searches += 1
+        for row in results:
+            for other_id in catalog.get(part_number(row.get('codigo', '')), ()):
+                prefetched.setdefault(other_id, row)
+        matched = match_portal_row(results, sku)
+        # Sem correspondência exata, os códigos parecidos vão para revisão (não são gravados).
+        return part_id, sku, matched, [] if matched else suggest_portal_rows(results, sku), None
+
+    tasks = [asyncio.create_task(sync_one(part_id, sku)) for part_id, sku in job.parts]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            part_id, sku, matched, suggestions, error = await next_done
+            job.processed += 1
+            if error is not None:
+                job.counts["error"] += 1
+                job.results.append({"part_id": part_id, "sku": sku, "status": "error", "error": error})
+                continue
+            if matched is None:
+                job.counts["not_found"] += 1
+                job.results.append({"part_id": part_id, "sku": sku, "status": "not_found", "suggestions": suggestions})
+                continue
+
+            cost = parse_brl_currency(matched.get('valorCusto', '0'))
+            price = parse_brl_currency(matched.get('valorVenda', '0'))
+            pending.append({"id": part_id, "cost": cost, "price": price, "last_price_updated_at": datetime.utcnow()})
+            job.counts["updated"] += 1
+            job.results.append({"part_id": part_id, "sku": sku, "status": "updated", "new_cost": cost, "new_price": price})
+            if len(pending) >= job.batch_size:
+                await flush()
+        await flush()
+        job.status = "completed"
+    except Exception as e:
+        logger.exception(f"Falha no job de sincronização {job.id}")
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        for task in tasks:
+            task.cancel() # Sem efeito nas já concluídas; interrompe o restante se o job falhar.
+        job.finished_at = datetime.utcnow()
+
+
+price_sync_jobs = PriceSyncJobStore()
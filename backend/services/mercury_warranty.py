@@ -0,0 +1,195 @@
+"""
+Atualização em lote dos dados de garantia dos motores cadastrados (Portal Mercury).
+
+Um job percorre os motores do tenant (`Engine.serial_number`), consulta a garantia de
+cada número de série com concorrência limitada, sobre a mesma sessão autenticada do
+tenant, e grava status, validade e data de venda em lotes. Só a página de resumo
+(`ewr010.asp`) é carregada; o nome do cliente não é usado aqui.
+
+Cada motor verificado recebe `warranty_checked_at`, e motores verificados dentro da
+janela configurada são pulados. Assim o job é retomável: se for interrompido, basta
+iniciá-lo de novo para continuar dos motores que ainda não foram gravados.
+
+Configuração (variáveis de ambiente):
+- MERCURY_WARRANTY_REFRESH_AFTER: idade mínima, em segundos, da última verificação
+  para o motor entrar no job (padrão: 604800, 7 dias).
+- MERCURY_WARRANTY_REFRESH_INTERVAL: intervalo, em segundos, do agendamento automático
+  para todos os tenants (padrão: 0 = desativado).
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+from services.mercury_sync import PriceSyncJob, PriceSyncJobStore
+
+logger = logging.getLogger(__name__)
+
+REFRESH_AFTER = float(os.getenv("MERCURY_WARRANTY_REFRESH_AFTER", "604800"))
+
+# Função que consulta um número de série e devolve o resumo da garantia (ou None).
+FetchFn = Callable[[str], Awaitable[Optional[Dict[str, str]]]]
+
+# Campos do resumo de garantia do portal -> colunas de Engine.
+WARRANTY_FIELDS = {
+    "status_garantia": "warranty_status",
+    "vld_garantia": "warranty_validity",
+    "dt_venda": "sale_date",
+}
+
+
+class WarrantyRefreshJob(PriceSyncJob):
+    """
+    Estado de um job de atualização de garantias. `parts` contém (engine_id, serial_number).
+    """
+
+
+def select_engines_for_refresh(db: Session, tenant_id: int, checked_before: Optional[datetime] = None, engine_ids: Optional[List[int]] = None) -> List[Tuple[int, str]]:
+    """
+    Seleciona (id, serial_number) dos motores do tenant cuja garantia não foi verificada
+    desde `checked_before` (ou nunca).
+    """
+    query = db.query(models.Engine.id, models.Engine.serial_number).filter(models.Engine.tenant_id == tenant_id)
+    if checked_before:
+        query = query.filter(
+            (models.Engine.warranty_checked_at.is_(None)) | (models.Engine.warranty_checked_at < checked_before)
+        )
+    if engine_ids:
+        query = query.filter(models.Engine.id.in_(engine_ids))
+    return [(engine_id, serial.strip()) for engine_id, serial in query.order_by(models.Engine.id).all() if serial and serial.strip()]
+
+
+def default_checked_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=REFRESH_AFTER)
+
+
+def _write_batch(session_factory: Callable[[], Session], updates: List[Dict[str, Any]]) -> int:
+    # Um UPDATE em lote por transação. Retorna quantos motores tiveram a garantia alterada.
+    db = session_factory()
+    try:
+        columns = list(WARRANTY_FIELDS.values())
+        current = {
+            row[0]: row[1:]
+            for row in db.query(models.Engine.id, *[getattr(models.Engine, c) for c in columns])
+            .filter(models.Engine.id.in_([u["id"] for u in updates]))
+        }
+        changed = sum(
+            1 for u in updates
+            if "warranty_status" in u and current.get(u["id"]) != tuple(u[c] for c in columns)
+        )
+        db.bulk_update_mappings(models.Engine, updates)
+        db.commit()
+        return changed
+    finally:
+        db.close()
+
+
+async def run_warranty_refresh(job: WarrantyRefreshJob, fetch: FetchFn, session_factory: Callable[[], Session]):
+    """
+    Executa o job: consulta cada número de série uma vez (motores com o mesmo serial
+    compartilham o resultado) e grava os dados de garantia em lotes.
+    """
+    job.status = "running"
+    job.started_at = datetime.utcnow()
+    semaphore = asyncio.Semaphore(job.concurrency)
+    pending: List[Dict[str, Any]] = []
+
+    serials: Dict[str, List[int]] = {}
+    for engine_id, serial in job.parts:
+        serials.setdefault(serial.upper(), []).append(engine_id)
+
+    async def flush():
+        if not pending:
+            return
+        batch = list(pending)
+        pending.clear()
+        job.changed += await asyncio.to_thread(_write_batch, session_factory, batch)
+
+    async def refresh_one(serial: str, engine_ids: List[int]):
+        async with semaphore:
+            job.searches += 1
+            job.reused += len(engine_ids) - 1
+            try:
+                return serial, engine_ids, await fetch(serial), None
+            except Exception as e:
+                return serial, engine_ids, None, str(e)
+
+    tasks = [asyncio.create_task(refresh_one(serial, ids)) for serial, ids in serials.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            serial, engine_ids, summary, error = await next_done
+            checked_at = datetime.utcnow()
+            for engine_id in engine_ids:
+                job.processed += 1
+                if error is not None:
+                    # Não marca como verificado: o motor entra de novo na próxima execução.
+                    job.counts["error"] += 1
+                    job.results.append({"engine_id": engine_id, "serial": serial, "status": "error", "error": error})
+                elif summary is None:
+                    job.counts["not_found"] += 1
+                    job.results.append({"engine_id": engine_id, "serial": serial, "status": "not_found"})
+                    pending.append({"id": engine_id, "warranty_checked_at": checked_at})
+                else:
+                    values = {column: summary.get(field, "") for field, column in WARRANTY_FIELDS.items()}
+                    job.counts["updated"] += 1
+                    job.results.append({"engine_id": engine_id, "serial": serial, "status": "updated", **values})
+                    pending.append({"id": engine_id, "warranty_checked_at": checked_at, **values})
+            if len(pending) >= job.batch_size:
+                await flush()
+        await flush()
+        job.status = "completed"
+    except Exception as e:
+        logger.exception(f"Falha no job de garantias {job.id}")
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        for task in tasks:
+            task.cancel()
+        job.finished_at = datetime.utcnow()
+
+
+class WarrantyRefreshScheduler:
+    """
+    Agenda a atualização periódica de garantias de todos os tenants (tarefa asyncio do servidor).
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval if interval is not None else float(os.getenv("MERCURY_WARRANTY_REFRESH_INTERVAL", "0"))
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+
+    def start(self, refresh_all: Callable[[], Awaitable[Any]]):
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop(refresh_all))
+
+    async def _loop(self, refresh_all: Callable[[], Awaitable[Any]]):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.last_run = datetime.utcnow()
+            try:
+                await refresh_all()
+            except Exception:
+                logger.exception("Falha na atualização agendada de garantias")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.interval > 0, "interval": self.interval, "running": self._task is not None, "last_run": self.last_run}
+
+
+warranty_refresh_jobs = PriceSyncJobStore(job_class=WarrantyRefreshJob)
+warranty_scheduler = WarrantyRefreshScheduler()
@@ -0,0 +1,292 @@
+"""
+Construção do XML da NF-e (layout 4.00) com lxml.
+
+Substitui a f-string do `FiscalService`, que repetia dezenas de
+`invoice_data.get('issuer', {}).get('address', {})...`, não escapava textos (um "&" no
+nome do cliente gerava XML inválido) e emitia sempre um único `<det>`, fosse qual fosse
+a quantidade de itens.
+
+O bloco `<emit>` depende só dos dados da empresa, então é montado uma vez por tenant e
+reaproveitado (cópia do elemento em cache); a cache é refeita quando os dados do
+emitente mudam. Cada item gera um `<det>` copiado de um modelo pronto (produto + grupo
+`<imposto>`, igual para todos os itens no Simples Nacional), preenchendo só os campos
+variáveis: copiar a subárvore em C custa cerca de um terço de criar os ~30 elementos.
+Comparativo em `benchmarks/bench_nfe_builder.py`.
+"""
+
+import copy
+import re
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from lxml import etree
+
+NFE_NAMESPACE = "http://www.portalfiscal.inf.br/nfe"
+NFE_VERSION = "4.00"
+DEFAULT_ACCESS_KEY = "0" * 44
+DEFAULT_CMUN = "4118204" # Paranaguá/PR (código IBGE)
+DEFAULT_CUF = "41"
+BRT = timezone(timedelta(hours=-3))
+
+_NON_DIGITS = re.compile(r"\D")
+_TAGS: Dict[str, str] = {}
+
+
+def _q(tag: str) -> str:
+    # Nome qualificado no namespace da NF-e ({ns}tag), memorizado.
+    name = _TAGS.get(tag)
+    if name is None:
+        name = _TAGS[tag] = f"{{{NFE_NAMESPACE}}}{tag}"
+    return name
+
+
+def _sub(parent: etree._Element, tag: str, text: Any = None) -> etree._Element:
+    element = etree.SubElement(parent, _q(tag))
+    if text is not None:
+        element.text = str(text)
+    return element
+
+
+def _digits(value: Optional[str]) -> str:
+    return _NON_DIGITS.sub("", value or "")
+
+
+def _money(value: Any) -> str:
+    return f"{float(value or 0):.2f}"
+
+
+def _quantity(value: Any) -> str:
+    return f"{float(value or 0):.4f}"
+
+
+def _build_imposto_template() -> etree._Element:
+    # Tributação padrão do Simples Nacional (CSOSN 102, PIS/COFINS 99 zerados).
+    imposto = etree.Element(_q("imposto"), nsmap={None: NFE_NAMESPACE})
+    _sub(imposto, "vTotTrib", "0.00")
+    icms = _sub(_sub(imposto, "ICMS"), "ICMSSN102")
+    _sub(icms, "orig", "0")
+    _sub(icms, "CSOSN", "102")
+    for group, rate, value in (("PIS", "pPIS", "vPIS"), ("COFINS", "pCOFINS", "vCOFINS")):
+        outr = _sub(_sub(imposto, group), f"{group}Outr")
+        _sub(outr, "CST", "99")
+        _sub(outr, "vBC", "0.00")
+        _sub(outr, rate, "0.00")
+        _sub(outr, value, "0.00")
+    return imposto
+
+
+_PROD_FIELDS = (
+    "cProd", "cEAN", "xProd", "NCM", "CFOP", "uCom", "qCom", "vUnCom", "vProd",
+    "cEANTrib", "uTrib", "qTrib", "vUnTrib", "indTot",
+)
+_PROD_DEFAULTS = {"cEAN": "SEM GTIN", "cEANTrib": "SEM GTIN", "uCom": "UN", "uTrib": "UN", "indTot": "1"}
+# Posição de cada campo variável dentro de <prod> no modelo.
+(_C_PROD, _X_PROD, _NCM, _CFOP, _Q_COM, _V_UN_COM, _V_PROD, _Q_TRIB, _V_UN_TRIB) = (
+    _PROD_FIELDS.index(field)
+    for field in ("cProd", "xProd", "NCM", "CFOP", "qCom", "vUnCom", "vProd", "qTrib", "vUnTrib")
+)
+
+
+def _build_det_template() -> etree._Element:
+    det = etree.Element(_q("det"), nsmap={None: NFE_NAMESPACE})
+    prod = _sub(det, "prod")
+    for field in _PROD_FIELDS:
+        _sub(prod, field, _PROD_DEFAULTS.get(field, ""))
+    det.append(_build_imposto_template())
+    return det
+
+
+_DET_TEMPLATE = _build_det_template()
+
+_ZERO_TOTALS = (
+    "vBC", "vICMS", "vICMSDeson", "vFCP", "vBCST", "vST", "vFCPST", "vFCPSTRet",
+)
+_ZERO_TOTALS_AFTER_PROD = (
+    "vFrete", "vSeg", "vDesc", "vII", "vIPI", "vIPIDevol", "vPIS", "vCOFINS", "vOutro",
+)
+
+
+def issuer_fingerprint(issuer: Dict[str, Any]) -> Tuple:
+    """
+    Campos do emitente que entram no `<emit>`; se mudarem, a cache do tenant é refeita.
+    """
+    address = issuer.get("address") or {}
+    return (
+        issuer.get("cnpj"), issuer.get("companyName"), issuer.get("tradeName"), issuer.get("ie"), issuer.get("crt"),
+        address.get("street"), address.get("number"), address.get("neighborhood"),
+        address.get("city"), address.get("state"), address.get("zip"),
+    )
+
+
+class EmitCache:
+    """
+    Cache dos elementos `<emit>` já montados, por tenant (ou pelos dados do emitente).
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[Tuple, etree._Element]] = {}
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0}
+
+    def get(self, key: Hashable, issuer: Dict[str, Any]) -> etree._Element:
+        fingerprint = issuer_fingerprint(issuer)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self.metrics["hits"] += 1
+                return entry[1]
+            self.metrics["misses"] += 1
+        emit = build_emit(issuer)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (fingerprint, emit)
+        return emit
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics, "entries": len(self._entries)}
+
+
+def build_emit(issuer: Dict[str, Any]) -> etree._Element:
+    """
+    Monta o grupo `<emit>` a partir dos dados do emitente (mesmo formato de `FiscalEntity`).
+    """
+    address = issuer.get("address") or {}
+    emit = etree.Element(_q("emit"), nsmap={None: NFE_NAMESPACE})
+    _sub(emit, "CNPJ", _digits(issuer.get("cnpj")))
+    _sub(emit, "xNome", issuer.get("companyName") or "")
+    if issuer.get("tradeName"):
+        _sub(emit, "xFant", issuer["tradeName"])
+    ender = _sub(emit, "enderEmit")
+    _sub(ender, "xLgr", address.get("street") or "")
+    _sub(ender, "nro", address.get("number") or "")
+    _sub(ender, "xBairro", address.get("neighborhood") or "")
+    _sub(ender, "cMun", DEFAULT_CMUN)
+    _sub(ender, "xMun", address.get("city") or "")
+    _sub(ender, "UF", address.get("state") or "")
+    _sub(ender, "CEP", _digits(address.get("zip")))
+    _sub(ender, "cPais", "1058")
+    _sub(ender, "xPais", "BRASIL")
+    _sub(emit, "IE", _digits(issuer.get("ie")))
+    _sub(emit, "CRT", issuer.get("crt") or "1")
+    return emit
+
+
+class NFeBuilder:
+    """
+    Gera o XML de uma NF-e 4.00 a partir do dicionário da `InvoiceRequest`.
+    """
+
+    def __init__(self, environment: str = "homologation", emit_cache: Optional[EmitCache] = None):
+        self.environment = environment
+        self.emit_cache = emit_cache or EmitCache()
+
+    def build(self, invoice_data: Dict[str, Any]) -> str:
+        root = self.build_tree(invoice_data)
+        return etree.tostring(root, encoding="unicode")
+
+    def build_tree(self, invoice_data: Dict[str, Any]) -> etree._Element:
+        issuer = invoice_data.get("issuer") or {}
+        items = self._items(invoice_data)
+
+        nfe = etree.Element(_q("NFe"), nsmap={None: NFE_NAMESPACE})
+        inf = _sub(nfe, "infNFe")
+        inf.set("Id", f"NFe{invoice_data.get('access_key') or DEFAULT_ACCESS_KEY}")
+        inf.set("versao", NFE_VERSION)
+
+        self._ide(inf, invoice_data)
+        # O <emit> em cache é compartilhado; cada nota recebe uma cópia.
+        cache_key = invoice_data.get("tenant_id") or issuer_fingerprint(issuer)
+        inf.append(copy.deepcopy(self.emit_cache.get(cache_key, issuer)))
+        self._dest(inf, invoice_data.get("recipient") or {})
+
+        products_total = 0.0
+        for number, item in enumerate(items, start=1):
+            products_total += self._det(inf, number, item)
+
+        self._total(inf, products_total, invoice_data.get("totalValue") or products_total)
+        _sub(_sub(inf, "transp"), "modFrete", "9")
+        return nfe
+
+    def _items(self, invoice_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        items = invoice_data.get("items") or []
+        if items:
+            return items
+        # Sem itens (ex.: nota de serviço), um item único com o valor total.
+        total = invoice_data.get("totalValue") or 0
+        description = invoice_data.get("naturezaOperacao") or "Venda de Mercadoria"
+        return [{"code": "001", "desc": description, "qty": 1, "price": total, "total": total}]
+
+    def _ide(self, inf: etree._Element, invoice_data: Dict[str, Any]):
+        number = str(invoice_data.get("number") or "")
+        ide = _sub(inf, "ide")
+        _sub(ide, "cUF", DEFAULT_CUF)
+        _sub(ide, "cNF", number)
+        _sub(ide, "natOp", invoice_data.get("naturezaOperacao") or "Venda de Mercadoria")
+        _sub(ide, "mod", "55")
+        _sub(ide, "serie", invoice_data.get("series") or "1")
+        _sub(ide, "nNF", number)
+        _sub(ide, "dhEmi", datetime.now(BRT).isoformat(timespec="seconds"))
+        _sub(ide, "tpNF", "1")
+        _sub(ide, "idDest", "1")
+        _sub(ide, "cMunFG", DEFAULT_CMUN)
+        _sub(ide, "tpImp", "1")
+        _sub(ide, "tpEmis", "1")
+        _sub(ide, "cDV", "0")
+        _sub(ide, "tpAmb", "2" if self.environment == "homologation" else "1")
+        _sub(ide, "finNFe", "1")
+        _sub(ide, "indFinal", "1")
+        _sub(ide, "indPres", "1")
+        _sub(ide, "procEmi", "0")
+        _sub(ide, "verProc", "MareAlta 1.0")
+
+    def _dest(self, inf: etree._Element, recipient: Dict[str, Any]):
+        dest = _sub(inf, "dest")
+        document = _digits(recipient.get("cnpj") or recipient.get("doc"))
+        _sub(dest, "CPF" if len(document) == 11 else "CNPJ", document)
+        _sub(dest, "xNome", recipient.get("name") or recipient.get("companyName") or "")
+        address = recipient.get("address")
+        if address:
+            ender = _sub(dest, "enderDest")
+            _sub(ender, "xLgr", address.get("street") or "")
+            _sub(ender, "nro", address.get("number") or "")
+            _sub(ender, "xBairro", address.get("neighborhood") or "")
+            _sub(ender, "cMun", DEFAULT_CMUN)
+            _sub(ender, "xMun", address.get("city") or "")
+            _sub(ender, "UF", address.get("state") or "")
+            _sub(ender, "CEP", _digits(address.get("zip")))
+            _sub(ender, "cPais", "1058")
+            _sub(ender, "xPais", "BRASIL")
+        _sub(dest, "indIEDest", "9")
+
+    def _det(self, inf: etree._Element, number: int, item: Dict[str, Any]) -> float:
+        total = float(item.get("total") or 0)
+        quantity = _quantity(item.get("qty"))
+        unit_price = _money(item.get("price"))
+        det = copy.deepcopy(_DET_TEMPLATE)
+        det.set("nItem", str(number))
+        prod = det[0]
+        prod[_C_PROD].text = item.get("code") or str(number)
+        prod[_X_PROD].text = item.get("desc") or ""
+        prod[_NCM].text = item.get("ncm") or "00000000"
+        prod[_CFOP].text = item.get("cfop") or "5102"
+        prod[_Q_COM].text = prod[_Q_TRIB].text = quantity
+        prod[_V_UN_COM].text = prod[_V_UN_TRIB].text = unit_price
+        prod[_V_PROD].text = _money(total)
+        inf.append(det)
+        return total
+
+    def _total(self, inf: etree._Element, products_total: float, invoice_total: float):
+        icms_tot = _sub(_sub(inf, "total"), "ICMSTot")
+        for tag in _ZERO_TOTALS:
+            _sub(icms_tot, tag, "0.00")
+        _sub(icms_tot, "vProd", _money(products_total))
+        for tag in _ZERO_TOTALS_AFTER_PROD:
+            _sub(icms_tot, tag, "0.00")
+        _sub(icms_tot, "vNF", _money(invoice_total))
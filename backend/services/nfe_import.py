@@ -0,0 +1,153 @@
+"""
+Leitura de XMLs de NF-e de fornecedores (notas de entrada) para importação no estoque.
+
+Substitui o `DOMParser` do `InventoryView.tsx`, que lia o XML inteiro no navegador e
+depois enviava os itens um a um. Aqui os arquivos (um ou vários XMLs, ou um .zip com
+eles) são lidos em streaming com `iterparse`: cada `<det>` é convertido em item e
+descartado em seguida, então uma nota de distribuidor com centenas de itens não vira
+uma árvore inteira em memória. A gravação (notas, movimentos e estoque) fica em
+`crud.import_supplier_invoices`, numa única transação.
+
+Aceita tanto a NF-e pura (`<NFe>`) quanto a distribuída com protocolo (`<nfeProc>`).
+"""
+
+import zipfile
+from datetime import datetime
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+from services.nfe_builder import NFE_NAMESPACE
+
+MAX_DOCUMENTS = 500  # Notas por importação (somando os XMLs de todos os arquivos e zips).
+
+_NS = f"{{{NFE_NAMESPACE}}}"
+_TAGS = tuple(f"{_NS}{tag}" for tag in ("ide", "emit", "det", "ICMSTot", "infNFe", "chNFe"))
+
+
+class TooManyDocuments(ValueError):
+    """
+    A importação passou de `MAX_DOCUMENTS` notas.
+    """
+
+
+def _text(element: etree._Element, tag: str) -> str:
+    return (element.findtext(f"{_NS}{tag}") or "").strip()
+
+
+def _float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def _issue_date(ide: etree._Element) -> Optional[datetime]:
+    # dhEmi (layout 3.10/4.00, com fuso) ou dEmi (layout 2.00, só a data).
+    value = _text(ide, "dhEmi") or _text(ide, "dEmi")
+    if not value:
+        return None
+    try:
+        # Guarda o horário local da emissão, sem fuso (como as demais datas do banco).
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _barcode(value: str) -> Optional[str]:
+    # O layout usa "SEM GTIN" quando o produto não tem código de barras.
+    return value if value and value.upper() != "SEM GTIN" else None
+
+
+def parse_nfe(source: IO[bytes]) -> Dict[str, Any]:
+    """
+    Lê uma NF-e em streaming e devolve os dados da nota e dos itens.
+    Levanta `ValueError` se o arquivo não for uma NF-e.
+    """
+    document: Dict[str, Any] = {"items": []}
+    found = False
+    context = etree.iterparse(
+        source, events=("end",), tag=_TAGS, resolve_entities=False, no_network=True, remove_comments=True,
+    )
+    for _, element in context:
+        tag = element.tag[len(_NS):]
+        if tag == "det":
+            prod = element.find(f"{_NS}prod")
+            if prod is not None:
+                quantity = _float(_text(prod, "qCom"))
+                unit_cost = _float(_text(prod, "vUnCom"))
+                document["items"].append({
+                    "line": int(element.get("nItem") or len(document["items"]) + 1),
+                    "sku": _text(prod, "cProd"),
+                    "barcode": _barcode(_text(prod, "cEAN")),
+                    "name": _text(prod, "xProd"),
+                    "quantity": quantity,
+                    "unit_cost": unit_cost,
+                    "total": _float(_text(prod, "vProd")) or round(quantity * unit_cost, 2),
+                })
+        elif tag == "ide":
+            document["number"] = _text(element, "nNF")
+            document["series"] = _text(element, "serie")
+            document["date"] = _issue_date(element)
+        elif tag == "emit":
+            document["supplier"] = _text(element, "xNome")
+            document["supplier_document"] = _text(element, "CNPJ") or _text(element, "CPF")
+        elif tag == "ICMSTot":
+            document["total_value"] = _float(_text(element, "vNF"))
+        elif tag == "infNFe":
+            found = True
+            document.setdefault("access_key", (element.get("Id") or "").replace("NFe", "", 1) or None)
+        elif tag == "chNFe":
+            # Chave do protocolo de autorização (nfeProc), a oficial.
+            document["access_key"] = (element.text or "").strip() or None
+        # Libera o que já foi lido: o elemento e os irmãos anteriores.
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    if not found:
+        raise ValueError("O arquivo não contém uma NF-e (<infNFe>).")
+    if not document.get("number") or not document.get("supplier"):
+        raise ValueError("NF-e sem número (nNF) ou sem emitente (xNome).")
+    document.setdefault("total_value", round(sum(item["total"] for item in document["items"]), 2))
+    return document
+
+
+def iter_sources(filename: str, fileobj: IO[bytes]) -> Iterator[Tuple[str, IO[bytes]]]:
+    """
+    Um XML, ou cada XML dentro de um .zip (lidos sob demanda, sem extrair o zip inteiro).
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(".xml"):
+                    with archive.open(info) as member:
+                        yield f"{filename}/{info.filename}", member
+    else:
+        fileobj.seek(0)
+        yield filename, fileobj
+
+
+def read_documents(files: Iterable[Tuple[str, IO[bytes]]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Lê todos os arquivos enviados. Retorna (notas lidas, erros por arquivo); um arquivo
+    inválido não impede a importação dos demais. Levanta `TooManyDocuments`.
+    """
+    documents: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    for filename, fileobj in files:
+        try:
+            for name, source in iter_sources(filename, fileobj):
+                if len(documents) + len(errors) >= MAX_DOCUMENTS:
+                    raise TooManyDocuments(f"Máximo de {MAX_DOCUMENTS} notas por importação.")
+                try:
+                    document = parse_nfe(source)
+                except (ValueError, etree.XMLSyntaxError) as e:
+                    errors.append({"file": name, "status": "error", "error": str(e)})
+                    continue
+                document["file"] = name
+                documents.append(document)
+        except zipfile.BadZipFile as e:
+            errors.append({"file": filename, "status": "error", "error": f"Arquivo zip inválido: {e}"})
+    return documents, errors
@@ -0,0 +1,41 @@
+"""
+Coalescência de requisições idênticas em andamento ("single-flight").
+
+Chamadas concorrentes com a mesma chave aguardam uma única execução compartilhada
+e recebem o mesmo resultado (ou a mesma exceção). A execução roda em uma task
+própria, então o cancelamento de um dos chamadores não interrompe os demais.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Agrupa chamadas concorrentes por chave, executando a função apenas uma vez.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self.executions = 0 # Execuções reais da função.
+        self.shared = 0 # Chamadas atendidas por uma execução já em andamento.
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda _task: self._forget(key, _task))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: "asyncio.Task[Any]"):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception() # Marca a exceção como consumida, mesmo sem chamadores restantes.
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._inflight), "executions": self.executions, "shared": self.shared}
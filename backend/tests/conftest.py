@@ -1,13 +1,19 @@
 """
 Pytest configuration and fixtures for backend tests
 """
+import os
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 from typing import Generator
 
+# A retomada da fila fiscal no startup rodaria em paralelo aos testes, na mesma conexão
+# do banco em memória; os testes da fila a executam explicitamente.
+os.environ["FISCAL_QUEUE_AUTOSTART"] = "0"
+
 from database import Base, get_db as database_get_db
 from main import app
 from dependencies import get_db as dependencies_get_db
@@ -139,3 +145,71 @@ def reset_dependency_overrides():
     """Reset dependency overrides after each test"""
     yield
     app.dependency_overrides.clear()
+
+
+class SQLCounter:
+    """Record the SQL statements run on the test engine inside a `with` block"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def selects(self) -> list:
+        return [(s, p) for s, p in self.statements if s.lstrip().upper().startswith("SELECT")]
+
+    def rows(self) -> int:
+        """Rows returned by the recorded SELECTs (re-run as COUNT(*) after the block)"""
+        with self.engine.connect() as connection:
+            return sum(
+                connection.exec_driver_sql(f"SELECT COUNT(*) FROM ({statement})", parameters).scalar()
+                for statement, parameters in self.selects
+            )
+
+
+@pytest.fixture
+def sql_counter(db) -> SQLCounter:
+    """Count the SQL statements (and rows fetched) of a block: `with sql_counter: ...`"""
+    return SQLCounter(engine)
+
+
+@pytest.fixture
+def assert_list_queries_constant(client, auth_headers, sql_counter, db):
+    """
+    Check that a list endpoint runs the same number of SQL statements for 2 and for 10 rows.
+
+    Usage: `assert_list_queries_constant("/api/boats", add_rows)`, where `add_rows(n)` creates
+    n more rows (with their related records) that the endpoint returns.
+    """
+    def fetch(path):
+        db.expire_all() # Nada em cache na sessão: toda relação lida vem do banco.
+        with sql_counter:
+            response = client.get(path, headers=auth_headers)
+        assert response.status_code == 200, response.text
+        return len(response.json()), sql_counter.count, [s for s, _ in sql_counter.statements]
+
+    def check(path, add_rows):
+        add_rows(2)
+        small_rows, small, _ = fetch(path)
+        add_rows(8)
+        large_rows, large, statements = fetch(path)
+        assert (small_rows, large_rows) == (2, 10)
+        # Uma consulta a mais por linha indica relação carregada sob demanda (N+1).
+        assert large == small, "\n\n".join(statements)
+
+    return check
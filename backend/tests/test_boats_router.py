@@ -151,3 +151,24 @@ class TestBoatsRouter:
         response = client.get("/api/boats")
         
         assert response.status_code == 401
+
+    def test_list_query_count_does_not_grow_with_boats(self, client: TestClient, test_tenant, db, assert_list_queries_constant):
+        """Test that the engines of every boat on the page come from one query"""
+        from models import Client, Boat, Engine
+
+        owner = Client(name="Boat Owner", document="12345678900", tenant_id=test_tenant.id)
+        db.add(owner)
+        db.commit()
+        owner_id = owner.id
+
+        def add_boats(n):
+            for i in range(n):
+                boat = Boat(name=f"Boat {i}", hull_id=f"HULL-{i}", client_id=owner_id, tenant_id=test_tenant.id)
+                boat.engines = [
+                    Engine(serial_number=f"SN-{i}-{side}", model="Verado 300", tenant_id=test_tenant.id)
+                    for side in ("BB", "BE")
+                ]
+                db.add(boat)
+            db.commit()
+
+        assert_list_queries_constant("/api/boats", add_boats)
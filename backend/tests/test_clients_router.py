@@ -125,3 +125,16 @@ class TestClientsRouter:
         response = client.get("/api/clients")
         
         assert response.status_code == 401
+
+    def test_list_query_count_does_not_grow_with_clients(self, client: TestClient, test_tenant, db, assert_list_queries_constant):
+        """Test that listing clients does not load their boats"""
+        from models import Client, Boat
+
+        def add_clients(n):
+            for i in range(n):
+                owner = Client(name=f"Client {i}", document=f"1234567890{i}", tenant_id=test_tenant.id)
+                owner.boats = [Boat(name=f"Boat {i}", hull_id=f"HULL-{i}", tenant_id=test_tenant.id)]
+                db.add(owner)
+            db.commit()
+
+        assert_list_queries_constant("/api/clients", add_clients)
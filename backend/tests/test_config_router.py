@@ -0,0 +1,39 @@
+"""
+Test config router
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.mark.routers
+class TestManufacturersRouter:
+    """Test manufacturers endpoints"""
+
+    def test_get_manufacturers_with_models(self, client: TestClient, auth_headers, test_tenant, db):
+        """Test listing manufacturers with their models"""
+        from models import Manufacturer, Model
+
+        manufacturer = Manufacturer(name="Mercury", type="ENGINE", tenant_id=test_tenant.id)
+        manufacturer.models = [Model(name="Verado 300"), Model(name="FourStroke 150")]
+        db.add(manufacturer)
+        db.commit()
+
+        response = client.get("/api/config/manufacturers?type=ENGINE", headers=auth_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 1
+        assert sorted(model["name"] for model in data[0]["models"]) == ["FourStroke 150", "Verado 300"]
+
+    def test_list_query_count_does_not_grow_with_manufacturers(self, client: TestClient, test_tenant, db, assert_list_queries_constant):
+        """Test that the models of every manufacturer on the page come from one query"""
+        from models import Manufacturer, Model
+
+        def add_manufacturers(n):
+            for i in range(n):
+                manufacturer = Manufacturer(name=f"Fabricante {i}", type="ENGINE", tenant_id=test_tenant.id)
+                manufacturer.models = [Model(name=f"Modelo {i}-{j}") for j in range(3)]
+                db.add(manufacturer)
+            db.commit()
+
+        assert_list_queries_constant("/api/config/manufacturers", add_manufacturers)
@@ -219,6 +219,25 @@ class TestPartCRUD:
         
         assert part.quantity == 20.0
 
+    def test_update_part_records_price_history(self, db: Session, test_tenant):
+        """Test that only real cost/price changes are written to the price history"""
+        import crud
+        import schemas
+        from models import PartPriceHistory
+
+        part = Part(sku="HIST-1", name="History Part", cost=10.0, price=20.0, tenant_id=test_tenant.id)
+        db.add(part)
+        db.commit()
+
+        crud.update_part(db, part.id, schemas.PartUpdate(quantity=5))
+        crud.update_part(db, part.id, schemas.PartUpdate(price=20.001))
+        assert db.query(PartPriceHistory).count() == 0
+
+        crud.update_part(db, part.id, schemas.PartUpdate(price=25.0), price_source="mercury")
+        history = db.query(PartPriceHistory).all()
+        assert len(history) == 1
+        assert (history[0].source, history[0].cost, history[0].price) == ("mercury", 10.0, 25.0)
+
 
 @pytest.mark.crud
 class TestServiceOrderCRUD:
@@ -0,0 +1,209 @@
+"""
+Test the SQLite production profile (database.py) and the query plans of the hot queries
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.pool import QueuePool
+
+import crud
+import models
+from database import create_db_engine
+from pagination import encode_cursor
+
+
+def pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+
+@pytest.mark.unit
+class TestSQLiteProfile:
+    """Test the pragmas and pool applied to SQLite connections"""
+
+    def test_file_database_uses_wal_and_pool(self, tmp_path):
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+        try:
+            assert pragma(engine, "journal_mode") == "wal"
+            assert pragma(engine, "synchronous") == 1  # NORMAL
+            assert pragma(engine, "busy_timeout") == 5000
+            assert pragma(engine, "cache_size") == -65536
+            assert pragma(engine, "mmap_size") == 256 * 1024 * 1024
+            assert pragma(engine, "temp_store") == 2  # MEMORY
+            assert isinstance(engine.pool, QueuePool)
+        finally:
+            engine.dispose()
+
+    def test_pragmas_apply_to_every_connection(self, tmp_path):
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'app.db'}", pragmas={"busy_timeout": 1234})
+        try:
+            first, second = engine.connect(), engine.connect()
+            try:
+                for connection in (first, second):
+                    assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+            finally:
+                first.close()
+                second.close()
+        finally:
+            engine.dispose()
+
+    def test_memory_database_skips_wal(self):
+        engine = create_db_engine("sqlite:///:memory:")
+        try:
+            assert pragma(engine, "journal_mode") == "memory"
+            assert pragma(engine, "synchronous") == 1
+        finally:
+            engine.dispose()
+
+
+def query_plans(db, call):
+    """Run `call` and return the EXPLAIN QUERY PLAN lines of every SELECT it issued"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    plans = []
+    for statement, parameters in statements:
+        if statement.lstrip().upper().startswith("SELECT"):
+            rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            plans.append([row[-1] for row in rows])
+    return plans
+
+
+def seed_records(db):
+    """Create a service order and a manufacturer of tenant 1 (related loads only run for found rows)"""
+    tenant = models.Tenant(name="Plans", subdomain="plans")
+    db.add(tenant)
+    db.flush()
+    owner = models.Client(name="Owner", document="12345678900", tenant_id=tenant.id)
+    db.add(owner)
+    db.flush()
+    boat = models.Boat(name="Boat", hull_id="HULL-1", client_id=owner.id, tenant_id=tenant.id)
+    db.add(boat)
+    db.flush()
+    order = models.ServiceOrder(boat_id=boat.id, description="Revisão", tenant_id=tenant.id)
+    db.add(order)
+    db.add(models.Manufacturer(name="Mercury", type="ENGINE", tenant_id=tenant.id))
+    db.commit()
+    order_id = order.id
+    db.expunge_all()
+    return order_id
+
+
+@pytest.mark.unit
+class TestQueryPlans:
+    """Test that the list and detail queries search the tenant/FK indexes instead of scanning"""
+
+    @pytest.mark.parametrize("call, expected", [
+        (lambda db: seed_records(db) and crud.get_orders(db, tenant_id=1), [
+            "SEARCH service_orders USING INDEX ix_service_orders_tenant_created",
+            "USING INDEX ix_service_items_order_id", "USING INDEX ix_order_notes_order_id",
+        ]),
+        (lambda db: crud.get_orders(db, status="PENDING", tenant_id=1), [
+            "SEARCH service_orders USING INDEX ix_service_orders_tenant_status_created",
+        ]),
+        (lambda db: crud.get_order(db, seed_records(db)), [
+            "USING INDEX ix_service_items_order_id", "USING INDEX ix_order_notes_order_id",
+        ]),
+        (lambda db: crud.get_transactions(db, tenant_id=1), ["SEARCH transactions USING INDEX ix_transactions_tenant_date"]),
+        (lambda db: crud.get_movements(db, tenant_id=1), ["SEARCH stock_movements USING INDEX ix_stock_movements_tenant_date"]),
+        (lambda db: crud.get_movements(db, part_id=1, tenant_id=1), [
+            "SEARCH stock_movements USING INDEX ix_stock_movements_tenant_part_date",
+        ]),
+        (lambda db: crud.get_part_by_sku(db, "8M0123456", tenant_id=1), ["SEARCH parts USING INDEX ix_parts_tenant_sku"]),
+        (lambda db: seed_records(db) and crud.get_boats(db, client_id=1, tenant_id=1), [
+            "SEARCH boats USING INDEX ix_boats_tenant_client", "USING INDEX ix_engines_boat_id",
+        ]),
+        (lambda db: seed_records(db) and crud.get_manufacturers(db, type="ENGINE", tenant_id=1), [
+            "SEARCH manufacturers USING INDEX ix_manufacturers_tenant_type", "USING INDEX ix_models_manufacturer_id",
+        ]),
+        # Páginas seguintes: o cursor vira um limite na busca pelo índice.
+        (lambda db: crud.get_transactions(db, tenant_id=1, limit=50, cursor=encode_cursor([datetime(2024, 1, 1), 10])), [
+            "SEARCH transactions USING INDEX ix_transactions_tenant_date (tenant_id=? AND date<?)",
+        ]),
+        (lambda db: crud.get_movements(db, part_id=1, tenant_id=1, limit=50, cursor=encode_cursor([datetime(2024, 1, 1), 10])), [
+            "SEARCH stock_movements USING INDEX ix_stock_movements_tenant_part_date (tenant_id=? AND part_id=? AND date<?)",
+        ]),
+        (lambda db: crud.get_parts(db, tenant_id=1, limit=50, cursor=encode_cursor([10])), ["(tenant_id=? AND rowid>?)"]),
+    ])
+    def test_hot_queries_use_indexes(self, db, call, expected):
+        lines = [line for plan in query_plans(db, lambda: call(db)) for line in plan]
+        for fragment in expected:
+            assert any(fragment in line for line in lines), lines
+        # Nenhuma tabela lida inteira, nem ordenação em memória.
+        assert not [line for line in lines if line.startswith("SCAN") and "anon" not in line], lines
+        assert not [line for line in lines if "TEMP B-TREE" in line], lines
+
+    @pytest.mark.parametrize("table, name, keys", [
+        ("service_orders", "ix_service_orders_tenant_created", ["created_at", "id"]),
+        ("service_orders", "ix_service_orders_tenant_status_created", ["created_at", "id"]),
+        ("stock_movements", "ix_stock_movements_tenant_date", ["date", "id"]),
+        ("stock_movements", "ix_stock_movements_tenant_part_date", ["date", "id"]),
+        ("transactions", "ix_transactions_tenant_date", ["date", "id"]),
+    ])
+    def test_list_indexes_end_with_the_keyset_order(self, table, name, keys):
+        # Sem o `id` no índice, só o SQLite (pelo rowid) evita ordenar a página em outros bancos.
+        index = next(i for i in models.Base.metadata.tables[table].indexes if i.name == name)
+        assert [column.name for column in index.columns][-len(keys):] == keys
+
+
+@pytest.mark.unit
+class TestKeysetBackfill:
+    """Test that rows with a NULL pagination key are backfilled and paged like any other"""
+
+    def test_pages_across_rows_with_null_date(self, tmp_path):
+        from sqlalchemy import MetaData, insert
+        from sqlalchemy.orm import sessionmaker
+
+        import backfill_keyset_columns
+
+        # Esquema antigo: as colunas da chave ainda aceitavam NULL.
+        legacy = MetaData()
+        for table in models.Base.metadata.sorted_tables:
+            table.to_metadata(legacy)
+        legacy.tables["service_orders"].c.created_at.nullable = True
+        legacy.tables["stock_movements"].c.date.nullable = True
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        try:
+            legacy.create_all(bind=engine)
+            with engine.begin() as connection:
+                connection.execute(insert(models.Tenant), [{"name": "Legacy", "subdomain": "legacy"}])
+                connection.execute(insert(models.Part), [{"tenant_id": 1, "sku": "8M0000001", "name": "Peça"}])
+                connection.execute(insert(models.StockMovement), [
+                    {"tenant_id": 1, "part_id": 1, "type": models.MovementType.OUT_OS, "quantity": 1,
+                     "description": f"mov {i}", "date": None if i in (2, 4) else datetime(2024, 1, 1 + i)}
+                    for i in range(6)
+                ])
+
+            assert backfill_keyset_columns.backfill(engine) == 2
+            db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+            try:
+                seen, cursor = [], None
+                while True:
+                    page = crud.get_movements(db, tenant_id=1, cursor=cursor, limit=2)
+                    seen.extend(movement.description for movement in page)
+                    cursor = page.next_cursor
+                    if not cursor:
+                        break
+                # Todas as linhas aparecem uma vez; as sem data ficam no fim, como as mais antigas.
+                assert seen == ["mov 5", "mov 3", "mov 1", "mov 0", "mov 4", "mov 2"]
+            finally:
+                db.close()
+        finally:
+            engine.dispose()
+
+    def test_keyset_columns_reject_null(self, db):
+        from sqlalchemy.exc import IntegrityError
+
+        db.add(models.StockMovement(tenant_id=1, part_id=1, type=models.MovementType.OUT_OS, quantity=1, date=None))
+        with pytest.raises(IntegrityError):
+            db.commit()
+        db.rollback()
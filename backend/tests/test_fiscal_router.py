@@ -0,0 +1,353 @@
+"""
+Test fiscal emission endpoints
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services.fiscal_pipeline import fiscal_pipeline
+from services.fiscal_queue import fiscal_queue
+from services.fiscal_service import fiscal_service
+
+
+def invoice_payload(**overrides):
+    payload = {
+        "type": "NFE",
+        "issuer": {
+            "companyName": "Mare Alta Nautica LTDA", "tradeName": "Mare Alta", "cnpj": "12345678000199",
+            "ie": "9012345678", "crt": "1",
+            "address": {"street": "Rua do Porto", "number": "10", "neighborhood": "Centro", "city": "Paranaguá", "state": "PR", "zip": "83200000"},
+        },
+        "recipient": {"name": "Joao da Silva", "doc": "12345678900"},
+        "items": [{"code": "8M0123456", "desc": "Filtro de oleo", "qty": 2, "price": 50.0, "total": 100.0}],
+        "totalValue": 100.0,
+    }
+    payload.update(overrides)
+    return payload
+
+
+@pytest.fixture
+def slow_sefaz(monkeypatch):
+    """SEFAZ stand-in that blocks its thread like the real SOAP call"""
+    def transmit(signed_xml):
+        time.sleep(0.3)
+        return {"status": "success", "protocol": "141000000000001", "xml": signed_xml}
+
+    monkeypatch.setattr(fiscal_service, "transmit_to_sefaz", transmit)
+
+
+@pytest.mark.routers
+class TestFiscalEmission:
+    """Test NF-e emission through the offloaded pipeline"""
+
+    def test_emit_invoice(self, client: TestClient, auth_headers, slow_sefaz):
+        response = client.post("/api/fiscal/emit", json=invoice_payload(), headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["protocol"] == "141000000000001"
+        assert "<Signature>" in data["xml"]
+
+    def test_requires_authentication(self, client: TestClient):
+        response = client.post("/api/fiscal/emit", json=invoice_payload())
+        assert response.status_code == 401
+
+    def test_event_loop_stays_responsive_during_emissions(self, client: TestClient, auth_headers, slow_sefaz):
+        async def run():
+            async with httpx.AsyncClient(app=app, base_url="http://test", headers=auth_headers) as http:
+                emissions = [asyncio.create_task(http.post("/api/fiscal/emit", json=invoice_payload())) for _ in range(4)]
+                await asyncio.sleep(0.05)
+                started = time.perf_counter()
+                stats = await http.get("/api/fiscal/pipeline")
+                elapsed = time.perf_counter() - started
+                in_flight = stats.json()["in_flight"]
+                responses = await asyncio.gather(*emissions)
+                return elapsed, in_flight, responses
+
+        elapsed, in_flight, responses = asyncio.run(run())
+        # Com a transmissão bloqueando o event loop, o GET esperaria as emissões (>= 0.3s cada).
+        assert elapsed < 0.2
+        assert in_flight == 4
+        assert all(r.status_code == 200 for r in responses)
+
+    def test_stage_timeout_returns_504(self, client: TestClient, auth_headers, slow_sefaz, monkeypatch):
+        monkeypatch.setitem(fiscal_pipeline.timeouts, "transmit", 0.05)
+        response = client.post("/api/fiscal/emit", json=invoice_payload(), headers=auth_headers)
+        assert response.status_code == 504
+        assert "transmit" in response.json()["detail"]
+
+    def test_pipeline_full_returns_503(self, client: TestClient, auth_headers, slow_sefaz, monkeypatch):
+        monkeypatch.setattr(fiscal_pipeline, "max_pending", 0)
+        response = client.post("/api/fiscal/emit", json=invoice_payload(), headers=auth_headers)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+
+
+@pytest.fixture
+def flaky_sefaz(monkeypatch):
+    """SEFAZ stand-in that fails the first `failures` transmissions"""
+    state = {"failures": 1, "calls": 0}
+
+    def transmit(signed_xml):
+        state["calls"] += 1
+        if state["calls"] <= state["failures"]:
+            raise ConnectionError("SEFAZ indisponível")
+        return {"status": "success", "protocol": "141000000000002", "message": "Autorizado o uso da NF-e", "xml": signed_xml}
+
+    monkeypatch.setattr(fiscal_service, "transmit_to_sefaz", transmit)
+    monkeypatch.setattr(fiscal_queue, "backoff", 0)
+    # O banco de teste é uma única conexão (StaticPool): um job por vez, sem threads disputando a conexão.
+    monkeypatch.setattr(fiscal_queue, "concurrency", 1)
+    return state
+
+
+@pytest.mark.routers
+class TestFiscalQueue:
+    """Test asynchronous emission through the persistent queue"""
+
+    def test_async_emit_returns_job_and_completes(self, client: TestClient, auth_headers, flaky_sefaz):
+        flaky_sefaz["failures"] = 0
+        response = client.post("/api/fiscal/emit?async=true", json=invoice_payload(), headers=auth_headers)
+        assert response.status_code == 202
+        job = response.json()["job"]
+        assert job["status"] == "queued"
+
+        # O TestClient executa a tarefa em segundo plano antes de devolver a resposta.
+        response = client.get(f"/api/fiscal/jobs/{job['id']}", headers=auth_headers)
+        assert response.status_code == 200
+        job = response.json()["job"]
+        assert job["status"] == "authorized"
+        assert job["protocol"] == "141000000000002"
+        assert "<Signature>" in job["xml"]
+        assert job["attempts"] == 1
+
+        jobs = client.get("/api/fiscal/jobs", headers=auth_headers).json()["jobs"]
+        assert [j["id"] for j in jobs] == [job["id"]]
+        assert "xml" not in jobs[0]
+
+    def test_failed_attempt_is_retried(self, client: TestClient, auth_headers, flaky_sefaz):
+        response = client.post("/api/fiscal/emit?async=true", json=invoice_payload(), headers=auth_headers)
+        job = client.get(f"/api/fiscal/jobs/{response.json()['job']['id']}", headers=auth_headers).json()["job"]
+        assert job["status"] == "authorized"
+        assert job["attempts"] == 2
+        assert flaky_sefaz["calls"] == 2
+
+    def test_gives_up_after_max_attempts(self, client: TestClient, auth_headers, flaky_sefaz, monkeypatch):
+        flaky_sefaz["failures"] = 10
+        monkeypatch.setattr(fiscal_queue, "max_attempts", 3)
+        response = client.post("/api/fiscal/emit?async=true", json=invoice_payload(), headers=auth_headers)
+        job = client.get(f"/api/fiscal/jobs/{response.json()['job']['id']}", headers=auth_headers).json()["job"]
+        assert job["status"] == "failed"
+        assert job["attempts"] == 3
+        assert "SEFAZ indisponível" in job["last_error"]
+
+    def test_timeout_on_last_attempt_keeps_number_reserved(self, client: TestClient, auth_headers, flaky_sefaz, slow_sefaz, monkeypatch):
+        monkeypatch.setattr(fiscal_queue, "max_attempts", 2)
+        monkeypatch.setitem(fiscal_pipeline.timeouts, "transmit", 0.05)
+        response = client.post("/api/fiscal/emit?async=true", json=invoice_payload(), headers=auth_headers)
+        job = client.get(f"/api/fiscal/jobs/{response.json()['job']['id']}", headers=auth_headers).json()["job"]
+        assert job["status"] == "failed" and job["attempts"] == 2
+        assert "transmit" in job["last_error"]
+        # A SEFAZ pode ter autorizado a nota: o número não vai para inutilização.
+        numbers = client.get("/api/fiscal/numbers", headers=auth_headers).json()["numbers"]
+        assert [(n["number"], n["status"]) for n in numbers] == [(1, "reserved")]
+
+    def test_job_of_other_tenant_is_hidden(self, client: TestClient, auth_headers, db):
+        from models import FiscalJob, Tenant
+
+        other = Tenant(name="Other", subdomain="other")
+        db.add(other)
+        db.commit()
+        job = FiscalJob(tenant_id=other.id, payload="{}")
+        db.add(job)
+        db.commit()
+        response = client.get(f"/api/fiscal/jobs/{job.id}", headers=auth_headers)
+        assert response.status_code == 404
+
+    def test_startup_resumes_queue_on_overridden_database(self, client: TestClient, db, monkeypatch):
+        started = []
+        monkeypatch.setenv("FISCAL_QUEUE_AUTOSTART", "1")
+        monkeypatch.setattr(fiscal_queue, "start", started.append)
+        # Novo ciclo de vida com o `get_db` substituído pelo banco de teste.
+        with TestClient(app):
+            pass
+        assert len(started) == 1
+        assert started[0].kw["bind"] is db.get_bind()
+
+    def test_recover_requeues_abandoned_jobs(self, db, test_tenant):
+        from datetime import datetime, timedelta
+        from models import FiscalJob
+
+        stale = FiscalJob(tenant_id=test_tenant.id, payload="{}", status="processing", locked_at=datetime.utcnow() - timedelta(hours=1))
+        fresh = FiscalJob(tenant_id=test_tenant.id, payload="{}", status="processing", locked_at=datetime.utcnow())
+        db.add_all([stale, fresh])
+        db.commit()
+        assert fiscal_queue.recover(db) == 1
+        db.expire_all()
+        assert stale.status == "queued" and stale.locked_at is None
+        assert fresh.status == "processing"
+
+
+@pytest.fixture
+def fast_sefaz_lots(monkeypatch):
+    """SEFAZ stand-in for enviNFe lots that records the size of each lot"""
+    lots = []
+
+    def transmit_batch(signed_xmls):
+        lots.append(len(signed_xmls))
+        envelope = fiscal_service.build_envi_nfe(signed_xmls, f"{len(lots):015d}")
+        assert envelope.count("<NFe ") == len(signed_xmls)
+        return [
+            {"status": "success", "protocol": f"14100000{len(lots):03d}{i:04d}", "message": "Autorizado o uso da NF-e", "lot": f"{len(lots):015d}", "xml": xml}
+            for i, xml in enumerate(signed_xmls)
+        ]
+
+    monkeypatch.setattr(fiscal_service, "transmit_batch_to_sefaz", transmit_batch)
+    return lots
+
+
+@pytest.mark.routers
+class TestFiscalBatchEmission:
+    """Test batch NF-e emission in enviNFe lots"""
+
+    def test_batch_is_split_in_lots_of_50(self, client: TestClient, auth_headers, fast_sefaz_lots):
+        invoices = [invoice_payload(totalValue=100.0 + i) for i in range(120)]
+        response = client.post("/api/fiscal/emit-batch", json={"invoices": invoices}, headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 120 and data["authorized"] == 120 and data["failed"] == 0
+        assert sorted(fast_sefaz_lots) == [20, 50, 50]
+        assert data["lots"] == 3
+        assert [r["index"] for r in data["results"]] == list(range(120))
+        assert all(r["protocol"] and "<Signature>" in r["xml"] for r in data["results"])
+
+    def test_nfse_is_sent_individually_not_in_lots(self, client: TestClient, auth_headers, fast_sefaz_lots, monkeypatch):
+        single = []
+
+        def transmit(signed_xml):
+            single.append(signed_xml)
+            return {"status": "success", "protocol": f"NFSE{len(single)}", "message": "NFS-e autorizada", "xml": signed_xml}
+
+        monkeypatch.setattr(fiscal_service, "transmit_to_sefaz", transmit)
+        invoices = [invoice_payload(type="NFSE" if i % 3 == 0 else "NFE", totalValue=100.0 + i) for i in range(9)]
+        data = client.post("/api/fiscal/emit-batch", json={"invoices": invoices}, headers=auth_headers).json()
+        assert data["authorized"] == 9
+        # Só as 6 NF-e vão no lote enviNFe; as 3 NFS-e seguem pelo envio individual.
+        assert fast_sefaz_lots == [6] and len(single) == 3 and data["lots"] == 1
+        assert [r["protocol"].startswith("NFSE") for r in data["results"]] == [i % 3 == 0 for i in range(9)]
+
+    def test_transmit_timeout_keeps_number_reserved(self, client: TestClient, auth_headers, db, fast_sefaz_lots, slow_sefaz, monkeypatch):
+        from models import FiscalNumber
+
+        monkeypatch.setitem(fiscal_pipeline.timeouts, "transmit", 0.05)
+        invoices = [invoice_payload(totalValue=10), invoice_payload(type="NFSE", totalValue=20)]
+        data = client.post("/api/fiscal/emit-batch", json={"invoices": invoices}, headers=auth_headers).json()
+        assert [r["status"] for r in data["results"]] == ["success", "timeout"]
+        assert "transmit" in data["results"][1]["error"]
+        # A NFS-e pode ter sido autorizada: o número não vai para inutilização.
+        statuses = {(n.invoice_type, n.number): n.status for n in db.query(FiscalNumber).all()}
+        nfse = data["results"][1]
+        assert statuses[("NFSE", int(nfse["number"]))] == "reserved"
+        assert statuses[("NFE", int(data["results"][0]["number"]))] == "used"
+
+    def test_envi_nfe_rejects_oversized_lot(self):
+        with pytest.raises(ValueError):
+            fiscal_service.build_envi_nfe(["<NFe/>"] * 51, "1")
+
+    def test_per_document_failures(self, client: TestClient, auth_headers, fast_sefaz_lots, monkeypatch):
+        original = fiscal_service.generate_nfe_xml
+
+        def generate(invoice_data):
+            if invoice_data["totalValue"] == 13:
+                raise ValueError("Item sem NCM")
+            return original(invoice_data)
+
+        monkeypatch.setattr(fiscal_service, "generate_nfe_xml", generate)
+        invoices = [invoice_payload(totalValue=v) for v in (10, 13, 20)]
+        data = client.post("/api/fiscal/emit-batch", json={"invoices": invoices}, headers=auth_headers).json()
+        assert [r["status"] for r in data["results"]] == ["success", "error", "success"]
+        assert data["results"][1]["error"] == "Item sem NCM"
+        assert fast_sefaz_lots == [2]
+
+    def test_batch_from_service_orders(self, client: TestClient, auth_headers, test_tenant, db, fast_sefaz_lots):
+        from models import Boat, Client, CompanyInfo, ItemType, OSStatus, Part, ServiceItem, ServiceOrder
+
+        db.add(CompanyInfo(tenant_id=test_tenant.id, company_name="Mare Alta Nautica LTDA", cnpj="12345678000199", city="Paranaguá", state="PR"))
+        owner = Client(name="Owner", document="12345678900", tenant_id=test_tenant.id)
+        db.add(owner)
+        db.commit()
+        boat = Boat(name="Boat", hull_id="HULL-1", client_id=owner.id, tenant_id=test_tenant.id)
+        part = Part(sku="8M0123456", name="Filtro", tenant_id=test_tenant.id)
+        db.add_all([boat, part])
+        db.commit()
+        done = ServiceOrder(boat_id=boat.id, description="Revisão", status=OSStatus.COMPLETED, tenant_id=test_tenant.id)
+        pending = ServiceOrder(boat_id=boat.id, description="Reparo", status=OSStatus.PENDING, tenant_id=test_tenant.id)
+        db.add_all([done, pending])
+        db.commit()
+        db.add_all([
+            ServiceItem(order_id=done.id, type=ItemType.PART, description="Filtro", part_id=part.id, quantity=2, unit_price=50, total=100),
+            ServiceItem(order_id=done.id, type=ItemType.LABOR, description="Mão de obra", quantity=1, unit_price=200, total=200),
+        ])
+        db.commit()
+
+        response = client.post("/api/fiscal/emit-batch", json={"orderIds": [done.id, pending.id, 9999]}, headers=auth_headers)
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [(r["order_id"], r["status"]) for r in results] == [(done.id, "success"), (pending.id, "error"), (9999, "error")]
+        assert "<xNome>Owner</xNome>" in results[0]["xml"]
+        assert "não concluída" in results[1]["error"]
+        assert fast_sefaz_lots == [1]
+
+    def test_batch_requires_documents(self, client: TestClient, auth_headers):
+        response = client.post("/api/fiscal/emit-batch", json={}, headers=auth_headers)
+        assert response.status_code == 400
+
+
+@pytest.mark.routers
+class TestFiscalNumbering:
+    """Test sequential NF-e numbering per tenant and series"""
+
+    def test_numbers_are_sequential(self, client: TestClient, auth_headers, monkeypatch):
+        monkeypatch.setattr(fiscal_service, "transmit_to_sefaz", lambda xml: {"status": "success", "protocol": "141000000000001", "xml": xml})
+        first = client.post("/api/fiscal/emit", json=invoice_payload(), headers=auth_headers).json()
+        second = client.post("/api/fiscal/emit", json=invoice_payload(), headers=auth_headers).json()
+        other_series = client.post("/api/fiscal/emit", json=invoice_payload(series="2"), headers=auth_headers).json()
+        assert (first["number"], second["number"]) == ("1", "2")
+        assert (other_series["number"], other_series["series"]) == ("1", "2")
+        assert "<nNF>2</nNF>" in second["xml"]
+
+        numbers = client.get("/api/fiscal/numbers?series=1", headers=auth_headers).json()["numbers"]
+        assert [(n["number"], n["status"], n["protocol"]) for n in numbers] == [
+            (2, "used", "141000000000001"), (1, "used", "141000000000001"),
+        ]
+
+    def test_failed_emission_voids_number(self, client: TestClient, auth_headers, monkeypatch):
+        def transmit(signed_xml):
+            raise ConnectionError("SEFAZ indisponível")
+
+        monkeypatch.setattr(fiscal_service, "transmit_to_sefaz", transmit)
+        response = client.post("/api/fiscal/emit", json=invoice_payload(), headers=auth_headers)
+        assert response.status_code == 500
+
+        monkeypatch.setattr(fiscal_service, "transmit_to_sefaz", lambda xml: {"status": "success", "protocol": "1", "xml": xml})
+        # O número que falhou não é reaproveitado: fica para inutilização.
+        assert client.post("/api/fiscal/emit", json=invoice_payload(), headers=auth_headers).json()["number"] == "2"
+        voided = client.get("/api/fiscal/numbers?status=voided", headers=auth_headers).json()["numbers"]
+        assert [(n["number"], n["reason"]) for n in voided] == [(1, "SEFAZ indisponível")]
+
+    def test_async_job_records_number(self, client: TestClient, auth_headers, flaky_sefaz):
+        flaky_sefaz["failures"] = 0
+        job = client.post("/api/fiscal/emit?async=true", json=invoice_payload(), headers=auth_headers).json()["job"]
+        assert job["number"] == "1"
+        numbers = client.get("/api/fiscal/numbers", headers=auth_headers).json()["numbers"]
+        assert [(n["number"], n["status"], n["protocol"]) for n in numbers] == [(1, "used", "141000000000002")]
+
+    def test_batch_reserves_contiguous_range(self, client: TestClient, auth_headers, fast_sefaz_lots):
+        client.post("/api/fiscal/emit-batch", json={"invoices": [invoice_payload()] * 3}, headers=auth_headers)
+        data = client.post("/api/fiscal/emit-batch", json={"invoices": [invoice_payload()] * 60}, headers=auth_headers).json()
+        assert [int(r["number"]) for r in data["results"]] == list(range(4, 64))
+        numbers = client.get("/api/fiscal/numbers?status=used&limit=1000", headers=auth_headers).json()["numbers"]
+        assert len(numbers) == 63
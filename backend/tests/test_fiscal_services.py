@@ -0,0 +1,403 @@
+"""
+Test fiscal services (NF-e XML builder, digital signature, numbering, queue recovery)
+"""
+import asyncio
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509.oid import NameOID
+from lxml import etree
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import Base
+
+from services.fiscal_numbering import FiscalNumbering
+from services.fiscal_queue import HOSTNAME, FiscalQueue, worker_is_dead
+from services.fiscal_signer import (
+    DSIG_NAMESPACE, CertificateError, FiscalSigner, load_credentials, verify_nfe_signature,
+)
+from services.nfe_builder import NFE_NAMESPACE, EmitCache, NFeBuilder
+
+NS = {"nfe": NFE_NAMESPACE}
+
+ISSUER = {
+    "companyName": "Mare Alta Nautica LTDA", "tradeName": "Mare Alta", "cnpj": "12.345.678/0001-99",
+    "ie": "901.234.567-8", "crt": "1",
+    "address": {"street": "Rua do Porto", "number": "10", "neighborhood": "Centro", "city": "Paranaguá", "state": "PR", "zip": "83200-000"},
+}
+
+
+def invoice(**overrides):
+    data = {
+        "type": "NFE", "number": "1001", "series": "1", "tenant_id": 1,
+        "issuer": ISSUER,
+        "recipient": {"name": "Joao da Silva", "doc": "123.456.789-00"},
+        "items": [
+            {"code": "8M0123456", "desc": "Filtro de oleo", "qty": 2, "price": 50.0, "total": 100.0},
+            {"code": "8M0654321", "desc": "Vela de ignicao", "qty": 4, "price": 25.5, "total": 102.0},
+        ],
+        "totalValue": 202.0,
+    }
+    data.update(overrides)
+    return data
+
+
+def parse(xml: str):
+    return etree.fromstring(xml.encode("utf-8"))
+
+
+@pytest.mark.unit
+class TestNFeBuilder:
+    """Test NF-e 4.00 generation with lxml"""
+
+    def test_one_det_per_item(self):
+        root = parse(NFeBuilder().build(invoice()))
+        dets = root.findall(".//nfe:det", NS)
+        assert [d.get("nItem") for d in dets] == ["1", "2"]
+        assert dets[1].findtext("nfe:prod/nfe:cProd", namespaces=NS) == "8M0654321"
+        assert dets[1].findtext("nfe:prod/nfe:qCom", namespaces=NS) == "4.0000"
+        assert dets[1].findtext("nfe:prod/nfe:vUnCom", namespaces=NS) == "25.50"
+        assert dets[1].find("nfe:imposto/nfe:ICMS/nfe:ICMSSN102/nfe:CSOSN", NS).text == "102"
+
+    def test_totals(self):
+        root = parse(NFeBuilder().build(invoice()))
+        assert root.findtext(".//nfe:ICMSTot/nfe:vProd", namespaces=NS) == "202.00"
+        assert root.findtext(".//nfe:ICMSTot/nfe:vNF", namespaces=NS) == "202.00"
+
+    def test_text_is_escaped(self):
+        xml = NFeBuilder().build(invoice(recipient={"name": "Silva & Filhos <ME>", "cnpj": "12.345.678/0001-00"}))
+        root = parse(xml)
+        assert root.findtext(".//nfe:dest/nfe:xNome", namespaces=NS) == "Silva & Filhos <ME>"
+        assert "Silva &amp; Filhos &lt;ME&gt;" in xml
+
+    def test_recipient_document_type(self):
+        builder = NFeBuilder()
+        person = parse(builder.build(invoice()))
+        company = parse(builder.build(invoice(recipient={"name": "Marina", "doc": "12.345.678/0001-00"})))
+        assert person.findtext(".//nfe:dest/nfe:CPF", namespaces=NS) == "12345678900"
+        assert company.findtext(".//nfe:dest/nfe:CNPJ", namespaces=NS) == "12345678000100"
+
+    def test_invoice_without_items_has_single_det(self):
+        root = parse(NFeBuilder().build(invoice(items=[], totalValue=350.0)))
+        dets = root.findall(".//nfe:det", NS)
+        assert len(dets) == 1
+        assert dets[0].findtext("nfe:prod/nfe:vProd", namespaces=NS) == "350.00"
+
+    def test_single_namespace_declaration(self):
+        xml = NFeBuilder().build(invoice())
+        assert xml.count("xmlns=") == 1
+
+    def test_emit_is_cached_per_tenant(self):
+        cache = EmitCache()
+        builder = NFeBuilder(emit_cache=cache)
+        first = parse(builder.build(invoice()))
+        builder.build(invoice(number="1002"))
+        assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+        assert first.findtext(".//nfe:emit/nfe:CNPJ", namespaces=NS) == "12345678000199"
+
+    def test_emit_rebuilt_when_issuer_changes(self):
+        cache = EmitCache()
+        builder = NFeBuilder(emit_cache=cache)
+        builder.build(invoice())
+        renamed = parse(builder.build(invoice(issuer={**ISSUER, "companyName": "Mare Alta Marinas LTDA"})))
+        assert renamed.findtext(".//nfe:emit/nfe:xNome", namespaces=NS) == "Mare Alta Marinas LTDA"
+        assert cache.stats()["misses"] == 2
+
+
+def make_pfx(path, password: str, name: str = "MARE ALTA NAUTICA LTDA:12345678000199"):
+    """Self-signed A1-like certificate (RSA 2048) written as PKCS#12"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder().subject_name(subject).issuer_name(subject).public_key(key.public_key())
+        .serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=365))
+        .sign(key, hashes.SHA256())
+    )
+    path.write_bytes(pkcs12.serialize_key_and_certificates(
+        b"a1", key, certificate, None, serialization.BestAvailableEncryption(password.encode())
+    ))
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory):
+    return make_pfx(tmp_path_factory.mktemp("certs") / "certificate.pfx", "segredo")
+
+
+@pytest.mark.unit
+class TestFiscalSigner:
+    """Test XMLDSig signing of <infNFe> with a cached A1 certificate"""
+
+    def test_signs_inf_nfe(self, certificate):
+        signer = FiscalSigner(cert_path=certificate, cert_dir="", password="segredo", max_workers=0)
+        signed = signer.sign(NFeBuilder().build(invoice()))
+        root = parse(signed)
+        assert root[-1].tag == f"{{{DSIG_NAMESPACE}}}Signature"
+        reference = root.find(".//{%s}Reference" % DSIG_NAMESPACE)
+        assert reference.get("URI") == "#" + root[0].get("Id")
+        assert verify_nfe_signature(signed)
+        assert signer.stats()["signed"] == 1
+
+    def test_tampered_document_fails_verification(self, certificate):
+        signer = FiscalSigner(cert_path=certificate, cert_dir="", password="segredo", max_workers=0)
+        signed = signer.sign(NFeBuilder().build(invoice()))
+        assert not verify_nfe_signature(signed.replace("<vNF>202.00</vNF>", "<vNF>2.00</vNF>"))
+
+    def test_certificate_is_parsed_once_per_version(self, tmp_path):
+        path = make_pfx(tmp_path / "renewed.pfx", "segredo")
+        first = load_credentials(path, "segredo")
+        assert load_credentials(path, "segredo") is first
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert load_credentials(path, "segredo") is not first
+
+    def test_wrong_password(self, certificate):
+        signer = FiscalSigner(cert_path=certificate, cert_dir="", password="errada", max_workers=0)
+        with pytest.raises(CertificateError):
+            signer.sign(NFeBuilder().build(invoice()))
+        assert signer.stats()["failed"] == 1
+
+    def test_tenant_certificate_takes_precedence(self, certificate, tmp_path):
+        make_pfx(tmp_path / "7.pfx", "segredo", name="MARINA DO TENANT 7")
+        signer = FiscalSigner(cert_path=certificate, cert_dir=str(tmp_path), password="segredo", max_workers=0)
+        assert signer.certificate_path(7) == str(tmp_path / "7.pfx")
+        assert signer.certificate_path(8) == certificate
+        assert "MARINA DO TENANT 7" in load_credentials(signer.certificate_path(7), "segredo").subject
+
+    def test_each_tenant_certificate_uses_its_own_password(self, certificate, tmp_path, monkeypatch):
+        make_pfx(tmp_path / "7.pfx", "senha-do-7", name="MARINA DO TENANT 7")
+        (tmp_path / "7.password").write_text("senha-do-7\n")
+        make_pfx(tmp_path / "9.pfx", "senha-do-9", name="MARINA DO TENANT 9")
+        monkeypatch.setenv("FISCAL_CERT_PASSWORD_9", "senha-do-9")
+        make_pfx(tmp_path / "11.pfx", "segredo", name="MARINA DO TENANT 11")  # sem senha própria
+        signer = FiscalSigner(cert_path=certificate, cert_dir=str(tmp_path), password="segredo", max_workers=0)
+        xml = NFeBuilder().build(invoice())
+        for tenant_id in (7, 9, 11, 8):
+            assert verify_nfe_signature(signer.sign(xml, tenant_id))
+        # A senha de um tenant nunca é usada para o certificado do servidor.
+        assert signer.certificate_password(certificate, 7) == "segredo"
+        assert signer.stats()["signed"] == 4
+
+    def test_missing_certificate(self, tmp_path):
+        xml = NFeBuilder().build(invoice())
+        testing = FiscalSigner(cert_path=str(tmp_path / "none.pfx"), cert_dir="", max_workers=0)
+        assert testing.sign(xml).endswith("<Signature>SignedByMareAlta</Signature></NFe>")
+        production = FiscalSigner(cert_path=str(tmp_path / "none.pfx"), cert_dir="", max_workers=0, allow_unsigned=False)
+        with pytest.raises(CertificateError):
+            production.sign(xml)
+
+    def test_process_pool_signs_batch(self, certificate):
+        signer = FiscalSigner(cert_path=certificate, cert_dir="", password="segredo", max_workers=2)
+        try:
+            xmls = [NFeBuilder().build(invoice(number=str(n))) for n in range(6)] + ["<NFe/>"]
+            results = signer.sign_many(xmls)
+        finally:
+            signer.shutdown()
+        assert all(verify_nfe_signature(xml) for xml in results[:6])
+        assert isinstance(results[6], ValueError)
+        assert signer.stats()["signed"] == 6 and signer.stats()["failed"] == 1
+
+
+@pytest.fixture
+def numbering_sessions(tmp_path):
+    # Banco em arquivo: cada thread tem a própria conexão, como os workers em produção.
+    engine = create_engine(f"sqlite:///{tmp_path / 'numbering.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.mark.unit
+class TestFiscalNumbering:
+    """Test the per-tenant, per-series NF-e number sequence"""
+
+    def test_concurrent_allocations_never_collide(self, numbering_sessions):
+        numbering = FiscalNumbering()
+
+        def allocate(count):
+            db = numbering_sessions()
+            try:
+                return numbering.allocate(db, tenant_id=1, count=count)
+            finally:
+                db.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ranges = list(pool.map(allocate, [1, 5, 1, 3] * 10))
+        allocated = sorted(n for numbers in ranges for n in numbers)
+        assert allocated == list(range(1, 101))
+        assert all(numbers == list(range(numbers[0], numbers[0] + len(numbers))) for numbers in ranges)
+
+    def test_series_and_tenants_are_independent(self, numbering_sessions):
+        numbering = FiscalNumbering()
+        db = numbering_sessions()
+        try:
+            assert numbering.allocate(db, 1, count=2) == [1, 2]
+            assert numbering.allocate(db, 1, series="2") == [1]
+            assert numbering.allocate(db, 2) == [1]
+            assert numbering.allocate(db, 1) == [3]
+        finally:
+            db.close()
+
+    def test_record_marks_used_and_voided(self, numbering_sessions):
+        numbering = FiscalNumbering()
+        db = numbering_sessions()
+        try:
+            numbering.allocate(db, 1, count=3)
+            numbering.record(db, 1, [("NFE", "1", 1, "used", "141000000000001"), ("NFE", "1", 2, "voided", "Rejeição 539")])
+            # O destino só é gravado uma vez: o número 1 já não está reservado.
+            numbering.record(db, 1, [("NFE", "1", 1, "voided", "duplicado")])
+            rows = {n.number: n for n in db.query(models.FiscalNumber).all()}
+            assert (rows[1].status, rows[1].protocol) == ("used", "141000000000001")
+            assert (rows[2].status, rows[2].reason) == ("voided", "Rejeição 539")
+            assert rows[3].status == "reserved"
+            assert [n["number"] for n in numbering.list_numbers(db, 1, status="reserved")] == [3]
+        finally:
+            db.close()
+
+
+class AuthorizingPipeline:
+    """Pipeline stand-in that authorizes every invoice"""
+
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, invoice_data):
+        self.emitted.append(invoice_data["number"])
+        return {"status": "success", "protocol": "141000000000003", "message": "Autorizado o uso da NF-e", "xml": "<NFe/>"}
+
+
+@pytest.mark.unit
+class TestFiscalQueueRecovery:
+    """Test that jobs left in 'processing' by a dead worker are requeued and settled"""
+
+    def enqueue_and_crash(self, sessions, number="1"):
+        # Um worker pega o job e "morre" antes de gravar o resultado.
+        crashed = FiscalQueue(pipeline=AuthorizingPipeline())
+        db = sessions()
+        try:
+            FiscalNumbering().allocate(db, tenant_id=1)
+            job_id = crashed.enqueue(db, 1, invoice(number=number)).id
+        finally:
+            db.close()
+        assert crashed._claim_next(sessions) == job_id
+        return job_id
+
+    def test_restart_within_stale_window_resumes_job(self, numbering_sessions):
+        job_id = self.enqueue_and_crash(numbering_sessions)
+        # Reinício do processo bem antes de FISCAL_QUEUE_STALE_AFTER (300 s).
+        pipeline = AuthorizingPipeline()
+        restarted = FiscalQueue(pipeline=pipeline, stale_after=300)
+        asyncio.run(restarted._resume(numbering_sessions))
+
+        db = numbering_sessions()
+        try:
+            job = db.query(models.FiscalJob).filter(models.FiscalJob.id == job_id).one()
+            assert (job.status, job.attempts, job.locked_by) == ("authorized", 2, None)
+            number = db.query(models.FiscalNumber).one()
+            assert (number.number, number.status, number.protocol) == (1, "used", "141000000000003")
+        finally:
+            db.close()
+        assert pipeline.emitted == ["1"]
+
+    def test_dead_and_unknown_workers(self, numbering_sessions):
+        queue = FiscalQueue(stale_after=300)
+        exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        dead = f"{HOSTNAME}:{exited.stdout.strip()}:abcd1234"
+        alive = f"{HOSTNAME}:{os.getppid()}:abcd1234"
+        other_host = "other-host:4321:abcd1234"
+        assert worker_is_dead(dead, queue.worker_id)
+        assert not worker_is_dead(alive, queue.worker_id)
+        # Em outro host não dá para saber: vale o prazo sem sinal de vida.
+        assert not worker_is_dead(other_host, queue.worker_id)
+
+        db = numbering_sessions()
+        try:
+            now = datetime.datetime.utcnow()
+            jobs = [
+                models.FiscalJob(tenant_id=1, payload="{}", status="processing", locked_by=locked_by, locked_at=locked_at)
+                for locked_by, locked_at in [
+                    (dead, now), (alive, now), (other_host, now), (other_host, now - datetime.timedelta(seconds=301)),
+                ]
+            ]
+            db.add_all(jobs)
+            db.commit()
+            assert queue.recover(db) == 2
+            db.expire_all()
+            assert [job.status for job in jobs] == ["queued", "processing", "processing", "queued"]
+        finally:
+            db.close()
+
+    def test_drain_sweeps_jobs_of_workers_that_die_meanwhile(self, numbering_sessions):
+        db = numbering_sessions()
+        try:
+            # Job de um worker de outro host que parou de renovar o sinal de vida.
+            job = models.FiscalJob(
+                tenant_id=1, payload=json.dumps(invoice(number="7")), status="processing", attempts=1,
+                locked_by="other-host:4321:abcd1234", locked_at=datetime.datetime.utcnow(),
+            )
+            db.add(job)
+            db.commit()
+            job_id = job.id
+        finally:
+            db.close()
+
+        pipeline = AuthorizingPipeline()
+        queue = FiscalQueue(pipeline=pipeline, stale_after=0.3)
+        started = time.perf_counter()
+        asyncio.run(asyncio.wait_for(queue.drain(numbering_sessions), 5))
+        # O worker continuou rodando e pegou o job assim que ele ficou abandonado.
+        assert time.perf_counter() - started >= 0.3
+        assert pipeline.emitted == ["7"]
+        db = numbering_sessions()
+        try:
+            assert db.query(models.FiscalJob.status).filter(models.FiscalJob.id == job_id).scalar() == "authorized"
+        finally:
+            db.close()
+
+    def test_heartbeat_keeps_long_emissions_claimed(self, numbering_sessions):
+        class SlowPipeline(AuthorizingPipeline):
+            async def emit(self, invoice_data):
+                await asyncio.sleep(0.5)
+                return await super().emit(invoice_data)
+
+        job_id = self.enqueue_and_crash(numbering_sessions)
+        db = numbering_sessions()
+        try:
+            # Só o job desta execução: o anterior já foi devolvido.
+            db.query(models.FiscalJob).update({"status": "queued", "locked_by": None})
+            db.commit()
+        finally:
+            db.close()
+        first, second = SlowPipeline(), AuthorizingPipeline()
+        worker = FiscalQueue(pipeline=first, stale_after=0.3)
+        observer = FiscalQueue(pipeline=second, stale_after=0.3)
+        observer.worker_id = f"{HOSTNAME}:{os.getppid()}:observer" # Outro processo do mesmo host.
+
+        async def run():
+            draining = asyncio.create_task(worker.drain(numbering_sessions))
+            await asyncio.sleep(0.4)
+            # A emissão passou do prazo, mas o worker renova o sinal de vida: nada a recuperar.
+            recovered = await asyncio.to_thread(observer._tick, numbering_sessions, [])
+            await draining
+            return recovered
+
+        assert asyncio.run(run()) == 0
+        assert (first.emitted, second.emitted) == (["1"], [])
+        db = numbering_sessions()
+        try:
+            assert db.query(models.FiscalJob.status).filter(models.FiscalJob.id == job_id).scalar() == "authorized"
+        finally:
+            db.close()
@@ -30,6 +30,24 @@ class TestInventoryRouter:
         data = response.json()
         assert len(data) == 3
     
+    def test_get_parts_only_from_own_tenant(self, client: TestClient, auth_headers, test_tenant, db):
+        """Test that the parts list is scoped to the user's tenant"""
+        from models import Part, Tenant
+
+        other = Tenant(name="Other Marina", subdomain="other")
+        db.add(other)
+        db.commit()
+        db.add_all([
+            Part(sku="OWN-1", name="Own part", tenant_id=test_tenant.id),
+            Part(sku="OTHER-1", name="Other part", tenant_id=other.id),
+        ])
+        db.commit()
+
+        response = client.get("/api/inventory/parts", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert [p["sku"] for p in response.json()] == ["OWN-1"]
+
     def test_create_part(self, client: TestClient, auth_headers):
         """Test creating a new part"""
         part_data = {
@@ -104,6 +122,81 @@ class TestInventoryRouter:
         assert data["name"] == "Updated Name"
         assert data["quantity"] == 20.0
     
+    def test_price_changes_since(self, client: TestClient, auth_headers, test_tenant, db):
+        """Test incremental price deltas built from the price history"""
+        from datetime import datetime, timedelta
+        from models import Part, PartPriceHistory
+
+        part = Part(sku="DELTA-1", name="Delta Part", cost=12.0, price=24.0, tenant_id=test_tenant.id)
+        untouched = Part(sku="DELTA-2", name="Untouched", cost=1.0, price=2.0, tenant_id=test_tenant.id)
+        db.add_all([part, untouched])
+        db.commit()
+        now = datetime.utcnow()
+        db.add_all([
+            PartPriceHistory(tenant_id=test_tenant.id, part_id=part.id, source="mercury", cost=10.0, price=20.0, observed_at=now - timedelta(days=2)),
+            PartPriceHistory(tenant_id=test_tenant.id, part_id=part.id, source="mercury", cost=12.0, price=24.0, observed_at=now - timedelta(hours=2)),
+        ])
+        db.commit()
+
+        client.put(f"/api/inventory/parts/{part.id}", json={"price": 26.0}, headers=auth_headers)
+        client.put(f"/api/inventory/parts/{untouched.id}", json={"quantity": 3}, headers=auth_headers)
+
+        since = (now - timedelta(days=1)).isoformat()
+        response = client.get(f"/api/inventory/parts/price-changes?since={since}", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 1
+        assert data[0]["sku"] == "DELTA-1"
+        assert data[0]["changes"] == 2
+        assert data[0]["source"] == "manual"
+        assert (data[0]["cost"], data[0]["price"]) == (12.0, 26.0)
+        assert (data[0]["previousCost"], data[0]["previousPrice"]) == (10.0, 20.0)
+
+        response = client.get(f"/api/inventory/parts/price-changes?since={since}&source=mercury", headers=auth_headers)
+        assert response.json()[0]["price"] == 24.0
+
+        # Usando o changedAt mais recente como próximo `since`, nada mais é retornado.
+        latest = max(change["changedAt"] for change in data)
+        response = client.get(f"/api/inventory/parts/price-changes?since={latest}", headers=auth_headers)
+        assert response.json() == []
+
+    def test_price_changes_are_paged_without_losing_ties(self, client: TestClient, auth_headers, test_tenant, db):
+        """Test that parts sharing a changedAt across a page boundary are all returned"""
+        from datetime import datetime, timedelta
+        from models import Part, PartPriceHistory
+
+        parts = [Part(sku=f"TIE-{i}", name=f"Tie {i}", cost=1.0, price=2.0, tenant_id=test_tenant.id) for i in range(5)]
+        db.add_all(parts)
+        db.commit()
+        now = datetime.utcnow().replace(microsecond=0)
+        moments = [now - timedelta(hours=3), now - timedelta(hours=1), now - timedelta(hours=1), now - timedelta(hours=1), now]
+        db.add_all([
+            PartPriceHistory(tenant_id=test_tenant.id, part_id=part.id, source="mercury", cost=1.0, price=2.0, observed_at=moment)
+            for part, moment in zip(parts, moments)
+        ])
+        # Alteração mais antiga da TIE-4: conta em `changes`, mas não define a ordem.
+        db.add(PartPriceHistory(tenant_id=test_tenant.id, part_id=parts[4].id, source="manual", cost=1.0, price=1.5, observed_at=now - timedelta(hours=4)))
+        db.commit()
+
+        since = (now - timedelta(days=1)).isoformat()
+        skus, changes, cursor, pages = [], {}, None, 0
+        while True:
+            params = {"since": since, "limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = client.get("/api/inventory/parts/price-changes", params=params, headers=auth_headers)
+            assert response.status_code == 200
+            assert len(response.json()) <= 2
+            pages += 1
+            for change in response.json():
+                skus.append(change["sku"])
+                changes[change["sku"]] = change["changes"]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        # As três peças com o mesmo changedAt atravessam a divisa da página sem se perder.
+        assert skus == ["TIE-0", "TIE-1", "TIE-2", "TIE-3", "TIE-4"]
+        assert pages == 3
+        assert changes["TIE-4"] == 2
+
     def test_update_part_quantity(self, client: TestClient, auth_headers, test_tenant, db):
         """Test updating part quantity specifically"""
         from models import Part
@@ -161,6 +254,47 @@ class TestInventoryRouter:
         data = response.json()
         assert len(data) >= 1
     
+    def test_stock_movements_cursor_pagination(self, client: TestClient, auth_headers, test_tenant, db):
+        """Test walking the movements history page by page with the cursor"""
+        from datetime import datetime, timedelta
+        from models import Part, StockMovement
+
+        part = Part(sku="PAGED-PART", name="Paged Part", tenant_id=test_tenant.id)
+        db.add(part)
+        db.commit()
+        start = datetime(2024, 1, 1)
+        # Datas repetidas de 10 em 10: o id desempata sem duplicar nem pular movimentos.
+        db.add_all([
+            StockMovement(part_id=part.id, quantity=1, type="IN_INVOICE", description=f"Mov {i}",
+                          date=start + timedelta(minutes=i // 10), tenant_id=test_tenant.id)
+            for i in range(250)
+        ])
+        db.commit()
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            params = {"limit": 100, **({"cursor": cursor} if cursor else {})}
+            response = client.get("/api/inventory/movements", params=params, headers=auth_headers)
+            assert response.status_code == 200
+            seen.extend(m["id"] for m in response.json())
+            pages += 1
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        assert pages == 3
+        assert len(seen) == len(set(seen)) == 250
+        # Mais recentes primeiro, id decrescente entre movimentos do mesmo instante.
+        expected = db.query(StockMovement.id).order_by(StockMovement.date.desc(), StockMovement.id.desc()).all()
+        assert seen == [row.id for row in expected]
+
+    def test_invalid_cursor_and_page_size(self, client: TestClient, auth_headers):
+        """Test that a tampered cursor and an oversized page are rejected"""
+        response = client.get("/api/inventory/movements", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+        assert response.status_code == 400
+        response = client.get("/api/inventory/parts", params={"limit": 10000}, headers=auth_headers)
+        assert response.status_code == 422
+
     def test_create_stock_movement(self, client: TestClient, auth_headers, test_tenant, db):
         """Test creating a stock movement"""
         from models import Part
@@ -196,3 +330,139 @@ class TestInventoryRouter:
         response = client.get("/api/inventory/parts")
         
         assert response.status_code == 401
+
+
+def supplier_nfe(number: str, items, key: str = None, proc: bool = True) -> bytes:
+    """Supplier NF-e (nfeProc with authorization protocol) as a distributor would send it"""
+    key = key or f"4124051234567800019955001{int(number):09d}1000000010"
+    dets = "".join(
+        f'<det nItem="{n}"><prod><cProd>{sku}</cProd><cEAN>{ean}</cEAN><xProd>{name}</xProd>'
+        f'<qCom>{qty:.4f}</qCom><vUnCom>{cost:.2f}</vUnCom><vProd>{qty * cost:.2f}</vProd></prod>'
+        f'<imposto><vTotTrib>0.00</vTotTrib></imposto></det>'
+        for n, (sku, ean, name, qty, cost) in enumerate(items, start=1)
+    )
+    total = sum(qty * cost for _, _, _, qty, cost in items)
+    nfe = (
+        f'<NFe xmlns="http://www.portalfiscal.inf.br/nfe"><infNFe Id="NFe{key}" versao="4.00">'
+        f'<ide><nNF>{number}</nNF><serie>1</serie><dhEmi>2024-05-10T10:20:30-03:00</dhEmi></ide>'
+        f'<emit><CNPJ>12345678000199</CNPJ><xNome>Distribuidora Nautica &amp; Cia</xNome></emit>'
+        f'<dest><CNPJ>98765432000100</CNPJ><xNome>Mare Alta</xNome></dest>{dets}'
+        f'<total><ICMSTot><vProd>{total:.2f}</vProd><vNF>{total:.2f}</vNF></ICMSTot></total></infNFe></NFe>'
+    )
+    if proc:
+        nfe = (
+            f'<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">{nfe}'
+            f'<protNFe versao="4.00"><infProt><chNFe>{key}</chNFe><nProt>141240000000001</nProt></infProt></protNFe></nfeProc>'
+        )
+    return ('<?xml version="1.0" encoding="UTF-8"?>' + nfe).encode("utf-8")
+
+
+@pytest.mark.routers
+class TestInvoiceImport:
+    """Test server-side import of supplier NF-e XMLs"""
+
+    @pytest.fixture
+    def parts(self, db, test_tenant):
+        from models import Part
+
+        filter_part = Part(sku="8M-0123456", name="Filtro", quantity=10, cost=40.0, price=90.0, tenant_id=test_tenant.id)
+        plug_part = Part(sku="NGK-BKR6E", barcode="7891234567895", name="Vela", quantity=0, cost=0, price=30.0, tenant_id=test_tenant.id)
+        db.add_all([filter_part, plug_part])
+        db.commit()
+        return filter_part, plug_part
+
+    def post(self, client, auth_headers, *files):
+        return client.post(
+            "/api/inventory/invoices/import",
+            files=[("files", (name, content, "application/octet-stream")) for name, content in files],
+            headers=auth_headers,
+        )
+
+    def test_import_single_xml(self, client: TestClient, auth_headers, db, parts):
+        from models import Invoice, MovementType, StockMovement
+
+        xml = supplier_nfe("1001", [
+            ("8M0123456", "SEM GTIN", "Filtro de oleo", 10, 60.0),     # mesmo SKU, sem o traço
+            ("VELA-01", "7891234567895", "Vela de ignicao", 4, 12.5),  # pelo código de barras
+            ("XPTO-99", "SEM GTIN", "Item sem cadastro", 1, 5.0),
+        ])
+        response = self.post(client, auth_headers, ("nfe-1001.xml", xml))
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["imported"], data["duplicates"], data["errors"], data["movements"]) == (1, 0, 0, 2)
+        document = data["documents"][0]
+        assert document["supplier"] == "Distribuidora Nautica & Cia"
+        assert document["matched"] == 2
+        assert [line["sku"] for line in document["unmatched"]] == ["XPTO-99"]
+
+        filter_part, plug_part = parts
+        db.expire_all()
+        assert filter_part.quantity == 20 and filter_part.cost == pytest.approx(50.0)
+        assert plug_part.quantity == 4 and plug_part.cost == pytest.approx(12.5)
+        movements = db.query(StockMovement).filter(StockMovement.type == MovementType.IN_INVOICE).all()
+        assert sorted(m.quantity for m in movements) == [4, 10]
+        invoice = db.query(Invoice).one()
+        assert invoice.id == document["invoiceId"]
+        assert invoice.xml_key.startswith("41240512345678") and invoice.total_value == 655.0
+
+    def test_import_zip_with_invalid_file(self, client: TestClient, auth_headers, parts):
+        import io
+        import zipfile
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("a.xml", supplier_nfe("2001", [("8M0123456", "SEM GTIN", "Filtro", 1, 40.0)]))
+            archive.writestr("b.xml", supplier_nfe("2002", [("NGK-BKR6E", "SEM GTIN", "Vela", 2, 10.0)], proc=False))
+            archive.writestr("notas.txt", "ignorado")
+            archive.writestr("quebrado.xml", "<NFe><infNFe>")
+        response = self.post(client, auth_headers, ("notas.zip", buffer.getvalue()))
+        data = response.json()
+        assert (data["imported"], data["errors"], data["movements"]) == (2, 1, 2)
+        assert data["documents"][-1]["file"] == "notas.zip/quebrado.xml"
+
+    def test_reimport_is_ignored(self, client: TestClient, auth_headers, db, parts):
+        xml = supplier_nfe("3001", [("8M0123456", "SEM GTIN", "Filtro", 5, 40.0)])
+        self.post(client, auth_headers, ("nfe.xml", xml))
+        data = self.post(client, auth_headers, ("nfe.xml", xml), ("copia.xml", xml)).json()
+        assert data["imported"] == 0 and data["duplicates"] == 2
+        db.expire_all()
+        assert parts[0].quantity == 15
+
+    def test_large_distributor_invoice(self, client: TestClient, auth_headers, test_tenant, db):
+        from models import Part, StockMovement
+
+        db.add_all([Part(sku=f"8M{i:07d}", name=f"Item {i}", quantity=0, tenant_id=test_tenant.id) for i in range(300)])
+        db.commit()
+        xml = supplier_nfe("4001", [(f"8M{i:07d}", "SEM GTIN", f"Item {i}", 2, 10.0) for i in range(300)])
+        data = self.post(client, auth_headers, ("distribuidor.xml", xml)).json()
+        assert data["movements"] == 300
+        assert db.query(StockMovement).count() == 300
+
+    def test_prefix_or_suffix_only_matches_stay_unmatched(self, client: TestClient, auth_headers, test_tenant, db):
+        from models import Part, StockMovement
+
+        part = Part(sku="200", name="Rotor", quantity=5, cost=100.0, price=150.0, tenant_id=test_tenant.id)
+        kit = Part(sku="ABC-100K1", name="Kit junta", quantity=1, cost=80.0, price=120.0, tenant_id=test_tenant.id)
+        db.add_all([part, kit])
+        db.commit()
+        xml = supplier_nfe("5001", [
+            ("10-200", "SEM GTIN", "Outra peca com prefixo", 3, 10.0),  # só casaria removendo o prefixo
+            ("1-200", "SEM GTIN", "Outra peca com prefixo", 2, 10.0),
+            ("ABC100", "SEM GTIN", "Peca avulsa do kit", 1, 10.0),     # só casaria removendo o sufixo
+        ])
+        document = self.post(client, auth_headers, ("nfe-5001.xml", xml)).json()["documents"][0]
+        assert document["matched"] == 0
+        assert [line["sku"] for line in document["unmatched"]] == ["10-200", "1-200", "ABC100"]
+
+        db.expire_all()
+        assert (part.quantity, part.cost) == (5, 100.0)
+        assert (kit.quantity, kit.cost) == (1, 80.0)
+        assert db.query(StockMovement).count() == 0
+
+    def test_not_an_nfe(self, client: TestClient, auth_headers):
+        data = self.post(client, auth_headers, ("pedido.xml", b"<pedido><item/></pedido>")).json()
+        assert data["errors"] == 1 and data["documents"][0]["status"] == "error"
+
+    def test_requires_authentication(self, client: TestClient):
+        response = client.post("/api/inventory/invoices/import", files=[("files", ("a.xml", b"<NFe/>", "text/xml"))])
+        assert response.status_code == 401
@@ -0,0 +1,356 @@
+"""
+Test Mercury router (portal access is replaced by canned results)
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from routers import mercury_router
+
+
+def portal_row(code, sale, cost):
+    return {
+        "codigo": code, "qtd": "1", "descricao": f"Item {code}", "qtdaEst": "1",
+        "valorVenda": sale, "valorTabela": sale, "valorCusto": cost,
+    }
+
+
+@pytest.fixture
+def mercury_company(db, test_tenant):
+    """Company info with Mercury credentials"""
+    from models import CompanyInfo
+
+    company = CompanyInfo(
+        tenant_id=test_tenant.id,
+        company_name="Mare Alta",
+        mercury_username="user",
+        mercury_password="secret"
+    )
+    db.add(company)
+    db.commit()
+    return company
+
+
+@pytest.fixture(autouse=True)
+def clear_mercury_cache():
+    """Keep cached portal results from leaking between tests"""
+    from services.mercury_cache import mercury_cache
+    mercury_cache.memory.clear()
+    yield
+    mercury_cache.memory.clear()
+
+
+@pytest.mark.mercury
+@pytest.mark.routers
+class TestMercurySearch:
+    """Test product search and warranty endpoints"""
+
+    def test_search_is_served_from_cache(self, client: TestClient, auth_headers, mercury_company, monkeypatch):
+        calls = []
+
+        async def fake_search(item, company, tenant_id=None):
+            calls.append(item)
+            return [portal_row("8M0123456", "R$ 10,00", "R$ 5,00")]
+
+        monkeypatch.setattr(mercury_router, "search_product_portal", fake_search)
+
+        for _ in range(3):
+            response = client.get("/api/mercury/search/8M0123456", headers=auth_headers)
+            assert response.status_code == 200
+            assert response.json()["results"][0]["codigo"] == "8M0123456"
+        assert len(calls) == 1
+
+        response = client.get("/api/mercury/search/8M0123456?refresh=true", headers=auth_headers)
+        assert response.status_code == 200
+        assert len(calls) == 2
+
+        response = client.delete("/api/mercury/cache?operation=product", headers=auth_headers)
+        assert response.json()["removed"] == 1
+        client.get("/api/mercury/search/8M0123456", headers=auth_headers)
+        assert len(calls) == 3
+
+    def test_warranty_not_found(self, client: TestClient, auth_headers, mercury_company, monkeypatch):
+        async def fake_warranty(serial, company, tenant_id=None):
+            return None
+
+        monkeypatch.setattr(mercury_router, "search_warranty_portal", fake_warranty)
+        response = client.get("/api/mercury/warranty/XYZ", headers=auth_headers)
+        assert response.status_code == 404
+
+    def test_busy_portal_returns_503(self, client: TestClient, auth_headers, mercury_company, monkeypatch):
+        from services.mercury_limiter import PortalBusy
+
+        async def busy_search(item, company, tenant_id=None):
+            raise PortalBusy("Fila de acesso ao portal Mercury cheia.")
+
+        monkeypatch.setattr(mercury_router, "search_product_portal", busy_search)
+        response = client.get("/api/mercury/search/filtro", headers=auth_headers)
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "5"
+
+    def test_concurrent_identical_searches_are_coalesced(self, monkeypatch):
+        import asyncio
+        calls = []
+
+        async def fake_fetch(item, company, tenant_id):
+            calls.append((tenant_id, item))
+            await asyncio.sleep(0.01)
+            return [portal_row(item.strip().upper(), "R$ 10,00", "R$ 5,00")]
+
+        monkeypatch.setattr(mercury_router, "_fetch_product", fake_fetch)
+
+        async def run():
+            return await asyncio.gather(
+                mercury_router.search_product_portal("8m0123456", None, tenant_id=1),
+                mercury_router.search_product_portal(" 8M0123456", None, tenant_id=1),
+                mercury_router.search_product_portal("8M0123456", None, tenant_id=2),
+            )
+
+        first, second, other_tenant = asyncio.run(run())
+        assert first == second
+        assert other_tenant[0]["codigo"] == "8M0123456"
+        assert sorted(tenant for tenant, _ in calls) == [1, 2]
+
+
+@pytest.mark.mercury
+@pytest.mark.routers
+class TestMercuryCircuitBreaker:
+    """Test fast-fail behaviour while the portal is down"""
+
+    def test_open_circuit_serves_stale_or_503(self, client: TestClient, auth_headers, test_tenant, mercury_company, monkeypatch):
+        from services.mercury_breaker import CircuitBreaker
+        from services.mercury_cache import mercury_cache
+
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, call_timeout=5)
+        monkeypatch.setattr(mercury_router, "portal_breaker", breaker)
+        calls = []
+
+        async def failing_scrape(item, company, tenant_id):
+            calls.append(item)
+            raise RuntimeError("net::ERR_CONNECTION_TIMED_OUT")
+
+        monkeypatch.setattr(mercury_router, "_scrape_product", failing_scrape)
+        # Resultado antigo, já expirado, mas ainda dentro do prazo de "stale".
+        monkeypatch.setitem(mercury_cache.ttls, "product", -1)
+        mercury_cache.set(test_tenant.id, "product", "filtro", [portal_row("8M0123456", "R$ 10,00", "R$ 5,00")])
+
+        for _ in range(2):
+            assert client.get("/api/mercury/search/filtro", headers=auth_headers).status_code == 500
+        assert breaker.state == "open"
+
+        response = client.get("/api/mercury/search/filtro", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["stale"] is True
+        assert response.json()["results"][0]["codigo"] == "8M0123456"
+
+        response = client.get("/api/mercury/search/helice", headers=auth_headers)
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) > 0
+        assert len(calls) == 2
+
+        response = client.get("/api/mercury/breaker", headers=auth_headers)
+        assert response.json()["breaker"]["state"] == "open"
+        response = client.post("/api/mercury/breaker/reset", headers=auth_headers)
+        assert response.json()["breaker"]["state"] == "closed"
+
+
+@pytest.mark.mercury
+@pytest.mark.routers
+class TestMercuryBulkSync:
+    """Test bulk price sync job"""
+
+    def test_bulk_sync_updates_matching_parts(self, client: TestClient, auth_headers, test_tenant, mercury_company, db, monkeypatch):
+        from models import Part
+
+        catalog = {
+            "8M0123456": [portal_row("8M0123456", "R$ 1.234,56", "R$ 987,65")],
+            "35-8M0065104": [portal_row("35-8M0065104", "R$ 210,90", "R$ 150,10")],
+        }
+        searched = []
+
+        async def fake_search(item, company, tenant_id=None):
+            searched.append(item)
+            return catalog.get(item, [])
+
+        monkeypatch.setattr(mercury_router, "search_product_portal", fake_search)
+
+        for sku, manufacturer in [("8M0123456", "Mercury"), ("35-8M0065104", "MERCURY"), ("UNKNOWN-1", "Mercury"), ("YAM-1", "Yamaha")]:
+            db.add(Part(sku=sku, name=sku, manufacturer=manufacturer, tenant_id=test_tenant.id))
+        db.commit()
+
+        response = client.post("/api/mercury/sync-prices", json={"concurrency": 2}, headers=auth_headers)
+        assert response.status_code == 200
+        job_id = response.json()["job"]["id"]
+        assert response.json()["job"]["total"] == 3
+
+        response = client.get(f"/api/mercury/sync-prices/{job_id}", headers=auth_headers)
+        assert response.status_code == 200
+        job = response.json()["job"]
+        assert job["status"] == "completed"
+        assert job["processed"] == 3
+        assert job["updated"] == 2
+        assert job["not_found"] == 1
+        assert sorted(searched) == ["35-8M0065104", "8M0123456", "UNKNOWN-1"]
+
+        db.expire_all()
+        part = db.query(Part).filter(Part.sku == "8M0123456").first()
+        assert part.price == 1234.56
+        assert part.cost == 987.65
+        assert part.last_price_updated_at is not None
+        assert db.query(Part).filter(Part.sku == "YAM-1").first().last_price_updated_at is None
+
+        from models import PartPriceHistory
+        assert job["changed"] == 2
+        assert db.query(PartPriceHistory).filter(PartPriceHistory.source == "mercury").count() == 2
+
+        # Sem mudança de preço no portal, uma nova sincronização não grava histórico.
+        response = client.post("/api/mercury/sync-prices", json={}, headers=auth_headers)
+        job = client.get(f"/api/mercury/sync-prices/{response.json()['job']['id']}", headers=auth_headers).json()["job"]
+        assert job["updated"] == 2 and job["changed"] == 0
+        assert db.query(PartPriceHistory).count() == 2
+
+    def test_bulk_sync_reuses_rows_for_other_parts(self, client: TestClient, auth_headers, test_tenant, mercury_company, db, monkeypatch):
+        from models import Part
+
+        # Uma busca genérica devolve também as linhas de outras peças do catálogo.
+        rows = [
+            portal_row("8M0123456", "R$ 100,00", "R$ 80,00"),
+            portal_row("35-8M0065104", "R$ 210,90", "R$ 150,10"),
+            portal_row("92-858064K01", "R$ 89,00", "R$ 60,00"),
+        ]
+        searched = []
+
+        async def fake_search(item, company, tenant_id=None):
+            searched.append(item)
+            return rows
+
+        monkeypatch.setattr(mercury_router, "search_product_portal", fake_search)
+
+        for sku in ["8M0123456", "8M 0065104", "92-858064-K01"]:
+            db.add(Part(sku=sku, name=sku, manufacturer="Mercury", tenant_id=test_tenant.id))
+        db.commit()
+
+        response = client.post("/api/mercury/sync-prices", json={"concurrency": 1}, headers=auth_headers)
+        job = client.get(f"/api/mercury/sync-prices/{response.json()['job']['id']}", headers=auth_headers).json()["job"]
+        assert job["status"] == "completed"
+        assert job["updated"] == 3
+        assert job["searches"] == 1 and job["reused"] == 2
+        assert searched == ["8M0123456"]
+
+        db.expire_all()
+        assert db.query(Part).filter(Part.sku == "8M 0065104").first().price == 210.90
+        assert db.query(Part).filter(Part.sku == "92-858064-K01").first().cost == 60.00
+
+    def test_near_miss_skus_are_suggested_not_written(self, client: TestClient, auth_headers, test_tenant, mercury_company, db, monkeypatch):
+        from models import Part
+
+        # O portal só devolve a peça vizinha (um dígito de diferença).
+        async def fake_search(item, company, tenant_id=None):
+            return [portal_row("8M0065105", "R$ 999,00", "R$ 500,00")]
+
+        monkeypatch.setattr(mercury_router, "search_product_portal", fake_search)
+        part = Part(sku="8M0065104", name="Filtro", manufacturer="Mercury", price=210.9, cost=150.1, tenant_id=test_tenant.id)
+        db.add(part)
+        db.commit()
+        part_id = part.id
+
+        response = client.post(f"/api/mercury/sync-price/{part_id}", headers=auth_headers)
+        assert response.status_code == 404
+        assert "8M0065105" in response.json()["detail"]
+
+        response = client.post("/api/mercury/sync-prices", json={}, headers=auth_headers)
+        job = client.get(f"/api/mercury/sync-prices/{response.json()['job']['id']}", headers=auth_headers).json()["job"]
+        assert (job["updated"], job["not_found"]) == (0, 1)
+        assert [row["codigo"] for row in job["results"][0]["suggestions"]] == ["8M0065105"]
+
+        db.expire_all()
+        part = db.query(Part).filter(Part.id == part_id).first()
+        assert (part.price, part.cost, part.last_price_updated_at) == (210.9, 150.1, None)
+
+    def test_bulk_sync_requires_credentials(self, client: TestClient, auth_headers):
+        response = client.post("/api/mercury/sync-prices", json={}, headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_unknown_job_returns_404(self, client: TestClient, auth_headers):
+        response = client.get("/api/mercury/sync-prices/does-not-exist", headers=auth_headers)
+        assert response.status_code == 404
+
+
+@pytest.mark.mercury
+@pytest.mark.routers
+class TestMercuryWarrantyRefresh:
+    """Test background warranty refresh for registered engines"""
+
+    @pytest.fixture
+    def engines(self, db, test_tenant):
+        from datetime import datetime
+        from models import Boat, Client, Engine
+
+        owner = Client(name="Owner", document="12345678900", tenant_id=test_tenant.id)
+        db.add(owner)
+        db.commit()
+        boat = Boat(name="Boat", hull_id="HULL-1", client_id=owner.id, tenant_id=test_tenant.id)
+        db.add(boat)
+        db.commit()
+        engines = [
+            Engine(boat_id=boat.id, tenant_id=test_tenant.id, serial_number="2B123456", model="F115"),
+            Engine(boat_id=boat.id, tenant_id=test_tenant.id, serial_number="2b123456 ", model="F115"),
+            Engine(boat_id=boat.id, tenant_id=test_tenant.id, serial_number="9Z999999", model="F60"),
+            Engine(boat_id=boat.id, tenant_id=test_tenant.id, serial_number="1A000001", model="F90",
+                   warranty_status="ATIVA", warranty_checked_at=datetime.utcnow()),
+        ]
+        db.add_all(engines)
+        db.commit()
+        return engines
+
+    def test_refresh_writes_warranty_and_skips_recent(self, client: TestClient, auth_headers, mercury_company, engines, db, monkeypatch):
+        from models import Engine
+
+        fetched = []
+
+        async def fake_warranty(serial, company, tenant_id=None, include_client=True):
+            fetched.append((serial, include_client))
+            if serial.upper() != "2B123456":
+                return None
+            return {"nro_motor": serial, "modelo": "F115 ELPT EFI", "dt_venda": "15/03/2023",
+                    "status_garantia": "ATIVA", "vld_garantia": "15/03/2026"}
+
+        monkeypatch.setattr(mercury_router, "search_warranty_portal", fake_warranty)
+
+        response = client.post("/api/mercury/warranty-refresh", json={}, headers=auth_headers)
+        assert response.status_code == 200
+        job_id = response.json()["job"]["id"]
+        assert response.json()["job"]["total"] == 3
+
+        job = client.get(f"/api/mercury/warranty-refresh/{job_id}", headers=auth_headers).json()["job"]
+        assert job["status"] == "completed"
+        assert (job["updated"], job["not_found"], job["changed"]) == (2, 1, 2)
+        # Seriais repetidos são consultados uma vez, sem a página do cliente.
+        assert sorted(fetched) == [("2B123456", False), ("9Z999999", False)]
+
+        db.expire_all()
+        refreshed = db.query(Engine).filter(Engine.id == engines[1].id).first()
+        assert (refreshed.warranty_status, refreshed.warranty_validity, refreshed.sale_date) == ("ATIVA", "15/03/2026", "15/03/2023")
+        assert refreshed.warranty_checked_at is not None
+        assert db.query(Engine).filter(Engine.id == engines[2].id).first().warranty_checked_at is not None
+
+        # Todos verificados há pouco: nada a fazer, a menos que seja forçado.
+        response = client.post("/api/mercury/warranty-refresh", json={}, headers=auth_headers)
+        assert response.json()["job"]["total"] == 0
+        response = client.post("/api/mercury/warranty-refresh", json={"force": True}, headers=auth_headers)
+        assert response.json()["job"]["total"] == 4
+
+    def test_scheduled_refresh_covers_all_tenants(self, db, mercury_company, engines, monkeypatch):
+        import asyncio
+        from sqlalchemy.orm import sessionmaker
+
+        fetched = []
+
+        async def fake_warranty(serial, company, tenant_id=None, include_client=True):
+            fetched.append((tenant_id, serial))
+            return None
+
+        monkeypatch.setattr(mercury_router, "search_warranty_portal", fake_warranty)
+        session_factory = sessionmaker(bind=db.get_bind())
+        asyncio.run(mercury_router.refresh_all_tenants_warranty(session_factory))
+        assert sorted(serial for _, serial in fetched) == ["2B123456", "9Z999999"]
+        assert {tenant for tenant, _ in fetched} == {mercury_company.tenant_id}
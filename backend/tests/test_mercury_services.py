@@ -0,0 +1,901 @@
+"""
+Test Mercury scraper services (sessions, caching, concurrency)
+"""
+import asyncio
+import os
+import time
+import httpx
+import pytest
+
+from services import mercury_parser
+from services.mercury_breaker import CircuitBreaker, CircuitOpen, MercuryPortalError
+from services.mercury_cache import MISSING, MercuryResultCache
+from services.mercury_http import MercuryHttpClient, MercuryHttpUnavailable
+from services.mercury_limiter import PortalBusy, PortalLimiter
+from services.mercury_session import MercurySessionManager, is_login_page
+from services.mercury_sku import SkuIndex, base_sku, normalize_sku
+from services.singleflight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def unthrottled_portal(monkeypatch):
+    """The rate governor has its own tests; don't let it slow the fake portal down"""
+    from services.mercury_limiter import portal_limiter
+    monkeypatch.setattr(portal_limiter, "rps", 0)
+
+
+LOGIN_HTML = '<form><input name="sUsuar"><input type="password" name="sSenha"></form>'
+
+
+class FakeContext:
+    """Minimal stand-in for a Playwright BrowserContext"""
+
+    def __init__(self):
+        self.cookies = []
+
+    async def add_cookies(self, cookies):
+        self.cookies = list(cookies)
+
+    async def clear_cookies(self):
+        self.cookies = []
+
+    async def storage_state(self):
+        return {"cookies": list(self.cookies), "origins": []}
+
+
+class FakePage:
+    """Minimal stand-in for a Playwright Page talking to the portal"""
+
+    def __init__(self, portal):
+        self.portal = portal
+        self.context = FakeContext()
+        self.url = None
+
+    async def goto(self, url):
+        self.url = url
+        await asyncio.sleep(0)
+
+    async def fill(self, selector, value):
+        pass
+
+    async def press(self, selector, key):
+        self.portal.logins += 1
+        await asyncio.sleep(0.01)
+        self.context.cookies = [{"name": "ASPSESSION", "value": f"s{self.portal.logins}"}]
+
+    async def wait_for_load_state(self):
+        pass
+
+    async def content(self):
+        cookie = self.context.cookies[0]["value"] if self.context.cookies else None
+        if cookie is None or cookie in self.portal.expired:
+            return LOGIN_HTML
+        return "<table><tr class='Row'><td>ok</td></tr></table>"
+
+
+class FakePortal:
+    def __init__(self):
+        self.logins = 0
+        self.expired = set()
+
+
+@pytest.mark.mercury
+class TestMercurySessionManager:
+    """Test per-tenant session reuse"""
+
+    def test_is_login_page(self):
+        assert is_login_page(LOGIN_HTML)
+        assert not is_login_page("<table></table>")
+
+    def test_session_is_reused_across_requests(self):
+        portal = FakePortal()
+        manager = MercurySessionManager()
+
+        async def run():
+            for _ in range(3):
+                html = await manager.goto(FakePage(portal), "https://portal/x", 1, "user", "pw")
+                assert "Row" in html
+
+        asyncio.run(run())
+        assert portal.logins == 1
+        assert manager.reuses == 2
+
+    def test_concurrent_requests_login_once(self):
+        portal = FakePortal()
+        manager = MercurySessionManager()
+
+        async def run():
+            pages = [FakePage(portal) for _ in range(5)]
+            await asyncio.gather(*(manager.goto(p, "https://portal/x", 1, "user", "pw") for p in pages))
+
+        asyncio.run(run())
+        assert portal.logins == 1
+
+    def test_expired_session_reauthenticates(self):
+        portal = FakePortal()
+        manager = MercurySessionManager()
+
+        async def run():
+            await manager.goto(FakePage(portal), "https://portal/x", 1, "user", "pw")
+            portal.expired.add("s1")
+            html = await manager.goto(FakePage(portal), "https://portal/x", 1, "user", "pw")
+            assert "Row" in html
+
+        asyncio.run(run())
+        assert portal.logins == 2
+
+    def test_tenants_are_isolated(self):
+        portal = FakePortal()
+        manager = MercurySessionManager()
+
+        async def run():
+            await manager.goto(FakePage(portal), "https://portal/x", 1, "user1", "pw")
+            await manager.goto(FakePage(portal), "https://portal/x", 2, "user2", "pw")
+
+        asyncio.run(run())
+        assert portal.logins == 2
+        assert manager.get_cookies(1) != manager.get_cookies(2)
+
+
+# --- Parser / HTTP backend over recorded portal pages ---
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "mercury")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def portal_transport(pages=None, accept_login=True):
+    """httpx transport that answers like the portal, using the recorded pages"""
+    pages = pages or {}
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        page = request.url.path.rsplit("/", 1)[-1]
+        if page == "epdv001.asp":
+            if request.method == "POST" and accept_login:
+                return httpx.Response(200, text="<html>ok</html>", headers={"Set-Cookie": "ASPSESSIONID=abc; Path=/"})
+            return httpx.Response(200, text=load_fixture("epdv001.html"))
+        if "ASPSESSIONID=abc" not in request.headers.get("cookie", ""):
+            return httpx.Response(200, text=load_fixture("epdv001.html"))
+        name = pages.get(page, page.replace(".asp", ".html"))
+        return httpx.Response(200, text=load_fixture(name))
+
+    return httpx.MockTransport(handler), calls
+
+
+@pytest.mark.mercury
+class TestMercuryParser:
+    """Test parsing of recorded portal pages"""
+
+    def test_parse_product_results(self):
+        rows = mercury_parser.parse_product_results(load_fixture("epdv002d2.html"))
+        assert len(rows) == 3
+        assert rows[0]["codigo"] == "8M0123456"
+        assert rows[0]["valorVenda"] == "R$ 1.234,56"
+        assert rows[0]["valorCusto"] == "R$ 987,65"
+
+    def test_no_records(self):
+        html = load_fixture("epdv002d2_norecords.html")
+        assert mercury_parser.is_no_records(html)
+        assert mercury_parser.parse_product_results(html) == []
+
+    def test_parse_warranty(self):
+        summary = mercury_parser.parse_warranty_summary(load_fixture("ewr010.html"), "2B123456")
+        assert summary["modelo"] == "F115 ELPT EFI"
+        assert summary["status_garantia"] == "ATIVA"
+        assert summary["vld_garantia"] == "15/03/2026"
+        assert mercury_parser.parse_warranty_summary(load_fixture("ewr010.html"), "9Z999999") is None
+        assert mercury_parser.parse_warranty_client_name(load_fixture("ewr010c.html")) == "JOAO DA SILVA"
+
+    def test_large_result_page(self):
+        html = load_fixture("epdv002d2.html")
+        row = '<tr class="Row Alt"><td><input type="checkbox"></td><td> <b>8M{0:07d}</b> </td><td>1</td><td>FILTRO {0}</td><td>0</td><td>R$ 1,00</td><td>R$ 1,00</td><td>R$ 0,50</td></tr>'
+        extra = "".join(row.format(i) for i in range(500))
+        html = html.replace("</table>\n    </td>", extra + "</table>\n    </td>", 1)
+        rows = mercury_parser.parse_product_results(html)
+        assert len(rows) == 503
+        assert rows[3]["codigo"] == "8M0000000"
+        assert rows[-1]["descricao"] == "FILTRO 499"
+
+    def test_empty_or_unrelated_pages(self):
+        assert mercury_parser.parse_product_results("") == []
+        assert mercury_parser.parse_product_results("<html><body><table><tr class='Row'><td>x</td></tr></table></body></html>") == []
+        assert mercury_parser.parse_warranty_summary("", "2B123456") is None
+        assert mercury_parser.parse_warranty_client_name("") == ""
+
+
+@pytest.mark.mercury
+class TestSkuIndex:
+    """Test normalized SKU matching of portal rows"""
+
+    def test_normalized_keys(self):
+        assert normalize_sku(" 8m-012 3456 ") == "8M0123456"
+        assert base_sku("35-8M0065104") == "8M0065104"
+        assert base_sku("92-858064K01") == "858064"
+
+    def test_exact_before_part_number(self):
+        index = SkuIndex([("92-858064K01", "kit"), ("858064", "part"), ("35-8M0065104", "filter")])
+        assert index.get("858064") == "part"
+        assert index.get("92 858064 k01") == "kit"
+        assert index.get("8M0065104") == "filter"
+
+    def test_prefixed_kit_prefers_its_own_row(self):
+        # O prefixo de categoria da peça não está no portal; o sufixo do kit precisa ser mantido.
+        rows = [{"codigo": "858064"}, {"codigo": "858064K01"}]
+        assert mercury_parser.match_portal_row(rows, "92-858064K01")["codigo"] == "858064K01"
+        assert mercury_parser.match_portal_row(list(reversed(rows)), "92-858064K01")["codigo"] == "858064K01"
+
+    def test_kit_does_not_take_other_kit_or_bare_part(self):
+        rows = [{"codigo": "8M0065104"}, {"codigo": "8M0065104K02"}]
+        assert mercury_parser.match_portal_row(rows, "8M0065104K01") is None
+        assert mercury_parser.match_portal_row(rows, "35-8M0065104K02")["codigo"] == "8M0065104K02"
+
+    def test_bare_part_does_not_take_kit_price(self):
+        rows = [{"codigo": "92-858064K01"}]
+        assert mercury_parser.match_portal_row(rows, "858064") is None
+        assert mercury_parser.match_portal_row(rows, "92-858064") is None
+        # Continua aparecendo como sugestão para revisão.
+        assert [row["codigo"] for row in mercury_parser.suggest_portal_rows(rows, "858064")] == ["92-858064K01"]
+
+    def test_skus_one_digit_apart_do_not_match(self):
+        # Números de peça parecidos são peças diferentes: nunca casam (só viram sugestão).
+        for row_sku, sku in [("8M0065105", "8M0065104"), ("35-879194A02", "35-879194A01"), ("8M0123456", "8M012345")]:
+            rows = [{"codigo": row_sku}]
+            assert mercury_parser.match_portal_row(rows, sku) is None
+            assert [row["codigo"] for row in mercury_parser.suggest_portal_rows(rows, sku)] == [row_sku]
+
+    def test_rejects_loose_substring_matches(self):
+        rows = mercury_parser.parse_product_results(load_fixture("epdv002d2.html"))
+        # A comparação antiga (`sku in codigo`) casava "8M01" com a primeira linha.
+        assert mercury_parser.match_portal_row(rows, "8M01") is None
+        assert mercury_parser.match_portal_row(rows, "8M9999999") is None
+        assert mercury_parser.match_portal_row(rows, "858064") is None  # só o kit 92-858064K01 está na página
+        assert mercury_parser.match_portal_row(rows, "858064K01")["codigo"] == "92-858064K01"
+
+    def test_ranked_candidates(self):
+        index = SkuIndex([("8M0123456", 1), ("8M0123457", 2), ("8M0123999", 3)])
+        ranked = index.candidates("8M01234561", cutoff=0.5)
+        assert [value for _, _, value in ranked][:2] == [1, 2]
+        assert ranked[0][0] > ranked[1][0]
+
+
+@pytest.mark.mercury
+class TestMercuryHttpClient:
+    """Test the browserless HTTP backend"""
+
+    def test_search_product_logs_in_once(self):
+        transport, calls = portal_transport()
+        client = MercuryHttpClient(base_url="https://portal.test/epdv", transport=transport)
+
+        async def run():
+            first = await client.search_product("filtro", "user", "pw", tenant_id=1)
+            second = await client.search_product("filtro", "user", "pw", tenant_id=1)
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert len(first) == 3 and first == second
+        assert client.logins == 1
+        login_posts = [c for c in calls if c.method == "POST"]
+        assert login_posts[0].url.path.endswith("epdv001.asp")
+        assert b"sAcao=LOGIN" in login_posts[0].content
+
+    def test_search_warranty(self):
+        transport, _ = portal_transport()
+        client = MercuryHttpClient(base_url="https://portal.test/epdv", transport=transport)
+        result = asyncio.run(client.search_warranty("2B123456", "user", "pw", tenant_id=1))
+        assert result["nro_serie"] == "2B123456"
+        assert result["nome_cli"] == "JOAO DA SILVA"
+
+    def test_rejected_login_raises_unavailable(self):
+        transport, _ = portal_transport(accept_login=False)
+        client = MercuryHttpClient(base_url="https://portal.test/epdv", transport=transport)
+        with pytest.raises(MercuryHttpUnavailable):
+            asyncio.run(client.search_product("filtro", "user", "wrong", tenant_id=1))
+
+    def test_unknown_layout_raises_unavailable(self):
+        transport, _ = portal_transport(pages={"epdv002d2.asp": "ewr010c.html"})
+        client = MercuryHttpClient(base_url="https://portal.test/epdv", transport=transport)
+        with pytest.raises(MercuryHttpUnavailable):
+            asyncio.run(client.search_product("filtro", "user", "pw", tenant_id=1))
+
+
+@pytest.mark.mercury
+class TestMercuryResultCache:
+    """Test tenant-scoped result cache"""
+
+    def test_hit_after_fetch(self):
+        cache = MercuryResultCache(max_entries=10, ttls={"product": 60}, persistent_path="")
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return [{"codigo": "8M0123456"}]
+
+        async def run():
+            await cache.get_or_fetch(1, "product", "8m0123456", fetch)
+            return await cache.get_or_fetch(1, "product", " 8M0123456 ", fetch)
+
+        assert asyncio.run(run()) == [{"codigo": "8M0123456"}]
+        assert len(calls) == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_tenants_do_not_share_entries(self):
+        cache = MercuryResultCache(max_entries=10, ttls={"product": 60}, persistent_path="")
+        cache.set(1, "product", "filtro", ["a"])
+        assert cache.get(2, "product", "filtro") is MISSING
+
+    def test_expired_entries(self):
+        cache = MercuryResultCache(max_entries=10, ttls={"product": -1, "warranty": 60}, persistent_path="")
+        cache.set(1, "product", "filtro", ["a"])
+        assert cache.get(1, "product", "filtro") is MISSING
+
+    def test_empty_results_are_cached_with_shorter_ttl(self, tmp_path):
+        cache = MercuryResultCache(max_entries=10, ttls={"product": 900, "warranty": 60}, persistent_path=str(tmp_path / "cache.db"), empty_ttl=30)
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return []
+
+        async def run():
+            return [await cache.get_or_fetch(1, "product", "naoexiste", fetch) for _ in range(3)]
+
+        # "Nenhum registro" é resposta do portal: as buscas seguintes não o consultam de novo.
+        assert asyncio.run(run()) == [[], [], []]
+        assert len(calls) == 1
+        cache.set(1, "warranty", "2B123456", None)
+        assert cache.get(1, "warranty", "2B123456") is None
+        # Validade: a menor entre a da operação e a de resultados vazios.
+        now = time.time()
+        assert 0 < cache.memory._data[(1, "product", "NAOEXISTE")][0] - now <= 30
+        cache.memory.clear()
+        assert cache.get(1, "warranty", "2B123456") is None # Também na camada persistente.
+
+    def test_lru_eviction(self):
+        cache = MercuryResultCache(max_entries=2, ttls={"product": 60}, persistent_path="")
+        cache.set(1, "product", "a", [1])
+        cache.set(1, "product", "b", [2])
+        cache.get(1, "product", "a")
+        cache.set(1, "product", "c", [3])
+        assert cache.get(1, "product", "b") is MISSING
+        assert cache.get(1, "product", "a") == [1]
+
+    def test_invalidate(self):
+        cache = MercuryResultCache(max_entries=10, ttls={"product": 60, "warranty": 60}, persistent_path="")
+        cache.set(1, "product", "a", [1])
+        cache.set(1, "warranty", "s1", {"x": 1})
+        cache.set(2, "product", "a", [1])
+        assert cache.invalidate(1, operation="product") == 1
+        assert cache.get(1, "warranty", "s1") == {"x": 1}
+        assert cache.get(2, "product", "a") == [1]
+
+    def test_stale_entries_are_kept_for_outages(self, tmp_path):
+        cache = MercuryResultCache(max_entries=10, ttls={"product": -1}, persistent_path=str(tmp_path / "c.db"), stale_ttl=60)
+        cache.set(1, "product", "filtro", ["a"])
+        assert cache.get(1, "product", "filtro") is MISSING
+        assert cache.get_stale(1, "product", "filtro") == ["a"]
+        cache.memory.clear()
+        assert cache.get_stale(1, "product", "filtro") == ["a"]
+        assert cache.get_stale(2, "product", "filtro") is MISSING
+        no_stale = MercuryResultCache(max_entries=10, ttls={"product": -1}, persistent_path="", stale_ttl=0)
+        no_stale.set(1, "product", "filtro", ["a"])
+        assert no_stale.get_stale(1, "product", "filtro") is MISSING
+
+    def test_persistent_tier_survives_restart(self, tmp_path):
+        path = str(tmp_path / "mercury_cache.db")
+        first = MercuryResultCache(max_entries=10, ttls={"warranty": 60}, persistent_path=path)
+        first.set(1, "warranty", "2B123456", {"modelo": "F115"})
+        second = MercuryResultCache(max_entries=10, ttls={"warranty": 60}, persistent_path=path)
+        assert second.get(1, "warranty", "2B123456") == {"modelo": "F115"}
+        assert second.stats()["persistent_hits"] == 1
+        second.invalidate(1)
+        third = MercuryResultCache(max_entries=10, ttls={"warranty": 60}, persistent_path=path)
+        assert third.get(1, "warranty", "2B123456") is MISSING
+
+
+@pytest.mark.mercury
+class TestSingleFlight:
+    """Test coalescing of identical in-flight requests"""
+
+    def test_concurrent_callers_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return ["result"]
+
+        async def run():
+            return await asyncio.gather(*[flight.do((1, "product", "A"), fetch) for _ in range(5)])
+
+        assert asyncio.run(run()) == [["result"]] * 5
+        assert len(calls) == 1
+        assert flight.stats() == {"in_flight": 0, "executions": 1, "shared": 4}
+
+    def test_distinct_keys_run_separately(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return key
+
+        async def run():
+            return await asyncio.gather(
+                flight.do((1, "product", "A"), lambda: fetch("t1")),
+                flight.do((2, "product", "A"), lambda: fetch("t2")),
+            )
+
+        assert asyncio.run(run()) == ["t1", "t2"]
+        assert sorted(calls) == ["t1", "t2"]
+
+    def test_errors_are_shared_and_not_cached(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("portal down")
+
+        async def run():
+            results = await asyncio.gather(*[flight.do("k", failing) for _ in range(3)], return_exceptions=True)
+            assert all(isinstance(r, RuntimeError) for r in results)
+            await asyncio.gather(flight.do("k", failing), return_exceptions=True)
+
+        asyncio.run(run())
+        assert len(calls) == 2
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "ok"
+
+        async def run():
+            first = asyncio.create_task(flight.do("k", fetch))
+            second = asyncio.create_task(flight.do("k", fetch))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(run()) == "ok"
+
+
+@pytest.mark.mercury
+class TestPortalLimiter:
+    """Test global/per-tenant concurrency limits and the rate governor"""
+
+    def test_global_and_tenant_limits(self):
+        limiter = PortalLimiter(max_concurrency=2, per_tenant=1, queue_timeout=1, rps=0)
+        running = {"now": 0, "peak": 0, "tenant1": 0, "tenant1_peak": 0}
+
+        async def op(tenant_id):
+            async with limiter.slot(tenant_id):
+                running["now"] += 1
+                running["peak"] = max(running["peak"], running["now"])
+                if tenant_id == 1:
+                    running["tenant1"] += 1
+                    running["tenant1_peak"] = max(running["tenant1_peak"], running["tenant1"])
+                await asyncio.sleep(0.01)
+                running["now"] -= 1
+                if tenant_id == 1:
+                    running["tenant1"] -= 1
+
+        async def run():
+            await asyncio.gather(*[op(tenant) for tenant in [1, 1, 1, 2, 2, 3]])
+
+        asyncio.run(run())
+        assert running["peak"] == 2
+        assert running["tenant1_peak"] == 1
+        stats = limiter.stats()
+        assert stats["granted"] == 6
+        assert stats["active"] == 0 and stats["queue_depth"] == 0
+
+    def test_round_robin_between_tenants(self):
+        limiter = PortalLimiter(max_concurrency=1, per_tenant=1, queue_timeout=1, rps=0)
+        order = []
+
+        async def op(tenant_id, label):
+            async with limiter.slot(tenant_id):
+                order.append(label)
+                await asyncio.sleep(0.001)
+
+        async def run():
+            # O tenant 1 enfileira um lote antes do tenant 2 chegar.
+            tasks = [asyncio.create_task(op(1, f"a{i}")) for i in range(4)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(op(2, "b0")))
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+        assert order.index("b0") <= 2
+
+    def test_queue_timeout_and_rejection(self):
+        limiter = PortalLimiter(max_concurrency=1, per_tenant=1, queue_timeout=0.02, max_queue=1, rps=0)
+
+        async def hold():
+            async with limiter.slot(1):
+                await asyncio.sleep(0.1)
+
+        async def run():
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(limiter.acquire(2))
+            await asyncio.sleep(0)
+            with pytest.raises(PortalBusy):
+                await limiter.acquire(3) # Fila cheia.
+            with pytest.raises(PortalBusy):
+                await waiting # Tempo esgotado.
+            await holder
+
+        asyncio.run(run())
+        stats = limiter.stats()
+        assert stats["rejected"] == 1
+        assert stats["timeouts"] == 1
+        assert stats["queue_depth"] == 0 and stats["active"] == 0
+
+    def test_throttle_caps_request_rate(self):
+        limiter = PortalLimiter(rps=20, burst=1)
+
+        async def run():
+            started = asyncio.get_running_loop().time()
+            for _ in range(4):
+                await limiter.throttle()
+            return asyncio.get_running_loop().time() - started
+
+        assert asyncio.run(run()) >= 0.14
+        assert limiter.stats()["throttled"] == 3
+
+
+@pytest.mark.mercury
+class TestCircuitBreaker:
+    """Test the portal circuit breaker state machine"""
+
+    def test_trips_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, call_timeout=1)
+
+        async def failing():
+            raise RuntimeError("portal down")
+
+        async def run():
+            for _ in range(3):
+                with pytest.raises(RuntimeError):
+                    await breaker.call(failing)
+            with pytest.raises(CircuitOpen):
+                await breaker.call(failing)
+
+        asyncio.run(run())
+        stats = breaker.stats()
+        assert stats["state"] == "open"
+        assert stats["failures"] == 3 and stats["rejected"] == 1 and stats["trips"] == 1
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, call_timeout=1)
+
+        async def failing():
+            raise RuntimeError("portal down")
+
+        async def ok():
+            return "ok"
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                await breaker.call(failing)
+            assert await breaker.call(ok) == "ok"
+            with pytest.raises(RuntimeError):
+                await breaker.call(failing)
+
+        asyncio.run(run())
+        assert breaker.state == "closed"
+
+    def test_timeout_counts_as_failure(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, call_timeout=0.01)
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        with pytest.raises(MercuryPortalError):
+            asyncio.run(breaker.call(slow))
+        assert breaker.state == "open"
+        assert breaker.stats()["timeouts"] == 1
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01, call_timeout=1)
+        outcomes = iter([RuntimeError("down"), RuntimeError("still down"), "ok"])
+
+        async def portal():
+            await asyncio.sleep(0.005)
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                await breaker.call(portal)
+            await asyncio.sleep(0.02)
+            with pytest.raises(RuntimeError):
+                await breaker.call(portal) # Chamada de teste falha: abre de novo.
+            assert breaker.state == "open"
+            await asyncio.sleep(0.02)
+            probe = asyncio.create_task(breaker.call(portal))
+            await asyncio.sleep(0)
+            with pytest.raises(CircuitOpen):
+                breaker.check() # Só uma chamada de teste por vez.
+            assert await probe == "ok"
+
+        asyncio.run(run())
+        assert breaker.state == "closed"
+
+
+@pytest.mark.mercury
+class TestReplayPortal:
+    """Run the real HTTP backend against the local replay portal (benchmarks/mercury_replay.py)"""
+
+    def test_product_search_and_no_records(self):
+        from benchmarks.mercury_replay import ReplayServer
+
+        with ReplayServer(extra_rows=5) as server:
+            client = MercuryHttpClient(base_url=server.base_url)
+
+            async def run():
+                try:
+                    rows = await client.search_product("filtro", "user", "pw", tenant_id=1)
+                    empty = await client.search_product("norecords", "user", "pw", tenant_id=1)
+                    return rows, empty
+                finally:
+                    await client.close()
+
+            rows, empty = asyncio.run(run())
+        assert len(rows) == 8
+        assert rows[-1]["codigo"] == "8M0000004"
+        assert empty == []
+        assert server.stats()["logins"] == 1
+
+    def test_warranty_found_and_not_found(self):
+        from benchmarks.mercury_replay import ReplayServer
+
+        with ReplayServer() as server:
+            client = MercuryHttpClient(base_url=server.base_url)
+
+            async def run():
+                try:
+                    found = await client.search_warranty("2B999001", "user", "pw", tenant_id=1)
+                    missing = await client.search_warranty("9Z000000", "user", "pw", tenant_id=1, include_client=False)
+                    return found, missing
+                finally:
+                    await client.close()
+
+            found, missing = asyncio.run(run())
+        assert found["nro_serie"] == "2B999001"
+        assert found["nome_cli"] == "JOAO DA SILVA"
+        assert missing is None
+
+    def test_relogin_after_session_expires(self):
+        from benchmarks.mercury_replay import ReplayServer
+
+        with ReplayServer(session_max_requests=2) as server:
+            client = MercuryHttpClient(base_url=server.base_url)
+
+            async def run():
+                try:
+                    return [await client.search_product("filtro", "user", "pw", tenant_id=1) for _ in range(5)]
+                finally:
+                    await client.close()
+
+            results = asyncio.run(run())
+        assert all(len(rows) == 3 for rows in results)
+        assert server.stats()["expired"] >= 1
+        assert server.stats()["logins"] >= 2
+
+    def test_injected_failures_raise_unavailable(self):
+        from benchmarks.mercury_replay import ReplayServer
+
+        with ReplayServer(failure_rate=1.0, failure_mode="500") as server:
+            client = MercuryHttpClient(base_url=server.base_url)
+
+            async def run():
+                try:
+                    await client.search_product("filtro", "user", "pw", tenant_id=1)
+                finally:
+                    await client.close()
+
+            with pytest.raises(MercuryHttpUnavailable):
+                asyncio.run(run())
+        assert server.stats()["failures"] >= 1
+
+
+class FakeBrowserContext(FakeContext):
+    """FakeContext that also tracks being closed and can fail to clear cookies"""
+
+    def __init__(self, clear_fails=False):
+        super().__init__()
+        self.closed = False
+        self.clear_fails = clear_fails
+
+    async def clear_cookies(self):
+        if self.clear_fails:
+            raise RuntimeError("context died")
+        await super().clear_cookies()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    """Minimal stand-in for a Playwright Browser"""
+
+    def __init__(self):
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self):
+        context = FakeBrowserContext()
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.connected = False
+
+
+class FakePlaywright:
+    """Minimal stand-in for the started Playwright driver; records every launch"""
+
+    def __init__(self):
+        self.browsers = []
+        self.chromium = self
+
+    async def launch(self, headless=True):
+        browser = FakeBrowser()
+        self.browsers.append(browser)
+        return browser
+
+    async def stop(self):
+        pass
+
+
+@pytest.mark.mercury
+class TestBrowserPool:
+    """Test context reuse, recycling and release of the Chromium context pool"""
+
+    def make_pool(self, **kwargs):
+        from services.mercury_pool import BrowserPool
+        pool = BrowserPool(size=kwargs.pop("size", 2), headless=True, **kwargs)
+        # Injeta o driver falso: `start()` só chama async_playwright() quando não há um.
+        pool._playwright = FakePlaywright()
+        return pool
+
+    def test_context_is_reused_and_cookies_cleared(self):
+        pool = self.make_pool(max_uses=10)
+
+        async def run():
+            async with pool.context() as first:
+                await first.add_cookies([{"name": "ASPSESSION", "value": "tenant1"}])
+            async with pool.context() as second:
+                return first, second
+
+        first, second = asyncio.run(run())
+        assert second is first
+        assert first.cookies == []
+        assert not first.closed
+        stats = pool.stats()
+        assert stats["contexts_created"] == 1
+        assert stats["contexts_recycled"] == 0
+        assert stats["idle"] == 1
+        assert stats["in_use"] == 0
+
+    def test_context_recycled_after_max_uses(self):
+        pool = self.make_pool(max_uses=2)
+
+        async def run():
+            seen = []
+            for _ in range(3):
+                async with pool.context() as context:
+                    seen.append(context)
+            return seen
+
+        first, second, third = asyncio.run(run())
+        assert second is first
+        # Esgotou os usos: é fechado na devolução e o próximo empréstimo cria outro.
+        assert first.closed
+        assert third is not first
+        assert pool.stats()["contexts_created"] == 2
+        assert pool.stats()["contexts_recycled"] == 1
+
+    def test_context_released_and_replaced_after_exception(self):
+        pool = self.make_pool(size=1, max_uses=10)
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                async with pool.context() as broken:
+                    raise RuntimeError("page crashed")
+            assert pool.stats()["in_use"] == 0
+            # Com size=1, o slot precisa ter sido devolvido ou isto ficaria bloqueado.
+            async with asyncio.timeout(1):
+                async with pool.context() as replacement:
+                    pass
+            return broken, replacement
+
+        broken, replacement = asyncio.run(run())
+        assert broken.closed
+        assert replacement is not broken
+        assert pool.stats()["contexts_recycled"] == 1
+        assert pool.stats()["idle"] == 1
+
+    def test_context_that_fails_to_clear_cookies_is_discarded(self):
+        pool = self.make_pool(max_uses=10)
+
+        async def run():
+            async with pool.context() as dead:
+                dead.clear_fails = True
+            async with pool.context() as fresh:
+                pass
+            return dead, fresh
+
+        dead, fresh = asyncio.run(run())
+        assert dead.closed
+        assert fresh is not dead
+        assert pool.stats()["contexts_recycled"] == 1
+
+    def test_dead_browser_is_relaunched_and_stale_contexts_dropped(self):
+        pool = self.make_pool(max_uses=10)
+
+        async def run():
+            async with pool.context() as old:
+                pass
+            # O navegador caiu com o contexto ocioso no pool.
+            pool._playwright.browsers[0].connected = False
+            assert pool.stats()["running"] is False
+            async with pool.context() as new:
+                pass
+            return old, new
+
+        old, new = asyncio.run(run())
+        browsers = pool._playwright.browsers
+        assert len(browsers) == 2
+        # O contexto da geração anterior é descartado, não emprestado.
+        assert old.closed
+        assert new is not old
+        assert new in browsers[1].contexts
+        stats = pool.stats()
+        assert stats["running"] is True
+        assert stats["browser_restarts"] == 1
+        assert stats["contexts_recycled"] == 1
+
+    def test_page_is_closed_after_block(self):
+        pool = self.make_pool(max_uses=10)
+        pages = []
+
+        class Page:
+            closed = False
+
+            async def close(self):
+                self.closed = True
+
+        async def new_page():
+            pages.append(Page())
+            return pages[-1]
+
+        async def run():
+            async with pool.context() as context:
+                context.new_page = new_page
+            async with pool.page() as page:
+                assert not page.closed
+            await pool.stop()
+
+        asyncio.run(run())
+        assert pages[0].closed
+        assert pool.stats()["running"] is False
+        assert pool.stats()["idle"] == 0
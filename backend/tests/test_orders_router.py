@@ -200,3 +200,77 @@ class TestOrdersRouter:
         response = client.get("/api/orders")
         
         assert response.status_code == 401
+
+
+@pytest.fixture
+def busy_orders(db, test_tenant):
+    """Three service orders with 40 items and 30 notes each"""
+    from models import Boat, Client, ItemType, OrderNote, ServiceItem, ServiceOrder
+
+    owner = Client(name="Owner", document="12345678900", tenant_id=test_tenant.id)
+    db.add(owner)
+    db.commit()
+    boat = Boat(name="Boat", hull_id="HULL-1", client_id=owner.id, tenant_id=test_tenant.id)
+    db.add(boat)
+    db.commit()
+    orders = [ServiceOrder(boat_id=boat.id, description=f"Revisão {i}", tenant_id=test_tenant.id) for i in range(3)]
+    db.add_all(orders)
+    db.commit()
+    for order in orders:
+        db.add_all(
+            [ServiceItem(order_id=order.id, type=ItemType.PART, description=f"Item {i}", unit_price=10, total=10) for i in range(40)]
+            + [OrderNote(order_id=order.id, text=f"Nota {i}") for i in range(30)]
+        )
+    db.commit()
+    order_ids = [order.id for order in orders]
+    db.expunge_all()
+    return order_ids
+
+
+@pytest.mark.crud
+class TestOrderLoading:
+    """Test that orders load items and notes without an items x notes join"""
+
+    def test_get_order_fetches_items_plus_notes_rows(self, db, busy_orders, sql_counter):
+        import crud
+
+        with sql_counter:
+            order = crud.get_order(db, busy_orders[0])
+            assert (len(order.items), len(order.notes)) == (40, 30)
+        # A OS, os itens e as notas: uma consulta cada, 1 + 40 + 30 linhas (e não 40 x 30).
+        assert sql_counter.count == 3
+        assert sql_counter.rows() == 71
+
+    def test_get_orders_query_count_is_constant(self, db, busy_orders, sql_counter):
+        import crud
+
+        with sql_counter:
+            orders = crud.get_orders(db, limit=10)
+            assert [len(o.items) + len(o.notes) for o in orders] == [70, 70, 70]
+        assert sql_counter.count == 3
+        assert sql_counter.rows() == 3 + 3 * 70
+
+    def test_list_query_count_does_not_grow_with_orders(self, db, test_tenant, assert_list_queries_constant):
+        from models import Boat, Client, ItemType, OrderNote, ServiceItem, ServiceOrder
+
+        owner = Client(name="Owner", document="12345678900", tenant_id=test_tenant.id)
+        owner.boats = [Boat(name="Boat", hull_id="HULL-1", tenant_id=test_tenant.id)]
+        db.add(owner)
+        db.commit()
+        boat_id = owner.boats[0].id
+
+        def add_orders(n):
+            for i in range(n):
+                order = ServiceOrder(boat_id=boat_id, description=f"Revisão {i}", tenant_id=test_tenant.id)
+                order.items = [ServiceItem(type=ItemType.LABOR, description="Mão de obra", unit_price=100, total=100)]
+                order.notes = [OrderNote(text="Cliente aguardando")]
+                db.add(order)
+            db.commit()
+
+        assert_list_queries_constant("/api/orders", add_orders)
+
+    def test_order_endpoint_returns_all_items_and_notes(self, client: TestClient, auth_headers, busy_orders):
+        response = client.get(f"/api/orders/{busy_orders[0]}", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert (len(data["items"]), len(data["notes"])) == (40, 30)
@@ -6,6 +6,8 @@ import {
 import { StorageService } from '../services/storage';
 import { FiscalDocType, FiscalStatus, FiscalInvoice, FiscalIssuer, FiscalDataPayload } from '../types';
 
+const FISCAL_JOB_POLL_MS = 2000; // Intervalo da consulta das emissões em andamento.
+
 interface FiscalViewProps {
     initialData?: FiscalDataPayload | null;
 }
@@ -130,28 +132,25 @@ export const FiscalView: React.FC<FiscalViewProps> = ({ initialData }) => {
                 issRetido: type === FiscalDocType.NFSE ? nfseData.issRetido : false
             };
 
+            // Emissão pela fila (?async=true): a API responde na hora com o job e a tela não
+            // fica presa esperando a SEFAZ; o resultado é acompanhado em pollFiscalJob.
             const ApiService = (await import('../services/api')).ApiService;
-            const result = await ApiService.emitFiscalInvoice(invoiceData);
-
-            if (result.status === 'success') {
-                const newInvoice: FiscalInvoice = {
-                    id: Math.random().toString(),
-                    type,
-                    number: result.number || Math.floor(Math.random() * 1000).toString(),
-                    series: '1',
-                    status: FiscalStatus.AUTHORIZED,
-                    issuedAt: new Date().toISOString(),
-                    recipientName: type === FiscalDocType.NFE ? nfeData.destinatario : nfseData.tomador,
-                    recipientDoc: type === FiscalDocType.NFE ? nfeData.docDestinatario : nfseData.docTomador,
-                    totalValue: type === FiscalDocType.NFE ? nfeData.items.reduce((acc, i) => acc + i.total, 0) : nfseData.valorServico,
-                    authorizationProtocol: result.protocol
-                };
-                setHistory([newInvoice, ...history]);
-                alert(`${type} transmitida com sucesso!\nProtocolo: ${result.protocol}\nMensagem: ${result.message}`);
-                setActiveTab('history');
-            } else {
-                alert(`Erro ao transmitir ${type}: ${result.message}`);
-            }
+            const job = await ApiService.emitFiscalInvoiceAsync(invoiceData);
+
+            const newInvoice: FiscalInvoice = {
+                id: `job-${job.id}`,
+                type,
+                number: job.number,
+                series: job.series || '1',
+                status: FiscalStatus.TRANSMITTING,
+                issuedAt: new Date().toISOString(),
+                recipientName: invoiceData.recipient.name,
+                recipientDoc: invoiceData.recipient.doc,
+                totalValue: invoiceData.totalValue
+            };
+            setHistory(prev => [newInvoice, ...prev]);
+            setActiveTab('history');
+            pollFiscalJob(job.id);
         } catch (error: any) {
             alert(`Erro ao transmitir nota fiscal: ${error.message}`);
         } finally {
@@ -159,6 +158,39 @@ export const FiscalView: React.FC<FiscalViewProps> = ({ initialData }) => {
         }
     };
 
+    // Acompanha os jobs de emissão enquanto a tela estiver aberta.
+    const isMounted = React.useRef(true);
+    React.useEffect(() => () => { isMounted.current = false; }, []);
+
+    const pollFiscalJob = async (jobId: number) => {
+        const ApiService = (await import('../services/api')).ApiService;
+        while (isMounted.current) {
+            await new Promise(resolve => setTimeout(resolve, FISCAL_JOB_POLL_MS));
+            let job;
+            try {
+                job = await ApiService.getFiscalJob(jobId);
+            } catch {
+                continue; // Falha de rede momentânea: tenta de novo no próximo ciclo.
+            }
+            if (!['authorized', 'rejected', 'failed'].includes(job.status)) continue;
+
+            const authorized = job.status === 'authorized';
+            setHistory(prev => prev.map(inv => inv.id !== `job-${jobId}` ? inv : {
+                ...inv,
+                status: authorized ? FiscalStatus.AUTHORIZED : FiscalStatus.REJECTED,
+                authorizationProtocol: job.protocol || undefined,
+                xml: job.xml || undefined,
+                rejectionReason: authorized ? undefined : (job.message || job.last_error || undefined)
+            }));
+            if (authorized) {
+                alert(`${job.type} ${job.number} transmitida com sucesso!\nProtocolo: ${job.protocol}\nMensagem: ${job.message}`);
+            } else {
+                alert(`Erro ao transmitir ${job.type} ${job.number}: ${job.message || job.last_error}`);
+            }
+            return;
+        }
+    };
+
     const handlePrint = (invoice: FiscalInvoice) => {
         const printWindow = window.open('', '_blank');
         if (!printWindow) return;
@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
-import { Part, Invoice, InvoiceItem, StockMovement } from '../types';
+import { Part, Invoice, StockMovement } from '../types';
 import { StorageService } from '../services/storage';
 import {
     Plus, Search, AlertTriangle, ShoppingCart, UploadCloud, FileText,
@@ -86,66 +86,36 @@ export const InventoryView: React.FC = () => {
         setInvoices(StorageService.getInvoices());
     };
 
-    // --- XML PARSER LOGIC ---
-    const handleXmlUpload = (event: React.ChangeEvent<HTMLInputElement>) => {
-        const file = event.target.files?.[0];
-        if (!file) return;
+    // --- XML IMPORT ---
+    // Os XMLs (ou .zip) são enviados ao backend, que lê as notas, vincula os itens às peças
+    // e lança os movimentos de entrada numa única requisição.
+    const handleXmlUpload = async (event: React.ChangeEvent<HTMLInputElement>) => {
+        const files = Array.from(event.target.files || []);
+        event.target.value = '';
+        if (!files.length) return;
 
-        const reader = new FileReader();
-        reader.onload = (e) => {
-            const text = e.target?.result as string;
-            try {
-                const parser = new DOMParser();
-                const xmlDoc = parser.parseFromString(text, "text/xml");
-
-                // Extract NFe Data (Basic extraction based on standard NFe layout)
-                const number = xmlDoc.getElementsByTagName('nNF')[0]?.textContent || '';
-                const supplier = xmlDoc.getElementsByTagName('xNome')[0]?.textContent || '';
-                const date = xmlDoc.getElementsByTagName('dhEmi')[0]?.textContent?.split('T')[0] || new Date().toISOString().split('T')[0];
-
-                // Extract Items
-                const detNodes = xmlDoc.getElementsByTagName('det');
-                const items: InvoiceItem[] = [];
-
-                for (let i = 0; i < detNodes.length; i++) {
-                    const prod = detNodes[i].getElementsByTagName('prod')[0];
-                    const sku = prod.getElementsByTagName('cProd')[0]?.textContent || '';
-                    const name = prod.getElementsByTagName('xProd')[0]?.textContent || '';
-                    const qCom = parseFloat(prod.getElementsByTagName('qCom')[0]?.textContent || '0');
-                    const vUnCom = parseFloat(prod.getElementsByTagName('vUnCom')[0]?.textContent || '0');
-
-                    // Try to find matching part in system
-                    const existingPart = parts.find(p => p.sku === sku || p.barcode === sku);
-
-                    items.push({
-                        sku,
-                        name,
-                        quantity: qCom,
-                        unitCost: vUnCom,
-                        total: qCom * vUnCom,
-                        partId: existingPart ? existingPart.id : undefined // Link if found
-                    });
-                }
-
-                const totalValue = items.reduce((acc, curr) => acc + curr.total, 0);
-
-                setInvoiceForm({
-                    number,
-                    supplier,
-                    date,
-                    items,
-                    totalValue,
-                    xmlKey: 'IMPORTED_FROM_XML'
-                });
+        try {
+            const result = await ApiService.importInvoiceXmls(files);
+            const unmatched = result.documents.flatMap((doc: any) =>
+                (doc.unmatched || []).map((line: any) => `NF ${doc.number}: ${line.sku} - ${line.name}`)
+            );
+            const failed = result.documents
+                .filter((doc: any) => doc.status === 'error')
+                .map((doc: any) => `${doc.file}: ${doc.error}`);
 
-                alert(`XML Importado com sucesso! ${items.length} itens encontrados. Verifique a associação dos produtos.`);
+            let message = `${result.imported} nota(s) importada(s), ${result.movements} item(ns) lançados no estoque.`;
+            if (result.duplicates) message += `\n${result.duplicates} nota(s) já importada(s) foram ignoradas.`;
+            if (unmatched.length) message += `\n\nItens sem peça cadastrada (não lançados):\n${unmatched.slice(0, 20).join('\n')}`;
+            if (unmatched.length > 20) message += `\n... e mais ${unmatched.length - 20}.`;
+            if (failed.length) message += `\n\nArquivos com erro:\n${failed.join('\n')}`;
+            alert(message);
 
-            } catch (error) {
-                alert("Erro ao ler XML. Verifique se é uma NFe válida.");
-                console.error(error);
-            }
-        };
-        reader.readAsText(file);
+            loadData();
+            setActiveTab('overview');
+        } catch (error) {
+            alert("Erro ao importar XML. Verifique se são NF-e válidas.");
+            console.error(error);
+        }
     };
 
     const handleInvoiceSubmit = () => {
@@ -562,10 +532,11 @@ export const InventoryView: React.FC = () => {
                         <div className="bg-slate-50 border-2 border-dashed border-slate-300 rounded-xl p-8 text-center mb-6">
                             <UploadCloud className="w-10 h-10 text-slate-400 mx-auto mb-2" />
                             <p className="text-slate-600 font-medium">Importar XML da Nota Fiscal</p>
-                            <p className="text-xs text-slate-400 mb-4">Arraste o arquivo ou clique para selecionar</p>
+                            <p className="text-xs text-slate-400 mb-4">Selecione um ou mais XMLs, ou um arquivo .zip com as notas</p>
                             <input
                                 type="file"
-                                accept=".xml"
+                                accept=".xml,.zip"
+                                multiple
                                 className="hidden"
                                 id="xmlUpload"
                                 onChange={handleXmlUpload}
@@ -574,7 +545,7 @@ export const InventoryView: React.FC = () => {
                                 htmlFor="xmlUpload"
                                 className="bg-cyan-600 text-white px-4 py-2 rounded-lg cursor-pointer hover:bg-cyan-700 text-sm font-medium"
                             >
-                                Selecionar Arquivo XML
+                                Selecionar Arquivos XML
                             </label>
                         </div>
 
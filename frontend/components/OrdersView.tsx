@@ -52,6 +52,8 @@ const CHECKLIST_TEMPLATES = {
 
 export const OrdersView: React.FC<OrdersViewProps> = ({ role, initialOrderId }) => {
     const [orders, setOrders] = useState<ServiceOrder[]>([]);
+    const [ordersCursor, setOrdersCursor] = useState<string | undefined>(undefined); // Próxima página de OS.
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
     const [boats, setBoats] = useState<Boat[]>([]);
     const [clients, setClients] = useState<Client[]>([]);
     const [parts, setParts] = useState<Part[]>([]);
@@ -104,6 +106,15 @@ export const OrdersView: React.FC<OrdersViewProps> = ({ role, initialOrderId })
             if (target) {
                 setSelectedOrder(target);
                 setActiveTab('details');
+            } else if (!isNaN(Number(initialOrderId))) {
+                // OS fora das páginas já carregadas: busca só ela.
+                ApiService.getOrder(Number(initialOrderId))
+                    .then(order => {
+                        setOrders(prev => prev.some(o => o.id === order.id) ? prev : [order, ...prev]);
+                        setSelectedOrder(order);
+                        setActiveTab('details');
+                    })
+                    .catch(() => undefined);
             }
         }
     }, [initialOrderId, orders]);
@@ -112,14 +123,17 @@ export const OrdersView: React.FC<OrdersViewProps> = ({ role, initialOrderId })
         setIsLoading(true);
         setError(null);
         try {
-            const [ordersData, boatsData, clientsData, partsData] = await Promise.all([
-                ApiService.getOrders(),
+            // A lista de OS é paginada (ver loadMoreOrders); embarcações, clientes e peças
+            // ainda vêm inteiros, pois a busca e os nomes da lista são resolvidos aqui.
+            const [ordersPage, boatsData, clientsData, partsData] = await Promise.all([
+                ApiService.getOrdersPage(),
                 ApiService.getBoats(),
                 ApiService.getClients(),
                 ApiService.getParts().catch(() => [])
             ]);
 
-            setOrders(ordersData);
+            setOrders(ordersPage.items);
+            setOrdersCursor(ordersPage.nextCursor);
             setBoats(boatsData);
             setClients(clientsData);
             setParts(partsData);
@@ -135,6 +149,21 @@ export const OrdersView: React.FC<OrdersViewProps> = ({ role, initialOrderId })
         }
     };
 
+    const loadMoreOrders = async () => {
+        if (!ordersCursor) return;
+        setIsLoadingMore(true);
+        try {
+            const page = await ApiService.getOrdersPage(ordersCursor);
+            setOrders(prev => [...prev, ...page.items.filter(o => !prev.some(p => p.id === o.id))]);
+            setOrdersCursor(page.nextCursor);
+        } catch (error: any) {
+            console.error("Error fetching orders", error);
+            setError("Erro ao carregar ordens: " + (error.response?.data?.detail || error.message));
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
+
     const isTechnician = role === UserRole.TECHNICIAN;
 
     const saveOrderUpdate = (updatedOrder: ServiceOrder) => {
@@ -833,6 +862,15 @@ export const OrdersView: React.FC<OrdersViewProps> = ({ role, initialOrderId })
                                 </div>
                             );
                         })}
+                        {ordersCursor && !isLoading && (
+                            <button
+                                onClick={loadMoreOrders}
+                                disabled={isLoadingMore}
+                                className="w-full p-2 border border-slate-200 rounded-lg bg-white text-sm text-slate-600 hover:bg-slate-100 disabled:opacity-50"
+                            >
+                                {isLoadingMore ? 'Carregando...' : 'Carregar mais'}
+                            </button>
+                        )}
                     </div>
                 </div>
 
@@ -39,6 +39,52 @@ api.interceptors.request.use((config) => {
     return config; // Retorna a configuração da requisição modificada.
 });
 
+// As listagens do backend são paginadas por cursor: cada resposta traz no cabeçalho
+// X-Next-Cursor o cursor da próxima página (ausente na última).
+const PAGE_SIZE = 500; // Maior página aceita pelo backend.
+const ORDERS_PAGE_SIZE = 50; // Página da lista de OS (botão "Carregar mais").
+
+// Uma página de uma listagem e o cursor da seguinte (undefined na última).
+export interface Page<T> {
+    items: T[];
+    nextCursor?: string;
+}
+
+/**
+ * Busca uma página de uma listagem.
+ * @param url O endpoint da listagem.
+ * @param params Os filtros da listagem.
+ * @param cursor O cursor devolvido pela página anterior (ausente na primeira).
+ * @param limit O tamanho da página.
+ * @returns Os itens da página e o cursor da próxima.
+ */
+async function fetchPage<T>(url: string, params: Record<string, any> = {}, cursor?: string, limit: number = PAGE_SIZE): Promise<Page<T>> {
+    const response = await api.get<T[]>(url, { params: { ...params, limit, cursor } });
+    return { items: response.data, nextCursor: response.headers['x-next-cursor'] || undefined };
+}
+
+/**
+ * Busca todas as páginas de uma listagem, seguindo o cursor até a última.
+ *
+ * Paliativo deliberado: carrega a tabela inteira, em páginas de PAGE_SIZE. Serve às telas
+ * que ainda filtram e cruzam os dados no navegador (cadastros usados como tabela de
+ * consulta — embarcações, clientes, peças — e a agenda). Listas que crescem sem limite
+ * devem usar fetchPage e carregar sob demanda, como a lista de OS (getOrdersPage).
+ * @param url O endpoint da listagem.
+ * @param params Os filtros da listagem.
+ * @returns Os itens de todas as páginas, na ordem do backend.
+ */
+async function fetchAllPages<T>(url: string, params: Record<string, any> = {}): Promise<T[]> {
+    const items: T[] = [];
+    let cursor: string | undefined;
+    do {
+        const page = await fetchPage<T>(url, params, cursor);
+        items.push(...page.items);
+        cursor = page.nextCursor;
+    } while (cursor);
+    return items;
+}
+
 // Objeto que contém todos os métodos para interagir com a API do backend.
 export const ApiService = {
     // --- AUTH (Autenticação) ---
@@ -87,8 +133,18 @@ export const ApiService = {
      */
     getOrders: async (status?: string) => {
         const params = status ? { status } : {};
-        const response = await api.get<ServiceOrder[]>('/orders', { params });
-        return response.data;
+        return fetchAllPages<ServiceOrder>('/orders', params);
+    },
+
+    /**
+     * Obtém uma página de ordens de serviço, da mais recente para a mais antiga.
+     * @param cursor Opcional: o cursor devolvido pela página anterior.
+     * @param status Opcional: filtra as ordens por status.
+     * @returns As ordens da página e o cursor da próxima.
+     */
+    getOrdersPage: async (cursor?: string, status?: string) => {
+        const params = status ? { status } : {};
+        return fetchPage<ServiceOrder>('/orders', params, cursor, ORDERS_PAGE_SIZE);
     },
 
     /**
@@ -160,8 +216,7 @@ export const ApiService = {
      * @returns Uma lista de peças.
      */
     getParts: async () => {
-        const response = await api.get<Part[]>('/inventory/parts');
-        return response.data;
+        return fetchAllPages<Part>('/inventory/parts');
     },
 
     /**
@@ -202,8 +257,7 @@ export const ApiService = {
      */
     getMovements: async (partId?: number) => {
         const params = partId ? { part_id: partId } : {};
-        const response = await api.get<StockMovement[]>('/inventory/movements', { params });
-        return response.data;
+        return fetchAllPages<StockMovement>('/inventory/movements', params);
     },
 
     /**
@@ -216,14 +270,28 @@ export const ApiService = {
         return response.data;
     },
 
+    /**
+     * Importa XMLs de NF-e de fornecedores (ou arquivos .zip com os XMLs) no estoque.
+     * A leitura, o vínculo dos itens às peças e os lançamentos são feitos no backend.
+     * @param files Os arquivos selecionados.
+     * @returns O resultado por nota (importada, duplicada ou com erro) e os itens não vinculados.
+     */
+    importInvoiceXmls: async (files: File[]) => {
+        const form = new FormData();
+        files.forEach(file => form.append('files', file));
+        const response = await api.post('/inventory/invoices/import', form, {
+            headers: { 'Content-Type': 'multipart/form-data' }
+        });
+        return response.data;
+    },
+
     // --- CLIENTS & BOATS (Clientes e Embarcações) ---
     /**
      * Obtém uma lista de todos os clientes.
      * @returns Uma lista de clientes.
      */
     getClients: async () => {
-        const response = await api.get<Client[]>('/clients');
-        return response.data;
+        return fetchAllPages<Client>('/clients');
     },
 
     /**
@@ -233,8 +301,7 @@ export const ApiService = {
      */
     getBoats: async (clientId?: number) => {
         const params = clientId ? { client_id: clientId } : {};
-        const response = await api.get<Boat[]>('/boats', { params });
-        return response.data;
+        return fetchAllPages<Boat>('/boats', params);
     },
 
     /**
@@ -269,6 +336,36 @@ export const ApiService = {
         return response.data;
     },
 
+    /**
+     * Enfileira a emissão de uma nota fiscal e retorna na hora com o job criado.
+     * @param invoiceData Os dados da nota fiscal.
+     * @returns O job de emissão (acompanhar com getFiscalJob).
+     */
+    emitFiscalInvoiceAsync: async (invoiceData: any) => {
+        const response = await api.post('/fiscal/emit', invoiceData, { params: { async: true } });
+        return response.data.job;
+    },
+
+    /**
+     * Consulta uma emissão assíncrona (status, protocolo e XML).
+     * @param jobId O ID do job de emissão.
+     * @returns O job de emissão.
+     */
+    getFiscalJob: async (jobId: number) => {
+        const response = await api.get(`/fiscal/jobs/${jobId}`);
+        return response.data.job;
+    },
+
+    /**
+     * Lista os números fiscais reservados e seu destino (usado, inutilizar ou reservado).
+     * @param status Filtra por status ('reserved', 'used' ou 'voided').
+     * @returns Os números da série, do mais recente ao mais antigo.
+     */
+    getFiscalNumbers: async (status?: string) => {
+        const response = await api.get('/fiscal/numbers', { params: { status } });
+        return response.data.numbers;
+    },
+
     // --- MERCURY ---
     /**
      * Pesquisa um produto no portal Mercury Marine.
@@ -306,8 +403,7 @@ export const ApiService = {
      * @returns Uma lista de transações.
      */
     getTransactions: async () => {
-        const response = await api.get<Transaction[]>('/transactions');
-        return response.data;
+        return fetchAllPages<Transaction>('/transactions');
     },
 
     /**
@@ -328,8 +424,7 @@ export const ApiService = {
      */
     getManufacturers: async (type?: 'BOAT' | 'ENGINE') => {
         const params = type ? { type } : {};
-        const response = await api.get<Manufacturer[]>('/config/manufacturers', { params });
-        return response.data;
+        return fetchAllPages<Manufacturer>('/config/manufacturers', params);
     },
 
     /**